@@ -1,13 +1,20 @@
-import streamlit as st
+import importlib
 import pandas as pd
+import streamlit as st
 import backend as db
-import base64
+import profiling
 import ui
-from datetime import datetime, date
-from streamlit_pdf_viewer import pdf_viewer
+from admin.common import auto_refresh
+
+# Every session shares one snapshot of the ledger (backend.Snapshot). With
+# copy-on-write, a page that assigns into a frame copies what it changes
+# instead of writing through to everyone's. Pages must not mutate snapshot
+# frames in place all the same: the write lands in their own copy and is lost.
+pd.set_option("mode.copy_on_write", True)
 
 # --- CONFIG ---
 st.set_page_config(page_title="Admin | Notion to Sew", layout="wide", page_icon="🧵", initial_sidebar_state="expanded")
+profiling.start("Home.py")
 
 ui.inject()
 
@@ -56,167 +63,13 @@ st.markdown("""
 
 """, unsafe_allow_html=True)
 
-# --- HELPER: AUTO REFRESH ---
-def auto_refresh():
-    """Clears session state to force a data reload."""
-    if 'data' in st.session_state:
-        del st.session_state['data']
-    st.rerun()
-
-# --- HELPER: Branded page header ---
-def page_header(icon: str, title: str, subtitle: str = ""):
-    ui.page_header(icon, title, subtitle)
-
-# --- HELPER: Normalize transaction IDs (handles "1001.0" → "1001" from old imports) ---
-def _normalize_tid(tid) -> str:
-    s = str(tid).strip()
-    try:
-        return str(int(float(s)))
-    except (ValueError, TypeError):
-        return s
-
-def _get_pdf_print_button(pdf_bytes, label="🖨️ Print / Open in New Tab"):
-    """Generates an HTML button that opens the PDF in a new browser tab for direct printing."""
-    try:
-        b64 = base64.b64encode(pdf_bytes).decode()
-        # Primary Streamlit Red: #FF4B4B
-        html = f"""
-            <a href="data:application/pdf;base64,{b64}" target="_blank" style="text-decoration: none;">
-                <button style="
-                    width: 100%;
-                    background-color: #FF4B4B;
-                    color: white;
-                    padding: 0.5rem 1rem;
-                    border: none;
-                    border-radius: 0.5rem;
-                    cursor: pointer;
-                    font-weight: 500;
-                    font-size: 1rem;
-                    margin-top: 10px;
-                    margin-bottom: 10px;
-                ">
-                    {label}
-                </button>
-            </a>
-        """
-        st.markdown(html, unsafe_allow_html=True)
-    except Exception as e:
-        st.error(f"Could not generate print link: {e}")
-
-# --- HELPER: Build PDF from stored transaction ---
-def _build_invoice_pdf(transaction_id: str, customer_name: str) -> bytes:
-    """Reconstruct a PDF for any historical transaction from session data."""
-    data = st.session_state['data']
-    norm_id = _normalize_tid(transaction_id)
-    items_df = data['items'].copy()
-    items_df['TransactionID'] = items_df['TransactionID'].apply(_normalize_tid)
-    inv_items = items_df[items_df['TransactionID'] == norm_id]
-    
-    # --- RACE CONDITION FIX: Refresh if items not yet in cache ---
-    if inv_items.empty:
-        db.force_refresh()
-        st.session_state['data'] = db.get_data()
-        data = st.session_state['data']
-        items_df = data['items'].copy()
-        items_df['TransactionID'] = items_df['TransactionID'].apply(_normalize_tid)
-        inv_items = items_df[items_df['TransactionID'] == norm_id]
-
-    cart = []
-    for _, item in inv_items.iterrows():
-        try: q, p = int(item['QtySold']), float(item['Price'])
-        except: q, p = 1, 0.0
-        cart.append({"sku": str(item.get('SKU', '')), "name": item['Name'], "qty": q, "price": p})
-    addr = "Modesto, CA"
-    if 'settings' in data:
-        s = dict(zip(data['settings']['Key'], data['settings']['Value']))
-        addr = s.get("Address", addr)
-    trans_df = data['transactions'].copy()
-    trans_df['TransactionID'] = trans_df['TransactionID'].apply(_normalize_tid)
-    t = trans_df[trans_df['TransactionID'] == norm_id]
-    tax, total, due, t_date = 0.0, 0.0, "", None
-    if not t.empty:
-        r = t.iloc[0]
-        try: tax = float(r['TaxAmount'] or 0)
-        except: pass
-        try: total = float(r['TotalAmount'] or 0)
-        except: pass
-        due = str(r.get('DueDate', ''))
-        t_date = r.get('Timestamp')
-    subtotal = sum(i['qty'] * i['price'] for i in cart if i.get('sku', '').upper() != 'FREIGHT')
-    cart_total = sum(i['qty'] * i['price'] for i in cart) + tax
-    return db.create_pdf(transaction_id, customer_name, addr, cart, subtotal, tax, cart_total, due, transaction_date=t_date)
-
-# --- HELPER: Edit Inventory Editor (shared by tab view + fullscreen) ---
-def _render_inv_editor(height=600):
-    full_inv = st.session_state['data']['inventory'].copy()
-
-    if 'Active' not in full_inv.columns:
-        full_inv['Active'] = True
-    full_inv['Active'] = full_inv['Active'].apply(
-        lambda x: str(x).strip().lower() not in ['false', '0', 'no', '']
-    )
-
-    c_s, c_sort, c_ord, c_show = st.columns([2, 2, 1, 1.5])
-    search     = c_s.text_input("🔍 Search", placeholder="Filter items...", key="inv_search")
-    sort_col   = c_sort.selectbox("Sort By", ["Name", "SKU", "Price", "WholesalePrice", "StockQty", "Cost"], key="inv_sort_col")
-    sort_asc   = c_ord.radio("Dir", ["↑", "↓"], horizontal=True, key="inv_sort_dir") == "↑"
-    show_inact = c_show.checkbox("Show Inactive Items", value=False, key="inv_show_inactive")
-
-    view_df = full_inv.copy()
-    if not show_inact:
-        view_df = view_df[view_df['Active'] == True]
-    if search:
-        mask = view_df.astype(str).apply(lambda x: x.str.contains(search, case=False)).any(axis=1)
-        view_df = view_df[mask]
-
-    if sort_col in view_df.columns:
-        try:
-            view_df = view_df.copy()
-            if sort_col in ['Price', 'WholesalePrice', 'StockQty', 'Cost']:
-                view_df[sort_col] = pd.to_numeric(view_df[sort_col], errors='coerce')
-            else:
-                # SKU / Name: cast to str so mixed-type columns don't crash sort
-                view_df[sort_col] = view_df[sort_col].astype(str)
-            view_df = view_df.sort_values(by=sort_col, ascending=sort_asc)
-        except Exception:
-            pass
-
-    csv_export = view_df.to_csv(index=False).encode('utf-8')
-    st.download_button("🖨️ Export / Print This List (CSV)", data=csv_export,
-                       file_name="inventory_export.csv", mime="text/csv", key="inv_export")
-
-    with st.form("inv_editor"):
-        edited_df = st.data_editor(
-            view_df,
-            use_container_width=True,
-            height=height,
-            num_rows="dynamic",
-            column_config={
-                "SKU":            st.column_config.TextColumn("SKU"),
-                "Active":         st.column_config.CheckboxColumn("Active", help="Uncheck to hide from kiosk and searches"),
-                "Price":          st.column_config.NumberColumn(format="$%.2f"),
-                "WholesalePrice": st.column_config.NumberColumn(format="$%.2f"),
-                "Cost":           st.column_config.NumberColumn(format="$%.2f"),
-            }
-        )
-        if st.form_submit_button("💾 Save Changes"):
-            full_inv.update(edited_df)
-            deleted_idx = view_df.index.difference(edited_df.index)
-            full_inv = full_inv.drop(index=deleted_idx, errors='ignore')
-            new_idx = edited_df.index.difference(view_df.index)
-            if not new_idx.empty:
-                full_inv = pd.concat([full_inv, edited_df.loc[new_idx]], ignore_index=True)
-            db.update_inventory_batch(full_inv.reset_index(drop=True))
-            st.success("Database Updated Successfully!")
-            auto_refresh()
-
 # --- INIT STATE ---
 if 'cart' not in st.session_state:
     st.session_state['cart'] = []
 if 'inv_fullscreen' not in st.session_state:
     st.session_state['inv_fullscreen'] = False
 if 'data' not in st.session_state or not st.session_state['data']:
-    with st.spinner("Connecting to Headquarters..."):
+    with st.spinner("Connecting to Headquarters..."), profiling.section("get_data"):
         st.session_state['data'] = db.get_data()
         if not st.session_state['data']:
             st.warning("⚠️ Could not load data from Google Sheets. Check your connection or API limits.")
@@ -226,12 +79,27 @@ if 'data' not in st.session_state or not st.session_state['data']:
 if not st.session_state.get('admin_authenticated'):
     st.switch_page("pages/Kiosk.py")
 
+# --- PAGES ---
+# Each menu entry is a module in admin/ with a render(), imported the first time
+# it's opened. Home.py used to carry all six pages, so starting the app pulled
+# in FPDF, smtplib and the PDF viewer before the login check whether or not
+# anyone printed anything. bench/page_loads.py measures startup and each page.
+PAGES = {
+    "📊 Dashboard": "dashboard",
+    "📦 Inventory": "inventory",
+    "🧮 Stocktake": "stocktake",
+    "🛒 Checkout": "checkout",
+    "👥 Customers": "customers",
+    "📝 Financials": "financials",
+    "⚙️ Settings": "settings",
+}
+
 # --- SIDEBAR ---
 with st.sidebar:
     st.markdown("## 🧵 Notion to Sew")
     st.caption("Admin Portal")
     st.divider()
-    menu = st.radio("Navigate", ["📊 Dashboard", "📦 Inventory", "🛒 Checkout", "👥 Customers", "📝 Financials", "⚙️ Settings"])
+    menu = st.radio("Navigate", list(PAGES))
     st.divider()
     if st.button("🔄 Refresh Database"):
         auto_refresh()
@@ -266,1241 +134,17 @@ if st.session_state.get('inv_fullscreen'):
     if _exit.button("✕ Exit Full Screen", use_container_width=True, type="primary"):
         st.session_state['inv_fullscreen'] = False
         st.rerun()
-    _render_inv_editor(height=900)
+    try:
+        with profiling.section("page: Inventory editor"):
+            importlib.import_module("admin.inventory").editor(height=900)
+        profiling.finish()
+    finally:
+        profiling.end()     # a page's st.rerun() or st.stop() skips finish()
     st.stop()
 
-# ==========================================
-# 1. DASHBOARD
-# ==========================================
-if menu == "📊 Dashboard":
-    page_header("📊", "Dashboard", "Sales overview and recent activity")
-    col_d1, col_d2 = st.columns(2)
-    today = date.today()
-    start_of_month = date(today.year, today.month, 1)
-    d_start = col_d1.date_input("Start Date", value=start_of_month)
-    d_end = col_d2.date_input("End Date", value=today)
-    
-    if 'transactions' in st.session_state['data']:
-        df = st.session_state['data']['transactions'].copy()
-        df_cust = st.session_state['data']['customers'].copy()
-        
-        # Date Filter
-        df['DateObj'] = pd.to_datetime(df['Timestamp']).dt.date
-        mask = (df['DateObj'] >= d_start) & (df['DateObj'] <= d_end)
-        df_filtered = df[mask].copy()
-        
-        # Metrics
-        df_filtered['TotalAmount'] = pd.to_numeric(df_filtered['TotalAmount'], errors='coerce').fillna(0)
-        total_sales = df_filtered['TotalAmount'].sum()
-        
-        unpaid_df = df[df['Status'].astype(str).str.strip().str.lower().isin(['pending', 'unpaid', 'open'])]
-        unpaid_total = pd.to_numeric(unpaid_df['TotalAmount'], errors='coerce').sum()
-        
-        c1, c2, c3 = st.columns(3)
-        c1.metric("Revenue (Period)", f"${total_sales:,.2f}")
-        c2.metric("Unpaid (All Time)", f"${unpaid_total:,.2f}", delta_color="inverse")
-        c3.metric("Orders (Period)", len(df_filtered))
-        
-        st.subheader("Recent Activity")
-        
-        # PREPARE GRANDMA-FRIENDLY TABLE
-        # 1. Merge to get Customer Name
-        df_display = df_filtered.merge(df_cust[['CustomerID', 'Name']], on='CustomerID', how='left')
-        df_display['Name'] = df_display['Name'].fillna('Guest / Unknown')
-        
-        # 2. Select & Rename Columns
-        df_display = df_display[['Timestamp', 'Name', 'TotalAmount', 'Status', 'PaymentMethod']]
-        df_display.columns = ["Date & Time", "Customer", "Total", "Status", "Payment"]
-        
-        # 3. Sort Newest First
-        df_display = df_display.sort_values(by="Date & Time", ascending=False).head(20)
-        
-        # 4. Display with Formatting
-        st.dataframe(
-            df_display,
-            use_container_width=True,
-            hide_index=True,
-            column_config={
-                "Total": st.column_config.NumberColumn(format="$%.2f"),
-                "Date & Time": st.column_config.DatetimeColumn(format="MMM DD, h:mm a"),
-                "Status": st.column_config.TextColumn(),
-            }
-        )
-
-# ==========================================
-# 2. INVENTORY
-# ==========================================
-elif menu == "📦 Inventory":
-    page_header("📦", "Inventory", "Manage products, stock levels, and costs")
-    
-    # Refresh data ensuring 'Cost' column exists in DataFrame
-    if 'Cost' not in st.session_state['data']['inventory'].columns:
-        st.session_state['data']['inventory']['Cost'] = 0.0
-    
-    tab1, tab2, tab3 = st.tabs(["🔄 Add / Restock", "📋 Edit Database", "📥 Bulk Import"])
-    
-    # --- TAB 1: SMART ADD/RESTOCK ---
-    with tab1:
-        st.info("💡 Type a SKU below. If it exists, you can add stock. If it's new, you can create it.")
-        
-        # We use a distinct key for the lookup to avoid session state collisions
-        lookup_sku = st.text_input("Scan or Type SKU", key="inv_sku_lookup").strip()
-        
-        df_inv = st.session_state['data']['inventory']
-        
-        # Check if SKU exists
-        existing_item = df_inv[df_inv['SKU'].astype(str) == lookup_sku]
-        
-        if lookup_sku and not existing_item.empty:
-            # --- RESTOCK MODE ---
-            row = existing_item.iloc[0]
-            st.success(f"**Found:** {row['Name']}")
-            st.caption(f"Current Stock: {row['StockQty']} | Current Cost: ${row.get('Cost', 0):.2f}")
-            
-            with st.form("restock_form"):
-                c1, c2 = st.columns(2)
-                qty_add = c1.number_input("Quantity to ADD (+)", 1, 10000, 50)
-                new_cost_val = c2.number_input("Unit Cost ($)", 0.0, 10000.0, float(row.get('Cost', 0.0)))
-
-                st.caption(f"New Total Stock will be: {row['StockQty'] + qty_add}")
-
-                st.divider()
-                log_purchase = st.checkbox("📒 Also log as Inventory Purchase expense?", value=True,
-                                           help="Records total purchase cost in Expenses for accurate P&L reporting")
-                ex_c1, ex_c2 = st.columns(2)
-                ex_date = ex_c1.date_input("Purchase Date", value=date.today())
-                ex_desc = ex_c2.text_input("Description", value=f"Restocked {row['Name']} (SKU: {row['SKU']})")
-
-                if st.form_submit_button("➕ Update Stock & Cost", type="primary"):
-                    db.restock_item(lookup_sku, qty_add, new_cost_val)
-                    if log_purchase and new_cost_val > 0:
-                        total_purchase = qty_add * new_cost_val
-                        db.add_expense(ex_date, "Inventory Purchase", total_purchase, ex_desc)
-                        st.success(f"Added {qty_add} units to {row['Name']} and logged ${total_purchase:.2f} inventory purchase expense!")
-                    else:
-                        st.success(f"Added {qty_add} to {row['Name']}!")
-                    auto_refresh()
-                    
-        elif lookup_sku:
-            # --- CREATE NEW MODE ---
-            st.warning("New Item Detected")
-            with st.form("add_item_form"):
-                c1, c2 = st.columns(2)
-                # SKU is pre-filled from the lookup
-                st.text_input("SKU", value=lookup_sku, disabled=True)
-                new_name = st.text_input("Product Name")
-                
-                c3, c4 = st.columns(2)
-                new_price = c3.number_input("Retail Price ($)", 0.0, 1000.0, 0.0)
-                new_whol = c4.number_input("Wholesale Price ($)", 0.0, 1000.0, 0.0)
-                
-                c5, c6 = st.columns(2)
-                new_stock = c5.number_input("Opening Stock", 0, 10000, 0)
-                new_cost = c6.number_input("Unit Cost ($)", 0.0, 1000.0, 0.0)
-
-                st.divider()
-                log_purchase_new = st.checkbox("📒 Also log as Inventory Purchase expense?", value=True,
-                                           key="new_item_log_purchase",
-                                           help="Records total purchase cost in Expenses for accurate P&L reporting")
-                ex_c1_n, ex_c2_n = st.columns(2)
-                ex_date_n = ex_c1_n.date_input("Purchase Date", value=date.today(), key="new_item_ex_date")
-                ex_desc_n = ex_c2_n.text_input("Description", value=f"Initial Purchase for {lookup_sku}", key="new_item_ex_desc")
-
-                if st.form_submit_button("✅ Create Item", type="primary"):
-                    if new_name:
-                        db.add_inventory_item(lookup_sku, new_name, new_price, new_stock, new_whol, new_cost)
-
-                        if log_purchase_new and new_cost > 0 and new_stock > 0:
-                            total_purchase = new_stock * new_cost
-                            db.add_expense(ex_date_n, "Inventory Purchase", total_purchase, ex_desc_n)
-                            st.success(f"Item Created and logged ${total_purchase:.2f} inventory purchase expense!")
-                        else:
-                            st.success("Item Created!")
-                        auto_refresh()
-                    else: st.error("Name required.")
-    # --- TAB 2: EDIT DATABASE ---
-    with tab2:
-        _fs_col, _ = st.columns([1, 5])
-        if _fs_col.button("⛶ Full Screen", key="inv_fs_open"):
-            st.session_state['inv_fullscreen'] = True
-            st.rerun()
-        _render_inv_editor(height=600)
-
-    with tab3:
-        st.subheader("Bulk Import from CSV")
-        # Added Cost to template
-        sample_data = pd.DataFrame([{"SKU": "TEST-01", "Name": "Example Item", "Price": 5.00, "WholesalePrice": 2.50, "StockQty": 100, "Cost": 1.25}])
-        csv_template = sample_data.to_csv(index=False).encode('utf-8')
-        st.download_button("⬇️ Download Template", data=csv_template, file_name="inventory_template.csv", mime="text/csv")
-        
-        uploaded_file = st.file_uploader("Upload filled CSV", type="csv")
-        if uploaded_file:
-            if st.button("🚀 Upload to Database"):
-                import_df = pd.read_csv(uploaded_file)
-                current_df = st.session_state['data']['inventory']
-                
-                # Check for Cost column in upload, fill 0 if missing
-                if 'Cost' not in import_df.columns:
-                    import_df['Cost'] = 0.0
-                    
-                final_df = pd.concat([current_df, import_df], ignore_index=True)
-                db.update_inventory_batch(final_df)
-                st.success("Import Complete!")
-                auto_refresh()
-
-
-# ==========================================
-# 3. CHECKOUT
-# ==========================================
-elif menu == "🛒 Checkout":
-    page_header("🛒", "Point of Sale", "Admin checkout with invoice + wholesale support")
-
-    # --- SUCCESS STATE ---
-    if st.session_state.get('checkout_complete'):
-        st.success(f"✅ Order #{st.session_state['last_order']['id']} Recorded Successfully!")
-        
-        c1, c2, c3, c4 = st.columns(4)
-        
-        # 1. View Invoice
-        if c1.button("👁️ View Invoice", use_container_width=True):
-            st.session_state['view_last_invoice'] = True
-        
-        # 2. Download & Print
-        pdf_data = st.session_state['last_order']['pdf']
-        with c2:
-            _get_pdf_print_button(pdf_data)
-            st.download_button(
-                "📄 Download PDF",
-                data=pdf_data,
-                file_name=f"Invoice_{st.session_state['last_order']['id']}.pdf",
-                mime="application/pdf",
-                use_container_width=True
-            )
-
-        # 3. Email Receipt
-        with c3:
-            with st.popover("📧 Email Receipt", use_container_width=True):
-                # Try to get customer email if available
-                # Note: last_order currently only stores id and pdf. 
-                # We might need to store the email too or look it up.
-                e_addr = st.text_input("Send to Email", placeholder="customer@example.com")
-                if st.button("Send ➝", type="primary", use_container_width=True):
-                    if e_addr:
-                        try:
-                            db.send_receipt_email(e_addr, st.session_state['last_order']['id'], pdf_data)
-                            st.success("Sent!")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-                    else: st.error("Email required.")
-
-        # 4. New Sale
-        if c4.button("✨ New Sale", type="primary", use_container_width=True):
-            st.session_state['checkout_complete'] = False
-            st.session_state['view_last_invoice'] = False
-            st.session_state['last_order'] = None
-            st.rerun()
-
-        # Preview Modal (JUMBO SIZE)
-        if st.session_state.get('view_last_invoice'):
-            st.divider()
-            st.caption("ℹ️ To print: Download the PDF and print from your computer.")
-            # Increased Width and Height significantly
-            pdf_viewer(input=st.session_state['last_order']['pdf'], width=1000, height=1000)
-            
-            if st.button("❌ Close Preview"):
-                st.session_state['view_last_invoice'] = False
-                st.rerun()
-
-    # --- NORMAL CHECKOUT SCREEN ---
-    else:
-        c1, c2 = st.columns([1.5, 1])
-        
-        # LEFT: Add Item
-        with c1:
-            st.subheader("Add Item")
-            
-            # Use a stable key for the widget and sync with a value key
-            if 'ck_wholesale_val' not in st.session_state:
-                st.session_state['ck_wholesale_val'] = False
-                
-            is_wholesale = st.checkbox("Apply Wholesale Pricing?", value=st.session_state['ck_wholesale_val'], key='ck_wholesale_widget')
-            
-            # Sync value back to our state key if user clicks it
-            st.session_state['ck_wholesale_val'] = is_wholesale
-            
-            inv = st.session_state['data']['inventory'].copy()
-            cust = st.session_state['data']['customers']
-            # Hide inactive items from checkout search
-            if 'Active' in inv.columns:
-                inv = inv[inv['Active'].apply(lambda x: str(x).strip().lower() not in ['false', '0', 'no', ''])]
-
-            # --- SORT BY SKU ---
-            inv['SKU'] = inv['SKU'].astype(str)
-            inv = inv.sort_values(by='SKU')
-
-            # Show price in lookup
-
-            inv['lookup'] = inv.apply(lambda r: f"{r['SKU']} | {r['Name']} (${float(r['WholesalePrice'] if is_wholesale and float(r.get('WholesalePrice', 0) or 0) > 0 else r['Price']):.2f})", axis=1)
-            
-            selected_item_str = st.selectbox("Search Item", inv['lookup'], index=None, key="checkout_item_search")
-            
-            if selected_item_str:
-                sku_str = selected_item_str.split(" | ")[0].strip()
-                mask = inv['SKU'].astype(str).str.strip() == sku_str
-                item_row = inv[mask].iloc[0]
-                with st.container(border=True):
-                    # Price Selection Logic
-                    base_price = item_row['WholesalePrice'] if is_wholesale and float(item_row.get('WholesalePrice', 0) or 0) > 0 else item_row['Price']
-                    
-                    c_qty, c_price = st.columns(2)
-                    qty = c_qty.number_input("Quantity", 1, 1000, 1)
-                    final_price = c_price.number_input("Unit Price ($)", 0.0, 10000.0, float(base_price))
-                    
-                    def add_to_cart_admin(s_sku, s_name, s_qty, s_price):
-                        st.session_state['cart'].append({
-                            "sku": s_sku, "name": s_name, "qty": s_qty, "price": s_price, "total": s_qty * s_price
-                        })
-                        st.session_state['checkout_item_search'] = None
-
-                    st.button("Add to Cart", type="primary", use_container_width=True, 
-                              on_click=add_to_cart_admin, args=(sku_str, item_row['Name'], qty, final_price))
-
-        # RIGHT: Cart & Pay
-        with c2:
-            with st.container(border=True):
-                st.subheader("Current Order")
-                if not st.session_state['cart']: 
-                    st.info("Cart is empty.")
-                else:
-                    subtotal = sum(item['total'] for item in st.session_state['cart'])
-                    # List Items
-                    for i, item in enumerate(st.session_state['cart']):
-                        c_a, c_b, c_c = st.columns([3, 1, 0.5])
-                        c_a.write(f"**{item['name']}**\n{item['qty']} @ ${item['price']:.2f}")
-                        c_b.write(f"${item['total']:.2f}")
-                        if c_c.button("x", key=f"del_{i}"):
-                            st.session_state['cart'].pop(i)
-                            st.rerun()
-                    st.divider()
-                    
-                    # Tax Logic
-                    if 'settings' in st.session_state['data']:
-                        s_df = st.session_state['data']['settings']
-                        settings_cache = dict(zip(s_df['Key'], s_df['Value']))
-                        raw_rate = settings_cache.get("TaxRate", "0.08")
-                        venmo_user = settings_cache.get("VenmoUser", "")
-                    else: raw_rate = "0.08"; venmo_user = ""
-                    
-                    try:
-                        tax_rate = float(str(raw_rate).replace("%", "").strip())
-                        if tax_rate > 1: tax_rate = tax_rate / 100
-                    except: tax_rate = 0.0
-                    # Always start with the fresh global rate; only override if a customer
-                    # with a custom rate is actively selected (set via rerun in customer block below)
-                    cust_has_custom_rate = (
-                        st.session_state.get('co_last_cust') is not None and
-                        st.session_state.get('co_effective_tax_rate') is not None and
-                        st.session_state.get('co_effective_tax_rate') != tax_rate
-                    )
-                    effective_tax_rate = st.session_state['co_effective_tax_rate'] if cust_has_custom_rate else tax_rate
-
-                    # --- FREIGHT ---
-                    freight = st.number_input("Freight / Shipping ($)", 0.0, 500.0, 0.0, step=0.05, key="freight_charge")
-
-                    # --- BULK DISCOUNT ---
-                    bulk_discount_pct = st.number_input("Bulk Discount (%)", 0.0, 100.0, 0.0, step=1.0)
-                    discount_amount = subtotal * (bulk_discount_pct / 100.0)
-                    discounted_subtotal = subtotal - discount_amount
-
-                    apply_tax = st.checkbox(f"Apply Tax ({(effective_tax_rate*100):.3f}%)", value=not is_wholesale)
-                    tax_amt = discounted_subtotal * effective_tax_rate if apply_tax else 0.0
-                    cart_total = discounted_subtotal + tax_amt + freight
-
-                    # CUSTOMER & CREDIT LOGIC
-                    cust_tab1, cust_tab2 = st.tabs(["Existing", "New"])
-                    selected_cust = None; cust_credit = 0.0; cust_id = "Guest"
-                    with cust_tab1:
-                        # Two customers can share a name, so pick by row, not by name —
-                        # otherwise the sale is filed against whichever one comes first.
-                        _name_counts = cust['Name'].astype(str).value_counts()
-                        _labels, _label_to_idx = [], {}
-                        for _idx, _r in cust.iterrows():
-                            _nm = str(_r['Name'])
-                            _lbl = f"{_nm} ({_r['CustomerID']})" if _name_counts.get(_nm, 0) > 1 else _nm
-                            _labels.append(_lbl); _label_to_idx[_lbl] = _idx
-
-                        # A customer just created on the "New" tab gets selected here.
-                        _new_id = st.session_state.pop('co_pending_new_id', None)
-                        if _new_id is not None:
-                            for _lbl, _idx in _label_to_idx.items():
-                                if cust.loc[_idx, 'CustomerID'] == _new_id:
-                                    st.session_state['co_cust_sel'] = _lbl
-                                    break
-
-                        selected_cust_name = st.selectbox("Customer", _labels, index=None, key='co_cust_sel')
-                        if selected_cust_name:
-                            cust_row = cust.loc[_label_to_idx[selected_cust_name]]
-                            selected_cust = str(cust_row['Name'])
-                            cust_id = cust_row['CustomerID']
-                            try: cust_credit = float(cust_row.get('Credit', 0) if cust_row.get('Credit') != "" else 0)
-                            except: cust_credit = 0.0
-                            cust_is_wholesale = str(cust_row.get('IsWholesale', '')).strip().upper() == 'TRUE'
-                            # Per-customer tax rate override
-                            raw_cust_tax = str(cust_row.get('TaxRate', '')).strip()
-                            try:
-                                cust_tax_val = float(raw_cust_tax)
-                                new_eff_rate = (cust_tax_val / 100 if cust_tax_val > 1 else cust_tax_val) if cust_tax_val > 0 else tax_rate
-                            except (ValueError, TypeError):
-                                new_eff_rate = tax_rate
-                            # Rerun when customer changes so wholesale + tax rate update before checkbox renders
-                            if selected_cust_name != st.session_state.get('co_last_cust'):
-                                st.session_state['co_last_cust'] = selected_cust_name
-                                st.session_state['ck_wholesale_val'] = cust_is_wholesale
-                                st.session_state['co_effective_tax_rate'] = new_eff_rate
-                                st.rerun()
-                            if cust_is_wholesale:
-                                st.info("🏭 Wholesale customer — wholesale pricing auto-applied")
-                        else:
-                            if st.session_state.get('co_last_cust') is not None:
-                                st.session_state['co_last_cust'] = None
-                                st.session_state['co_effective_tax_rate'] = tax_rate
-                    with cust_tab2:
-                        with st.form("q_add"):
-                            nn = st.text_input("Name"); ne = st.text_input("Email")
-                            if st.form_submit_button("Save"):
-                                if nn:
-                                    # Hand the new ID to the Existing tab; setting the
-                                    # raw name breaks when that name is not unique.
-                                    st.session_state['co_pending_new_id'] = db.add_customer(nn, ne)
-                                    st.session_state.pop('co_cust_sel', None)
-                                    auto_refresh()
-                                else: st.error("Name required")
-
-                    credit_applied = 0.0
-                    if selected_cust and cust_credit > 0:
-                        st.info(f"💎 **Credit Available: ${cust_credit:.2f}**")
-                        if st.checkbox("Apply Store Credit?"):
-                            max_apply = min(cust_credit, cart_total)
-                            credit_applied = st.number_input("Amount to apply", 0.0, max_apply, max_apply)
-                    
-                    final_due = max(0.0, cart_total - credit_applied)
-                    st.write(f"Subtotal: ${subtotal:.2f}")
-                    if bulk_discount_pct > 0:
-                        st.write(f"Bulk Discount ({bulk_discount_pct}%): -${discount_amount:.2f}")
-                        st.write(f"Discounted Subtotal: ${discounted_subtotal:.2f}")
-                    st.write(f"Tax: ${tax_amt:.2f}")
-                    if credit_applied > 0: st.write(f"Store Credit: -${credit_applied:.2f}")
-                    st.markdown(f"### Total: ${final_due:.2f}")
-                    st.divider()
-                    
-                    pay_method = st.selectbox("Payment", ["Cash", "Card", "Venmo", "Invoice (Pay Later)"])
-                    if pay_method == "Venmo" and venmo_user:
-                        st.image(f"https://api.qrserver.com/v1/create-qr-code/?size=150x150&data=https://venmo.com/u/{venmo_user}", width=150, caption=f"@{venmo_user}")
-
-                    if st.button("✅ Complete Order", type="primary", use_container_width=True):
-                        if selected_cust or pay_method == "Cash": # Allow Cash Guest checkout
-                            # Handle Guest
-                            if not selected_cust: cust_id = "Guest"; selected_cust = "Guest"
-                            
-                            status = "Pending" if pay_method == "Invoice (Pay Later)" else "Paid"
-                            with st.spinner("Processing..."):
-                                try:
-                                    new_id = db.commit_sale(
-                                        st.session_state['cart'], cart_total, tax_amt, cust_id,
-                                        pay_method, is_wholesale, status, credit_used=credit_applied
-                                    )
-                                except Exception as e:
-                                    # Never leave the cart in a state where the sale
-                                    # looks complete but nothing was written.
-                                    st.error(f"❌ **The sale was not saved.** {e}")
-                                    st.warning("Your cart has been kept — try Complete Order again.")
-                                    st.stop()
-
-                                # Record Freight if applicable
-                                if freight > 0:
-                                    db.record_freight(new_id, freight)
-
-                                # Generate PDF
-                                address = db.get_settings_dict().get("Address", "Modesto, CA")
-                                
-                                # Add freight to cart for line items table display
-                                checkout_cart_pdf = st.session_state['cart'].copy()
-                                if freight > 0:
-                                    checkout_cart_pdf.append({"sku": "FREIGHT", "name": "Shipping", "qty": 1, "price": freight})
-
-                                pdf_bytes = db.create_pdf(new_id, selected_cust, address, checkout_cart_pdf, subtotal, tax_amt, cart_total, "Upon Receipt", credit_applied=credit_applied, discount_amount=discount_amount, freight_amount=freight)
-                                
-                                # Store State
-                                st.session_state['last_order'] = {
-                                    'id': new_id,
-                                    'pdf': pdf_bytes
-                                }
-                                st.session_state['checkout_complete'] = True
-                                st.session_state['cart'] = []
-                                st.rerun()
-                        else: st.error("Select customer (required for non-cash orders).")
-
-# ==========================================
-# 4. CUSTOMERS (Card View & CRM)
-# ==========================================
-elif menu == "👥 Customers":
-    page_header("👥", "Customers", "CRM — profiles, purchase history, and store credit")
-    
-    # Initialize Session State for Navigation
-    if 'active_cust_id' not in st.session_state:
-        st.session_state['active_cust_id'] = None
-
-    df_cust = st.session_state['data']['customers']
-    df_trans = st.session_state['data']['transactions']
-    df_items = st.session_state['data']['items']
-
-    # --- HELPER: PHONE FORMAT ---
-    def format_us_phone(phone_raw):
-        digits = ''.join(filter(str.isdigit, str(phone_raw)))
-        if len(digits) == 10: return f"({digits[:3]}) {digits[3:6]}-{digits[6:]}"
-        return str(phone_raw)
-
-# ==========================================
-    # VIEW A: THE CUSTOMER LIST (Cards)
-    # ==========================================
-    if st.session_state['active_cust_id'] is None:
-        
-        # 1. Top Actions
-        # FIX: vertical_alignment="bottom" makes the button sit flush with the search bar
-        c_search, c_add = st.columns([3, 1], vertical_alignment="bottom")
-        
-        # Search Bar
-        search_q = c_search.text_input("🔍 Search Customers", placeholder="Name or Phone...")
-        
-        # Add Button (Now aligned)
-        with c_add:
-            with st.popover("➕ New Customer", use_container_width=True):
-                with st.form("quick_create_cust"):
-                    n_n = st.text_input("Name")
-                    n_e = st.text_input("Email")
-                    if st.form_submit_button("Create"):
-                        if n_n:
-                            db.add_customer(n_n, n_e)
-                            st.success("Created!")
-                            auto_refresh()
-                        else: st.error("Name required")
-
-        st.divider()
-
-        # 2. Filter Logic
-        if search_q:
-            # Flexible search
-            mask = (
-                df_cust['Name'].astype(str).str.contains(search_q, case=False) | 
-                df_cust['Phone'].astype(str).str.contains(search_q)
-            )
-            filtered_df = df_cust[mask]
-        else:
-            filtered_df = df_cust
-            
-        # 3. Render the list
-        # One compact row per customer rather than a full-height card: the book
-        # runs to 200+ names, and tall cards made it a scroll marathon to reach
-        # anyone past the B's. Long lists are paged so a rerun stays cheap.
-        if filtered_df.empty:
-            st.info("No customers found.")
-        else:
-            # Sort customers alphabetically by name
-            filtered_df = filtered_df.sort_values(by="Name")
-
-            PAGE_SIZE = 25
-            total = len(filtered_df)
-            pages = max(1, -(-total // PAGE_SIZE))
-            page = 1
-            if pages > 1:
-                c_count, c_page = st.columns([2, 1], vertical_alignment="center")
-                c_count.caption(f"{total} customers — showing {PAGE_SIZE} at a time. "
-                                "Search above to jump straight to someone.")
-                page = c_page.number_input("Page", 1, pages, 1, key="cust_page",
-                                           label_visibility="collapsed")
-            else:
-                st.caption(f"{total} customer{'s' if total != 1 else ''}")
-            filtered_df = filtered_df.iloc[(page - 1) * PAGE_SIZE: page * PAGE_SIZE]
-
-            for i, row in filtered_df.iterrows():
-                with st.container(border=True):
-                    c_info, c_cred, c_btn = st.columns([5, 2, 2], vertical_alignment="center")
-
-                    # Info — name and contact on two tight lines
-                    with c_info:
-                        ph = format_us_phone(row['Phone'])
-                        email = str(row.get('Email', '') or '').strip()
-                        bits = [ph if ph else "no phone"] + ([email] if email else [])
-                        st.markdown(
-                            f"**{row['Name']}**  \n"
-                            f"<span style='color:#7A736A;font-size:0.85em'>{' · '.join(bits)}</span>",
-                            unsafe_allow_html=True,
-                        )
-
-                    # Credit Badge
-                    with c_cred:
-                        try: cred = float(row.get('Credit', 0) if row.get('Credit') != "" else 0)
-                        except: cred = 0.0
-                        if cred > 0:
-                            st.markdown(
-                                f"<div style='text-align:right'><span style='background:#E7F1ED;"
-                                f"color:#14503F;padding:2px 10px;border-radius:999px;"
-                                f"font-size:0.85em;font-weight:600'>${cred:,.2f} credit</span></div>",
-                                unsafe_allow_html=True,
-                            )
-
-                    # Manage Button
-                    with c_btn:
-                        if st.button("Manage →", key=f"btn_m_{i}_{row['CustomerID']}",
-                                     use_container_width=True):
-                            st.session_state['active_cust_id'] = row['CustomerID']
-                            # Remember the row too: CustomerID alone is not reliably
-                            # unique, and looking the profile up by ID can open the
-                            # wrong customer.
-                            st.session_state['active_cust_row'] = i
-                            st.rerun()
-
-    # ==========================================
-    # VIEW B: THE PROFILE (Detailed)
-    # ==========================================
-    else:
-        # Get Active Customer Data
-        cid = st.session_state['active_cust_id']
-        ridx = st.session_state.get('active_cust_row')
-        mask = df_cust['CustomerID'] == cid
-
-        if df_cust[mask].empty:
-            st.error("Customer not found. They may have been deleted.")
-            if st.button("Back to List"):
-                st.session_state['active_cust_id'] = None
-                st.session_state['active_cust_row'] = None
-                st.rerun()
-        else:
-            # Prefer the exact row that was clicked. Falling back to the first
-            # ID match is what makes a shared ID open the wrong customer.
-            if ridx is not None and ridx in df_cust.index and df_cust.loc[ridx, 'CustomerID'] == cid:
-                row = df_cust.loc[ridx]
-            else:
-                row = df_cust[mask].iloc[0]
-
-            if len(df_cust[mask]) > 1:
-                sharers = ", ".join(df_cust[mask]['Name'].astype(str))
-                st.error(
-                    f"⚠️ **CustomerID {cid} is shared by {len(df_cust[mask])} customers "
-                    f"({sharers}).** The history and store credit below are the *combined* "
-                    "totals for all of them, and edits here may save to the wrong one. "
-                    "Give each customer a unique CustomerID in the Customers sheet to fix this."
-                )
-
-            # --- HEADER ---
-            c_back, c_title = st.columns([1, 5])
-            if c_back.button("⬅️ Back"):
-                st.session_state['active_cust_id'] = None
-                st.session_state['active_cust_row'] = None
-                st.rerun()
-            c_title.title(row['Name'])
-
-            # Pre-compute transaction history so the preview can render full-width below columns
-            my_trans = df_trans[df_trans['CustomerID'] == cid]
-            if not my_trans.empty:
-                my_trans = my_trans.sort_values(by="Timestamp", ascending=False)
-
-            # --- MAIN CONTENT ---
-            preview_slot = st.empty()
-            col1, col2 = st.columns([1, 1.5])
-            
-            # LEFT: Edit Profile & Credit
-            with col1:
-                with st.container(border=True):
-                    st.subheader("Edit Details")
-                    with st.form(f"edit_{cid}"):
-                        u_name = st.text_input("Name", value=row['Name'])
-                        u_phone = st.text_input("Phone", value=str(row.get('Phone', "")))
-                        u_addr = st.text_area("Address", value=str(row.get('Address', "")))
-                        u_notes = st.text_area("Notes", value=str(row.get('Notes', "")))
-                        st.divider()
-                        u_wholesale = st.checkbox(
-                            "🏭 Wholesale Customer",
-                            value=str(row.get('IsWholesale', '')).strip().upper() == 'TRUE',
-                            help="Auto-applies wholesale pricing and no tax at checkout"
-                        )
-                        raw_cust_tax = str(row.get('TaxRate', '')).strip()
-                        try:
-                            stored_rate = float(raw_cust_tax)
-                            display_rate = stored_rate * 100 if stored_rate < 1.0 else stored_rate
-                        except (ValueError, TypeError):
-                            display_rate = 0.0
-                        u_tax_override = st.number_input(
-                            "Custom Tax Rate (% — 0 = use global default)",
-                            min_value=0.0, max_value=100.0,
-                            value=float(display_rate), step=0.001, format="%.3f",
-                            help="Overrides the global tax rate for this customer only."
-                        )
-                        if st.form_submit_button("💾 Save Changes"):
-                            tax_override_decimal = u_tax_override / 100.0 if u_tax_override > 0 else None
-                            # update_customer_details swallows its errors and returns
-                            # False; reporting "Saved!" regardless hides lost edits.
-                            if db.update_customer_details(cid, u_name, u_addr, u_phone, u_notes,
-                                                          is_wholesale=u_wholesale,
-                                                          tax_rate_override=tax_override_decimal):
-                                st.success("Saved!")
-                                auto_refresh()
-                            else:
-                                st.error("❌ Not saved — the database rejected the change. "
-                                         "Check your connection and try again.")
-                    
-                    st.write("")
-                    with st.expander("🗑️ Delete Profile"):
-                        if len(df_cust[mask]) > 1:
-                            # Deleting by ID removes whichever row comes first in the
-                            # sheet, which may well be the other customer.
-                            st.error(
-                                f"Deletion is disabled while CustomerID {cid} is shared by "
-                                "more than one customer — it could delete the wrong one. "
-                                "Give them unique IDs first."
-                            )
-                        elif st.checkbox(f"I confirm deletion of {row['Name']}", key="del_chk"):
-                            if st.button("Delete Permanently", type="primary"):
-                                if db.delete_customer(cid):
-                                    st.session_state['active_cust_id'] = None
-                                    st.session_state['active_cust_row'] = None
-                                    st.success("Deleted.")
-                                    auto_refresh()
-                                else:
-                                    st.error("❌ Not deleted — the database rejected the change.")
-
-                st.divider()
-                
-                # Credit Logic
-                try: raw_cred = float(row.get('Credit', 0) if row.get('Credit') != "" else 0)
-                except: raw_cred = 0.0
-                st.metric("Store Credit Balance", f"${raw_cred:,.2f}")
-                
-                with st.expander("🎁 Sell Gift Certificate / Add Credit"):
-                    giver_lookup = st.selectbox("Who is paying?", ["Self (Same Person)"] + list(df_cust['Name']), index=0)
-                    gc_amount = st.number_input("Amount ($)", 0.0, 5000.0, 50.0, step=10.0)
-                    gc_pay_method = st.selectbox("Payment Method", ["Cash", "Card", "Venmo", "Check"])
-                    
-                    if st.button("💸 Add Credit", type="primary"):
-                        if giver_lookup == "Self (Same Person)": giver_id = cid
-                        else: giver_id = df_cust[df_cust['Name'] == giver_lookup].iloc[0]['CustomerID']
-                        with st.spinner("Processing..."):
-                            db.sell_gift_certificate(giver_id, cid, gc_amount, gc_pay_method)
-                            st.success(f"Added ${gc_amount}!")
-                            auto_refresh()
-
-            # RIGHT: Purchase History
-            with col2:
-                st.subheader("History")
-                if my_trans.empty:
-                    st.info("No purchase history.")
-                else:
-                    # Iterate with Index (i) to fix duplicate key error
-                    for i, t_row in my_trans.iterrows():
-                        with st.container(border=True):
-                            c_d, c_a, c_s, c_act = st.columns([1.6, 1, 0.9, 2.5], vertical_alignment="center")
-
-                            c_d.write(f"**{str(t_row['Timestamp'])[:10]}**")
-                            c_d.caption(f"#{t_row['TransactionID']}")
-
-                            try: amt = float(t_row['TotalAmount'] if t_row['TotalAmount'] != '' else 0)
-                            except: amt = 0.0
-                            c_a.write(f"**${amt:.2f}**")
-
-                            status_raw = str(t_row['Status']).strip()
-                            is_paid = status_raw.lower() not in ['pending', 'unpaid', 'open']
-                            # A full-width alert box in a narrow column wraps to one
-                            # letter per line. A pill sizes to its text instead.
-                            c_s.markdown(
-                                '<span class="pill pill-paid">Paid</span>' if is_paid
-                                else '<span class="pill pill-due">Unpaid</span>',
-                                unsafe_allow_html=True)
-
-                            # ACTION BUTTONS (Unique Keys Added)
-                            b1, b2, b3, b4 = c_act.columns(4)
-
-                            # KEY FIX: Append _{i} to ensure uniqueness
-                            if b1.button("👁️", key=f"v_{t_row['TransactionID']}_{i}", help="View"):
-                                st.session_state[f"view_inv_{t_row['TransactionID']}"] = True
-                                st.rerun()
-
-                            # Email Button
-                            with b2:
-                                with st.popover("📧", help="Email Receipt"):
-                                    e_addr = st.text_input("Email", value=row.get('Email', ''), key=f"em_{t_row['TransactionID']}_{i}")
-                                    if st.button("Send", key=f"ems_{t_row['TransactionID']}_{i}", use_container_width=True):
-                                        if e_addr:
-                                            try:
-                                                pdf_b = _build_invoice_pdf(str(t_row['TransactionID']), row['Name'])
-                                                db.send_receipt_email(e_addr, str(t_row['TransactionID']), pdf_b)
-                                                st.toast("Email Sent!")
-                                            except Exception as e:
-                                                st.error(f"Failed: {e}")
-                                        else: st.error("Email required.")
-
-                            if not is_paid:
-                                if b3.button("💲", key=f"p_{t_row['TransactionID']}_{i}", help="Mark Paid"):
-                                    db.mark_invoice_paid(t_row['TransactionID'])
-                                    st.toast("Paid!")
-                                    auto_refresh()
-
-                            if b4.button("🗑️", key=f"d_{t_row['TransactionID']}_{i}", type="primary", help="Delete"):
-                                db.delete_invoice(t_row['TransactionID'])
-                                st.warning("Deleted.")
-                                auto_refresh()
-
-            # --- RENDER ACTIVE PREVIEW TO SLOT (Full width, above columns) ---
-            if not my_trans.empty:
-                for i, t_row in my_trans.iterrows():
-                    if st.session_state.get(f"view_inv_{t_row['TransactionID']}", False):
-                        with preview_slot.container(border=True):
-                            if st.button("❌ Close Preview", key=f"cls_{t_row['TransactionID']}_{i}"):
-                                st.session_state[f"view_inv_{t_row['TransactionID']}"] = False
-                                st.rerun()
-                            t_id = str(t_row['TransactionID'])
-                            pdf_bytes = _build_invoice_pdf(t_id, row['Name'])
-                            _get_pdf_print_button(pdf_bytes)
-                            st.download_button(
-                                "🖨️ Download PDF",
-                                data=pdf_bytes,
-                                file_name=f"Invoice_{t_id}.pdf",
-                                mime="application/pdf",
-                                key=f"dl_{t_id}_{i}",
-                                type="primary",
-                                use_container_width=True
-                            )
-                            pdf_viewer(input=pdf_bytes, width="100%")
-
-# ==========================================
-# 5. FINANCIALS
-# ==========================================
-elif menu == "📝 Financials":
-    page_header("📝", "Financial Reports", "Income statement, tax liability, top sellers, and A/R")
-    tab1, tab2, tab3, tab4 = st.tabs(["💰 Income Statement", "🏛️ Sales Tax", "📈 Top Sellers", "⏳ Unpaid"])
-    
-# --- TAB 1: INCOME STATEMENT (New!) ---
-    with tab1:
-        st.header("Income Statement")
-        
-        # 1. Date Selection
-        c1, c2 = st.columns(2)
-        r_start = c1.date_input("Start Date", value=date(date.today().year, 1, 1), key="r_start")
-        r_end = c2.date_input("End Date", value=date.today(), key="r_end")
-        
-        if st.button("📊 Generate Report"):
-            # A. Prepare Data
-            df_trans = st.session_state['data']['transactions'].copy()
-            df_items = st.session_state['data']['items'].copy()
-            df_exp = st.session_state.get('data', {}).get('expenses', pd.DataFrame())
-            
-            # Filter by Date
-            df_trans['DateObj'] = pd.to_datetime(df_trans['Timestamp']).dt.date
-            mask_t = (df_trans['DateObj'] >= r_start) & (df_trans['DateObj'] <= r_end)
-            f_trans = df_trans[mask_t]
-            
-            # B. Calculate Revenue (Split Retail vs Wholesale)
-            f_trans['TotalAmount'] = pd.to_numeric(f_trans['TotalAmount'], errors='coerce').fillna(0)
-            f_trans['TaxAmount'] = pd.to_numeric(f_trans['TaxAmount'], errors='coerce').fillna(0)
-            
-            # Identify Wholesale (Check column existence safely)
-            if 'IsWholesale' in f_trans.columns:
-                ws_mask = f_trans['IsWholesale'].astype(str).str.lower() == 'true'
-            else: ws_mask = pd.Series([False] * len(f_trans))
-            
-            # Net Sales = Total - Tax
-            f_trans['NetSale'] = f_trans['TotalAmount'] - f_trans['TaxAmount']
-            
-            # C. Freight Income & Adjusted Product Revenue
-            valid_ids = f_trans['TransactionID'].astype(str).tolist()
-            df_items['TransactionID'] = df_items['TransactionID'].astype(str)
-            f_items_all = df_items[df_items['TransactionID'].isin(valid_ids)].copy()
-            f_items_all['QtySold'] = pd.to_numeric(f_items_all['QtySold'], errors='coerce').fillna(0)
-            f_items_all['Price'] = pd.to_numeric(f_items_all['Price'], errors='coerce').fillna(0)
-            f_items_all['LineTotal'] = f_items_all['QtySold'] * f_items_all['Price']
-            
-            freight_mask = f_items_all['SKU'].astype(str).str.upper() == 'FREIGHT'
-            freight_income = f_items_all[freight_mask]['LineTotal'].sum()
-            
-            # Since NetSale (Total - Tax) includes freight, we subtract freight_income from the sum 
-            # to get the product revenue part, then split by IsWholesale.
-            # Actually, more accurately, we can split NetSale and then subtract transaction-specific freight, 
-            # but for the summary, subtracting the total freight_income from the totals is equivalent.
-            
-            total_net_sale = f_trans['NetSale'].sum()
-            total_product_revenue = total_net_sale - freight_income
-            
-            # Split product revenue proportionally or just by mask on NetSale and adjust
-            # PRO-TIP: It's cleaner to calculate freight per transaction if we want exact split, 
-            # but usually Freight is retail. Let's just subtract it from the overall total_income 
-            # and report it separately.
-            
-            wholesale_sales = f_trans[ws_mask]['NetSale'].sum()
-            retail_sales = f_trans[~ws_mask]['NetSale'].sum()
-            
-            # Adjustment: Subtract freight from retail/wholesale sums. 
-            # Usually freight is tagged to the transaction type.
-            ws_freight = f_items_all[freight_mask & f_items_all['TransactionID'].isin(f_trans[ws_mask]['TransactionID'])]['LineTotal'].sum()
-            rt_freight = freight_income - ws_freight
-            
-            wholesale_sales -= ws_freight
-            retail_sales -= rt_freight
-            
-            total_income = wholesale_sales + retail_sales + freight_income
-            
-            # D. Calculate COGS
-            # Exclude non-product items (gift certificates and FREIGHT have no inventory cost)
-            f_items = f_items_all[
-                (~f_items_all['SKU'].astype(str).str.upper().str.startswith('GIFT')) &
-                (~f_items_all['SKU'].astype(str).str.upper().str.contains('FREIGHT'))
-            ].copy()
-
-            if 'inventory' in st.session_state['data']:
-                inv_ref = st.session_state['data']['inventory'][['SKU', 'Cost']].copy()
-                inv_ref['SKU'] = inv_ref['SKU'].astype(str)
-                f_items['SKU'] = f_items['SKU'].astype(str)
-                merged_items = f_items.merge(inv_ref, on='SKU', how='left')
-                merged_items['QtySold'] = pd.to_numeric(merged_items['QtySold'], errors='coerce').fillna(0)
-                merged_items['Cost'] = pd.to_numeric(merged_items['Cost'], errors='coerce')
-                no_cost_skus = merged_items[merged_items['Cost'].isna() | (merged_items['Cost'] == 0)]['SKU'].unique()
-                if len(no_cost_skus) > 0:
-                    st.warning(f"⚠️ COGS may be understated: {len(no_cost_skus)} SKU(s) sold in this period have no unit cost entered. Set costs in Inventory to improve accuracy.")
-                merged_items['LineCost'] = merged_items['QtySold'] * merged_items['Cost'].fillna(0)
-                total_cogs = merged_items['LineCost'].sum()
-            else: total_cogs = 0.0
-
-            # Check for invoices with no line items (contribute $0 to COGS)
-            product_item_ids = set(
-                df_items[
-                    df_items['TransactionID'].astype(str).isin(valid_ids) &
-                    ~df_items['SKU'].astype(str).str.upper().str.startswith('GIFT')
-                ]['TransactionID'].astype(str).unique()
-            )
-            invoices_no_items = [tid for tid in valid_ids if tid not in product_item_ids]
-            if invoices_no_items:
-                st.warning(
-                    f"⚠️ {len(invoices_no_items)} invoice(s) in this period have no matching line item records "
-                    f"and contribute $0 to COGS. This is common for old imported invoices. "
-                    f"Invoice IDs: {', '.join(invoices_no_items[:10])}{'…' if len(invoices_no_items) > 10 else ''}"
-                )
-
-            gross_profit = total_income - total_cogs
-            
-            # D. Expenses
-            expenses_breakdown = {}
-            total_expenses = 0.0
-            if not df_exp.empty:
-                df_exp['DateObj'] = pd.to_datetime(df_exp['Date']).dt.date
-                mask_e = (df_exp['DateObj'] >= r_start) & (df_exp['DateObj'] <= r_end)
-                f_exp = df_exp[mask_e].copy()
-                f_exp['Amount'] = pd.to_numeric(f_exp['Amount'], errors='coerce').fillna(0)
-                expenses_breakdown = f_exp.groupby('Category')['Amount'].sum().to_dict()
-                total_expenses = sum(expenses_breakdown.values())
-            
-            net_profit = gross_profit - total_expenses
-            
-            # E. Generate PDF
-            financials = {
-                'retail_sales': retail_sales, 'wholesale_sales': wholesale_sales,
-                'freight_income': freight_income,
-                'total_income': total_income, 'cogs': total_cogs,
-                'gross_profit': gross_profit, 'expenses_breakdown': expenses_breakdown,
-                'total_expenses': total_expenses, 'net_profit': net_profit
-            }
-            
-            pdf_data = db.generate_income_statement_pdf(r_start, r_end, financials)
-            
-            # F. Preview & Download
-            st.divider()
-            c_a, c_b, c_c = st.columns(3)
-            c_a.metric("Total Revenue", f"${total_income:,.2f}")
-            c_b.metric("COGS", f"${total_cogs:,.2f}")
-            c_c.metric("Net Profit", f"${net_profit:,.2f}", delta_color="normal")
-            
-            # Preview
-            st.divider()
-            # No base64 encoding needed
-            pdf_viewer(input=pdf_data, width=1000, height=1000)
-            
-            st.download_button(
-                "⬇️ Download PDF", data=pdf_data,
-                file_name=f"IncomeStatement_{r_start}_{r_end}.pdf",
-                mime="application/pdf", type="primary", use_container_width=True
-            )
-            
-
-        # --- LOG AN EXPENSE (always visible, outside Generate button) ---
-        st.divider()
-        with st.expander("➕ Log an Expense"):
-            if 'settings' in st.session_state['data']:
-                s_df = st.session_state['data']['settings']
-                s_dict = dict(zip(s_df['Key'], s_df['Value']))
-                raw_cats = s_dict.get("ExpenseCategories", "Fabric, Notions, Rent, Marketing, Shipping, Wages, Other")
-                cat_options = [x.strip() for x in raw_cats.split(",") if x.strip()]
-            else:
-                cat_options = ["Fabric", "Notions", "Rent", "Marketing", "Other"]
-
-            with st.form("log_expense_form"):
-                ex_c1, ex_c2 = st.columns(2)
-                ex_date = ex_c1.date_input("Date", value=date.today(), key="ex_date")
-                ex_cat = ex_c2.selectbox("Category", cat_options, key="ex_cat")
-                ex_c3, ex_c4 = st.columns(2)
-                ex_amount = ex_c3.number_input("Amount ($)", 0.01, 100000.0, 10.0, key="ex_amount")
-                ex_desc = ex_c4.text_input("Description", placeholder="e.g. Fabric from JoAnn", key="ex_desc")
-                if st.form_submit_button("💾 Save Expense", type="primary"):
-                    db.add_expense(ex_date, ex_cat, ex_amount, ex_desc)
-                    st.success(f"Logged ${ex_amount:.2f} under {ex_cat}.")
-                    auto_refresh()
-
-    with tab2:
-        st.header("Sales Tax Liability")
-        c1, c2 = st.columns(2)
-        st_start = c1.date_input("Start Date", value=date(date.today().year, 1, 1), key="st_start")
-        st_end = c2.date_input("End Date", value=date.today(), key="st_end")
-        df = st.session_state['data']['transactions'].copy()
-        df['DateObj'] = pd.to_datetime(df['Timestamp']).dt.date
-        mask = (df['DateObj'] >= st_start) & (df['DateObj'] <= st_end)
-        filtered_df = df[mask]
-        total_tax = pd.to_numeric(filtered_df['TaxAmount'], errors='coerce').sum()
-        
-        # Calculate total freight for this period to exclude from taxable sales
-        df_items = st.session_state['data']['items']
-        df_items['TransactionID'] = df_items['TransactionID'].astype(str)
-        valid_ids = filtered_df['TransactionID'].astype(str).tolist()
-        f_items_period = df_items[df_items['TransactionID'].isin(valid_ids)]
-        f_items_period['QtySold'] = pd.to_numeric(f_items_period['QtySold'], errors='coerce').fillna(0)
-        f_items_period['Price'] = pd.to_numeric(f_items_period['Price'], errors='coerce').fillna(0)
-        total_freight_period = (f_items_period[f_items_period['SKU'].astype(str).str.upper() == 'FREIGHT']['QtySold'] * f_items_period[f_items_period['SKU'].astype(str).str.upper() == 'FREIGHT']['Price']).sum()
-
-        taxable_sales = pd.to_numeric(filtered_df['TotalAmount'], errors='coerce').sum() - total_tax - total_freight_period
-        m1, m2 = st.columns(2)
-        m1.metric("Tax Collected", f"${total_tax:,.2f}"); m2.metric("Taxable Sales", f"${taxable_sales:,.2f}")
-
-    # --- TAB 3: TOP SELLERS (Product Focused) ---
-    with tab3:
-        st.header("🏆 Product Performance")
-        
-        # 1. Controls
-        c1, c2, c3 = st.columns([1, 1, 2])
-        ts_start = c1.date_input("Start Date", value=date(date.today().year, 1, 1), key="ts_start")
-        ts_end = c2.date_input("End Date", value=date.today(), key="ts_end")
-        rank_by = c3.radio("Rank Products By:", ["Quantity Sold", "Total Revenue ($)", "Net Profit ($)"], horizontal=True)
-        
-        # 2. Data Preparation
-        df_items = st.session_state['data']['items'].copy()
-        df_trans = st.session_state['data']['transactions'][['TransactionID', 'Timestamp']].copy()
-        
-        # Merge Transactions to get Date
-        df_items['TransactionID'] = df_items['TransactionID'].astype(str)
-        df_trans['TransactionID'] = df_trans['TransactionID'].astype(str)
-        merged = df_items.merge(df_trans, on='TransactionID', how='left')
-        
-        # Filter by Date
-        merged['DateObj'] = pd.to_datetime(merged['Timestamp']).dt.date
-        mask = (merged['DateObj'] >= ts_start) & (merged['DateObj'] <= ts_end)
-        filtered_items = merged[mask].copy()
-        
-        if not filtered_items.empty:
-            # Clean Numbers
-            filtered_items['QtySold'] = pd.to_numeric(filtered_items['QtySold'], errors='coerce').fillna(0)
-            filtered_items['Price'] = pd.to_numeric(filtered_items['Price'], errors='coerce').fillna(0)
-            
-            # Merge with Inventory to get COST (exclude gift certificates and freight)
-            filtered_items = filtered_items[
-                (~filtered_items['SKU'].astype(str).str.upper().str.startswith('GIFT')) &
-                (~filtered_items['SKU'].astype(str).str.upper().str.contains('FREIGHT'))
-            ]
-            if 'inventory' in st.session_state['data']:
-                inv_ref = st.session_state['data']['inventory'][['SKU', 'Cost']].copy()
-                inv_ref['SKU'] = inv_ref['SKU'].astype(str)
-                filtered_items['SKU'] = filtered_items['SKU'].astype(str)
-                full_data = filtered_items.merge(inv_ref, on='SKU', how='left')
-                full_data['Cost'] = pd.to_numeric(full_data['Cost'], errors='coerce').fillna(0)
-            else:
-                full_data = filtered_items.copy()
-                full_data['Cost'] = 0.0
-
-            # Calculate Metrics
-            full_data['Revenue'] = full_data['QtySold'] * full_data['Price']
-            full_data['TotalCost'] = full_data['QtySold'] * full_data['Cost']
-            full_data['Profit'] = full_data['Revenue'] - full_data['TotalCost']
-            
-            # Group by Product
-            product_group = full_data.groupby(['Name', 'SKU'])[['QtySold', 'Revenue', 'Profit']].sum().reset_index()
-            
-            # Sort
-            if "Revenue" in rank_by:
-                sorted_df = product_group.sort_values(by='Revenue', ascending=False)
-                metric_col = 'Revenue'
-                chart_color = "#2ecc71" # Green
-            elif "Profit" in rank_by:
-                sorted_df = product_group.sort_values(by='Profit', ascending=False)
-                metric_col = 'Profit'
-                chart_color = "#f1c40f" # Gold
-            else:
-                sorted_df = product_group.sort_values(by='QtySold', ascending=False)
-                metric_col = 'QtySold'
-                chart_color = "#3498db" # Blue
-            
-            # --- VISUALIZATION: TOP 10 CHART ---
-            st.subheader(f"📊 Top 10 by {rank_by.split('(')[0].strip()}")
-            top_10 = sorted_df.head(10).set_index('Name')
-            st.bar_chart(top_10[metric_col], color=chart_color)
-            
-            st.divider()
-
-            # --- DETAILED TABLE ---
-            st.subheader("📋 Product Leaderboard")
-            st.dataframe(
-                sorted_df.head(50), # Showing top 50 rows
-                use_container_width=True,
-                hide_index=True,
-                column_config={
-                    "Name": st.column_config.TextColumn("Product Name", width="medium"),
-                    "SKU": st.column_config.TextColumn("SKU", width="small"),
-                    "QtySold": st.column_config.NumberColumn("Sold", format="%d"),
-                    "Revenue": st.column_config.NumberColumn("Revenue", format="$%.2f"),
-                    "Profit": st.column_config.NumberColumn("Profit", format="$%.2f"),
-                }
-            )
-            
-        else:
-            st.info("No sales found in this period.")
-
-    with tab4:
-        st.header("Accounts Receivable")
-        df_trans = st.session_state['data']['transactions']
-        df_cust = st.session_state['data']['customers']
-        df_items = st.session_state['data']['items']
-        pending = df_trans[df_trans['Status'].astype(str).str.strip().str.lower().isin(['pending', 'unpaid', 'open'])].copy()
-        if pending.empty: st.success("🎉 All invoices are paid!")
-        else:
-            if not df_cust.empty:
-                pending['CustomerID'] = pending['CustomerID'].astype(str)
-                df_cust['CustomerID'] = df_cust['CustomerID'].astype(str)
-                # Collapse duplicate CustomerIDs first. Merging against them fans
-                # each invoice out into one row per matching customer, which both
-                # inflates the totals and crashes the page on duplicate widget keys.
-                lookup = df_cust[['CustomerID', 'Name']].copy()
-                shared = lookup['CustomerID'].duplicated(keep=False)
-                if shared.any():
-                    lookup.loc[shared, 'Name'] = (
-                        lookup[shared].groupby('CustomerID')['Name']
-                        .transform(lambda s: " / ".join(s.astype(str)) + " ⚠️ shared ID")
-                    )
-                lookup = lookup.drop_duplicates(subset='CustomerID', keep='first')
-                merged = pending.merge(lookup, on='CustomerID', how='left')
-            else: merged = pending; merged['Name'] = "Unknown"
-            
-            for i, row in merged.iterrows():
-                with st.container(border=True):
-                    c1, c2, c3, c4 = st.columns([2, 2, 1, 1.5])
-                    cust_name = row['Name'] if pd.notna(row['Name']) else "Unknown"
-                    c1.write(f"**{cust_name}**"); c1.caption(f"#{row['TransactionID']}")
-                    c2.write(f"Due: {row['DueDate']}")
-                    c3.write(f"**${float(row['TotalAmount']):,.2f}**")
-                    c_v, c_p = c4.columns(2)
-                    # Keys carry the row index as well — invoice numbers are not
-                    # guaranteed unique, and a collision crashes the whole tab.
-                    if c_v.button("👁️", key=f"uv_{row['TransactionID']}_{i}"):
-                        st.session_state[f"view_inv_{row['TransactionID']}"] = True
-                        st.rerun()
-                    if c_p.button("💲", key=f"up_{row['TransactionID']}_{i}"):
-                        db.mark_invoice_paid(row['TransactionID']); st.balloons(); auto_refresh()
-
-                # Previewer (Unpaid Report)
-                if st.session_state.get(f"view_inv_{row['TransactionID']}", False):
-                    with st.container(border=True):
-                        if st.button("❌ Close", key=f"uclose_{row['TransactionID']}_{i}"):
-                            st.session_state[f"view_inv_{row['TransactionID']}"] = False
-                            st.rerun()
-
-                        # Build PDF from stored transaction data
-                        t_id = str(row['TransactionID'])
-                        pdf_bytes = _build_invoice_pdf(t_id, cust_name)
-                        
-                        # 2. Download Button
-                        st.download_button(
-                            "🖨️ Download Invoice", 
-                            data=pdf_bytes,
-                            file_name=f"Invoice_{t_id}.pdf",
-                            mime="application/pdf",
-                            key=f"dl_unpaid_{t_id}_{i}",
-                            type="primary",
-                            use_container_width=True
-                        )
-
-                        # 3. PDF Viewer (No Base64!)
-                        pdf_viewer(input=pdf_bytes, width=700, height=800)
-
-# ==========================================
-# 6. SETTINGS
-# ==========================================
-elif menu == "⚙️ Settings":
-    page_header("⚙️", "Settings", "Company info, tax rate, invoice numbering")
-    
-    # Load Settings
-    if 'settings' in st.session_state['data']:
-        raw_settings = st.session_state['data']['settings']
-        settings_dict = dict(zip(raw_settings['Key'], raw_settings['Value']))
-    else: settings_dict = {}
-
-    with st.form("settings_form"):
-        col1, col2 = st.columns(2)
-        
-        # COLUMN 1: Company Info
-        with col1:
-            st.subheader("🏢 Company Info")
-            c_name = st.text_input("Company Name", value=settings_dict.get("CompanyName", "Notion to Sew"))
-            c_addr = st.text_area("Address", value=settings_dict.get("Address", "Modesto, CA"))
-            
-            st.subheader("💰 Financials")
-            venmo_user = st.text_input("Venmo Username", value=settings_dict.get("VenmoUser", ""))
-            
-        # COLUMN 2: Operations
-        with col2:
-            st.subheader("⚙️ Operations")
-            # Tax Rate Logic
-            raw_val = settings_dict.get("TaxRate", "0.08")
-            try:
-                clean_val = float(str(raw_val).replace("%", "").strip())
-                # Normalize: stored as decimal (0.0875) → display as 8.75; stored as percent (8.75) → display as 8.75
-                display_rate = clean_val * 100 if clean_val < 1.0 else clean_val
-            except ValueError:
-                display_rate = 8.0
-            # Guard: clamp display_rate to a sane percentage range (0–99)
-            display_rate = max(0.0, min(float(display_rate), 99.0))
-
-            new_rate_percent = st.number_input(
-                "Sales Tax Rate — enter as a percentage, e.g. 8.75 for 8.75%",
-                min_value=0.0, max_value=99.0,
-                value=display_rate, step=0.001, format="%.3f"
-            )
-            st.caption(f"ℹ️ Will be applied as **{new_rate_percent:.3f}%** on retail sales.")
-            next_inv = st.text_input("Next Invoice ID", value=settings_dict.get("NextInvoiceID", "1000"))
-            
-            # NEW: Expense Categories Management
-            st.divider()
-            st.markdown("### 🏷️ Expense Categories")
-            st.caption("Separate categories with commas.")
-            default_cats = "Fabric, Notions, Rent, Marketing, Shipping, Wages, Other"
-            current_cats = settings_dict.get("ExpenseCategories", default_cats)
-            new_cats = st.text_area("Categories", value=current_cats, height=100)
-
-        st.divider()
-        if st.form_submit_button("💾 Save All Settings", type="primary"):
-            decimal_rate = new_rate_percent / 100
-            
-            # Clean up the categories list (remove extra spaces)
-            clean_cats_str = ", ".join([x.strip() for x in new_cats.split(",") if x.strip()])
-            
-            updates = {
-                "CompanyName": c_name, 
-                "Address": c_addr, 
-                "TaxRate": decimal_rate, 
-                "NextInvoiceID": next_inv, 
-                "VenmoUser": venmo_user,
-                "ExpenseCategories": clean_cats_str  # Saving the new list
-            }
-            db.update_settings(updates)
-            st.success("✅ Settings Saved!")
-            auto_refresh()
+try:
+    with profiling.section(f"page: {menu.split(maxsplit=1)[-1]}"):
+        importlib.import_module(f"admin.{PAGES[menu]}").render()
+    profiling.finish()
+finally:
+    profiling.end()         # a page's st.rerun() or st.stop() skips finish()
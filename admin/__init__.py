@@ -0,0 +1 @@
+"""The admin app's pages. Home.py imports each one the first time it's opened."""
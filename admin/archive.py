@@ -0,0 +1,71 @@
+"""Archive: move closed years out of the live tables, or put them back."""
+from datetime import date
+
+import streamlit as st
+import backend as db
+from admin.common import auto_refresh
+
+
+def _kb(n):
+    return f"{n / 1024:,.0f} KB"
+
+
+def render():
+    st.caption("An archived year is stored compressed and left out of what every screen "
+               "loads, which keeps the app quick as the years pile up. Reports, customer "
+               "history and invoice reprints still read it back when asked, and the "
+               "dashboard's year over year uses its monthly totals.")
+    for year in db.missing_sales_years():
+        c_msg, c_btn = st.columns([4, 2], vertical_alignment="center")
+        c_msg.warning(f"⚠️ {year} isn't open in the database yet, so a sale in {year} "
+                      "would fail. The next deploy opens it, or open it now, between "
+                      "customers.")
+        if c_btn.button(f"📂 Open {year}", key=f"sales_year_{year}", use_container_width=True):
+            try:
+                db.create_sales_year(year)
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ {year} was not opened: {e}")
+
+    live, archived = db.archive_status()
+    this_year = date.today().year
+
+    st.subheader("📂 Open Years")
+    for _, r in live.iterrows():
+        year = int(r['Year'])
+        c_y, c_n, c_btn = st.columns([1, 3, 2], vertical_alignment="center")
+        c_y.write(f"**{year}**")
+        c_n.write(f"{int(r['Invoices']):,} invoices"
+                  + (f", {int(r['Unpaid'])} unpaid" if r['Unpaid'] else ""))
+        if year >= this_year:
+            c_btn.caption("Still open")
+        elif r['Unpaid']:
+            c_btn.caption("Settle or void its unpaid invoices first")
+        elif c_btn.button(f"🗄️ Archive {year}", key=f"archive_{year}", use_container_width=True):
+            try:
+                with st.spinner(f"Archiving {year}..."):
+                    n = db.archive_year(year)
+                st.success(f"Archived {n:,} invoices from {year}.")
+                auto_refresh()
+            except Exception as e:
+                st.error(f"❌ {year} was not archived: {e}")
+
+    st.subheader("🗄️ Archived Years")
+    if archived.empty:
+        st.info("Nothing archived yet.")
+        return
+    for _, r in archived.iterrows():
+        year = int(r['Year'])
+        c_y, c_n, c_btn = st.columns([1, 3, 2], vertical_alignment="center")
+        c_y.write(f"**{year}**")
+        c_n.write(f"{int(r['Invoices']):,} invoices, {_kb(r['Stored'])} "
+                  f"({_kb(r['Raw'])} uncompressed)")
+        c_n.caption(f"Archived {r['ArchivedAt'].astimezone(db.TZ):%b %d, %Y}")
+        if c_btn.button(f"↩️ Restore {year}", key=f"restore_{year}", use_container_width=True):
+            try:
+                with st.spinner(f"Restoring {year}..."):
+                    n = db.restore_year(year)
+                st.success(f"Restored {n:,} invoices to {year}.")
+                auto_refresh()
+            except Exception as e:
+                st.error(f"❌ {year} was not restored: {e}")
@@ -0,0 +1,359 @@
+"""Checkout: the admin point of sale."""
+import streamlit as st
+import pandas as pd
+import backend as db
+from admin.common import auto_refresh, page_header, pdf_print_button
+
+# --- CHECKOUT: fragments, so a click reruns only the part of the page it touched ---
+# Adding one item used to re-execute all of Home.py: the integrity check, the
+# sidebar, a row-wise apply building search labels for 1,500 products and a
+# loop over every customer. Now the item picker is a fragment that holds the
+# cart, which holds the customer/payment panel. A widget reruns the innermost
+# fragment it sits in, and everything nested inside that: picking an item
+# redraws the picker and cart, removing a line or changing freight redraws the
+# cart and payment panel, choosing a payment method redraws that panel alone.
+# Changing the customer still reruns the app, since wholesale pricing in the
+# picker follows the customer. bench/checkout_reruns.py times each case.
+
+_INACTIVE = ['false', '0', 'no', '']
+
+def _drop_from_cart(i):
+    st.session_state['cart'].pop(i)
+
+def _add_to_cart(s_sku, s_name, s_qty, s_price):
+    st.session_state['cart'].append({
+        "sku": s_sku, "name": s_name, "qty": s_qty, "price": s_price, "total": s_qty * s_price
+    })
+    st.session_state['checkout_item_search'] = None
+
+def _scan_to_cart(is_wholesale):
+    """A scanner types the SKU and presses Enter: one exact lookup, straight
+    into the cart. A repeat scan bumps the line's quantity."""
+    code = st.session_state['checkout_scan'].strip()
+    st.session_state['checkout_scan'] = ""
+    if not code:
+        return
+    item = db.lookup_sku(code)
+    if item is None or str(item.get('Active', True)).strip().lower() in _INACTIVE:
+        st.session_state['checkout_scan_miss'] = code
+        return
+    st.session_state.pop('checkout_scan_miss', None)
+    wholesale = float(item.get('WholesalePrice') or 0)
+    price = wholesale if is_wholesale and wholesale > 0 else float(item['Price'] or 0)
+    for line in st.session_state['cart']:
+        if line['sku'] == item['SKU'] and line['price'] == price:
+            line['qty'] += 1
+            line['total'] = line['qty'] * price
+            return
+    _add_to_cart(item['SKU'], item['Name'], 1, price)
+
+def _unit_prices(inv, is_wholesale):
+    """Price each row rings up at: wholesale when asked for and set, else retail."""
+    if not is_wholesale or 'WholesalePrice' not in inv.columns:
+        return pd.to_numeric(inv['Price'], errors='coerce')
+    wholesale = pd.to_numeric(inv['WholesalePrice'], errors='coerce').fillna(0)
+    return pd.to_numeric(inv['WholesalePrice'].where(wholesale > 0, inv['Price']), errors='coerce')
+
+@st.fragment
+def _checkout():
+    c1, c2 = st.columns([1.5, 1])
+
+    # LEFT: Add Item
+    with c1:
+        st.subheader("Add Item")
+
+        # Use a stable key for the widget and sync with a value key
+        if 'ck_wholesale_val' not in st.session_state:
+            st.session_state['ck_wholesale_val'] = False
+
+        is_wholesale = st.checkbox("Apply Wholesale Pricing?", value=st.session_state['ck_wholesale_val'], key='ck_wholesale_widget')
+
+        # Sync value back to our state key if user clicks it
+        st.session_state['ck_wholesale_val'] = is_wholesale
+
+        inv = st.session_state['data']['inventory']
+        # Hide inactive items from checkout search
+        if 'Active' in inv.columns:
+            inv = inv[~inv['Active'].astype(str).str.strip().str.lower().isin(_INACTIVE)]
+
+        # --- SORT BY SKU ---
+        inv = inv.assign(SKU=inv['SKU'].astype(str)).sort_values(by='SKU')
+
+        # Show price in lookup
+        inv['lookup'] = (inv['SKU'] + " | " + inv['Name'].astype(str) + " ($"
+                         + _unit_prices(inv, is_wholesale).map('{:.2f}'.format) + ")")
+
+        selected_item_str = st.selectbox("Search Item", inv['lookup'], index=None, key="checkout_item_search")
+
+        item_row = None
+        if selected_item_str:
+            sku_str = selected_item_str.split(" | ")[0].strip()
+            item_row = db.lookup_sku(sku_str)
+        if item_row is not None:
+            with st.container(border=True):
+                # Price Selection Logic
+                base_price = item_row['WholesalePrice'] if is_wholesale and float(item_row.get('WholesalePrice', 0) or 0) > 0 else item_row['Price']
+
+                c_qty, c_price = st.columns(2)
+                qty = c_qty.number_input("Quantity", 1, 1000, 1)
+                final_price = c_price.number_input("Unit Price ($)", 0.0, 10000.0, float(base_price))
+
+                st.button("Add to Cart", type="primary", use_container_width=True,
+                          on_click=_add_to_cart, args=(sku_str, item_row['Name'], qty, final_price))
+
+    # RIGHT: Cart & Pay
+    with c2:
+        _checkout_cart(is_wholesale)
+
+@st.fragment
+def _checkout_cart(is_wholesale):
+    with st.container(border=True):
+        st.subheader("Current Order")
+        # Scanning reruns this fragment only: the cart and payment panel,
+        # not the picker's label column over every product.
+        st.text_input("Scan", key="checkout_scan", placeholder="📷 Scan or type an exact SKU + Enter",
+                      label_visibility="collapsed", on_change=_scan_to_cart, args=(is_wholesale,))
+        if st.session_state.get('checkout_scan_miss'):
+            st.warning(f"No item for sale with SKU **{st.session_state['checkout_scan_miss']}**.")
+        if not st.session_state['cart']:
+            st.info("Cart is empty.")
+            return
+        subtotal = sum(item['total'] for item in st.session_state['cart'])
+        # List Items
+        for i, item in enumerate(st.session_state['cart']):
+            c_a, c_b, c_c = st.columns([3, 1, 0.5])
+            c_a.write(f"**{item['name']}**\n{item['qty']} @ ${item['price']:.2f}")
+            c_b.write(f"${item['total']:.2f}")
+            c_c.button("x", key=f"del_{i}", on_click=_drop_from_cart, args=(i,))
+        st.divider()
+
+        # Tax Logic
+        if 'settings' in st.session_state['data']:
+            s_df = st.session_state['data']['settings']
+            settings_cache = dict(zip(s_df['Key'], s_df['Value']))
+            raw_rate = settings_cache.get("TaxRate", "0.08")
+            venmo_user = settings_cache.get("VenmoUser", "")
+        else: raw_rate = "0.08"; venmo_user = ""
+
+        try:
+            tax_rate = float(str(raw_rate).replace("%", "").strip())
+            if tax_rate > 1: tax_rate = tax_rate / 100
+        except: tax_rate = 0.0
+        # Always start with the fresh global rate; only override if a customer
+        # with a custom rate is actively selected (set via rerun in customer block below)
+        cust_has_custom_rate = (
+            st.session_state.get('co_last_cust') is not None and
+            st.session_state.get('co_effective_tax_rate') is not None and
+            st.session_state.get('co_effective_tax_rate') != tax_rate
+        )
+        effective_tax_rate = st.session_state['co_effective_tax_rate'] if cust_has_custom_rate else tax_rate
+
+        # --- FREIGHT ---
+        freight = st.number_input("Freight / Shipping ($)", 0.0, 500.0, 0.0, step=0.05, key="freight_charge")
+
+        # --- BULK DISCOUNT ---
+        bulk_discount_pct = st.number_input("Bulk Discount (%)", 0.0, 100.0, 0.0, step=1.0)
+        discount_amount = subtotal * (bulk_discount_pct / 100.0)
+        discounted_subtotal = subtotal - discount_amount
+
+        apply_tax = st.checkbox(f"Apply Tax ({(effective_tax_rate*100):.3f}%)", value=not is_wholesale)
+        tax_amt = discounted_subtotal * effective_tax_rate if apply_tax else 0.0
+        cart_total = discounted_subtotal + tax_amt + freight
+
+        _checkout_payment(is_wholesale, tax_rate, venmo_user, {
+            "subtotal": subtotal, "discount_pct": bulk_discount_pct, "discount": discount_amount,
+            "discounted": discounted_subtotal, "tax": tax_amt, "freight": freight, "total": cart_total,
+        })
+
+@st.fragment
+def _checkout_payment(is_wholesale, tax_rate, venmo_user, order):
+    cust = st.session_state['data']['customers']
+    subtotal, cart_total, tax_amt, freight = order['subtotal'], order['total'], order['tax'], order['freight']
+
+    # CUSTOMER & CREDIT LOGIC
+    cust_tab1, cust_tab2 = st.tabs(["Existing", "New"])
+    selected_cust = None; cust_credit = 0.0; cust_id = "Guest"
+    with cust_tab1:
+        # Two customers can share a name, so pick by row, not by name —
+        # otherwise the sale is filed against whichever one comes first.
+        _names = cust['Name'].astype(str)
+        _labels = _names.where(~_names.duplicated(keep=False),
+                               _names + " (" + cust['CustomerID'].astype(str) + ")").tolist()
+        _label_to_idx = dict(zip(_labels, cust.index))
+
+        # A customer just created on the "New" tab gets selected here.
+        _new_id = st.session_state.pop('co_pending_new_id', None)
+        if _new_id is not None:
+            for _lbl, _idx in _label_to_idx.items():
+                if cust.loc[_idx, 'CustomerID'] == _new_id:
+                    st.session_state['co_cust_sel'] = _lbl
+                    break
+
+        selected_cust_name = st.selectbox("Customer", _labels, index=None, key='co_cust_sel')
+        if selected_cust_name:
+            cust_row = cust.loc[_label_to_idx[selected_cust_name]]
+            selected_cust = str(cust_row['Name'])
+            cust_id = cust_row['CustomerID']
+            try: cust_credit = float(cust_row.get('Credit', 0) if cust_row.get('Credit') != "" else 0)
+            except: cust_credit = 0.0
+            cust_is_wholesale = str(cust_row.get('IsWholesale', '')).strip().upper() == 'TRUE'
+            # Per-customer tax rate override
+            raw_cust_tax = str(cust_row.get('TaxRate', '')).strip()
+            try:
+                cust_tax_val = float(raw_cust_tax)
+                new_eff_rate = (cust_tax_val / 100 if cust_tax_val > 1 else cust_tax_val) if cust_tax_val > 0 else tax_rate
+            except (ValueError, TypeError):
+                new_eff_rate = tax_rate
+            # Rerun when customer changes so wholesale + tax rate update before checkbox renders
+            if selected_cust_name != st.session_state.get('co_last_cust'):
+                st.session_state['co_last_cust'] = selected_cust_name
+                st.session_state['ck_wholesale_val'] = cust_is_wholesale
+                st.session_state['co_effective_tax_rate'] = new_eff_rate
+                st.rerun()
+            if cust_is_wholesale:
+                st.info("🏭 Wholesale customer — wholesale pricing auto-applied")
+        else:
+            if st.session_state.get('co_last_cust') is not None:
+                st.session_state['co_last_cust'] = None
+                st.session_state['co_effective_tax_rate'] = tax_rate
+    with cust_tab2:
+        with st.form("q_add"):
+            nn = st.text_input("Name"); ne = st.text_input("Email")
+            if st.form_submit_button("Save"):
+                if nn:
+                    # Hand the new ID to the Existing tab; setting the
+                    # raw name breaks when that name is not unique.
+                    st.session_state['co_pending_new_id'] = db.add_customer(nn, ne)
+                    st.session_state.pop('co_cust_sel', None)
+                    auto_refresh()
+                else: st.error("Name required")
+
+    credit_applied = 0.0
+    if selected_cust and cust_credit > 0:
+        st.info(f"💎 **Credit Available: ${cust_credit:.2f}**")
+        if st.checkbox("Apply Store Credit?"):
+            max_apply = min(cust_credit, cart_total)
+            credit_applied = st.number_input("Amount to apply", 0.0, max_apply, max_apply)
+
+    final_due = max(0.0, cart_total - credit_applied)
+    st.write(f"Subtotal: ${subtotal:.2f}")
+    if order['discount_pct'] > 0:
+        st.write(f"Bulk Discount ({order['discount_pct']}%): -${order['discount']:.2f}")
+        st.write(f"Discounted Subtotal: ${order['discounted']:.2f}")
+    st.write(f"Tax: ${tax_amt:.2f}")
+    if credit_applied > 0: st.write(f"Store Credit: -${credit_applied:.2f}")
+    st.markdown(f"### Total: ${final_due:.2f}")
+    st.divider()
+
+    pay_method = st.selectbox("Payment", ["Cash", "Card", "Venmo", "Invoice (Pay Later)"])
+    if pay_method == "Venmo" and venmo_user:
+        st.image(f"https://api.qrserver.com/v1/create-qr-code/?size=150x150&data=https://venmo.com/u/{venmo_user}", width=150, caption=f"@{venmo_user}")
+
+    if st.button("✅ Complete Order", type="primary", use_container_width=True):
+        if selected_cust or pay_method == "Cash": # Allow Cash Guest checkout
+            # Handle Guest
+            if not selected_cust: cust_id = "Guest"; selected_cust = "Guest"
+
+            status = "Pending" if pay_method == "Invoice (Pay Later)" else "Paid"
+            with st.spinner("Processing..."):
+                try:
+                    new_id = db.commit_sale(
+                        st.session_state['cart'], cart_total, tax_amt, cust_id,
+                        pay_method, is_wholesale, status, credit_used=credit_applied
+                    )
+                except Exception as e:
+                    # Never leave the cart in a state where the sale
+                    # looks complete but nothing was written.
+                    st.error(f"❌ **The sale was not saved.** {e}")
+                    st.warning("Your cart has been kept — try Complete Order again.")
+                    st.stop()
+
+                # Record Freight if applicable
+                if freight > 0:
+                    db.record_freight(new_id, freight)
+
+                # Generate PDF
+                address = db.get_settings_dict().get("Address", "Modesto, CA")
+
+                # Add freight to cart for line items table display
+                checkout_cart_pdf = st.session_state['cart'].copy()
+                if freight > 0:
+                    checkout_cart_pdf.append({"sku": "FREIGHT", "name": "Shipping", "qty": 1, "price": freight})
+
+                pdf_bytes = db.create_pdf(new_id, selected_cust, address, checkout_cart_pdf, subtotal, tax_amt, cart_total, "Upon Receipt", credit_applied=credit_applied, discount_amount=order['discount'], freight_amount=freight)
+
+                # Store State
+                st.session_state['last_order'] = {
+                    'id': new_id,
+                    'pdf': pdf_bytes
+                }
+                st.session_state['checkout_complete'] = True
+                st.session_state['cart'] = []
+                st.rerun()
+        else: st.error("Select customer (required for non-cash orders).")
+
+
+def render():
+    page_header("🛒", "Point of Sale", "Admin checkout with invoice + wholesale support")
+
+    # --- SUCCESS STATE ---
+    if st.session_state.get('checkout_complete'):
+        st.success(f"✅ Order #{st.session_state['last_order']['id']} Recorded Successfully!")
+        
+        c1, c2, c3, c4 = st.columns(4)
+        
+        # 1. View Invoice
+        if c1.button("👁️ View Invoice", use_container_width=True):
+            st.session_state['view_last_invoice'] = True
+        
+        # 2. Download & Print
+        pdf_data = st.session_state['last_order']['pdf']
+        with c2:
+            pdf_print_button(pdf_data)
+            st.download_button(
+                "📄 Download PDF",
+                data=pdf_data,
+                file_name=f"Invoice_{st.session_state['last_order']['id']}.pdf",
+                mime="application/pdf",
+                use_container_width=True
+            )
+
+        # 3. Email Receipt
+        with c3:
+            with st.popover("📧 Email Receipt", use_container_width=True):
+                # Try to get customer email if available
+                # Note: last_order currently only stores id and pdf. 
+                # We might need to store the email too or look it up.
+                e_addr = st.text_input("Send to Email", placeholder="customer@example.com")
+                if st.button("Send ➝", type="primary", use_container_width=True):
+                    if e_addr:
+                        try:
+                            db.send_receipt_email(e_addr, st.session_state['last_order']['id'], pdf_data)
+                            st.success("Sent!")
+                        except Exception as e:
+                            st.error(f"Error: {e}")
+                    else: st.error("Email required.")
+
+        # 4. New Sale
+        if c4.button("✨ New Sale", type="primary", use_container_width=True):
+            st.session_state['checkout_complete'] = False
+            st.session_state['view_last_invoice'] = False
+            st.session_state['last_order'] = None
+            st.rerun()
+
+        # Preview Modal (JUMBO SIZE)
+        if st.session_state.get('view_last_invoice'):
+            st.divider()
+            st.caption("ℹ️ To print: Download the PDF and print from your computer.")
+            # Increased Width and Height significantly
+            # Only the receipt needs the viewer; it costs ~85ms to import.
+            from streamlit_pdf_viewer import pdf_viewer
+            pdf_viewer(input=st.session_state['last_order']['pdf'], width=1000, height=1000)
+            
+            if st.button("❌ Close Preview"):
+                st.session_state['view_last_invoice'] = False
+                st.rerun()
+
+    # --- NORMAL CHECKOUT SCREEN ---
+    else:
+        _checkout()
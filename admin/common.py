@@ -0,0 +1,73 @@
+"""Helpers every admin page shares: the header, reloads, invoice PDFs."""
+import base64
+import streamlit as st
+import backend as db
+import ui
+
+# --- HELPER: AUTO REFRESH ---
+def auto_refresh():
+    """Clears session state to force a data reload."""
+    if 'data' in st.session_state:
+        del st.session_state['data']
+    st.rerun()
+
+# --- HELPER: Branded page header ---
+def page_header(icon: str, title: str, subtitle: str = ""):
+    ui.page_header(icon, title, subtitle)
+
+def pdf_print_button(pdf_bytes, label="🖨️ Print / Open in New Tab"):
+    """Generates an HTML button that opens the PDF in a new browser tab for direct printing."""
+    try:
+        b64 = base64.b64encode(pdf_bytes).decode()
+        # Primary Streamlit Red: #FF4B4B
+        html = f"""
+            <a href="data:application/pdf;base64,{b64}" target="_blank" style="text-decoration: none;">
+                <button style="
+                    width: 100%;
+                    background-color: #FF4B4B;
+                    color: white;
+                    padding: 0.5rem 1rem;
+                    border: none;
+                    border-radius: 0.5rem;
+                    cursor: pointer;
+                    font-weight: 500;
+                    font-size: 1rem;
+                    margin-top: 10px;
+                    margin-bottom: 10px;
+                ">
+                    {label}
+                </button>
+            </a>
+        """
+        st.markdown(html, unsafe_allow_html=True)
+    except Exception as e:
+        st.error(f"Could not generate print link: {e}")
+
+# --- HELPER: Build PDF from stored transaction ---
+def build_invoice_pdf(transaction_id: int, customer_name: str) -> bytes:
+    """Reconstruct a PDF for any historical transaction from session data."""
+    data = st.session_state['data']
+    # The lines come from the live snapshot, not session data, so an invoice
+    # rung up a moment ago is found without reloading the session.
+    r, inv_items = db.invoice(transaction_id)
+
+    cart = []
+    for _, item in inv_items.iterrows():
+        try: q, p = int(item['QtySold']), float(item['Price'])
+        except: q, p = 1, 0.0
+        cart.append({"sku": str(item.get('SKU', '')), "name": item['Name'], "qty": q, "price": p})
+    addr = "Modesto, CA"
+    if 'settings' in data:
+        s = dict(zip(data['settings']['Key'], data['settings']['Value']))
+        addr = s.get("Address", addr)
+    tax, total, due, t_date = 0.0, 0.0, "", None
+    if r is not None:
+        try: tax = float(r['TaxAmount'] or 0)
+        except: pass
+        try: total = float(r['TotalAmount'] or 0)
+        except: pass
+        due = str(r.get('DueDate', ''))
+        t_date = r.get('Timestamp')
+    subtotal = sum(i['qty'] * i['price'] for i in cart if i.get('sku', '').upper() != 'FREIGHT')
+    cart_total = sum(i['qty'] * i['price'] for i in cart) + tax
+    return db.create_pdf(transaction_id, customer_name, addr, cart, subtotal, tax, cart_total, due, transaction_date=t_date)
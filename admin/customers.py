@@ -0,0 +1,354 @@
+"""Customers: the card list, profiles, purchase history and store credit."""
+import streamlit as st
+import backend as db
+from admin.common import auto_refresh, build_invoice_pdf, page_header, pdf_print_button
+
+
+def render():
+    page_header("👥", "Customers", "CRM — profiles, purchase history, and store credit")
+    
+    # Initialize Session State for Navigation
+    if 'active_cust_id' not in st.session_state:
+        st.session_state['active_cust_id'] = None
+
+    df_cust = st.session_state['data']['customers']
+
+    # --- HELPER: PHONE FORMAT ---
+    def format_us_phone(phone_raw):
+        digits = ''.join(filter(str.isdigit, str(phone_raw)))
+        if len(digits) == 10: return f"({digits[:3]}) {digits[3:6]}-{digits[6:]}"
+        return str(phone_raw)
+
+# ==========================================
+    # VIEW A: THE CUSTOMER LIST (Cards)
+    # ==========================================
+    if st.session_state['active_cust_id'] is None:
+        
+        # 1. Top Actions
+        # FIX: vertical_alignment="bottom" makes the button sit flush with the search bar
+        c_search, c_sort, c_add = st.columns([3, 1.5, 1], vertical_alignment="bottom")
+        
+        # Search Bar
+        search_q = c_search.text_input("🔍 Search Customers", placeholder="Name or Phone...")
+        # Spend, balance and last purchase are kept per customer by the
+        # database (customer_stats), so sorting on them is just a sort.
+        sort_by = c_sort.selectbox("Sort by", ["Name", "Top spenders", "Owes the most",
+                                               "Last purchase"], key="cust_sort")
+        
+        # Add Button (Now aligned)
+        with c_add:
+            with st.popover("➕ New Customer", use_container_width=True):
+                with st.form("quick_create_cust"):
+                    n_n = st.text_input("Name")
+                    n_e = st.text_input("Email")
+                    if st.form_submit_button("Create"):
+                        if n_n:
+                            db.add_customer(n_n, n_e)
+                            st.success("Created!")
+                            auto_refresh()
+                        else: st.error("Name required")
+
+        st.divider()
+
+        # 2. Filter Logic
+        if search_q:
+            # Flexible search
+            mask = (
+                df_cust['Name'].astype(str).str.contains(search_q, case=False) | 
+                df_cust['Phone'].astype(str).str.contains(search_q)
+            )
+            filtered_df = df_cust[mask]
+        else:
+            filtered_df = df_cust
+        if sort_by == "Owes the most":
+            filtered_df = filtered_df[filtered_df['Balance'] > 0]
+            
+        # 3. Render the list
+        # One compact row per customer rather than a full-height card: the book
+        # runs to 200+ names, and tall cards made it a scroll marathon to reach
+        # anyone past the B's. Long lists are paged so a rerun stays cheap.
+        if filtered_df.empty:
+            st.info("No customers found.")
+        else:
+            if sort_by == "Top spenders":
+                filtered_df = filtered_df.sort_values(by="Spend", ascending=False, kind="stable")
+            elif sort_by == "Owes the most":
+                filtered_df = filtered_df.sort_values(by="Balance", ascending=False, kind="stable")
+            elif sort_by == "Last purchase":
+                filtered_df = filtered_df.sort_values(by="LastPurchase", ascending=False, kind="stable")
+            else:
+                filtered_df = filtered_df.sort_values(by="Name")
+
+            PAGE_SIZE = 25
+            total = len(filtered_df)
+            pages = max(1, -(-total // PAGE_SIZE))
+            page = 1
+            if pages > 1:
+                c_count, c_page = st.columns([2, 1], vertical_alignment="center")
+                c_count.caption(f"{total} customers — showing {PAGE_SIZE} at a time. "
+                                "Search above to jump straight to someone.")
+                page = c_page.number_input("Page", 1, pages, 1, key="cust_page",
+                                           label_visibility="collapsed")
+            else:
+                st.caption(f"{total} customer{'s' if total != 1 else ''}")
+            filtered_df = filtered_df.iloc[(page - 1) * PAGE_SIZE: page * PAGE_SIZE]
+
+            for i, row in filtered_df.iterrows():
+                with st.container(border=True):
+                    c_info, c_cred, c_btn = st.columns([5, 2, 2], vertical_alignment="center")
+
+                    # Info — name and contact on two tight lines
+                    with c_info:
+                        ph = format_us_phone(row['Phone'])
+                        email = str(row.get('Email', '') or '').strip()
+                        bits = [ph if ph else "no phone"] + ([email] if email else [])
+                        if row['Invoices']:
+                            bits.append(f"${float(row['Spend']):,.0f} spent")
+                        if row['Balance'] > 0:
+                            bits.append(f"${float(row['Balance']):,.2f} due")
+                        st.markdown(
+                            f"**{row['Name']}**  \n"
+                            f"<span style='color:#7A736A;font-size:0.85em'>{' · '.join(bits)}</span>",
+                            unsafe_allow_html=True,
+                        )
+
+                    # Credit Badge
+                    with c_cred:
+                        try: cred = float(row.get('Credit', 0) if row.get('Credit') != "" else 0)
+                        except: cred = 0.0
+                        if cred > 0:
+                            st.markdown(
+                                f"<div style='text-align:right'><span style='background:#E7F1ED;"
+                                f"color:#14503F;padding:2px 10px;border-radius:999px;"
+                                f"font-size:0.85em;font-weight:600'>${cred:,.2f} credit</span></div>",
+                                unsafe_allow_html=True,
+                            )
+
+                    # Manage Button
+                    with c_btn:
+                        if st.button("Manage →", key=f"btn_m_{i}_{row['CustomerID']}",
+                                     use_container_width=True):
+                            st.session_state['active_cust_id'] = row['CustomerID']
+                            # Remember the row too: CustomerID alone is not reliably
+                            # unique, and looking the profile up by ID can open the
+                            # wrong customer.
+                            st.session_state['active_cust_row'] = i
+                            st.rerun()
+
+    # ==========================================
+    # VIEW B: THE PROFILE (Detailed)
+    # ==========================================
+    else:
+        # Get Active Customer Data
+        cid = st.session_state['active_cust_id']
+        ridx = st.session_state.get('active_cust_row')
+        mask = df_cust['CustomerID'] == cid
+
+        if df_cust[mask].empty:
+            st.error("Customer not found. They may have been deleted.")
+            if st.button("Back to List"):
+                st.session_state['active_cust_id'] = None
+                st.session_state['active_cust_row'] = None
+                st.rerun()
+        else:
+            # Prefer the exact row that was clicked. Falling back to the first
+            # ID match is what makes a shared ID open the wrong customer.
+            if ridx is not None and ridx in df_cust.index and df_cust.loc[ridx, 'CustomerID'] == cid:
+                row = df_cust.loc[ridx]
+            else:
+                row = df_cust[mask].iloc[0]
+
+            if len(df_cust[mask]) > 1:
+                sharers = ", ".join(df_cust[mask]['Name'].astype(str))
+                st.error(
+                    f"⚠️ **CustomerID {cid} is shared by {len(df_cust[mask])} customers "
+                    f"({sharers}).** The history and store credit below are the *combined* "
+                    "totals for all of them, and edits here may save to the wrong one. "
+                    "Give each customer a unique CustomerID in the Customers sheet to fix this."
+                )
+
+            # --- HEADER ---
+            c_back, c_title = st.columns([1, 5])
+            if c_back.button("⬅️ Back"):
+                st.session_state['active_cust_id'] = None
+                st.session_state['active_cust_row'] = None
+                st.rerun()
+            c_title.title(row['Name'])
+
+            m_spend, m_bal, m_n, m_last = st.columns(4)
+            m_spend.metric("Lifetime Spend", f"${float(row['Spend']):,.2f}")
+            m_bal.metric("Open Balance", f"${float(row['Balance']):,.2f}")
+            m_n.metric("Invoices", f"{int(row['Invoices']):,}")
+            m_last.metric("Last Purchase", row['LastPurchase'] or "—")
+
+            # Pre-compute transaction history so the preview can render full-width below columns.
+            # Newest first, archived years included.
+            my_trans = db.customer_history(cid)
+
+            # --- MAIN CONTENT ---
+            preview_slot = st.empty()
+            col1, col2 = st.columns([1, 1.5])
+            
+            # LEFT: Edit Profile & Credit
+            with col1:
+                with st.container(border=True):
+                    st.subheader("Edit Details")
+                    with st.form(f"edit_{cid}"):
+                        u_name = st.text_input("Name", value=row['Name'])
+                        u_phone = st.text_input("Phone", value=str(row.get('Phone', "")))
+                        u_addr = st.text_area("Address", value=str(row.get('Address', "")))
+                        u_notes = st.text_area("Notes", value=str(row.get('Notes', "")))
+                        st.divider()
+                        u_wholesale = st.checkbox(
+                            "🏭 Wholesale Customer",
+                            value=str(row.get('IsWholesale', '')).strip().upper() == 'TRUE',
+                            help="Auto-applies wholesale pricing and no tax at checkout"
+                        )
+                        raw_cust_tax = str(row.get('TaxRate', '')).strip()
+                        try:
+                            stored_rate = float(raw_cust_tax)
+                            display_rate = stored_rate * 100 if stored_rate < 1.0 else stored_rate
+                        except (ValueError, TypeError):
+                            display_rate = 0.0
+                        u_tax_override = st.number_input(
+                            "Custom Tax Rate (% — 0 = use global default)",
+                            min_value=0.0, max_value=100.0,
+                            value=float(display_rate), step=0.001, format="%.3f",
+                            help="Overrides the global tax rate for this customer only."
+                        )
+                        if st.form_submit_button("💾 Save Changes"):
+                            tax_override_decimal = u_tax_override / 100.0 if u_tax_override > 0 else None
+                            # update_customer_details swallows its errors and returns
+                            # False; reporting "Saved!" regardless hides lost edits.
+                            if db.update_customer_details(cid, u_name, u_addr, u_phone, u_notes,
+                                                          is_wholesale=u_wholesale,
+                                                          tax_rate_override=tax_override_decimal):
+                                st.success("Saved!")
+                                auto_refresh()
+                            else:
+                                st.error("❌ Not saved — the database rejected the change. "
+                                         "Check your connection and try again.")
+                    
+                    st.write("")
+                    with st.expander("🗑️ Delete Profile"):
+                        if len(df_cust[mask]) > 1:
+                            # Deleting by ID removes whichever row comes first in the
+                            # sheet, which may well be the other customer.
+                            st.error(
+                                f"Deletion is disabled while CustomerID {cid} is shared by "
+                                "more than one customer — it could delete the wrong one. "
+                                "Give them unique IDs first."
+                            )
+                        elif st.checkbox(f"I confirm deletion of {row['Name']}", key="del_chk"):
+                            if st.button("Delete Permanently", type="primary"):
+                                if db.delete_customer(cid):
+                                    st.session_state['active_cust_id'] = None
+                                    st.session_state['active_cust_row'] = None
+                                    st.success("Deleted.")
+                                    auto_refresh()
+                                else:
+                                    st.error("❌ Not deleted — the database rejected the change.")
+
+                st.divider()
+                
+                # Credit Logic
+                try: raw_cred = float(row.get('Credit', 0) if row.get('Credit') != "" else 0)
+                except: raw_cred = 0.0
+                st.metric("Store Credit Balance", f"${raw_cred:,.2f}")
+                
+                with st.expander("🎁 Sell Gift Certificate / Add Credit"):
+                    giver_lookup = st.selectbox("Who is paying?", ["Self (Same Person)"] + list(df_cust['Name']), index=0)
+                    gc_amount = st.number_input("Amount ($)", 0.0, 5000.0, 50.0, step=10.0)
+                    gc_pay_method = st.selectbox("Payment Method", ["Cash", "Card", "Venmo", "Check"])
+                    
+                    if st.button("💸 Add Credit", type="primary"):
+                        if giver_lookup == "Self (Same Person)": giver_id = cid
+                        else: giver_id = df_cust[df_cust['Name'] == giver_lookup].iloc[0]['CustomerID']
+                        with st.spinner("Processing..."):
+                            db.sell_gift_certificate(giver_id, cid, gc_amount, gc_pay_method)
+                            st.success(f"Added ${gc_amount}!")
+                            auto_refresh()
+
+            # RIGHT: Purchase History
+            with col2:
+                st.subheader("History")
+                if my_trans.empty:
+                    st.info("No purchase history.")
+                else:
+                    # Iterate with Index (i) to fix duplicate key error
+                    for i, t_row in my_trans.iterrows():
+                        with st.container(border=True):
+                            c_d, c_a, c_s, c_act = st.columns([1.6, 1, 0.9, 2.5], vertical_alignment="center")
+
+                            c_d.write(f"**{str(t_row['Timestamp'])[:10]}**")
+                            c_d.caption(f"#{t_row['TransactionID']}")
+
+                            try: amt = float(t_row['TotalAmount'] if t_row['TotalAmount'] != '' else 0)
+                            except: amt = 0.0
+                            c_a.write(f"**${amt:.2f}**")
+
+                            status_raw = str(t_row['Status']).strip()
+                            is_paid = status_raw.lower() not in ['pending', 'unpaid', 'open']
+                            # A full-width alert box in a narrow column wraps to one
+                            # letter per line. A pill sizes to its text instead.
+                            c_s.markdown(
+                                '<span class="pill pill-paid">Paid</span>' if is_paid
+                                else '<span class="pill pill-due">Unpaid</span>',
+                                unsafe_allow_html=True)
+
+                            # ACTION BUTTONS (Unique Keys Added)
+                            b1, b2, b3, b4 = c_act.columns(4)
+
+                            # KEY FIX: Append _{i} to ensure uniqueness
+                            if b1.button("👁️", key=f"v_{t_row['TransactionID']}_{i}", help="View"):
+                                st.session_state[f"view_inv_{t_row['TransactionID']}"] = True
+                                st.rerun()
+
+                            # Email Button
+                            with b2:
+                                with st.popover("📧", help="Email Receipt"):
+                                    e_addr = st.text_input("Email", value=row.get('Email', ''), key=f"em_{t_row['TransactionID']}_{i}")
+                                    if st.button("Send", key=f"ems_{t_row['TransactionID']}_{i}", use_container_width=True):
+                                        if e_addr:
+                                            try:
+                                                pdf_b = build_invoice_pdf(t_row['TransactionID'], row['Name'])
+                                                db.send_receipt_email(e_addr, str(t_row['TransactionID']), pdf_b)
+                                                st.toast("Email Sent!")
+                                            except Exception as e:
+                                                st.error(f"Failed: {e}")
+                                        else: st.error("Email required.")
+
+                            if not is_paid:
+                                if b3.button("💲", key=f"p_{t_row['TransactionID']}_{i}", help="Mark Paid"):
+                                    db.mark_invoice_paid(t_row['TransactionID'])
+                                    st.toast("Paid!")
+                                    auto_refresh()
+
+                            # An archived invoice is history: view and re-send only.
+                            if not t_row['Archived'] and b4.button("🗑️", key=f"d_{t_row['TransactionID']}_{i}", type="primary", help="Delete"):
+                                db.delete_invoice(t_row['TransactionID'])
+                                st.warning("Deleted.")
+                                auto_refresh()
+
+            # --- RENDER ACTIVE PREVIEW TO SLOT (Full width, above columns) ---
+            if not my_trans.empty:
+                for i, t_row in my_trans.iterrows():
+                    if st.session_state.get(f"view_inv_{t_row['TransactionID']}", False):
+                        with preview_slot.container(border=True):
+                            if st.button("❌ Close Preview", key=f"cls_{t_row['TransactionID']}_{i}"):
+                                st.session_state[f"view_inv_{t_row['TransactionID']}"] = False
+                                st.rerun()
+                            t_id = t_row['TransactionID']
+                            pdf_bytes = build_invoice_pdf(t_id, row['Name'])
+                            pdf_print_button(pdf_bytes)
+                            st.download_button(
+                                "🖨️ Download PDF",
+                                data=pdf_bytes,
+                                file_name=f"Invoice_{t_id}.pdf",
+                                mime="application/pdf",
+                                key=f"dl_{t_id}_{i}",
+                                type="primary",
+                                use_container_width=True
+                            )
+                            from streamlit_pdf_viewer import pdf_viewer
+                            pdf_viewer(input=pdf_bytes, width="100%")
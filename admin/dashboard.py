@@ -0,0 +1,70 @@
+"""Dashboard: this month's sales and recent activity."""
+import streamlit as st
+import pandas as pd
+import backend as db
+from datetime import date
+from admin.common import page_header
+
+
+def render():
+    page_header("📊", "Dashboard", "Sales overview and recent activity")
+    col_d1, col_d2 = st.columns(2)
+    today = date.today()
+    start_of_month = date(today.year, today.month, 1)
+    d_start = col_d1.date_input("Start Date", value=start_of_month)
+    d_end = col_d2.date_input("End Date", value=today)
+    
+    if 'transactions' in st.session_state['data']:
+        df = st.session_state['data']['transactions']
+        df_cust = st.session_state['data']['customers']
+        
+        # Date Filter. A range into an archived year reads that year back.
+        df_range, _ = db.sales_between(d_start, d_end)
+        df_range['DateObj'] = pd.to_datetime(df_range['Timestamp']).dt.date
+        mask = (df_range['DateObj'] >= d_start) & (df_range['DateObj'] <= d_end)
+        df_filtered = df_range[mask].copy()
+        
+        # Metrics
+        df_filtered['TotalAmount'] = pd.to_numeric(df_filtered['TotalAmount'], errors='coerce').fillna(0)
+        total_sales = df_filtered['TotalAmount'].sum()
+        
+        unpaid_df = df[df['Status'].astype(str).str.strip().str.lower().isin(['pending', 'unpaid', 'open'])]
+        unpaid_total = pd.to_numeric(unpaid_df['TotalAmount'], errors='coerce').sum()
+        
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Revenue (Period)", f"${total_sales:,.2f}")
+        c2.metric("Unpaid (All Time)", f"${unpaid_total:,.2f}", delta_color="inverse")
+        c3.metric("Orders (Period)", len(df_filtered))
+        
+        st.subheader("Recent Activity")
+        
+        # PREPARE GRANDMA-FRIENDLY TABLE
+        # 1. Merge to get Customer Name
+        df_display = df_filtered.merge(df_cust[['CustomerID', 'Name']], on='CustomerID', how='left')
+        df_display['Name'] = df_display['Name'].fillna('Guest / Unknown')
+        
+        # 2. Select & Rename Columns
+        df_display = df_display[['Timestamp', 'Name', 'TotalAmount', 'Status', 'PaymentMethod']]
+        df_display.columns = ["Date & Time", "Customer", "Total", "Status", "Payment"]
+        
+        # 3. Sort Newest First
+        df_display = df_display.sort_values(by="Date & Time", ascending=False).head(20)
+        
+        # 4. Display with Formatting
+        st.dataframe(
+            df_display,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Total": st.column_config.NumberColumn(format="$%.2f"),
+                "Date & Time": st.column_config.DatetimeColumn(format="MMM DD, h:mm a"),
+                "Status": st.column_config.TextColumn(),
+            }
+        )
+
+        # Year over year, from the kept monthly totals for archived years and
+        # the live ledger for open ones: no archived invoice is read for it.
+        yoy = db.sales_by_month()
+        if yoy.shape[1] > 1:
+            st.subheader("Year over Year")
+            st.line_chart(yoy, x_label="Month", y_label="Sales ($)")
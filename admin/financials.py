@@ -0,0 +1,358 @@
+"""Financials: income statement, sales tax, top sellers and unpaid invoices."""
+import streamlit as st
+import pandas as pd
+import backend as db
+import profiling
+from datetime import date
+from admin.common import auto_refresh, build_invoice_pdf, page_header
+
+
+def render():
+    page_header("📝", "Financial Reports", "Income statement, tax liability, top sellers, and A/R")
+    tab1, tab2, tab3, tab4 = st.tabs(["💰 Income Statement", "🏛️ Sales Tax", "📈 Top Sellers", "⏳ Unpaid"])
+    
+# --- TAB 1: INCOME STATEMENT (New!) ---
+    with tab1, profiling.section("Income Statement"):
+        st.header("Income Statement")
+        
+        # 1. Date Selection
+        c1, c2 = st.columns(2)
+        r_start = c1.date_input("Start Date", value=date(date.today().year, 1, 1), key="r_start")
+        r_end = c2.date_input("End Date", value=date.today(), key="r_end")
+        
+        if st.button("📊 Generate Report"):
+            # A. Prepare Data (an archived year in the range is read back)
+            df_trans, df_items = db.sales_between(r_start, r_end)
+            df_exp = st.session_state.get('data', {}).get('expenses', pd.DataFrame())
+            
+            # Filter by Date
+            df_trans['DateObj'] = pd.to_datetime(df_trans['Timestamp']).dt.date
+            mask_t = (df_trans['DateObj'] >= r_start) & (df_trans['DateObj'] <= r_end)
+            f_trans = df_trans[mask_t]
+            
+            # B. Calculate Revenue (Split Retail vs Wholesale)
+            f_trans['TotalAmount'] = pd.to_numeric(f_trans['TotalAmount'], errors='coerce').fillna(0)
+            f_trans['TaxAmount'] = pd.to_numeric(f_trans['TaxAmount'], errors='coerce').fillna(0)
+            
+            # Identify Wholesale (Check column existence safely)
+            if 'IsWholesale' in f_trans.columns:
+                ws_mask = f_trans['IsWholesale'].astype(str).str.lower() == 'true'
+            else: ws_mask = pd.Series([False] * len(f_trans))
+            
+            # Net Sales = Total - Tax
+            f_trans['NetSale'] = f_trans['TotalAmount'] - f_trans['TaxAmount']
+            
+            # C. Freight Income & Adjusted Product Revenue
+            valid_ids = f_trans['TransactionID']
+            f_items_all = df_items[df_items['TransactionID'].isin(valid_ids)].copy()
+            f_items_all['QtySold'] = pd.to_numeric(f_items_all['QtySold'], errors='coerce').fillna(0)
+            f_items_all['Price'] = pd.to_numeric(f_items_all['Price'], errors='coerce').fillna(0)
+            f_items_all['LineTotal'] = f_items_all['QtySold'] * f_items_all['Price']
+            
+            freight_mask = f_items_all['SKU'].astype(str).str.upper() == 'FREIGHT'
+            freight_income = f_items_all[freight_mask]['LineTotal'].sum()
+            
+            # Since NetSale (Total - Tax) includes freight, we subtract freight_income from the sum 
+            # to get the product revenue part, then split by IsWholesale.
+            # Actually, more accurately, we can split NetSale and then subtract transaction-specific freight, 
+            # but for the summary, subtracting the total freight_income from the totals is equivalent.
+            
+            total_net_sale = f_trans['NetSale'].sum()
+            total_product_revenue = total_net_sale - freight_income
+            
+            # Split product revenue proportionally or just by mask on NetSale and adjust
+            # PRO-TIP: It's cleaner to calculate freight per transaction if we want exact split, 
+            # but usually Freight is retail. Let's just subtract it from the overall total_income 
+            # and report it separately.
+            
+            wholesale_sales = f_trans[ws_mask]['NetSale'].sum()
+            retail_sales = f_trans[~ws_mask]['NetSale'].sum()
+            
+            # Adjustment: Subtract freight from retail/wholesale sums. 
+            # Usually freight is tagged to the transaction type.
+            ws_freight = f_items_all[freight_mask & f_items_all['TransactionID'].isin(f_trans[ws_mask]['TransactionID'])]['LineTotal'].sum()
+            rt_freight = freight_income - ws_freight
+            
+            wholesale_sales -= ws_freight
+            retail_sales -= rt_freight
+            
+            total_income = wholesale_sales + retail_sales + freight_income
+            
+            # D. Calculate COGS
+            # Exclude non-product items (gift certificates and FREIGHT have no inventory cost)
+            f_items = f_items_all[
+                (~f_items_all['SKU'].astype(str).str.upper().str.startswith('GIFT')) &
+                (~f_items_all['SKU'].astype(str).str.upper().str.contains('FREIGHT'))
+            ].copy()
+
+            if 'inventory' in st.session_state['data']:
+                inv_ref = st.session_state['data']['inventory'][['SKU', 'Cost']]
+                inv_ref['SKU'] = inv_ref['SKU'].astype(str)
+                f_items['SKU'] = f_items['SKU'].astype(str)
+                merged_items = f_items.merge(inv_ref, on='SKU', how='left')
+                merged_items['QtySold'] = pd.to_numeric(merged_items['QtySold'], errors='coerce').fillna(0)
+                merged_items['Cost'] = pd.to_numeric(merged_items['Cost'], errors='coerce')
+                no_cost_skus = merged_items[merged_items['Cost'].isna() | (merged_items['Cost'] == 0)]['SKU'].unique()
+                if len(no_cost_skus) > 0:
+                    st.warning(f"⚠️ COGS may be understated: {len(no_cost_skus)} SKU(s) sold in this period have no unit cost entered. Set costs in Inventory to improve accuracy.")
+                merged_items['LineCost'] = merged_items['QtySold'] * merged_items['Cost'].fillna(0)
+                total_cogs = merged_items['LineCost'].sum()
+            else: total_cogs = 0.0
+
+            # Check for invoices with no line items (contribute $0 to COGS)
+            product_item_ids = df_items['TransactionID'][
+                ~df_items['SKU'].astype(str).str.upper().str.startswith('GIFT')
+            ]
+            invoices_no_items = valid_ids[~valid_ids.isin(product_item_ids)].tolist()
+            if invoices_no_items:
+                st.warning(
+                    f"⚠️ {len(invoices_no_items)} invoice(s) in this period have no matching line item records "
+                    f"and contribute $0 to COGS. This is common for old imported invoices. "
+                    f"Invoice IDs: {', '.join(map(str, invoices_no_items[:10]))}{'…' if len(invoices_no_items) > 10 else ''}"
+                )
+
+            gross_profit = total_income - total_cogs
+            
+            # D. Expenses
+            expenses_breakdown = {}
+            total_expenses = 0.0
+            if not df_exp.empty:
+                df_exp['DateObj'] = pd.to_datetime(df_exp['Date']).dt.date
+                mask_e = (df_exp['DateObj'] >= r_start) & (df_exp['DateObj'] <= r_end)
+                f_exp = df_exp[mask_e].copy()
+                f_exp['Amount'] = pd.to_numeric(f_exp['Amount'], errors='coerce').fillna(0)
+                expenses_breakdown = f_exp.groupby('Category')['Amount'].sum().to_dict()
+                total_expenses = sum(expenses_breakdown.values())
+            
+            net_profit = gross_profit - total_expenses
+            
+            # E. Generate PDF
+            financials = {
+                'retail_sales': retail_sales, 'wholesale_sales': wholesale_sales,
+                'freight_income': freight_income,
+                'total_income': total_income, 'cogs': total_cogs,
+                'gross_profit': gross_profit, 'expenses_breakdown': expenses_breakdown,
+                'total_expenses': total_expenses, 'net_profit': net_profit
+            }
+            
+            pdf_data = db.generate_income_statement_pdf(r_start, r_end, financials)
+            
+            # F. Preview & Download
+            st.divider()
+            c_a, c_b, c_c = st.columns(3)
+            c_a.metric("Total Revenue", f"${total_income:,.2f}")
+            c_b.metric("COGS", f"${total_cogs:,.2f}")
+            c_c.metric("Net Profit", f"${net_profit:,.2f}", delta_color="normal")
+            
+            # Preview
+            st.divider()
+            # No base64 encoding needed
+            from streamlit_pdf_viewer import pdf_viewer
+            pdf_viewer(input=pdf_data, width=1000, height=1000)
+            
+            st.download_button(
+                "⬇️ Download PDF", data=pdf_data,
+                file_name=f"IncomeStatement_{r_start}_{r_end}.pdf",
+                mime="application/pdf", type="primary", use_container_width=True
+            )
+            
+
+        # --- LOG AN EXPENSE (always visible, outside Generate button) ---
+        st.divider()
+        with st.expander("➕ Log an Expense"):
+            if 'settings' in st.session_state['data']:
+                s_df = st.session_state['data']['settings']
+                s_dict = dict(zip(s_df['Key'], s_df['Value']))
+                raw_cats = s_dict.get("ExpenseCategories", "Fabric, Notions, Rent, Marketing, Shipping, Wages, Other")
+                cat_options = [x.strip() for x in raw_cats.split(",") if x.strip()]
+            else:
+                cat_options = ["Fabric", "Notions", "Rent", "Marketing", "Other"]
+
+            with st.form("log_expense_form"):
+                ex_c1, ex_c2 = st.columns(2)
+                ex_date = ex_c1.date_input("Date", value=date.today(), key="ex_date")
+                ex_cat = ex_c2.selectbox("Category", cat_options, key="ex_cat")
+                ex_c3, ex_c4 = st.columns(2)
+                ex_amount = ex_c3.number_input("Amount ($)", 0.01, 100000.0, 10.0, key="ex_amount")
+                ex_desc = ex_c4.text_input("Description", placeholder="e.g. Fabric from JoAnn", key="ex_desc")
+                if st.form_submit_button("💾 Save Expense", type="primary"):
+                    db.add_expense(ex_date, ex_cat, ex_amount, ex_desc)
+                    st.success(f"Logged ${ex_amount:.2f} under {ex_cat}.")
+                    auto_refresh()
+
+    with tab2, profiling.section("Sales Tax"):
+        st.header("Sales Tax Liability")
+        c1, c2 = st.columns(2)
+        st_start = c1.date_input("Start Date", value=date(date.today().year, 1, 1), key="st_start")
+        st_end = c2.date_input("End Date", value=date.today(), key="st_end")
+        df, df_items = db.sales_between(st_start, st_end)
+        df['DateObj'] = pd.to_datetime(df['Timestamp']).dt.date
+        mask = (df['DateObj'] >= st_start) & (df['DateObj'] <= st_end)
+        filtered_df = df[mask]
+        total_tax = pd.to_numeric(filtered_df['TaxAmount'], errors='coerce').sum()
+        
+        # Calculate total freight for this period to exclude from taxable sales
+        f_items_period = df_items[df_items['TransactionID'].isin(filtered_df['TransactionID'])]
+        f_items_period['QtySold'] = pd.to_numeric(f_items_period['QtySold'], errors='coerce').fillna(0)
+        f_items_period['Price'] = pd.to_numeric(f_items_period['Price'], errors='coerce').fillna(0)
+        total_freight_period = (f_items_period[f_items_period['SKU'].astype(str).str.upper() == 'FREIGHT']['QtySold'] * f_items_period[f_items_period['SKU'].astype(str).str.upper() == 'FREIGHT']['Price']).sum()
+
+        taxable_sales = pd.to_numeric(filtered_df['TotalAmount'], errors='coerce').sum() - total_tax - total_freight_period
+        m1, m2 = st.columns(2)
+        m1.metric("Tax Collected", f"${total_tax:,.2f}"); m2.metric("Taxable Sales", f"${taxable_sales:,.2f}")
+
+    # --- TAB 3: TOP SELLERS (Product Focused) ---
+    with tab3, profiling.section("Top Sellers"):
+        st.header("🏆 Product Performance")
+        
+        # 1. Controls
+        c1, c2, c3 = st.columns([1, 1, 2])
+        ts_start = c1.date_input("Start Date", value=date(date.today().year, 1, 1), key="ts_start")
+        ts_end = c2.date_input("End Date", value=date.today(), key="ts_end")
+        rank_by = c3.radio("Rank Products By:", ["Quantity Sold", "Total Revenue ($)", "Net Profit ($)"], horizontal=True)
+        
+        # 2. Data Preparation
+        df_trans, df_items = db.sales_between(ts_start, ts_end)
+        df_trans = df_trans[['TransactionID', 'Timestamp']]
+        
+        # Merge Transactions to get Date (int64 keys on both sides)
+        merged = df_items.merge(df_trans, on='TransactionID', how='left')
+        
+        # Filter by Date
+        merged['DateObj'] = pd.to_datetime(merged['Timestamp']).dt.date
+        mask = (merged['DateObj'] >= ts_start) & (merged['DateObj'] <= ts_end)
+        filtered_items = merged[mask].copy()
+        
+        if not filtered_items.empty:
+            # Clean Numbers
+            filtered_items['QtySold'] = pd.to_numeric(filtered_items['QtySold'], errors='coerce').fillna(0)
+            filtered_items['Price'] = pd.to_numeric(filtered_items['Price'], errors='coerce').fillna(0)
+            
+            # Merge with Inventory to get COST (exclude gift certificates and freight)
+            filtered_items = filtered_items[
+                (~filtered_items['SKU'].astype(str).str.upper().str.startswith('GIFT')) &
+                (~filtered_items['SKU'].astype(str).str.upper().str.contains('FREIGHT'))
+            ]
+            if 'inventory' in st.session_state['data']:
+                inv_ref = st.session_state['data']['inventory'][['SKU', 'Cost']]
+                inv_ref['SKU'] = inv_ref['SKU'].astype(str)
+                filtered_items['SKU'] = filtered_items['SKU'].astype(str)
+                full_data = filtered_items.merge(inv_ref, on='SKU', how='left')
+                full_data['Cost'] = pd.to_numeric(full_data['Cost'], errors='coerce').fillna(0)
+            else:
+                full_data = filtered_items.copy()
+                full_data['Cost'] = 0.0
+
+            # Calculate Metrics
+            full_data['Revenue'] = full_data['QtySold'] * full_data['Price']
+            full_data['TotalCost'] = full_data['QtySold'] * full_data['Cost']
+            full_data['Profit'] = full_data['Revenue'] - full_data['TotalCost']
+            
+            # Group by Product
+            product_group = full_data.groupby(['Name', 'SKU'])[['QtySold', 'Revenue', 'Profit']].sum().reset_index()
+            
+            # Sort
+            if "Revenue" in rank_by:
+                sorted_df = product_group.sort_values(by='Revenue', ascending=False)
+                metric_col = 'Revenue'
+                chart_color = "#2ecc71" # Green
+            elif "Profit" in rank_by:
+                sorted_df = product_group.sort_values(by='Profit', ascending=False)
+                metric_col = 'Profit'
+                chart_color = "#f1c40f" # Gold
+            else:
+                sorted_df = product_group.sort_values(by='QtySold', ascending=False)
+                metric_col = 'QtySold'
+                chart_color = "#3498db" # Blue
+            
+            # --- VISUALIZATION: TOP 10 CHART ---
+            st.subheader(f"📊 Top 10 by {rank_by.split('(')[0].strip()}")
+            top_10 = sorted_df.head(10).set_index('Name')
+            st.bar_chart(top_10[metric_col], color=chart_color)
+            
+            st.divider()
+
+            # --- DETAILED TABLE ---
+            st.subheader("📋 Product Leaderboard")
+            st.dataframe(
+                sorted_df.head(50), # Showing top 50 rows
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Name": st.column_config.TextColumn("Product Name", width="medium"),
+                    "SKU": st.column_config.TextColumn("SKU", width="small"),
+                    "QtySold": st.column_config.NumberColumn("Sold", format="%d"),
+                    "Revenue": st.column_config.NumberColumn("Revenue", format="$%.2f"),
+                    "Profit": st.column_config.NumberColumn("Profit", format="$%.2f"),
+                }
+            )
+            
+        else:
+            st.info("No sales found in this period.")
+
+    with tab4, profiling.section("Unpaid"):
+        st.header("Accounts Receivable")
+        df_trans = st.session_state['data']['transactions']
+        df_cust = st.session_state['data']['customers']
+        df_items = st.session_state['data']['items']
+        pending = df_trans[df_trans['Status'].astype(str).str.strip().str.lower().isin(['pending', 'unpaid', 'open'])].copy()
+        if pending.empty: st.success("🎉 All invoices are paid!")
+        else:
+            if not df_cust.empty:
+                pending['CustomerID'] = pending['CustomerID'].astype(str)
+                df_cust['CustomerID'] = df_cust['CustomerID'].astype(str)
+                # Collapse duplicate CustomerIDs first. Merging against them fans
+                # each invoice out into one row per matching customer, which both
+                # inflates the totals and crashes the page on duplicate widget keys.
+                lookup = df_cust[['CustomerID', 'Name']].copy()
+                shared = lookup['CustomerID'].duplicated(keep=False)
+                if shared.any():
+                    lookup.loc[shared, 'Name'] = (
+                        lookup[shared].groupby('CustomerID')['Name']
+                        .transform(lambda s: " / ".join(s.astype(str)) + " ⚠️ shared ID")
+                    )
+                lookup = lookup.drop_duplicates(subset='CustomerID', keep='first')
+                merged = pending.merge(lookup, on='CustomerID', how='left')
+            else: merged = pending; merged['Name'] = "Unknown"
+            
+            for i, row in merged.iterrows():
+                with st.container(border=True):
+                    c1, c2, c3, c4 = st.columns([2, 2, 1, 1.5])
+                    cust_name = row['Name'] if pd.notna(row['Name']) else "Unknown"
+                    c1.write(f"**{cust_name}**"); c1.caption(f"#{row['TransactionID']}")
+                    c2.write(f"Due: {row['DueDate']}")
+                    c3.write(f"**${float(row['TotalAmount']):,.2f}**")
+                    c_v, c_p = c4.columns(2)
+                    # Keys carry the row index as well — invoice numbers are not
+                    # guaranteed unique, and a collision crashes the whole tab.
+                    if c_v.button("👁️", key=f"uv_{row['TransactionID']}_{i}"):
+                        st.session_state[f"view_inv_{row['TransactionID']}"] = True
+                        st.rerun()
+                    if c_p.button("💲", key=f"up_{row['TransactionID']}_{i}"):
+                        db.mark_invoice_paid(row['TransactionID']); st.balloons(); auto_refresh()
+
+                # Previewer (Unpaid Report)
+                if st.session_state.get(f"view_inv_{row['TransactionID']}", False):
+                    with st.container(border=True):
+                        if st.button("❌ Close", key=f"uclose_{row['TransactionID']}_{i}"):
+                            st.session_state[f"view_inv_{row['TransactionID']}"] = False
+                            st.rerun()
+
+                        # Build PDF from stored transaction data
+                        t_id = row['TransactionID']
+                        pdf_bytes = build_invoice_pdf(t_id, cust_name)
+                        
+                        # 2. Download Button
+                        st.download_button(
+                            "🖨️ Download Invoice", 
+                            data=pdf_bytes,
+                            file_name=f"Invoice_{t_id}.pdf",
+                            mime="application/pdf",
+                            key=f"dl_unpaid_{t_id}_{i}",
+                            type="primary",
+                            use_container_width=True
+                        )
+
+                        # 3. PDF Viewer (No Base64!)
+                        from streamlit_pdf_viewer import pdf_viewer
+                        pdf_viewer(input=pdf_bytes, width=700, height=800)
@@ -0,0 +1,83 @@
+"""Database health: costliest statements, table bloat, unused indexes, cache hits,
+and whether stock counts still match the stock ledger."""
+from datetime import datetime
+
+import streamlit as st
+import backend as db
+
+TOP = 15
+
+
+def _pct(v):
+    return "—" if v is None else f"{float(v):.1f}%"
+
+
+def render():
+    _statistics()
+    _stock_ledger()
+
+
+def _statistics():
+    st.caption("Postgres' own statistics for this database, counted since the last stats reset.")
+    if st.button("🩺 Check Now"):
+        st.session_state['db_health'] = (datetime.now(db.TZ), db.database_health())
+    if 'db_health' not in st.session_state:
+        return
+    checked_at, h = st.session_state['db_health']
+    st.caption(f"Checked {checked_at:%b %d, %I:%M %p}")
+
+    cache = h["cache"]
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Table Cache Hits", _pct(cache["tables"]))
+    c2.metric("Index Cache Hits", _pct(cache["indexes"]))
+    c3.metric("Database Cache Hits", _pct(cache["database"]))
+    c4.metric("Counting Since", cache["since"])
+    st.caption("Below about 99% the working set no longer fits in the server's memory, "
+               "and reads start going to disk.")
+
+    st.subheader("🐢 Statements")
+    st.caption(f"From {h['source']}.")
+    stmts = h["statements"]
+    wide = {"Statement": st.column_config.TextColumn(width="large")}
+    if stmts.empty:
+        st.info("Nothing counted yet.")
+    else:
+        st.markdown("**Most time in total**")
+        st.dataframe(stmts.sort_values("Total ms", ascending=False).head(TOP),
+                     hide_index=True, column_config=wide)
+        st.markdown("**Most often**")
+        st.dataframe(stmts.sort_values("Calls", ascending=False).head(TOP),
+                     hide_index=True, column_config=wide)
+
+    st.subheader("🗄️ Tables")
+    st.caption("Dead % is space autovacuum hasn't reclaimed yet: bloat. Seq scans on a big "
+               "table mean a query that reads all of it.")
+    st.dataframe(h["tables"], hide_index=True)
+
+    st.subheader("🧹 Unused Indexes")
+    if h["unused_indexes"].empty:
+        st.success("Every index has been used.")
+    else:
+        st.caption("Never scanned since the stats reset. Some exist for a rare delete's "
+                   "foreign-key check; bench/plans.py shows which before you drop one.")
+        st.dataframe(h["unused_indexes"], hide_index=True)
+
+
+def _stock_ledger():
+    st.subheader("📦 Stock Ledger")
+    st.caption("Compares each item's stock count with the sum of its stock moves, for just "
+               "the items sold, restocked or edited since the last check. An item that "
+               "disagrees had its count changed without a move to explain it.")
+    if st.button("📦 Check Stock"):
+        with st.spinner("Checking..."):
+            checked, _ = db.reconcile_stock()
+        st.session_state['stock_check'] = (checked, *db.stock_drift())
+    if 'stock_check' not in st.session_state:
+        return
+    checked, last, drift = st.session_state['stock_check']
+    st.caption(f"Checked {checked:,} items at {last.astimezone(db.TZ):%b %d, %I:%M %p}")
+    if drift.empty:
+        st.success("Every item's count matches its ledger.")
+    else:
+        st.warning(f"{len(drift):,} items' counts don't match their ledger.")
+        st.dataframe(drift, hide_index=True)
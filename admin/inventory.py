@@ -0,0 +1,221 @@
+"""Inventory: the product editor, restocks, new items and stock on a past date."""
+import streamlit as st
+import pandas as pd
+import backend as db
+from datetime import date, datetime, time, timedelta
+from admin.common import auto_refresh, page_header
+
+# --- HELPER: Edit Inventory Editor (shared by tab view + Home.py's fullscreen) ---
+def editor(height=600):
+    full_inv = st.session_state['data']['inventory']
+
+    if 'Active' not in full_inv.columns:
+        full_inv['Active'] = True
+    full_inv['Active'] = full_inv['Active'].apply(
+        lambda x: str(x).strip().lower() not in ['false', '0', 'no', '']
+    )
+
+    c_s, c_sort, c_ord, c_show = st.columns([2, 2, 1, 1.5])
+    search     = c_s.text_input("🔍 Search", placeholder="Filter items...", key="inv_search")
+    sort_col   = c_sort.selectbox("Sort By", ["Name", "SKU", "Price", "WholesalePrice", "StockQty", "Cost"], key="inv_sort_col")
+    sort_asc   = c_ord.radio("Dir", ["↑", "↓"], horizontal=True, key="inv_sort_dir") == "↑"
+    show_inact = c_show.checkbox("Show Inactive Items", value=False, key="inv_show_inactive")
+
+    view_df = full_inv.copy()
+    if not show_inact:
+        view_df = view_df[view_df['Active'] == True]
+    if search:
+        mask = view_df.astype(str).apply(lambda x: x.str.contains(search, case=False)).any(axis=1)
+        view_df = view_df[mask]
+
+    if sort_col in view_df.columns:
+        try:
+            view_df = view_df.copy()
+            if sort_col in ['Price', 'WholesalePrice', 'StockQty', 'Cost']:
+                view_df[sort_col] = pd.to_numeric(view_df[sort_col], errors='coerce')
+            else:
+                # SKU / Name: cast to str so mixed-type columns don't crash sort
+                view_df[sort_col] = view_df[sort_col].astype(str)
+            view_df = view_df.sort_values(by=sort_col, ascending=sort_asc)
+        except Exception:
+            pass
+
+    csv_export = view_df.to_csv(index=False).encode('utf-8')
+    st.download_button("🖨️ Export / Print This List (CSV)", data=csv_export,
+                       file_name="inventory_export.csv", mime="text/csv", key="inv_export")
+
+    with st.form("inv_editor"):
+        edited_df = st.data_editor(
+            view_df,
+            use_container_width=True,
+            height=height,
+            num_rows="dynamic",
+            column_config={
+                "SKU":            st.column_config.TextColumn("SKU"),
+                "Active":         st.column_config.CheckboxColumn("Active", help="Uncheck to hide from kiosk and searches"),
+                "Price":          st.column_config.NumberColumn(format="$%.2f"),
+                "WholesalePrice": st.column_config.NumberColumn(format="$%.2f"),
+                "Cost":           st.column_config.NumberColumn(format="$%.2f"),
+            }
+        )
+        if st.form_submit_button("💾 Save Changes"):
+            full_inv.update(edited_df)
+            deleted_idx = view_df.index.difference(edited_df.index)
+            full_inv = full_inv.drop(index=deleted_idx, errors='ignore')
+            new_idx = edited_df.index.difference(view_df.index)
+            if not new_idx.empty:
+                full_inv = pd.concat([full_inv, edited_df.loc[new_idx]], ignore_index=True)
+            db.update_inventory_batch(full_inv.reset_index(drop=True))
+            st.success("Database Updated Successfully!")
+            auto_refresh()
+
+
+def render():
+    page_header("📦", "Inventory", "Manage products, stock levels, and costs")
+    
+    tab1, tab2, tab3, tab4 = st.tabs(["🔄 Add / Restock", "📋 Edit Database", "📥 Bulk Import",
+                                      "📅 On Hand On..."])
+    
+    # --- TAB 1: SMART ADD/RESTOCK ---
+    with tab1:
+        st.info("💡 Type a SKU below. If it exists, you can add stock. If it's new, you can create it.")
+        
+        # We use a distinct key for the lookup to avoid session state collisions
+        lookup_sku = st.text_input("Scan or Type SKU", key="inv_sku_lookup").strip()
+        
+        # Check if SKU exists
+        row = db.lookup_sku(lookup_sku)
+
+        if row is not None:
+            # --- RESTOCK MODE ---
+            st.success(f"**Found:** {row['Name']}")
+            st.caption(f"Current Stock: {row['StockQty']} | Current Cost: ${row.get('Cost', 0):.2f}")
+            
+            with st.form("restock_form"):
+                c1, c2 = st.columns(2)
+                qty_add = c1.number_input("Quantity to ADD (+)", 1, 10000, 50)
+                new_cost_val = c2.number_input("Unit Cost ($)", 0.0, 10000.0, float(row.get('Cost', 0.0)))
+
+                st.caption(f"New Total Stock will be: {row['StockQty'] + qty_add}")
+
+                st.divider()
+                log_purchase = st.checkbox("📒 Also log as Inventory Purchase expense?", value=True,
+                                           help="Records total purchase cost in Expenses for accurate P&L reporting")
+                ex_c1, ex_c2 = st.columns(2)
+                ex_date = ex_c1.date_input("Purchase Date", value=date.today())
+                ex_desc = ex_c2.text_input("Description", value=f"Restocked {row['Name']} (SKU: {row['SKU']})")
+
+                if st.form_submit_button("➕ Update Stock & Cost", type="primary"):
+                    db.restock_item(lookup_sku, qty_add, new_cost_val)
+                    if log_purchase and new_cost_val > 0:
+                        total_purchase = qty_add * new_cost_val
+                        db.add_expense(ex_date, "Inventory Purchase", total_purchase, ex_desc)
+                        st.success(f"Added {qty_add} units to {row['Name']} and logged ${total_purchase:.2f} inventory purchase expense!")
+                    else:
+                        st.success(f"Added {qty_add} to {row['Name']}!")
+                    auto_refresh()
+                    
+        elif lookup_sku:
+            # --- CREATE NEW MODE ---
+            st.warning("New Item Detected")
+            with st.form("add_item_form"):
+                c1, c2 = st.columns(2)
+                # SKU is pre-filled from the lookup
+                st.text_input("SKU", value=lookup_sku, disabled=True)
+                new_name = st.text_input("Product Name")
+                
+                c3, c4 = st.columns(2)
+                new_price = c3.number_input("Retail Price ($)", 0.0, 1000.0, 0.0)
+                new_whol = c4.number_input("Wholesale Price ($)", 0.0, 1000.0, 0.0)
+                
+                c5, c6 = st.columns(2)
+                new_stock = c5.number_input("Opening Stock", 0, 10000, 0)
+                new_cost = c6.number_input("Unit Cost ($)", 0.0, 1000.0, 0.0)
+
+                st.divider()
+                log_purchase_new = st.checkbox("📒 Also log as Inventory Purchase expense?", value=True,
+                                           key="new_item_log_purchase",
+                                           help="Records total purchase cost in Expenses for accurate P&L reporting")
+                ex_c1_n, ex_c2_n = st.columns(2)
+                ex_date_n = ex_c1_n.date_input("Purchase Date", value=date.today(), key="new_item_ex_date")
+                ex_desc_n = ex_c2_n.text_input("Description", value=f"Initial Purchase for {lookup_sku}", key="new_item_ex_desc")
+
+                if st.form_submit_button("✅ Create Item", type="primary"):
+                    if new_name:
+                        db.add_inventory_item(lookup_sku, new_name, new_price, new_stock, new_whol, new_cost)
+
+                        if log_purchase_new and new_cost > 0 and new_stock > 0:
+                            total_purchase = new_stock * new_cost
+                            db.add_expense(ex_date_n, "Inventory Purchase", total_purchase, ex_desc_n)
+                            st.success(f"Item Created and logged ${total_purchase:.2f} inventory purchase expense!")
+                        else:
+                            st.success("Item Created!")
+                        auto_refresh()
+                    else: st.error("Name required.")
+    # --- TAB 2: EDIT DATABASE ---
+    with tab2:
+        _fs_col, _ = st.columns([1, 5])
+        if _fs_col.button("⛶ Full Screen", key="inv_fs_open"):
+            st.session_state['inv_fullscreen'] = True
+            st.rerun()
+        editor(height=600)
+
+    with tab3:
+        st.subheader("Bulk Import from CSV")
+        # Added Cost to template
+        sample_data = pd.DataFrame([{"SKU": "TEST-01", "Name": "Example Item", "Price": 5.00, "WholesalePrice": 2.50, "StockQty": 100, "Cost": 1.25}])
+        csv_template = sample_data.to_csv(index=False).encode('utf-8')
+        st.download_button("⬇️ Download Template", data=csv_template, file_name="inventory_template.csv", mime="text/csv")
+        
+        st.caption("SKU is the only required column. A blank cell leaves an existing item as it is; "
+                   "a new SKU needs a Name and a Price. StockQty is the count on the shelf — any "
+                   "change is logged as a stock adjustment.")
+        if st.session_state.get('inv_import_done'):
+            st.success(st.session_state.pop('inv_import_done'))
+
+        uploaded_file = st.file_uploader("Upload filled CSV", type="csv")
+        if uploaded_file:
+            c_chk, c_go = st.columns(2)
+            check = c_chk.button("🔎 Check File", use_container_width=True)
+            if c_go.button("🚀 Upload to Database", type="primary", use_container_width=True) or check:
+                uploaded_file.seek(0)
+                with st.spinner("Checking..." if check else "Importing..."):
+                    report = db.import_inventory(uploaded_file, dry_run=check)
+                if report['ignored']:
+                    st.warning(f"Ignored columns: {', '.join(report['ignored'])}")
+                if report['errors']:
+                    st.error("Nothing was imported. Fix these rows and upload again:")
+                    st.dataframe(pd.DataFrame(report['errors'], columns=["Line", "Problem"]),
+                                 hide_index=True, use_container_width=True)
+                else:
+                    summary = (f"{report['inserted']} new, {report['updated']} updated, "
+                               f"{report['unchanged']} unchanged, {report['moves']} stock changes "
+                               f"logged ({report['seconds']:.1f}s).")
+                    if check:
+                        st.info(f"Ready to import: {summary}")
+                    else:
+                        st.session_state['inv_import_done'] = f"Import complete: {summary}"
+                        auto_refresh()
+
+    # --- TAB 4: STOCK ON A PAST DATE ---
+    # From the stock ledger's checkpoints, not today's StockQty: a year-end
+    # count asked in February still gets Dec 31's numbers.
+    with tab4:
+        st.caption("What the stock ledger says was on the shelf at the close of a day — "
+                   "for a year-end inventory, or to check a stocktake against.")
+        c_day, c_go = st.columns([2, 1], vertical_alignment="bottom")
+        day = c_day.date_input("At the close of", value=date(date.today().year - 1, 12, 31),
+                               max_value=date.today(), key="inv_onhand_day")
+        if c_go.button("📅 Show", use_container_width=True):
+            st.session_state['inv_onhand'] = (
+                day, db.stock_at(datetime.combine(day + timedelta(days=1), time.min)))
+        if 'inv_onhand' in st.session_state:
+            day, stock = st.session_state['inv_onhand']
+            held = stock[stock['OnHand'] != 0]
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Items", f"{len(held):,}")
+            m2.metric("Units", f"{int(held['OnHand'].sum()):,}")
+            m3.metric("Value at Cost", f"${float(held['Value'].fillna(0).sum()):,.2f}")
+            st.dataframe(held, hide_index=True, use_container_width=True)
+            st.download_button("⬇️ Download CSV", data=held.to_csv(index=False).encode('utf-8'),
+                               file_name=f"on_hand_{day:%Y-%m-%d}.csv", mime="text/csv")
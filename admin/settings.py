@@ -0,0 +1,94 @@
+"""Settings: company info, tax rate, invoice numbering, expense categories,
+the database's health and the archive of closed years."""
+import streamlit as st
+import backend as db
+from admin import archive, health
+from admin.common import auto_refresh, page_header
+
+
+def render():
+    page_header("⚙️", "Settings", "Company info, tax rate, invoice numbering")
+    
+    tab_settings, tab_health, tab_archive = st.tabs(["⚙️ Settings", "🩺 Database", "🗄️ Archive"])
+    with tab_settings:
+        # Load Settings
+        if 'settings' in st.session_state['data']:
+            raw_settings = st.session_state['data']['settings']
+            settings_dict = dict(zip(raw_settings['Key'], raw_settings['Value']))
+        else: settings_dict = {}
+
+        with st.form("settings_form"):
+            col1, col2 = st.columns(2)
+        
+            # COLUMN 1: Company Info
+            with col1:
+                st.subheader("🏢 Company Info")
+                c_name = st.text_input("Company Name", value=settings_dict.get("CompanyName", "Notion to Sew"))
+                c_addr = st.text_area("Address", value=settings_dict.get("Address", "Modesto, CA"))
+            
+                st.subheader("💰 Financials")
+                venmo_user = st.text_input("Venmo Username", value=settings_dict.get("VenmoUser", ""))
+            
+            # COLUMN 2: Operations
+            with col2:
+                st.subheader("⚙️ Operations")
+                # Tax Rate Logic
+                raw_val = settings_dict.get("TaxRate", "0.08")
+                try:
+                    clean_val = float(str(raw_val).replace("%", "").strip())
+                    # Normalize: stored as decimal (0.0875) → display as 8.75; stored as percent (8.75) → display as 8.75
+                    display_rate = clean_val * 100 if clean_val < 1.0 else clean_val
+                except ValueError:
+                    display_rate = 8.0
+                # Guard: clamp display_rate to a sane percentage range (0–99)
+                display_rate = max(0.0, min(float(display_rate), 99.0))
+
+                new_rate_percent = st.number_input(
+                    "Sales Tax Rate — enter as a percentage, e.g. 8.75 for 8.75%",
+                    min_value=0.0, max_value=99.0,
+                    value=display_rate, step=0.001, format="%.3f"
+                )
+                st.caption(f"ℹ️ Will be applied as **{new_rate_percent:.3f}%** on retail sales.")
+                next_inv = st.text_input("Next Invoice ID", value=settings_dict.get("NextInvoiceID", "1000"))
+            
+                # NEW: Expense Categories Management
+                st.divider()
+                st.markdown("### 🏷️ Expense Categories")
+                st.caption("Separate categories with commas.")
+                default_cats = "Fabric, Notions, Rent, Marketing, Shipping, Wages, Other"
+                current_cats = settings_dict.get("ExpenseCategories", default_cats)
+                new_cats = st.text_area("Categories", value=current_cats, height=100)
+
+                st.divider()
+                st.markdown("### 🛠️ Diagnostics")
+                profiling_on = st.checkbox(
+                    "Profiling panel", value=settings_dict.get("Profiling") == "on",
+                    help="Times every rerun of the admin portal and the kiosk and shows the "
+                         "breakdown in the sidebar. Slows pages down while on; "
+                         "?profile=1 in the URL does the same for one browser tab.")
+
+            st.divider()
+            if st.form_submit_button("💾 Save All Settings", type="primary"):
+                decimal_rate = new_rate_percent / 100
+            
+                # Clean up the categories list (remove extra spaces)
+                clean_cats_str = ", ".join([x.strip() for x in new_cats.split(",") if x.strip()])
+            
+                updates = {
+                    "CompanyName": c_name, 
+                    "Address": c_addr, 
+                    "TaxRate": decimal_rate, 
+                    "NextInvoiceID": next_inv, 
+                    "VenmoUser": venmo_user,
+                    "ExpenseCategories": clean_cats_str,  # Saving the new list
+                    "Profiling": "on" if profiling_on else "off",
+                }
+                db.update_settings(updates)
+                st.success("✅ Settings Saved!")
+                auto_refresh()
+
+    with tab_health:
+        health.render()
+
+    with tab_archive:
+        archive.render()
@@ -0,0 +1,108 @@
+"""Stocktake: count the shelves from any number of devices, then apply it all at once."""
+from datetime import date
+
+import streamlit as st
+import backend as db
+from admin.common import auto_refresh, page_header
+
+
+def render():
+    page_header("🧮", "Stocktake", "Count the shelves, then apply every count at once")
+    takes = db.stocktakes()
+    open_takes = takes[takes['Applied'].isna()]
+    applied = takes[takes['Applied'].notna()]
+    names = dict(zip(takes['ID'], takes['Name']))
+
+    with st.popover("➕ New Stocktake"):
+        with st.form("new_stocktake"):
+            name = st.text_input("Name", value=f"Stocktake {date.today():%b %d, %Y}")
+            if st.form_submit_button("Start") and name.strip():
+                st.session_state['stocktake_id'] = db.open_stocktake(name)
+                st.rerun()
+
+    if open_takes.empty:
+        st.info("No stocktake is open. Start one, then count from as many devices as you like: "
+                "nothing changes until it's applied.")
+    else:
+        ids = open_takes['ID'].tolist()
+        current = st.session_state.get('stocktake_id')
+        sid = st.selectbox("Counting into", ids, index=ids.index(current) if current in ids else 0,
+                           format_func=names.get)
+        st.session_state['stocktake_id'] = sid
+        _count(sid)
+        _review(sid, names[sid])
+
+    if not applied.empty:
+        _history(applied, names)
+
+
+def _count(sid):
+    st.subheader("Count")
+    st.text_input("Counting as", key="stocktake_who", placeholder="Your name or this device",
+                  help="Shown next to each count, so two people counting know who did what.")
+    with st.form("stocktake_count", clear_on_submit=True):
+        c_sku, c_qty = st.columns([3, 1])
+        sku = c_sku.text_input("Scan or Type SKU").strip()
+        qty = c_qty.number_input("On the shelf", 0, 100000, 1)
+        add = st.checkbox("Add to its earlier count — it's on more than one shelf")
+        if st.form_submit_button("✔️ Record Count", type="primary") and sku:
+            n = db.record_count(sid, sku, qty, add=add,
+                                counted_by=st.session_state.get('stocktake_who', '').strip())
+            if n is None:
+                st.error(f"❌ {sku} isn't in the inventory, or this stocktake was just applied.")
+            else:
+                st.success(f"**{sku}**: {n} counted.")
+
+
+def _review(sid, name):
+    counts = db.stocktake_counts(sid)
+    st.subheader(f"Counted So Far ({len(counts):,})")
+    if counts.empty:
+        st.caption("Nothing counted yet.")
+        return
+    off = counts[counts['Variance'] != 0]
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Items Counted", f"{len(counts):,}")
+    m2.metric("Items Off", f"{len(off):,}")
+    m3.metric("Variance at Cost", f"${float(off['AtCost'].fillna(0).sum()):,.2f}")
+    st.caption("Expected is the stock count when the item was counted. Applying moves each "
+               "item's stock by its variance, so a sale rung up since doesn't get undone.")
+    st.dataframe(counts, hide_index=True, use_container_width=True)
+
+    c_apply, c_discard = st.columns(2)
+    with c_apply.popover("✅ Apply Stocktake", use_container_width=True):
+        st.write(f"Changes the stock of the {len(off):,} items that are off and logs each "
+                 "change as a count. Items nobody counted are left alone. This can't be undone.")
+        if st.button(f"Apply {name}", type="primary", key="stocktake_apply"):
+            try:
+                with st.spinner("Applying..."):
+                    db.apply_stocktake(sid)
+                st.session_state['stocktake_report'] = sid
+                auto_refresh()
+            except Exception as e:
+                st.error(f"❌ Not applied: {e}")
+    with c_discard.popover("🗑️ Discard", use_container_width=True):
+        st.write("Throws away every count in it. Stock isn't touched.")
+        if st.button(f"Discard {name}", key="stocktake_discard"):
+            db.discard_stocktake(sid)
+            st.session_state.pop('stocktake_id', None)
+            st.rerun()
+
+
+def _history(applied, names):
+    st.divider()
+    st.subheader("📋 Applied Stocktakes")
+    ids = applied['ID'].tolist()
+    shown = st.session_state.get('stocktake_report')
+    sid = st.selectbox("Variance report for", ids, index=ids.index(shown) if shown in ids else 0,
+                       format_func=lambda i: f"{names[i]} — applied "
+                       f"{applied.loc[applied['ID'] == i, 'Applied'].iat[0].astimezone(db.TZ):%b %d, %Y}")
+    counts = db.stocktake_counts(sid)
+    off = counts[counts['Variance'] != 0]
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Items Counted", f"{len(counts):,}")
+    m2.metric("Items Off", f"{len(off):,}")
+    m3.metric("Variance at Cost", f"${float(off['AtCost'].fillna(0).sum()):,.2f}")
+    st.dataframe(off, hide_index=True, use_container_width=True)
+    st.download_button("⬇️ Download Variance Report", data=counts.to_csv(index=False).encode('utf-8'),
+                       file_name=f"stocktake_{sid}.csv", mime="text/csv")
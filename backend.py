@@ -11,8 +11,14 @@ What actually changes, beneath identical signatures:
   - duplicate ids, negative credit and orphan rows are refused by the engine
   - reads are indexed queries rather than downloading whole worksheets
 """
+import contextlib
 import os
 import pathlib
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from functools import cached_property
 from datetime import datetime, timedelta
 
 import pandas as pd
@@ -20,6 +26,9 @@ import psycopg
 import pytz
 import streamlit as st
 
+import metrics
+import profiling
+
 # Document generation is storage-agnostic; re-exported so `db.create_pdf(...)`
 # keeps working for callers that already import it from here.
 from documents import (  # noqa: F401
@@ -28,6 +37,23 @@ from documents import (  # noqa: F401
 
 TZ = pytz.timezone("America/Los_Angeles")
 
+# --- METRICS -----------------------------------------------------------------
+# See metrics.py for how to scrape them.
+SALES = metrics.counter("nts_sales_committed_total", "Sales recorded by commit_sale.")
+SALE_FAILURES = metrics.counter("nts_sales_failed_total",
+                                "commit_sale calls that raised, by exception class.", ["error"])
+CHECKOUT_SECONDS = metrics.histogram("nts_checkout_seconds",
+                                     "commit_sale duration, committed sales only.")
+SNAPSHOT_HITS = metrics.counter("nts_snapshot_hits_total",
+                                "snapshot() calls answered without reading anything.")
+SNAPSHOT_READS = metrics.counter("nts_snapshot_reads_total",
+                                 "Tables re-read into a new snapshot.", ["table"])
+READ_SECONDS = metrics.histogram("nts_table_read_seconds", "One table's _read().", ["table"])
+INVALIDATIONS = metrics.counter("nts_snapshot_invalidations_total",
+                                "Tables marked stale: by a write, or by SNAPSHOT_TTL running out.",
+                                ["table", "cause"])
+metrics.expose()
+
 
 # --- CONNECTIVITY ------------------------------------------------------------
 
@@ -49,18 +75,85 @@ def _database_url() -> str:
     raise RuntimeError("No database_url in secrets, DATABASE_URL or .env.local")
 
 
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", 4))
+
+
+@st.cache_resource
+def _statement_stats():
+    return {"lock": threading.Lock(), "since": datetime.now(TZ), "by_sql": {}}
+
+
+class _TimedCursor(psycopg.Cursor):
+    """Counts and times every statement by its text: pg_stat_statements'
+    numbers from the app's side of the wire, for a server without the
+    extension. A dict update per statement."""
+
+    def execute(self, query, params=None, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            _statement_seen(query, time.perf_counter() - t0, self.rowcount)
+
+
+def _statement_seen(query, seconds, rows):
+    sql = " ".join(query.split()) if isinstance(query, str) else repr(query)
+    state = _statement_stats()
+    with state["lock"]:
+        s = state["by_sql"].get(sql)
+        if s is None:
+            s = state["by_sql"][sql] = {"caller": _caller(), "calls": 0, "total_s": 0.0,
+                                        "max_s": 0.0, "rows": 0}
+        s["calls"] += 1
+        s["total_s"] += seconds
+        s["max_s"] = max(s["max_s"], seconds)
+        s["rows"] += max(rows, 0)
+
+
+def _caller():
+    """The backend.py function a statement came from, past _q and _x."""
+    f = sys._getframe(3)
+    while f is not None:
+        if f.f_code.co_filename == __file__ and f.f_code.co_name not in ("_q", "_x"):
+            return f.f_code.co_name
+        f = f.f_back
+    return "?"
+
+
 @st.cache_resource
 def get_pool():
     from psycopg_pool import ConnectionPool
     # Neon's pooled endpoint handles server-side pooling; this keeps a small
     # client-side pool so a rerun doesn't pay TLS setup every time.
-    return ConnectionPool(_database_url(), min_size=1, max_size=4,
-                          kwargs={"autocommit": False}, open=True)
+    # Every session in the process — kiosk iPads, admin tabs, the web POS —
+    # shares it, so max_size is how many sales can be in the database at once.
+    # bench/checkout_load.py shows what raising it buys.
+    pool = ConnectionPool(_database_url(), min_size=1, max_size=POOL_MAX,
+                          kwargs={"autocommit": False, "cursor_factory": _TimedCursor},
+                          open=True)
+    metrics.collector("pool", lambda: _pool_metrics(pool))
+    return pool
+
+
+def _pool_metrics(pool):
+    s = pool.get_stats()
+    return [
+        ("nts_pool_checkouts_total", "counter", "Connections handed out by the pool.",
+         s.get("requests_num", 0)),
+        ("nts_pool_waits_total", "counter", "Checkouts that queued for a free connection.",
+         s.get("requests_queued", 0)),
+        ("nts_pool_wait_seconds_total", "counter", "Time spent queued for a connection.",
+         s.get("requests_wait_ms", 0) / 1000),
+        ("nts_pool_errors_total", "counter", "Checkouts that failed or timed out.",
+         s.get("requests_errors", 0)),
+        ("nts_pool_size", "gauge", "Connections open.", s.get("pool_size", 0)),
+        ("nts_pool_available", "gauge", "Connections open and idle.", s.get("pool_available", 0)),
+    ]
 
 
 def _q(sql, params=None):
     """Read query -> DataFrame."""
-    with get_pool().connection() as conn:
+    with profiling.section("postgres"), get_pool().connection() as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params or ())
             cols = [d.name for d in cur.description]
@@ -69,7 +162,7 @@ def _q(sql, params=None):
 
 def _x(sql, params=None, fetch=False):
     """Write statement, committed."""
-    with get_pool().connection() as conn:
+    with profiling.section("postgres"), get_pool().connection() as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params or ())
             out = cur.fetchone() if fetch else None
@@ -82,7 +175,6 @@ def _x(sql, params=None, fetch=False):
 # indexes DataFrames by those names in dozens of places; renaming them here
 # would be a rewrite of Home.py for no benefit.
 
-@st.cache_data(ttl=600)
 def _read(table: str) -> pd.DataFrame:
     if table == "inventory":
         return _q("""
@@ -103,22 +195,30 @@ def _read(table: str) -> pd.DataFrame:
                    to_char(due_date, 'YYYY-MM-DD') AS "DueDate",
                    tax AS "TaxAmount",
                    CASE WHEN is_wholesale THEN 'TRUE' ELSE 'FALSE' END AS "IsWholesale"
-              FROM invoices ORDER BY sold_at""")
+              FROM invoices ORDER BY sold_at""").astype({"TransactionID": "int64"})
     if table == "items":
         return _q("""
             SELECT invoice_id AS "TransactionID", COALESCE(sku, '') AS "SKU",
                    qty AS "QtySold", unit_price AS "Price", description AS "Name"
-              FROM invoice_lines ORDER BY invoice_id, id""")
+              FROM invoice_lines ORDER BY invoice_id, id""").astype({"TransactionID": "int64"})
     if table == "customers":
+        # Invoices..LastPurchase come from customer_stats (011), kept by a
+        # trigger on invoices: lifetime, archived years included. Anything
+        # that writes an invoice refreshes "Customers" as well.
         return _q("""
-            SELECT id AS "CustomerID", name AS "Name", COALESCE(email,'') AS "Email",
-                   COALESCE(phone,'') AS "Phone",
-                   COALESCE(to_char(joined_on,'YYYY-MM-DD'),'') AS "Joined",
-                   COALESCE(address,'') AS "Address", COALESCE(notes,'') AS "Notes",
-                   credit AS "Credit",
-                   CASE WHEN is_wholesale THEN 'TRUE' ELSE 'FALSE' END AS "IsWholesale",
-                   COALESCE(tax_rate::text,'') AS "TaxRate"
-              FROM customers ORDER BY name""")
+            SELECT c.id AS "CustomerID", c.name AS "Name", COALESCE(c.email,'') AS "Email",
+                   COALESCE(c.phone,'') AS "Phone",
+                   COALESCE(to_char(c.joined_on,'YYYY-MM-DD'),'') AS "Joined",
+                   COALESCE(c.address,'') AS "Address", COALESCE(c.notes,'') AS "Notes",
+                   c.credit AS "Credit",
+                   CASE WHEN c.is_wholesale THEN 'TRUE' ELSE 'FALSE' END AS "IsWholesale",
+                   COALESCE(c.tax_rate::text,'') AS "TaxRate",
+                   COALESCE(s.invoices, 0) AS "Invoices", COALESCE(s.spend, 0) AS "Spend",
+                   COALESCE(s.balance, 0) AS "Balance",
+                   COALESCE(to_char(s.last_sold_at AT TIME ZONE 'America/Los_Angeles',
+                                    'YYYY-MM-DD'), '') AS "LastPurchase"
+              FROM customers c LEFT JOIN customer_stats s ON s.customer_id = c.id
+             ORDER BY c.name""")
     if table == "settings":
         return _q('SELECT key AS "Key", value AS "Value" FROM settings ORDER BY key')
     if table == "expenses":
@@ -126,14 +226,110 @@ def _read(table: str) -> pd.DataFrame:
             SELECT to_char(spent_on,'YYYY-MM-DD') AS "Date", category AS "Category",
                    amount AS "Amount", COALESCE(description,'') AS "Description"
               FROM expenses ORDER BY spent_on DESC""")
+    if table == "history":
+        # Archived years' monthly totals only; their invoices are read on demand.
+        return _q("""
+            SELECT a.year AS "Year", to_char(m.month, 'YYYY-MM') AS "Month",
+                   m.invoices AS "Invoices", m.customers AS "Customers",
+                   m.total AS "TotalAmount", m.tax AS "TaxAmount", m.freight AS "Freight",
+                   m.wholesale AS "Wholesale", a.archived_at AS "ArchivedAt",
+                   pg_column_size(a.invoices) + pg_column_size(a.lines) AS "Stored",
+                   a.raw_bytes AS "Raw"
+              FROM sales_months m
+              JOIN sales_archive a ON a.year = extract(year FROM m.month)
+             ORDER BY m.month""")
     raise ValueError(table)
 
 
+# --- SNAPSHOT ----------------------------------------------------------------
+# get_data() used to return st.cache_data's unpickled copy of every table, so
+# each kiosk iPad and admin tab held its own ledger, and most pages .copy()'d it
+# again. Now the process keeps one Snapshot that every session references: a
+# write marks the tables it touched stale, and the next get_data() re-reads just
+# those into a new version, sharing the rest. Pandas copy-on-write, switched on
+# by Home.py and pages/Kiosk.py at start-up, is what makes sharing safe: a page
+# that assigns into a frame copies the columns it changes, not the table, and
+# never anyone else's. bench/session_memory.py measures it.
+
+TABLES = ("inventory", "transactions", "items", "customers", "settings", "expenses",
+          "history")
+SNAPSHOT_TTL = 600      # seconds before a full re-read picks up outside edits
+
+
+class Snapshot(Mapping):
+    """Every table at one version, read-only and shared by all sessions.
+    Indexing hands out a shallow copy, so adding a column to what you got
+    doesn't add it for everyone else."""
+
+    def __init__(self, version, tables, taken_at):
+        self.version = version
+        self.taken_at = taken_at
+        self._tables = tables
+
+    def __getitem__(self, table):
+        return self._tables[table].copy(deep=False)
+
+    def __iter__(self):
+        return iter(self._tables)
+
+    def __len__(self):
+        return len(self._tables)
+
+    @cached_property
+    def skus(self):
+        """SKU -> product row, built once per version. The products primary key
+        makes SKUs unique, so this is an exact index, not a search."""
+        inv = self._tables["inventory"]
+        return dict(zip(inv["SKU"].astype(str), inv.to_dict("records")))
+
+    @cached_property
+    def invoices(self):
+        """Invoice id -> row position in transactions."""
+        ids = self._tables["transactions"]["TransactionID"]
+        return dict(zip(ids.tolist(), range(len(ids))))
+
+    @cached_property
+    def invoice_lines(self):
+        """Invoice id -> row positions of its lines in items. The lines are
+        read in invoice_id order, so each invoice's are one contiguous run."""
+        return self._tables["items"].groupby("TransactionID", sort=False).indices
+
+
+@st.cache_resource
+def _snapshots():
+    return {"lock": threading.Lock(), "current": None, "stale": set(TABLES)}
+
+
+def snapshot() -> Snapshot:
+    """The current Snapshot, re-reading whatever went stale since the last one."""
+    state = _snapshots()
+    with state["lock"]:
+        snap = state["current"]
+        if snap is None or time.monotonic() - snap.taken_at > SNAPSHOT_TTL:
+            for t in set(TABLES) - state["stale"]:
+                INVALIDATIONS.inc(table=t, cause="ttl")
+            state["stale"].update(TABLES)
+        stale = state["stale"]
+        if not stale:
+            SNAPSHOT_HITS.inc()
+        else:
+            tables = {t: _timed_read(t) if t in stale else snap._tables[t] for t in TABLES}
+            taken_at = time.monotonic() if stale.issuperset(TABLES) else snap.taken_at
+            snap = Snapshot(snap.version + 1 if snap else 1, tables, taken_at)
+            state["current"], state["stale"] = snap, set()
+        return snap
+
+
+def _timed_read(table):
+    SNAPSHOT_READS.inc(table=table)
+    with READ_SECONDS.time(table=table):
+        return _read(table)
+
+
 def get_data():
-    """All tables, each cached independently."""
+    """All tables, as the shared Snapshot."""
     try:
-        return {k: _read(k) for k in
-                ("inventory", "transactions", "items", "customers", "settings", "expenses")}
+        return snapshot()
     except Exception as e:
         st.error(f"🚨 Database Error: {e}")
         return {}
@@ -144,20 +340,16 @@ def get_data():
 _TAB_TO_TABLE = {
     "Inventory": "inventory", "Transactions": "transactions",
     "TransactionItems": "items", "Customers": "customers",
-    "Settings": "settings", "Expenses": "expenses",
+    "Settings": "settings", "Expenses": "expenses", "History": "history",
 }
 
 
 def force_refresh(*tabs):
-    if tabs:
-        for t in tabs:
-            key = _TAB_TO_TABLE.get(t, t)
-            try:
-                _read.clear(key)
-            except Exception:
-                _read.clear()
-    else:
-        _read.clear()
+    state = _snapshots()
+    with state["lock"]:
+        for t in {_TAB_TO_TABLE.get(t, t) for t in tabs or TABLES} - state["stale"]:
+            INVALIDATIONS.inc(table=t, cause="write")
+            state["stale"].add(t)
     return True
 
 
@@ -181,8 +373,45 @@ def check_integrity():
     return problems
 
 
+def lookup_sku(sku):
+    """The product with exactly this SKU, as a dict, or None. For scanners: a
+    hash lookup instead of a mask over the whole inventory frame. A miss asks
+    the database by primary key once, in case the item was added since this
+    snapshot was taken."""
+    key = str(sku).strip()
+    if not key:
+        return None
+    row = snapshot().skus.get(key)
+    if row is None and not _q("SELECT 1 FROM products WHERE sku = %s", (key,)).empty:
+        force_refresh("Inventory")
+        row = snapshot().skus.get(key)
+    return dict(row) if row else None
+
+
+def invoice(invoice_id):
+    """(header row as a dict or None, lines DataFrame) for one invoice, looked
+    up by its integer id in the snapshot's indexes. A miss asks the database
+    by primary key once, like lookup_sku(), for an invoice just written, and
+    then the archive, for one from a closed year."""
+    key = int(invoice_id)
+    snap = snapshot()
+    if key not in snap.invoices:
+        if not _q("SELECT 1 FROM invoices WHERE id = %s", (key,)).empty:
+            force_refresh("Transactions", "TransactionItems", "Customers")
+            snap = snapshot()
+        elif not snap._tables["history"].empty:
+            found = _q("SELECT year FROM archived_invoices WHERE id = %s", (key,))
+            if not found.empty:
+                trans, items = _archived_year(int(found["year"].iat[0]), snap)
+                rows = trans[trans["TransactionID"] == key]
+                return rows.iloc[0].to_dict(), items[items["TransactionID"] == key]
+    pos = snap.invoices.get(key)
+    header = snap._tables["transactions"].iloc[pos].to_dict() if pos is not None else None
+    return header, snap._tables["items"].iloc[snap.invoice_lines.get(key, [])]
+
+
 def get_settings_dict():
-    df = _read("settings")
+    df = snapshot()["settings"]
     return {} if df.empty else dict(zip(df["Key"], df["Value"]))
 
 
@@ -195,6 +424,289 @@ def get_tax_rate() -> float:
         return 0.0
 
 
+# --- ARCHIVE -----------------------------------------------------------------
+# Closed years live in sales_archive (010), not in the snapshot: only their
+# monthly totals do, as "history". Whatever asks about a date range, a
+# customer or an invoice number reads through to them and gets the columns
+# _read() gives. An archived year never changes, so each is read once per
+# process and kept, under its ArchivedAt — a restore and re-archive is a new
+# key, not a stale hit.
+
+@st.cache_resource
+def _archive_cache():
+    return {"lock": threading.Lock(), "years": {}}
+
+
+def _archived_year(year, snap):
+    """(transactions, items) for one archived year, as shallow copies."""
+    hist = snap._tables["history"]
+    key = (year, hist.loc[hist["Year"] == year, "ArchivedAt"].max())
+    state = _archive_cache()
+    with state["lock"]:
+        hit = state["years"].get(key)
+    if hit is None:
+        trans = _q("""
+            SELECT i.id AS "TransactionID",
+                   to_char(i.sold_at AT TIME ZONE 'America/Los_Angeles',
+                           'YYYY-MM-DD HH24:MI:SS') AS "Timestamp",
+                   i.total AS "TotalAmount",
+                   initcap(i.payment::text) AS "PaymentMethod",
+                   COALESCE(i.customer_id, 'Guest') AS "CustomerID",
+                   initcap(i.status::text) AS "Status",
+                   to_char(i.due_date, 'YYYY-MM-DD') AS "DueDate",
+                   i.tax AS "TaxAmount",
+                   CASE WHEN i.is_wholesale THEN 'TRUE' ELSE 'FALSE' END AS "IsWholesale"
+              FROM sales_archive a, jsonb_populate_recordset(NULL::invoices, a.invoices) i
+             WHERE a.year = %s ORDER BY i.sold_at""", (year,)).astype({"TransactionID": "int64"})
+        items = _q("""
+            SELECT l.invoice_id AS "TransactionID", COALESCE(l.sku, '') AS "SKU",
+                   l.qty AS "QtySold", l.unit_price AS "Price", l.description AS "Name"
+              FROM sales_archive a, jsonb_populate_recordset(NULL::invoice_lines, a.lines) l
+             WHERE a.year = %s ORDER BY l.invoice_id, l.id""", (year,)).astype({"TransactionID": "int64"})
+        hit = (trans, items)
+        with state["lock"]:
+            state["years"] = {k: v for k, v in state["years"].items() if k[0] != year}
+            state["years"][key] = hit
+    return hit[0].copy(deep=False), hit[1].copy(deep=False)
+
+
+def sales_between(start, end):
+    """(transactions, items) for a report over start..end: the snapshot's, with
+    any archived year the range reaches into read through ahead of them. Not
+    cut to the range; the reports filter by Timestamp themselves."""
+    snap = snapshot()
+    trans, items = snap["transactions"], snap["items"]
+    years = sorted(y for y in snap._tables["history"]["Year"].unique()
+                   if start.year <= y <= end.year)
+    if not years:
+        return trans, items
+    old = [_archived_year(int(y), snap) for y in years]
+    return (pd.concat([t for t, _ in old] + [trans], ignore_index=True),
+            pd.concat([i for _, i in old] + [items], ignore_index=True))
+
+
+def customer_history(cust_id):
+    """One customer's invoices, newest first, archived years included.
+    Archived is True on those: they can be viewed and re-sent, not changed."""
+    snap = snapshot()
+    trans = snap["transactions"]
+    mine = [trans[trans["CustomerID"] == cust_id].assign(Archived=False)]
+    if not snap._tables["history"].empty:
+        years = _q("SELECT DISTINCT year FROM archived_invoices WHERE customer_id = %s",
+                   (cust_id,))["year"]
+        for y in years:
+            old, _ = _archived_year(int(y), snap)
+            mine.append(old[old["CustomerID"] == cust_id].assign(Archived=True))
+    out = pd.concat(mine, ignore_index=True)
+    return out.sort_values("Timestamp", ascending=False, ignore_index=True)
+
+
+def sales_by_month():
+    """Sales per calendar month, a column per year, for year over year:
+    archived years from their kept totals, open ones from the snapshot."""
+    snap = snapshot()
+    trans = snap["transactions"]
+    live = pd.DataFrame({"Month": trans["Timestamp"].str[:7],
+                         "TotalAmount": pd.to_numeric(trans["TotalAmount"], errors="coerce")})
+    old = snap["history"][["Month", "TotalAmount"]]
+    months = pd.concat([old.assign(TotalAmount=pd.to_numeric(old["TotalAmount"])), live],
+                       ignore_index=True)
+    months = months.groupby("Month", as_index=False)["TotalAmount"].sum()
+    return (months.assign(Year=months["Month"].str[:4], Month=months["Month"].str[5:].astype(int))
+                  .pivot(index="Month", columns="Year", values="TotalAmount")
+                  .reindex(range(1, 13)))
+
+
+def archive_status():
+    """(open, archived) for Settings' Archive tab, a row per year, both from
+    the snapshot. Open years: invoices and how many are unpaid. Archived:
+    invoices, bytes stored (compressed) and raw."""
+    snap = snapshot()
+    trans = snap["transactions"]
+    live = (trans.assign(Year=trans["Timestamp"].str[:4].astype(int),
+                         Unpaid=trans["Status"].str.lower() == "pending")
+                 .groupby("Year", as_index=False)
+                 .agg(Invoices=("TransactionID", "size"), Unpaid=("Unpaid", "sum")))
+    archived = (snap["history"].groupby("Year", as_index=False)
+                .agg(Invoices=("Invoices", "sum"), Stored=("Stored", "first"),
+                     Raw=("Raw", "first"), ArchivedAt=("ArchivedAt", "first")))
+    return live, archived
+
+
+# Detaching or attaching a year takes ACCESS EXCLUSIVE on invoices and
+# invoice_lines. Queued behind a long report, it would hold every kiosk read
+# and checkout queued behind itself, so it gives up instead, as migrations do.
+YEAR_LOCK_TIMEOUT = "5s"
+
+
+@contextlib.contextmanager
+def _year_lock():
+    """A connection whose transaction waits at most YEAR_LOCK_TIMEOUT for a
+    lock, committed at the end, with a busy table said in plain words."""
+    try:
+        with profiling.section("postgres"), get_pool().connection() as conn:
+            conn.execute(f"SET LOCAL lock_timeout = '{YEAR_LOCK_TIMEOUT}'")
+            yield conn
+            conn.commit()
+    except psycopg.errors.LockNotAvailable:
+        raise RuntimeError(f"the sales tables were busy for {YEAR_LOCK_TIMEOUT} (a report or "
+                           "sale still running). Nothing changed; try again in a moment.") from None
+
+
+def archive_year(year):
+    """Moves a closed year's invoices and lines into the archive. Returns how
+    many invoices went; raises with Postgres' reason when it refuses — an
+    open year, or unpaid invoices in it — or when the tables stay busy."""
+    with _year_lock() as conn:
+        n = conn.execute("SELECT archive_sales_year(%s)", (int(year),)).fetchone()[0]
+    force_refresh("Transactions", "TransactionItems", "History")
+    return n
+
+
+def restore_year(year):
+    """Puts an archived year back into the live tables."""
+    with _year_lock() as conn:
+        n = conn.execute("SELECT restore_sales_year(%s)", (int(year),)).fetchone()[0]
+    force_refresh("Transactions", "TransactionItems", "History")
+    return n
+
+
+def missing_sales_years():
+    """This year and next, whichever has no partitions yet (009). migrations.py
+    makes them on deploy, but a year can turn with no deploy since the last."""
+    this = datetime.now(TZ).year
+    return _q("""SELECT y FROM generate_series(%s::integer, %s::integer) y
+                  WHERE to_regclass('stock_moves_' || y) IS NULL""",
+              (this, this + 1))["y"].tolist()
+
+
+def create_sales_year(year):
+    """Makes a year's partitions. DDL on invoices, invoice_lines and
+    stock_moves: it waits for any sale in progress, and holds the next one."""
+    with _year_lock() as conn:
+        conn.execute("SELECT ensure_sales_year(%s)", (int(year),))
+
+
+# --- STOCK LEDGER ------------------------------------------------------------
+# stock_moves is meant to explain every unit on hand. 012 keeps per-SKU
+# checkpoints of it, so "on hand at" is a checkpoint plus a few moves rather
+# than the whole ledger, and reconcile_stock() compares stock_qty with it only
+# for SKUs that moved or were edited since the last check.
+
+def stock_at(when):
+    """Every product's on-hand as the ledger had it at `when` (a datetime,
+    naive = shop time), with cost, for a year-end or stocktake count."""
+    when = pd.Timestamp(when)
+    if when.tzinfo is None:
+        when = when.tz_localize(TZ)
+    return _q("""
+        SELECT p.sku AS "SKU", p.name AS "Name", COALESCE(s.on_hand, 0) AS "OnHand",
+               p.cost AS "Cost", COALESCE(s.on_hand, 0) * p.cost AS "Value"
+          FROM products p LEFT JOIN stock_at(%s) s ON s.sku = p.sku
+         ORDER BY p.sku""", (when.to_pydatetime(),))
+
+
+def reconcile_stock():
+    """Runs the incremental check. Returns (SKUs compared, SKUs now drifted)."""
+    return _x("SELECT checked, drifted FROM reconcile_stock()", fetch=True)
+
+
+def stock_drift():
+    """(last check's time or None, the SKUs whose stock_qty disagrees with
+    their ledger as of it)."""
+    last = _q("SELECT max(checked_at) AS at FROM stock_checks")["at"].iat[0]
+    drift = _q("""
+        SELECT d.sku AS "SKU", p.name AS "Name", d.stock_qty AS "StockQty",
+               d.ledger AS "Ledger", d.stock_qty - d.ledger AS "Off",
+               d.found_at AS "Since"
+          FROM stock_drift d JOIN products p ON p.sku = d.sku
+         ORDER BY abs(d.stock_qty - d.ledger) DESC, d.sku""")
+    return (None if pd.isna(last) else last), drift
+
+
+# --- DIAGNOSTICS -------------------------------------------------------------
+# For Settings' Database tab. Everything here reads Postgres' statistics views,
+# which count from the last stats reset, not from when the app started.
+
+def _server_statements():
+    """pg_stat_statements for this database, or None where it isn't installed
+    or isn't in shared_preload_libraries (then reading the view raises)."""
+    try:
+        if _q("SELECT to_regclass('pg_stat_statements') IS NOT NULL AS ok")["ok"].iat[0]:
+            return _q("""
+                SELECT query AS "Statement", calls AS "Calls",
+                       round(total_exec_time::numeric, 1) AS "Total ms",
+                       round(mean_exec_time::numeric, 2) AS "Mean ms",
+                       round(max_exec_time::numeric, 1) AS "Max ms",
+                       rows AS "Rows",
+                       round(100.0 * shared_blks_hit
+                             / NULLIF(shared_blks_hit + shared_blks_read, 0), 1) AS "Cache hit %%"
+                  FROM pg_stat_statements
+                 WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())""")
+    except psycopg.Error:
+        pass
+    return None
+
+
+def _app_statements():
+    state = _statement_stats()
+    with state["lock"]:
+        rows = [{"Statement": sql, "Called from": s["caller"], "Calls": s["calls"],
+                 "Total ms": round(s["total_s"] * 1000, 1),
+                 "Mean ms": round(s["total_s"] * 1000 / s["calls"], 2),
+                 "Max ms": round(s["max_s"] * 1000, 1), "Rows": s["rows"]}
+                for sql, s in state["by_sql"].items()]
+    return pd.DataFrame(rows, columns=["Statement", "Called from", "Calls", "Total ms",
+                                       "Mean ms", "Max ms", "Rows"])
+
+
+def database_health():
+    """Statements, tables, unused indexes and cache hit ratios, as a dict.
+
+    Statements come from pg_stat_statements when the server has it. Otherwise
+    from this process's own count of what it sent (_TimedCursor), which times
+    the round trip rather than the execution, and starts at the app's start."""
+    statements = _server_statements()
+    if statements is not None:
+        source = "pg_stat_statements, every client of this database"
+    else:
+        statements = _app_statements()
+        source = (f"this app process since {_statement_stats()['since']:%b %d %H:%M} "
+                  "(pg_stat_statements isn't installed on the server)")
+    tables = _q("""
+        SELECT s.relname AS "Table", s.n_live_tup AS "Live rows", s.n_dead_tup AS "Dead rows",
+               round(100.0 * s.n_dead_tup / NULLIF(s.n_live_tup + s.n_dead_tup, 0), 1) AS "Dead %%",
+               pg_size_pretty(pg_total_relation_size(s.relid)) AS "Size",
+               s.seq_scan AS "Seq scans", s.seq_tup_read AS "Rows seq-read",
+               COALESCE(s.idx_scan, 0) AS "Index scans",
+               round(100.0 * io.heap_blks_hit
+                     / NULLIF(io.heap_blks_hit + io.heap_blks_read, 0), 1) AS "Cache hit %%",
+               COALESCE(to_char(greatest(s.last_vacuum, s.last_autovacuum)
+                                AT TIME ZONE 'America/Los_Angeles', 'YYYY-MM-DD HH24:MI'), '')
+                 AS "Last vacuum"
+          FROM pg_stat_user_tables s JOIN pg_statio_user_tables io USING (relid)
+         ORDER BY pg_total_relation_size(s.relid) DESC""")
+    unused = _q("""
+        SELECT s.relname AS "Table", s.indexrelname AS "Index",
+               pg_size_pretty(pg_relation_size(s.indexrelid)) AS "Size"
+          FROM pg_stat_user_indexes s JOIN pg_index i USING (indexrelid)
+         WHERE s.idx_scan = 0 AND NOT i.indisunique
+         ORDER BY pg_relation_size(s.indexrelid) DESC""")
+    cache = _q("""
+        SELECT (SELECT round(100.0 * sum(heap_blks_hit)
+                             / NULLIF(sum(heap_blks_hit + heap_blks_read), 0), 2)
+                  FROM pg_statio_user_tables) AS tables,
+               (SELECT round(100.0 * sum(idx_blks_hit)
+                             / NULLIF(sum(idx_blks_hit + idx_blks_read), 0), 2)
+                  FROM pg_statio_user_indexes) AS indexes,
+               round(100.0 * blks_hit / NULLIF(blks_hit + blks_read, 0), 2) AS database,
+               COALESCE(to_char(stats_reset AT TIME ZONE 'America/Los_Angeles',
+                                'YYYY-MM-DD HH24:MI'), 'never') AS since
+          FROM pg_stat_database WHERE datname = current_database()""").iloc[0].to_dict()
+    return {"source": source, "statements": statements, "tables": tables,
+            "unused_indexes": unused, "cache": cache}
+
+
 # --- WRITES ------------------------------------------------------------------
 
 def add_customer(name, email, is_wholesale=False):
@@ -208,8 +720,13 @@ def add_customer(name, email, is_wholesale=False):
 
 
 def add_inventory_item(sku, name, price, stock, wholesale_price, cost):
-    _x("""INSERT INTO products (sku, name, price, stock_qty, wholesale_price, cost)
-          VALUES (%s,%s,%s,%s,NULLIF(%s,0)::numeric,NULLIF(%s,0)::numeric)""",
+    # Opening stock goes in the ledger too, or reconcile_stock() flags it.
+    _x("""WITH p AS (
+              INSERT INTO products (sku, name, price, stock_qty, wholesale_price, cost)
+              VALUES (%s,%s,%s,%s,NULLIF(%s,0)::numeric,NULLIF(%s,0)::numeric)
+              RETURNING sku, stock_qty)
+          INSERT INTO stock_moves (sku, delta, reason, note)
+          SELECT sku, stock_qty, 'count', 'opening stock' FROM p WHERE stock_qty <> 0""",
        (str(sku).strip(), name, price or 0, int(stock or 0),
         wholesale_price or 0, cost or 0))
     return force_refresh("Inventory")
@@ -245,11 +762,20 @@ def update_inventory_batch(df_changes):
                     sku = str(r.get("SKU", "")).strip()
                     if not sku:
                         continue
+                    # A StockQty typed into the grid is a count: the ledger
+                    # gets the difference, or reconcile_stock() flags it.
                     cur.execute("""
-                        UPDATE products SET name=%s, price=%s, stock_qty=%s,
-                               wholesale_price=NULLIF(%s,0)::numeric,
-                               cost=NULLIF(%s,0)::numeric, active=%s
-                         WHERE sku=%s""",
+                        WITH up AS (
+                            UPDATE products p SET name=%s, price=%s, stock_qty=%s,
+                                   wholesale_price=NULLIF(%s,0)::numeric,
+                                   cost=NULLIF(%s,0)::numeric, active=%s
+                              FROM (SELECT sku, stock_qty FROM products WHERE sku=%s
+                                    FOR NO KEY UPDATE) o
+                             WHERE p.sku = o.sku
+                            RETURNING p.sku, p.stock_qty - o.stock_qty AS delta)
+                        INSERT INTO stock_moves (sku, delta, reason, note)
+                        SELECT sku, delta, 'adjustment', 'edited in the inventory grid'
+                          FROM up WHERE delta <> 0""",
                         (r.get("Name") or sku, float(r.get("Price") or 0),
                          int(float(r.get("StockQty") or 0)),
                          float(r.get("WholesalePrice") or 0), float(r.get("Cost") or 0),
@@ -261,7 +787,255 @@ def update_inventory_batch(df_changes):
         return False
 
 
-_PAYMENT = {"cash": "cash", "check": "check", "card": "card", "venmo": "venmo",
+# --- BULK IMPORT ---
+# The Bulk Import tab used to concat the CSV onto the whole inventory and hand
+# it to update_inventory_batch: one UPDATE per row, new SKUs silently dropped,
+# a bad cell discovered as an exception halfway through. Now the file is read
+# in chunks as text, each chunk validated as it comes, streamed with COPY into
+# a temp table, and merged with one INSERT ... ON CONFLICT. All or nothing: any
+# bad row and the import reports every problem and changes nothing.
+#
+# Columns are the editor's export headers; only SKU is required. A blank cell
+# on an existing SKU keeps what's there, a new SKU needs Name and Price, and a
+# WholesalePrice or Cost of 0 means none, as in the editor. StockQty is the
+# count on the shelf; the difference is written to stock_moves.
+# bench/inventory_import.py times a 50,000-row catalogue.
+
+IMPORT_CHUNK = 5000
+_IMPORT_COLUMNS = {"SKU": "sku", "Name": "name", "Price": "price",
+                   "WholesalePrice": "wholesale_price", "Cost": "cost",
+                   "StockQty": "stock_qty", "Vendor": "vendor",
+                   "Category": "category", "Active": "active"}
+_MONEY = ("Price", "WholesalePrice", "Cost")
+_YES, _NO = {"true", "1", "yes", "y"}, {"false", "0", "no", "n"}
+_MAX_ERRORS = 50
+
+
+class _Rejected(Exception):
+    """Validation failed; unwinds the import's transaction."""
+
+
+def _import_chunk(chunk, first_line, seen, errors):
+    """Validate one chunk of strings. Returns its rows for COPY, in
+    _IMPORT_COLUMNS order with the CSV line first, blanks as None."""
+    chunk = chunk.set_axis(pd.RangeIndex(first_line, first_line + len(chunk)))
+
+    def fail(mask, col, why):
+        errors.extend((n, f"{col} {why}: {chunk.at[n, col]!r}")
+                      for n in chunk.index[mask.to_numpy()])
+
+    out = {}
+    for col, name in _IMPORT_COLUMNS.items():
+        if col not in chunk.columns:
+            out[name] = [None] * len(chunk)
+            continue
+        raw = chunk[col].str.strip()
+        blank = raw == ""
+        if col == "SKU":
+            fail(blank, col, "is blank")
+            fail(~blank & (raw.duplicated(keep=False) | raw.isin(seen)), col, "appears twice")
+            seen.update(raw)
+        elif col in _MONEY:
+            raw = raw.str.replace(r"[$,]", "", regex=True)
+            num = pd.to_numeric(raw, errors="coerce")
+            fail(~blank & ~num.between(0, 99_999_999.99), col, "is not a price")
+        elif col == "StockQty":
+            num = pd.to_numeric(raw.str.replace(",", ""), errors="coerce")
+            whole = (num % 1 == 0) & num.abs().lt(2**31)
+            fail(~blank & ~whole, col, "is not a whole number")
+            raw = num.where(whole).astype("Int64").astype("string")
+        elif col == "Active":
+            low = raw.str.lower()
+            fail(~blank & ~low.isin(_YES | _NO), col, "is not yes/no")
+            raw = low.isin(_YES).map({True: "t", False: "f"})
+        out[name] = raw.astype(object).where(~blank, None)
+    return zip(chunk.index, *out.values())
+
+
+def import_inventory(csv_file, dry_run=False):
+    """Upsert products from a CSV. With dry_run, everything runs and is then
+    rolled back, so the report says what the import would do. Returns a dict:
+    rows, inserted, updated, unchanged, moves, seconds, ignored (unknown
+    columns) and errors, a list of (line, message) that is empty on success;
+    line 0 is the file as a whole."""
+    t0 = time.perf_counter()
+    report = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "moves": 0,
+              "seconds": 0.0, "ignored": [], "errors": []}
+    errors = report["errors"]
+    try:
+        reader = pd.read_csv(csv_file, dtype=str, keep_default_na=False,
+                             encoding="utf-8-sig", chunksize=IMPORT_CHUNK)
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TEMP TABLE inventory_import (
+                        line integer, sku text, name text, price numeric,
+                        wholesale_price numeric, cost numeric, stock_qty integer,
+                        vendor text, category text, active boolean
+                    ) ON COMMIT DROP""")
+                seen, line = set(), 2          # line 1 is the header
+                with cur.copy(f"COPY inventory_import (line, {', '.join(_IMPORT_COLUMNS.values())})"
+                              " FROM STDIN") as cp:
+                    for chunk in reader:
+                        chunk.columns = chunk.columns.str.strip()
+                        if line == 2:
+                            report["ignored"] = [c for c in chunk.columns if c not in _IMPORT_COLUMNS]
+                            if "SKU" not in chunk.columns:
+                                errors.append((1, "no SKU column"))
+                                break
+                        chunk = chunk[[c for c in chunk.columns if c in _IMPORT_COLUMNS]]
+                        rows = _import_chunk(chunk, line, seen, errors)
+                        line += len(chunk)
+                        if not errors:         # past the first bad row, only validate
+                            for row in rows:
+                                cp.write_row(row)
+                report["rows"] = line - 2
+                if not errors:
+                    cur.execute("""
+                        SELECT s.line, s.sku FROM inventory_import s
+                         WHERE (s.name IS NULL OR s.price IS NULL)
+                           AND NOT EXISTS (SELECT 1 FROM products p WHERE p.sku = s.sku)
+                         ORDER BY s.line""")
+                    errors.extend((n, f"new SKU {sku!r} needs a Name and a Price")
+                                  for n, sku in cur.fetchall())
+                if errors:
+                    errors.sort()
+                    del errors[_MAX_ERRORS:]
+                    raise _Rejected
+                # Held only for the merge: a sale landing between reading a shelf
+                # count and writing it would put a wrong delta in the ledger.
+                cur.execute("LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE")
+                cur.execute("""
+                    WITH src AS (
+                        SELECT s.sku,
+                               COALESCE(s.name, p.name) AS name,
+                               COALESCE(s.price, p.price) AS price,
+                               CASE WHEN s.wholesale_price IS NULL THEN p.wholesale_price
+                                    ELSE NULLIF(s.wholesale_price, 0) END AS wholesale_price,
+                               CASE WHEN s.cost IS NULL THEN p.cost
+                                    ELSE NULLIF(s.cost, 0) END AS cost,
+                               COALESCE(s.stock_qty, p.stock_qty, 0) AS stock_qty,
+                               COALESCE(s.vendor, p.vendor) AS vendor,
+                               COALESCE(s.category, p.category) AS category,
+                               COALESCE(s.active, p.active, true) AS active,
+                               COALESCE(s.stock_qty, p.stock_qty, 0)
+                                 - COALESCE(p.stock_qty, 0) AS delta
+                          FROM inventory_import s LEFT JOIN products p ON p.sku = s.sku
+                    ), up AS (
+                        INSERT INTO products AS p (sku, name, price, wholesale_price, cost,
+                                                   stock_qty, vendor, category, active)
+                        SELECT sku, name, price, wholesale_price, cost,
+                               stock_qty, vendor, category, active FROM src
+                        ON CONFLICT (sku) DO UPDATE SET
+                               name = EXCLUDED.name, price = EXCLUDED.price,
+                               wholesale_price = EXCLUDED.wholesale_price, cost = EXCLUDED.cost,
+                               stock_qty = EXCLUDED.stock_qty, vendor = EXCLUDED.vendor,
+                               category = EXCLUDED.category, active = EXCLUDED.active
+                         WHERE (p.name, p.price, p.wholesale_price, p.cost, p.stock_qty,
+                                p.vendor, p.category, p.active)
+                               IS DISTINCT FROM
+                               (EXCLUDED.name, EXCLUDED.price, EXCLUDED.wholesale_price,
+                                EXCLUDED.cost, EXCLUDED.stock_qty, EXCLUDED.vendor,
+                                EXCLUDED.category, EXCLUDED.active)
+                        RETURNING p.sku, p.xmax = 0 AS inserted
+                    ), moves AS (
+                        INSERT INTO stock_moves (sku, delta, reason, note)
+                        SELECT src.sku, src.delta, 'adjustment', 'CSV import'
+                          FROM src JOIN up USING (sku) WHERE src.delta <> 0
+                        RETURNING 1
+                    )
+                    SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted),
+                           (SELECT count(*) FROM moves)
+                      FROM up""")
+                report["inserted"], report["updated"], report["moves"] = cur.fetchone()
+                report["unchanged"] = report["rows"] - report["inserted"] - report["updated"]
+            if dry_run:
+                conn.rollback()
+            else:
+                conn.commit()
+                force_refresh("Inventory")
+    except _Rejected:
+        pass
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        errors.append((0, f"not a readable CSV: {e}"))
+    except psycopg.Error as e:
+        errors.append((0, f"the database refused the import: {e}"))
+    report["seconds"] = time.perf_counter() - t0
+    return report
+
+
+# --- STOCKTAKE ---
+# A shelf count is collected per SKU into stocktake_counts (013), from as many
+# phones as are counting, and changes nothing until apply_stocktake() applies
+# it all at once: 'count' moves and stock changes in one statement, and the
+# variances back. Counting into the inventory grid did neither.
+
+def stocktakes():
+    """Every stocktake, newest first, with how many SKUs it has counted.
+    Applied is NaT while it's still open."""
+    return _q("""
+        SELECT s.id AS "ID", s.name AS "Name", s.opened_at AS "Opened",
+               s.applied_at AS "Applied", count(c.sku) AS "Counted"
+          FROM stocktakes s LEFT JOIN stocktake_counts c ON c.stocktake_id = s.id
+         GROUP BY s.id ORDER BY s.opened_at DESC""")
+
+
+def open_stocktake(name):
+    return _x("INSERT INTO stocktakes (name) VALUES (%s) RETURNING id",
+              (str(name).strip(),), fetch=True)[0]
+
+
+def record_count(stocktake_id, sku, qty, add=False, counted_by=None):
+    """Counts `qty` of `sku` into an open stocktake, replacing an earlier count
+    of it or, with add, adding to it. Returns the SKU's count so far, or None
+    for an unknown SKU or a stocktake that has been applied. The lock on the
+    stocktake makes a count that races its apply wait, then find it closed."""
+    out = _x("""
+        INSERT INTO stocktake_counts AS c (stocktake_id, sku, counted, expected, counted_by)
+        SELECT s.id, p.sku, %s, p.stock_qty, %s
+          FROM stocktakes s, products p
+         WHERE s.id = %s AND s.applied_at IS NULL AND p.sku = %s
+           FOR KEY SHARE OF s
+        ON CONFLICT (stocktake_id, sku) DO UPDATE
+           SET counted    = CASE WHEN %s THEN c.counted + EXCLUDED.counted ELSE EXCLUDED.counted END,
+               expected   = CASE WHEN %s THEN c.expected ELSE EXCLUDED.expected END,
+               counted_by = EXCLUDED.counted_by, counted_at = now()
+        RETURNING counted""",
+        (int(qty), counted_by or None, int(stocktake_id), str(sku).strip(), bool(add), bool(add)),
+        fetch=True)
+    return None if out is None else out[0]
+
+
+def stocktake_counts(stocktake_id):
+    """A stocktake's counts, biggest variance first, with the variance at cost."""
+    return _q("""
+        SELECT c.sku AS "SKU", p.name AS "Name", c.expected AS "Expected",
+               c.counted AS "Counted", c.counted - c.expected AS "Variance",
+               (c.counted - c.expected) * p.cost AS "AtCost",
+               COALESCE(c.counted_by, '') AS "CountedBy", c.counted_at AS "CountedAt"
+          FROM stocktake_counts c JOIN products p ON p.sku = c.sku
+         WHERE c.stocktake_id = %s
+         ORDER BY abs(c.counted - c.expected) DESC, c.sku""", (int(stocktake_id),))
+
+
+def apply_stocktake(stocktake_id):
+    """Applies an open stocktake. Returns its variances, biggest first; raises
+    with Postgres' reason if it was applied already."""
+    with get_pool().connection() as conn:
+        rows = conn.execute("SELECT * FROM apply_stocktake(%s)",
+                            (int(stocktake_id),)).fetchall()
+        conn.commit()
+    force_refresh("Inventory")
+    return pd.DataFrame(rows, columns=["SKU", "Expected", "Counted", "Variance"])
+
+
+def discard_stocktake(stocktake_id):
+    """Deletes an open stocktake and its counts. An applied one is history."""
+    _x("DELETE FROM stocktakes WHERE id = %s AND applied_at IS NULL", (int(stocktake_id),))
+    return True
+
+
+_PAYMENT ={"cash": "cash", "check": "check", "card": "card", "venmo": "venmo",
             "invoice (pay later)": "invoice", "pay later (invoice)": "invoice"}
 
 
@@ -275,27 +1049,38 @@ def commit_sale(cart, total, tax, cust_id, payment_method, is_wholesale,
               "description": i.get("name") or str(i["sku"]),
               "qty": float(i["qty"]), "unit_price": float(i["price"])} for i in cart]
     pay = _PAYMENT.get(str(payment_method).split(" (+")[0].strip().lower())
-    row = _x("SELECT record_sale(%s, %s::jsonb, %s::payment_method, %s::invoice_status,"
-             "                   0, 0, %s, %s, %s)",
-             (cust_id if cust_id and cust_id != "Guest" else None,
-              json.dumps(lines), pay, str(status).strip().lower(),
-              float(tax or 0), float(credit_used or 0), bool(is_wholesale)),
-             fetch=True)
+    # Python floats go over the wire as float8, and Postgres won't pick a
+    # numeric-typed function for a float8 argument, so cast them here.
+    t0 = time.perf_counter()
+    try:
+        row = _x("SELECT record_sale(%s, %s::jsonb, %s::payment_method, %s::invoice_status,"
+                 "                   0, 0, %s::numeric, %s::numeric, %s)",
+                 (cust_id if cust_id and cust_id != "Guest" else None,
+                  json.dumps(lines), pay, str(status).strip().lower(),
+                  float(tax or 0), float(credit_used or 0), bool(is_wholesale)),
+                 fetch=True)
+    except Exception as e:
+        SALE_FAILURES.inc(error=type(e).__name__)
+        raise
     invoice_id = row[0]
     if str(status).strip().lower() == "pending":
         days = 30 if is_wholesale else 0
         _x("UPDATE invoices SET due_date = (sold_at + %s)::date WHERE id = %s",
            (timedelta(days=days), invoice_id))
     force_refresh("Transactions", "TransactionItems", "Inventory", "Customers")
+    SALES.inc()
+    CHECKOUT_SECONDS.observe(time.perf_counter() - t0)
     return str(invoice_id)
 
 
 def record_freight(invoice_id, amount):
-    _x("""INSERT INTO invoice_lines (invoice_id, sku, description, qty, unit_price)
-          VALUES (%s, NULL, 'Shipping', 1, %s)""", (int(invoice_id), round(float(amount), 2)))
+    # A line is filed under its invoice's year: it carries the invoice's sold_at.
+    _x("""INSERT INTO invoice_lines (invoice_id, sold_at, sku, description, qty, unit_price)
+          SELECT id, sold_at, NULL, 'Shipping', 1, %s FROM invoices WHERE id = %s""",
+       (round(float(amount), 2), int(invoice_id)))
     _x("UPDATE invoices SET freight=%s, total=total+%s WHERE id=%s",
        (round(float(amount), 2), round(float(amount), 2), int(invoice_id)))
-    return force_refresh("Transactions", "TransactionItems")
+    return force_refresh("Transactions", "TransactionItems", "Customers")
 
 
 def mark_invoice_paid(invoice_id):
@@ -304,7 +1089,7 @@ def mark_invoice_paid(invoice_id):
                  "WHERE id=%s RETURNING id", (int(invoice_id),), fetch=True)
         if out is None:
             return False
-        return force_refresh("Transactions")
+        return force_refresh("Transactions", "Customers")
     except Exception:
         return False
 
@@ -313,7 +1098,7 @@ def delete_invoice(invoice_id):
     try:
         # ON DELETE CASCADE removes the lines; no loop, nothing left behind.
         _x("DELETE FROM invoices WHERE id=%s", (int(invoice_id),))
-        return force_refresh("Transactions", "TransactionItems")
+        return force_refresh("Transactions", "TransactionItems", "Customers")
     except Exception:
         return False
 
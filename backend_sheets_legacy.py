@@ -1,16 +1,14 @@
 import uuid
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email.mime.text import MIMEText
-from email import encoders
+import time
+import numbers
+import threading
 import streamlit as st
 import gspread
+from gspread.utils import fill_gaps, numericise, numericise_all, rowcol_to_a1, to_records
 import pandas as pd
 from google.oauth2.service_account import Credentials
 from datetime import datetime, timedelta
 import pytz
-from fpdf import FPDF
 
 # --- CONNECTIVITY ---
 SPREADSHEET_NAME = "NotionToSew_DB"
@@ -26,12 +24,57 @@ SHEETS = {
     "expenses":     "Expenses",
 }
 
+class Quota:
+    """Token buckets in front of the Sheets API, one per kind ("read", "write").
+
+    Google allows 60 reads and 60 writes per minute per user, and the service
+    account is the only user, so every session in the process shares one
+    allowance. A bucket of `burst` tokens refilling at (per_minute - burst) a
+    minute never lets more than per_minute through in any 60 seconds: a rush
+    of writes waits here for a fraction of a second instead of drawing a 429
+    and BackOffHTTPClient's 2-4-8-second sleeps.
+
+    take() reserves a token before sleeping, so concurrent callers queue up
+    behind each other rather than all waking at once. `clock` and `sleep` are
+    there for bench/sheets_calls.py, which replays a busy hour in virtual time.
+    """
+
+    def __init__(self, per_minute=60, burst=10, clock=time.monotonic, sleep=time.sleep):
+        self.rate = (per_minute - burst) / 60.0
+        self.burst = burst
+        self.clock, self.sleep = clock, sleep
+        self._tokens, self._stamp = {}, {}
+        self._lock = threading.Lock()
+
+    def take(self, kind):
+        """Blocks until a `kind` request may go out; returns the seconds waited."""
+        with self._lock:
+            now = self.clock()
+            tokens = min(self.burst, self._tokens.get(kind, self.burst)
+                         + (now - self._stamp.get(kind, now)) * self.rate)
+            self._tokens[kind], self._stamp[kind] = tokens - 1, now
+        wait = (1 - tokens) / self.rate if tokens < 1 else 0.0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+QUOTA = Quota()
+
+class _ThrottledClient(gspread.BackOffHTTPClient):
+    """BackOffHTTPClient that asks QUOTA first. Drive calls (open by name)
+    have their own, much larger quota and go straight through."""
+
+    def request(self, method, endpoint, *args, **kwargs):
+        if "sheets.googleapis.com" in endpoint:
+            QUOTA.take("read" if method.upper() == "GET" else "write")
+        return super().request(method, endpoint, *args, **kwargs)
+
 @st.cache_resource
 def get_client():
     """Connects to Google Cloud."""
     scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
     creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scopes)
-    return gspread.authorize(creds)
+    return gspread.authorize(creds, http_client=_ThrottledClient)
 
 @st.cache_resource
 def get_sheet():
@@ -50,42 +93,67 @@ def get_sheet():
         pass
     return client.open_by_key(key) if key else client.open(SPREADSHEET_NAME)
 
-@st.cache_data(ttl=600)
-def _read_sheet(tab_name):
-    """One worksheet as a DataFrame, cached per tab."""
-    return pd.DataFrame(get_sheet().worksheet(tab_name).get_all_records())
+@st.cache_resource
+def _worksheet(tab_name):
+    """Worksheet handle, fetched once. sh.worksheet() re-downloads the whole
+    spreadsheet's metadata on every call, and that is a read against quota."""
+    return get_sheet().worksheet(tab_name)
+
+def _range(tab, a1=""):
+    return f"'{tab}'!{a1}" if a1 else f"'{tab}'"
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _revision():
+    """The workbook's Drive modifiedTime. One Drive metadata call, which comes
+    out of Drive's quota rather than the 60-a-minute Sheets one; held for 30s
+    so a burst of reruns makes one call, not one each."""
+    return get_sheet().get_lastUpdateTime()
+
+def _records(values):
+    """Rows from the values API -> DataFrame, the way get_all_records() builds
+    it: header row as keys, short rows padded, numbers numericised."""
+    if not values:
+        return pd.DataFrame()
+    rows = fill_gaps(values)
+    return pd.DataFrame(to_records(rows[0], [numericise_all(r) for r in rows[1:]]))
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _read_all(revision):
+    """Every tab as a DataFrame, downloaded in one values.batchGet.
+
+    Keyed on the revision: until somebody edits the workbook, in the app or by
+    hand in Sheets, the cached copy is the current one and nothing is fetched.
+    It used to be six worksheet downloads (plus six metadata fetches) every ten
+    minutes whether or not anything had changed, on top of the ones after
+    every write."""
+    tabs = list(SHEETS.values())
+    try:
+        got = get_sheet().values_batch_get([_range(tab) for tab in tabs])
+    except gspread.exceptions.APIError:
+        # A missing optional tab (Expenses) fails the whole batch.
+        tabs.remove(SHEETS["expenses"])
+        got = get_sheet().values_batch_get([_range(tab) for tab in tabs])
+    return {tab: _records(vr.get("values", [])) for tab, vr in zip(tabs, got["valueRanges"])}
 
 def get_data():
-    """All data tables. Each tab is cached separately, so refreshing after a
-    write only re-downloads what actually changed."""
+    """All data tables, as of the workbook's current revision."""
     try:
-        out = {}
-        for key, tab in SHEETS.items():
-            try:
-                out[key] = _read_sheet(tab)
-            except Exception:
-                # A missing optional tab (Expenses) shouldn't sink the whole load.
-                if key == "expenses":
-                    out[key] = pd.DataFrame()
-                else:
-                    raise
-        return out
+        frames = _read_all(_revision())
+        return {key: frames.get(tab, pd.DataFrame()) for key, tab in SHEETS.items()}
     except Exception as e:
         st.error(f"🚨 Database Error: {e}")
         return {}
 
 # --- HELPER: Force Cache Clear ---
 def force_refresh(*tabs):
-    """Invalidates cached reads. Pass the worksheet names that changed, e.g.
-    force_refresh("Customers"). With no arguments every tab is dropped."""
-    if tabs:
-        for tab in tabs:
-            try:
-                _read_sheet.clear(tab)
-            except Exception:
-                _read_sheet.clear()   # older Streamlit can't clear a single entry
-    else:
-        _read_sheet.clear()
+    """Invalidates cached reads after a write. Every tab comes back in the
+    same single request, so the worksheet names callers pass, e.g.
+    force_refresh("Customers"), no longer narrow anything down.
+
+    Drive's modifiedTime can trail a write by a few seconds, so the download
+    is dropped too rather than trusting the revision to have moved."""
+    _revision.clear()
+    _read_all.clear()
     return True
 
 def check_integrity():
@@ -154,55 +222,122 @@ def get_tax_rate() -> float:
     except Exception:
         return 0.0
 
+
 # --- LOGIC & WRITES ---
+# Every write below costs a fixed number of API calls, however many rows or
+# items it touches: one batchGet for everything it needs to look up, then as
+# few batch writes as the operation allows. The old cell-at-a-time version
+# spent 16 calls on a five-item sale with store credit, and 27 reads on a
+# twenty-item one — a Saturday rush ran into the 60-a-minute quota.
+# bench/sheets_calls.py counts them.
+
+def _fetch(*ranges):
+    """One values.batchGet for several (tab, a1) ranges -> list of row lists.
+    Cells come back formatted, as ws.cell().value did; empty trailing rows and
+    cells are omitted, so index with _at()."""
+    got = get_sheet().values_batch_get([_range(tab, a1) for tab, a1 in ranges])
+    return [vr.get("values", []) for vr in got["valueRanges"]]
+
+def _at(rows, row, col=1):
+    """Value at 1-based (row, col) of a _fetch() result, "" if absent."""
+    try:
+        return rows[row - 1][col - 1]
+    except IndexError:
+        return ""
+
+def _find(column, value):
+    """1-based row of the first cell in `column` equal to `value`, like
+    ws.find(); None on a miss."""
+    value = str(value)
+    for i, cells in enumerate(column):
+        if cells and cells[0] == value:
+            return i + 1
+    return None
+
+def _plain(v):
+    # Values come from DataFrames as often as from forms; numpy scalars aren't
+    # JSON serialisable.
+    if isinstance(v, numbers.Integral) and not isinstance(v, bool):
+        return int(v)
+    if isinstance(v, numbers.Real):
+        return float(v)
+    return v
+
+def _write(cells, option="USER_ENTERED"):
+    """Writes [(tab, row, col, value)] in one values.batchUpdate. USER_ENTERED
+    is what update_cell() used, so numbers and dates land typed the same way."""
+    if cells:
+        get_sheet().values_batch_update({
+            "valueInputOption": option,
+            "data": [{"range": _range(tab, rowcol_to_a1(r, c)), "values": [[_plain(v)]]}
+                     for tab, r, c, v in cells],
+        })
+
+def _append(tab, rows):
+    """Appends rows after the last one with data, RAW like append_row()."""
+    get_sheet().values_append(_range(tab), {"valueInputOption": "RAW"},
+                              {"values": [[_plain(v) for v in row] for row in rows]})
+
+def _delete(rows_by_tab):
+    """Deletes {tab: [1-based rows]} in one spreadsheets.batchUpdate. Bottom
+    rows go first so the indexes above them stay put."""
+    requests = [
+        {"deleteDimension": {"range": {"sheetId": _worksheet(tab).id, "dimension": "ROWS",
+                                       "startIndex": row - 1, "endIndex": row}}}
+        for tab, rows in rows_by_tab.items() for row in sorted(set(rows), reverse=True)
+    ]
+    if requests:
+        get_sheet().batch_update({"requests": requests})
+
+def _next_invoice(settings, date_now):
+    """(invoice_id, counter write or None) from a _fetch() of Settings!A:B."""
+    row = _find(settings, "NextInvoiceID")
+    try:
+        current_id = int(_at(settings, row, 2))
+    except (TypeError, ValueError):
+        return f"INV-{date_now.strftime('%H%M%S')}", None
+    return str(current_id), ("Settings", row, 2, current_id)
 
 def add_customer(name, email, is_wholesale=False):
-    sh = get_sheet()
-    ws = sh.worksheet("Customers")
+    headers, ids = _fetch(("Customers", "1:1"), ("Customers", "A:A"))
+    headers = headers[0] if headers else []
     # Ensure IsWholesale and TaxRate column headers exist
-    headers = ws.row_values(1)
-    if 'IsWholesale' not in headers:
-        ws.update_cell(1, 9, 'IsWholesale')
-    if 'TaxRate' not in headers:
-        ws.update_cell(1, 10, 'TaxRate')
+    fix = [("Customers", 1, col, head) for col, head in ((9, 'IsWholesale'), (10, 'TaxRate'))
+           if head not in headers]
+    _write(fix)
     # Sheets has no UNIQUE constraint, so enforce it here. A collision silently
     # merges two customers' invoice histories and makes the Manage button open
     # the wrong profile — see check_integrity().
-    existing = {v.strip() for v in ws.col_values(1)[1:] if v.strip()}
+    existing = {c[0].strip() for c in ids[1:] if c and c[0].strip()}
     new_id = f"C-{uuid.uuid4().hex[:8]}"
     while new_id in existing:
         new_id = f"C-{uuid.uuid4().hex[:8]}"
 
     date_joined = datetime.now().strftime("%Y-%m-%d")
-    ws.append_row([new_id, name, email, "", date_joined, "", "", 0.0, "TRUE" if is_wholesale else "FALSE", ""])
+    _append("Customers", [[new_id, name, email, "", date_joined, "", "", 0.0,
+                           "TRUE" if is_wholesale else "FALSE", ""]])
     force_refresh("Customers")
     return new_id
 
 # UPDATED: Added cost parameter
 def add_inventory_item(sku, name, price, stock, wholesale_price, cost):
-    sh = get_sheet()
-    ws = sh.worksheet("Inventory")
     # Cost is added as the 6th column (Column F)
-    ws.append_row([sku, name, price, stock, wholesale_price, cost])
+    _append("Inventory", [[sku, name, price, stock, wholesale_price, cost]])
     return force_refresh("Inventory")
 
 # NEW: Specific function to Restock (Safer than full rewrite)
 def restock_item(sku, qty_to_add, new_cost=None):
-    sh = get_sheet()
-    ws = sh.worksheet("Inventory")
-    
     try:
-        cell = ws.find(str(sku), in_column=1)
-        # Update Stock (Column 4 / D)
-        current_stock = int(ws.cell(cell.row, 4).value or 0)
-        ws.update_cell(cell.row, 4, current_stock + qty_to_add)
-        
-        # Update Cost (Column 6 / F) if provided
+        skus, stock = _fetch(("Inventory", "A:A"), ("Inventory", "D:D"))
+        row = _find(skus, sku)
+        if row is None:
+            return False
+        # Stock is column 4 (D), cost column 6 (F)
+        current_stock = int(_at(stock, row) or 0)
+        cells = [("Inventory", row, 4, current_stock + qty_to_add)]
         if new_cost is not None:
-             # Check if col 6 exists, if not we might need to be careful, 
-             # but assuming schema is set:
-            ws.update_cell(cell.row, 6, new_cost)
-            
+            cells.append(("Inventory", row, 6, new_cost))
+        _write(cells)
         return force_refresh("Inventory")
     except Exception:
         return False
@@ -211,61 +346,71 @@ def restock_item(sku, qty_to_add, new_cost=None):
 def update_inventory_batch(df_changes):
     if df_changes.empty:
         return False # Safety guard: never wipe the sheet if DF is empty
-        
-    sh = get_sheet()
-    ws = sh.worksheet("Inventory")
-    
+
     # 1. Prepare data
     headers = df_changes.columns.tolist()
     data = df_changes.astype(str).values.tolist()
     payload = [headers] + data
-    
-    # 2. Update the data range only (overwrite)
-    # This prevents the "window of death" where data is cleared but not yet written
-    ws.update(values=payload, range_name="A1")
-    
-    # 3. Optional: Clear only rows below the new dataset if the list got shorter
-    # (Prevents "ghost" rows if you deleted items)
-    current_row_count = len(ws.get_all_values())
-    new_row_count = len(payload)
-    if current_row_count > new_row_count:
-        # Clear rows from (new_last_row + 1) to (old_last_row), spanning all columns
-        last_col = chr(ord('A') + len(headers) - 1)
-        ws.batch_clear([f"A{new_row_count + 1}:{last_col}{current_row_count}"])
-
+    last_col = chr(ord('A') + len(headers) - 1)
+
+    # 2. Overwrite the data range and blank any rows left over from a longer
+    # list (deleted items) in the same request. One write means there is no
+    # "window of death" where data is cleared but not yet written.
+    current_row_count = len(_fetch(("Inventory", f"A:{last_col}"))[0])
+    blank = [[""] * len(headers)] * max(0, current_row_count - len(payload))
+    get_sheet().values_batch_update({
+        "valueInputOption": "RAW",
+        "data": [{"range": _range("Inventory", "A1"), "values": payload + blank}],
+    })
     return force_refresh("Inventory")
 
-# ... (Rest of commit_sale, mark_invoice_paid, etc. remains the same) ...
-
 def commit_sale(cart, total, tax, cust_id, payment_method, is_wholesale, status="Paid", credit_used=0.0):
-    sh = get_sheet()
-    
-    # 1. Deduct Credit
+    tz = pytz.timezone("America/Los_Angeles")
+    date_now = datetime.now(tz)
+
+    # 1. Everything the sale needs to look up, in one read
+    cust_ids, credits, settings, skus, stock = _fetch(
+        ("Customers", "A:A"), ("Customers", "H:H"), ("Settings", "A:B"),
+        ("Inventory", "A:A"), ("Inventory", "D:D"))
+
+    # 2. Credit, invoice counter and stock, in one write
+    cells, undo = [], []
     if credit_used > 0 and cust_id:
-        ws_cust = sh.worksheet("Customers")
+        row = _find(cust_ids, cust_id)
         try:
-            cell = ws_cust.find(cust_id, in_column=1)
-            current_credit = float(ws_cust.cell(cell.row, 8).value or 0)
-            ws_cust.update_cell(cell.row, 8, max(0.0, current_credit - credit_used))
+            if row is None:
+                raise LookupError("customer not found")
+            current_credit = float(_at(credits, row) or 0)
         except Exception as e:
             # Silently keeping the credit means the customer is charged twice for
             # it later. Fail the sale instead so it can be redone.
             raise RuntimeError(f"Could not apply store credit for {cust_id}: {e}")
-
-    # 2. Invoice ID
-    tz = pytz.timezone("America/Los_Angeles")
-    date_now = datetime.now(tz)
-
-    ws_set = sh.worksheet("Settings")
-    counter_cell = None
-    try:
-        cell = ws_set.find("NextInvoiceID", in_column=1)
-        current_id = int(ws_set.cell(cell.row, cell.col + 1).value)
-        ws_set.update_cell(cell.row, cell.col + 1, current_id + 1)
-        invoice_id = str(current_id)
-        counter_cell = (cell.row, cell.col + 1, current_id)
-    except:
-        invoice_id = f"INV-{date_now.strftime('%H%M%S')}"
+        cells.append(("Customers", row, 8, max(0.0, current_credit - credit_used)))
+        undo.append(("Customers", row, 8, current_credit))
+
+    invoice_id, counter = _next_invoice(settings, date_now)
+    if counter:
+        tab, row, col, current_id = counter
+        cells.append((tab, row, col, current_id + 1))
+        undo.append(counter)
+
+    # get_all_records() numericised the SKUs the cart was built from, so match
+    # on the same form: "00123" in the sheet is 123 in the cart.
+    sku_rows = {}
+    for i, c in enumerate(skus[1:], start=2):
+        if c:
+            sku_rows.setdefault(str(numericise(c[0])), i)
+    sold = {}
+    for item in cart:
+        row = sku_rows.get(str(item['sku']))
+        if row:
+            sold[row] = sold.get(row, 0) + item['qty']
+    for row, qty in sold.items():
+        try: curr_stock = int(float(_at(stock, row) or 0))
+        except ValueError: curr_stock = 0
+        cells.append(("Inventory", row, 4, max(0, curr_stock - qty)))
+        undo.append(("Inventory", row, 4, _at(stock, row)))
+    _write(cells)
 
     due_date = (date_now + timedelta(days=30 if is_wholesale else 0)).strftime("%Y-%m-%d")
     final_pay_method = f"{payment_method} (+${credit_used} Credit)" if credit_used > 0 else payment_method
@@ -274,175 +419,147 @@ def commit_sale(cart, total, tax, cust_id, payment_method, is_wholesale, status=
     # The invoice number is reserved above *before* this row is written. If the
     # write fails the number is spent and the sale disappears with no trace —
     # six sales were lost that way before this rollback existed. Put the counter
-    # back so the next attempt reuses the number rather than skipping it.
+    # back so the next attempt reuses the number rather than skipping it, and
+    # the credit and stock with it, since they went out in the same write.
     try:
-        sh.worksheet("Transactions").append_row([
+        _append("Transactions", [[
             invoice_id, date_now.strftime("%Y-%m-%d %H:%M:%S"), round(float(total), 2), final_pay_method,
             cust_id, status, due_date, round(float(tax), 2), "TRUE" if is_wholesale else "FALSE"
-        ])
+        ]])
     except Exception as e:
-        if counter_cell:
-            row, col, original = counter_cell
-            try: ws_set.update_cell(row, col, original)
-            except Exception: pass
+        try: _write(undo)
+        except Exception: pass
         raise RuntimeError(f"Sale was NOT saved — invoice {invoice_id} could not be written: {e}")
 
     # 4. Items
-    items_rows = []
-    for item in cart:
-        items_rows.append([invoice_id, item['sku'], item['qty'], item['price'], item['name']])
-    sh.worksheet("TransactionItems").append_rows(items_rows)
-    
-    # 5. Inventory Deduct
-    ws_inv = sh.worksheet("Inventory")
-    inv_data = ws_inv.get_all_records()
-    sku_map = {str(row['SKU']): i + 2 for i, row in enumerate(inv_data)}
-    updates = []
-    for item in cart:
-        s_key = str(item['sku'])
-        if s_key in sku_map:
-            row_num = sku_map[s_key]
-            raw_val = ws_inv.cell(row_num, 4).value
-            try: curr_stock = int(float(raw_val or 0))
-            except: curr_stock = 0
-            updates.append({'range': f'D{row_num}', 'values': [[max(0, curr_stock - item['qty'])]]})
-    if updates: ws_inv.batch_update(updates)
+    _append("TransactionItems", [[invoice_id, item['sku'], item['qty'], item['price'], item['name']]
+                                 for item in cart])
     force_refresh("Transactions", "TransactionItems", "Inventory", "Customers", "Settings")
     return invoice_id
 
 def record_freight(invoice_id, amount):
     """Appends a freight line item to TransactionItems."""
-    sh = get_sheet()
-    sh.worksheet("TransactionItems").append_row([invoice_id, "FREIGHT", 1, round(float(amount), 2), "Shipping"])
+    _append("TransactionItems", [[invoice_id, "FREIGHT", 1, round(float(amount), 2), "Shipping"]])
     force_refresh("TransactionItems")
     return True
 
 def mark_invoice_paid(invoice_id):
-    sh = get_sheet()
-    ws = sh.worksheet("Transactions")
     invoice_id_str = str(invoice_id).strip()
-    # Try direct find first (fast path)
     try:
-        cell = ws.find(invoice_id_str, in_column=1)
-        ws.update_cell(cell.row, 6, "Paid")
-        return force_refresh("Transactions")
-    except Exception:
-        pass
-    # Fallback: scan all rows to handle float-formatted IDs ("1001.0" vs "1001")
-    try:
-        all_rows = ws.get_all_values()
-        for row_idx, row_vals in enumerate(all_rows):
-            if row_idx == 0:  # skip header
-                continue
-            if not row_vals:
-                continue
-            cell_val = str(row_vals[0]).strip()
-            match = False
+        ids = _fetch(("Transactions", "A:A"))[0]
+        row = _find(ids, invoice_id_str)
+        # Fallback: float-formatted IDs ("1001.0" vs "1001")
+        for row_idx, cells in enumerate(ids[1:], start=2):
+            if row is not None:
+                break
+            cell_val = str(cells[0]).strip() if cells else ""
             try:
-                match = float(cell_val) == float(invoice_id_str)
+                if cell_val and float(cell_val) == float(invoice_id_str):
+                    row = row_idx
             except (ValueError, TypeError):
-                match = cell_val == invoice_id_str
-            if match:
-                ws.update_cell(row_idx + 1, 6, "Paid")
-                return force_refresh("Transactions")
+                pass
+        if row is None:
+            return False
+        _write([("Transactions", row, 6, "Paid")])
+        return force_refresh("Transactions")
     except Exception:
-        pass
-    return False
+        return False
 
 def delete_invoice(invoice_id):
-    sh = get_sheet()
-    ws_trans = sh.worksheet("Transactions")
-    try: ws_trans.delete_rows(ws_trans.find(str(invoice_id), in_column=1).row)
-    except: pass
-    ws_items = sh.worksheet("TransactionItems")
     try:
-        while True: ws_items.delete_rows(ws_items.find(str(invoice_id), in_column=1).row)
-    except: pass
+        trans, items = _fetch(("Transactions", "A:A"), ("TransactionItems", "A:A"))
+        key = str(invoice_id)
+        first = _find(trans, key)
+        _delete({"Transactions": [first] if first else [],
+                 "TransactionItems": [i + 1 for i, c in enumerate(items) if c and c[0] == key]})
+    except Exception:
+        pass
     return force_refresh("Transactions", "TransactionItems")
 
 def update_customer_details(cust_id, new_name, address, phone, notes, is_wholesale=None, tax_rate_override=None):
-    sh = get_sheet()
-    ws = sh.worksheet("Customers")
     try:
-        cell = ws.find(cust_id, in_column=1)
-        ws.update_cell(cell.row, 2, new_name)
-        ws.update_cell(cell.row, 4, phone)
-        ws.update_cell(cell.row, 6, address)
-        ws.update_cell(cell.row, 7, notes)
-        if is_wholesale is not None or tax_rate_override is not None:
-            headers = ws.row_values(1)
-            if is_wholesale is not None:
-                if 'IsWholesale' not in headers:
-                    ws.update_cell(1, len(headers) + 1, 'IsWholesale')
-                    headers.append('IsWholesale')
-                ws.update_cell(cell.row, headers.index('IsWholesale') + 1, "TRUE" if is_wholesale else "FALSE")
-            if tax_rate_override is not None:
-                if 'TaxRate' not in headers:
-                    ws.update_cell(1, len(headers) + 1, 'TaxRate')
-                    headers.append('TaxRate')
-                val = str(tax_rate_override) if tax_rate_override else ""
-                ws.update_cell(cell.row, headers.index('TaxRate') + 1, val)
+        headers, ids = _fetch(("Customers", "1:1"), ("Customers", "A:A"))
+        headers = list(headers[0]) if headers else []
+        row = _find(ids, cust_id)
+        if row is None:
+            return False
+        cells = [("Customers", row, 2, new_name), ("Customers", row, 4, phone),
+                 ("Customers", row, 6, address), ("Customers", row, 7, notes)]
+        for head, value, wanted in (
+                ('IsWholesale', "TRUE" if is_wholesale else "FALSE", is_wholesale is not None),
+                ('TaxRate', str(tax_rate_override) if tax_rate_override else "",
+                 tax_rate_override is not None)):
+            if not wanted:
+                continue
+            if head not in headers:
+                headers.append(head)
+                cells.append(("Customers", 1, len(headers), head))
+            cells.append(("Customers", row, headers.index(head) + 1, value))
+        _write(cells)
         return force_refresh("Customers")
     except Exception: return False
 
 def delete_customer(cust_id):
-    sh = get_sheet()
-    ws = sh.worksheet("Customers")
     try:
-        ws.delete_rows(ws.find(cust_id, in_column=1).row)
+        row = _find(_fetch(("Customers", "A:A"))[0], cust_id)
+        if row is None:
+            return False
+        _delete({"Customers": [row]})
         return force_refresh("Customers")
     except: return False
 
 def sell_gift_certificate(giver_id, receiver_id, amount, pay_method):
-    sh = get_sheet()
-    
     # 1. Invoice ID & Timestamp
     tz = pytz.timezone("America/Los_Angeles")
     date_now = datetime.now(tz)
-    
-    ws_set = sh.worksheet("Settings")
+
+    settings, cust_ids, names, credits = _fetch(
+        ("Settings", "A:B"), ("Customers", "A:A"), ("Customers", "B:B"), ("Customers", "H:H"))
+    invoice_id, counter = _next_invoice(settings, date_now)
+    cells, undo = [], []
+    if counter:
+        tab, row, col, current_id = counter
+        cells.append((tab, row, col, current_id + 1))
+        undo.append(counter)
+
+    # 2. Counter and the receiver's credit, in one write
+    receiver = _find(cust_ids, receiver_id)
+    receiver_name = _at(names, receiver) if receiver else "Unknown"
+    if receiver:
+        try:
+            curr = float(_at(credits, receiver) or 0)
+            cells.append(("Customers", receiver, 8, curr + amount))
+            undo.append(("Customers", receiver, 8, curr))
+        except ValueError: pass
+    _write(cells)
+
+    # 3. The sale itself; same rollback as commit_sale()
     try:
-        cell = ws_set.find("NextInvoiceID", in_column=1)
-        current_id = int(ws_set.cell(cell.row, cell.col + 1).value)
-        ws_set.update_cell(cell.row, cell.col + 1, current_id + 1)
-        invoice_id = str(current_id)
-    except: 
-        invoice_id = f"INV-{date_now.strftime('%H%M%S')}"
-
-    ws_cust = sh.worksheet("Customers")
-    try: receiver_name = ws_cust.cell(ws_cust.find(receiver_id, in_column=1).row, 2).value
-    except: receiver_name = "Unknown"
-
-    sh.worksheet("Transactions").append_row([
-        invoice_id, date_now.strftime("%Y-%m-%d %H:%M:%S"), amount, pay_method, 
-        giver_id, "Paid", date_now.strftime("%Y-%m-%d"), 0.0, "FALSE"
-    ])
-    sh.worksheet("TransactionItems").append_row([
+        _append("Transactions", [[
+            invoice_id, date_now.strftime("%Y-%m-%d %H:%M:%S"), amount, pay_method,
+            giver_id, "Paid", date_now.strftime("%Y-%m-%d"), 0.0, "FALSE"
+        ]])
+    except Exception:
+        try: _write(undo)
+        except Exception: pass
+        raise
+    _append("TransactionItems", [[
         invoice_id, "GIFT-CERT", 1, amount, f"Gift Certificate for {receiver_name}"
-    ])
-    
-    try:
-        cell = ws_cust.find(receiver_id, in_column=1)
-        curr = float(ws_cust.cell(cell.row, 8).value or 0)
-        ws_cust.update_cell(cell.row, 8, curr + amount)
-    except: pass
+    ]])
 
     force_refresh("Transactions", "TransactionItems", "Customers", "Settings")
     return invoice_id
 
 def update_settings(updates_dict):
-    sh = get_sheet()
-    ws = sh.worksheet("Settings")
-    data = ws.get_all_records()
-    key_map = {row['Key']: i + 2 for i, row in enumerate(data)}
-    for key, new_val in updates_dict.items():
-        if key in key_map: ws.update_cell(key_map[key], 2, new_val)
-        else: ws.append_row([key, new_val])
+    keys = _fetch(("Settings", "A:A"))[0]
+    key_map = {c[0]: i + 1 for i, c in enumerate(keys) if i and c}
+    _write([("Settings", key_map[key], 2, new_val)
+            for key, new_val in updates_dict.items() if key in key_map])
+    new = [[key, new_val] for key, new_val in updates_dict.items() if key not in key_map]
+    if new:
+        _append("Settings", new)
     return force_refresh("Settings")
 
 def add_expense(date, category, amount, description):
-    sh = get_sheet()
-    ws = sh.worksheet("Expenses")
-    ws.append_row([str(date), category, f"{float(amount):.3f}", description])
+    _append("Expenses", [[str(date), category, f"{float(amount):.3f}", description]])
     return force_refresh("Expenses")
-
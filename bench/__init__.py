@@ -0,0 +1,5 @@
+"""Offline benchmarks and the stand-ins they run against.
+
+Nothing here is imported by the app. Run modules as scripts from the repo
+root, e.g. `python -m bench.sheets_calls`.
+"""
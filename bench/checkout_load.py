@@ -0,0 +1,194 @@
+"""Many registers ringing up the same few SKUs at once.
+
+    DATABASE_URL=... python -m bench.checkout_load                  # 1, 4, 16 registers
+    DATABASE_URL=... python -m bench.checkout_load --registers 8,32 --seconds 30
+    DATABASE_URL=... python -m bench.checkout_load --pool 4         # the app's pool
+
+A retreat weekend: the kiosk, the admin POS and the web POS all selling the
+same popular items. Each simulated register is a thread calling
+backend.commit_sale() in a loop for --seconds. A cart is --lines lines, and
+each line is one of --hot-skus hot SKUs with probability --hot-share,
+otherwise any stocked product. Lines are in the order they were scanned, not
+sorted, just like a real cart. record_sale() updates products.stock_qty one
+line at a time, so two carts holding the same hot SKUs queue on those rows,
+and carts holding them in opposite orders can deadlock.
+
+It runs against a scratch database built the way bench/suite.py builds one,
+at --scale, and dropped afterwards; no sale lands in the database in
+DATABASE_URL. Every register count gets the same database, one after the
+other.
+
+Reported per register count:
+
+  sales/s       committed sales per second, all registers together
+  p50 p95 p99   commit_sale() latency, committed sales only
+  lock wait     time backends spent in a Lock wait, sampled from
+                pg_stat_activity every 10ms, summed over backends
+  pool wait     time spent waiting for a connection from backend's pool
+  deadlock, serialization, other
+                failed sales, by error class
+
+Then the ledger is checked: for every hot SKU, the stock_qty change must equal
+the sum of its stock_moves. A lost update shows up there.
+
+--pool sets backend.POOL_MAX (the DB_POOL_MAX environment variable in the
+app). The default, 0, gives each register its own connection, which
+measures the database. --pool 4 measures the app as deployed, with sales
+also queueing on the pool.
+"""
+import argparse
+import collections
+import os
+import random
+import sys
+import threading
+import time
+import warnings
+
+import psycopg
+from psycopg.conninfo import conninfo_to_dict
+
+from bench import suite
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import backend as db     # noqa: E402
+
+SAMPLE = 0.01
+
+
+def _pct(xs, p):
+    return xs[min(len(xs) - 1, round(p / 100 * (len(xs) - 1)))] * 1000 if xs else float("nan")
+
+
+def _error(e):
+    if isinstance(e, psycopg.errors.DeadlockDetected):
+        return "deadlock"
+    if isinstance(e, psycopg.errors.SerializationFailure):
+        return "serialization"
+    return "other"
+
+
+def _sampler(url, stop, out):
+    """Sums backends in a Lock wait, in seconds, until `stop` is set."""
+    with psycopg.connect(url, autocommit=True) as conn:
+        while not stop.is_set():
+            n = conn.execute("""SELECT count(*) FROM pg_stat_activity
+                                 WHERE datname = current_database()
+                                   AND wait_event_type = 'Lock'""").fetchone()[0]
+            out["lock_wait_s"] += n * SAMPLE
+            out["lock_wait_peak"] = max(out["lock_wait_peak"], n)
+            stop.wait(SAMPLE)
+
+
+def _register(k, args, hot, stocked, deadline, lat, errors):
+    rnd = random.Random(args.seed * 1000 + k)
+    while time.monotonic() < deadline:
+        cart = []
+        for _ in range(args.lines):
+            sku, name, price = rnd.choice(hot if rnd.random() < args.hot_share else stocked)
+            cart.append({"sku": sku, "name": name, "qty": rnd.randint(1, 3), "price": price})
+        t0 = time.perf_counter()
+        try:
+            db.commit_sale(cart, sum(i["qty"] * i["price"] for i in cart), 0.0, "Guest", "Cash", False)
+        except Exception as e:
+            errors[_error(e)] += 1
+        else:
+            lat.append(time.perf_counter() - t0)
+
+
+def _stock(url, skus):
+    with psycopg.connect(url) as conn:
+        return dict(conn.execute("""
+            SELECT p.sku, p.stock_qty - COALESCE(sum(m.delta), 0)
+              FROM products p LEFT JOIN stock_moves m USING (sku)
+             WHERE p.sku = ANY(%s) GROUP BY p.sku, p.stock_qty""", (skus,)).fetchall())
+
+
+def _deadlocks(url):
+    with psycopg.connect(url, autocommit=True) as conn:
+        return conn.execute("""SELECT deadlocks FROM pg_stat_database
+                                WHERE datname = current_database()""").fetchone()[0]
+
+
+def level(url, n, args, hot, stocked):
+    db.POOL_MAX = args.pool or n
+    suite._reset_backend()
+    db.get_pool().wait()
+    lat, errors, server = [], collections.Counter(), {"lock_wait_s": 0.0, "lock_wait_peak": 0}
+    before = _deadlocks(url)
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sampler, args=(url, stop, server))
+    sampler.start()
+    deadline = time.monotonic() + args.seconds
+    t0 = time.perf_counter()
+    regs = [threading.Thread(target=_register, args=(k, args, hot, stocked, deadline, lat, errors))
+            for k in range(n)]
+    for t in regs:
+        t.start()
+    for t in regs:
+        t.join()
+    wall = time.perf_counter() - t0
+    stop.set()
+    sampler.join()
+    pool = db.get_pool().get_stats()
+    after = _deadlocks(url)
+    lat.sort()
+    return {"registers": n, "pool": db.POOL_MAX, "sales": len(lat),
+            "sales_s": len(lat) / wall, "p50": _pct(lat, 50), "p95": _pct(lat, 95),
+            "p99": _pct(lat, 99), "lock_wait_s": server["lock_wait_s"],
+            "lock_wait_peak": server["lock_wait_peak"],
+            "pool_wait_s": pool.get("requests_wait_ms", 0) / 1000,
+            "deadlock": errors["deadlock"], "serialization": errors["serialization"],
+            "other": errors["other"], "server_deadlocks": after - before}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--registers", default="1,4,16", type=lambda s: [int(x) for x in s.split(",")])
+    ap.add_argument("--seconds", default=10.0, type=float)
+    ap.add_argument("--lines", default=5, type=int)
+    ap.add_argument("--hot-skus", default=5, type=int)
+    ap.add_argument("--hot-share", default=0.5, type=float)
+    ap.add_argument("--pool", default=0, type=int)
+    ap.add_argument("--scale", default=1.0, type=float)
+    ap.add_argument("--seed", default=0, type=int)
+    args = ap.parse_args()
+    warnings.simplefilter("ignore")
+
+    base = suite.load._url()
+    print(f"building a {args.scale:g}x scratch database...", flush=True)
+    suite.build(base, args.scale, args.seed)
+    url = suite._scratch(base)
+    try:
+        with psycopg.connect(url) as conn:
+            rows = conn.execute("""SELECT sku, name, price::float FROM products
+                                    WHERE active AND stock_qty > 0 ORDER BY sku""").fetchall()
+        rnd = random.Random(args.seed)
+        hot = rnd.sample(rows, args.hot_skus)
+        skus = [sku for sku, _, _ in hot]
+        drift = _stock(url, skus)
+
+        print(f"{len(rows):,} stocked products, hot: {', '.join(skus)}\n")
+        print(f"{'registers':>9} {'pool':>4} {'sales/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+              f" {'lock wait':>10} {'pool wait':>10} {'deadlock':>8} {'serial.':>7} {'other':>5}")
+        for n in args.registers:
+            r = level(url, n, args, hot, rows)
+            print(f"{r['registers']:>9} {r['pool']:>4} {r['sales_s']:>8.1f} {r['p50']:>6.1f}ms"
+                  f" {r['p95']:>6.1f}ms {r['p99']:>6.1f}ms {r['lock_wait_s']:>9.2f}s"
+                  f" {r['pool_wait_s']:>9.2f}s {r['deadlock']:>8} {r['serialization']:>7}"
+                  f" {r['other']:>5}")
+            if r["server_deadlocks"] != r["deadlock"]:
+                print(f"{'':>9} (the server counted {r['server_deadlocks']} deadlocks)")
+
+        lost = {sku: d for sku, d in _stock(url, skus).items() if d != drift[sku]}
+        print(f"\nledger: {'stock_qty matches stock_moves for every hot SKU' if not lost else lost}")
+        if lost:
+            sys.exit(1)
+    finally:
+        suite._reset_backend()
+        suite._admin(base, f'DROP DATABASE IF EXISTS "{conninfo_to_dict(url)["dbname"]}" WITH (FORCE)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""How long a click in the admin Checkout takes to rerun.
+
+    DATABASE_URL=... python -m bench.checkout_reruns            # this Home.py
+    DATABASE_URL=... python -m bench.checkout_reruns old/Home.py
+
+Drives Home.py through streamlit.testing's AppTest against a real database —
+a local Postgres loaded with db/load.py from db/synthetic.py is the intended
+target — and times each interaction a cashier makes: pick an item, add it,
+change freight, remove a line, pick a payment method.
+
+AppTest always reruns the whole script, so two numbers are taken from every
+run. "script" is the execution of Home.py itself (AppTest's own recompile of
+the file is left out, as a real server caches it). "fragment" is how long the
+st.fragment the widget sits in took inside that run, which is what a browser
+click now pays: Streamlit reruns just that function. A Home.py without
+fragments has only the first column.
+"""
+import collections
+import functools
+import os
+import statistics
+import sys
+import time
+
+import streamlit as st
+from streamlit.navigation import page
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPEAT = 7
+
+TIMES = collections.defaultdict(list)
+
+
+def _timed_exec(code, env):
+    t0 = time.perf_counter()
+    try:
+        exec(code, env)  # noqa: S102
+    finally:
+        TIMES["script"].append(time.perf_counter() - t0)
+
+
+_fragment = st.fragment
+
+
+def _timed_fragment(func=None, *, run_every=None):
+    if func is None:
+        return functools.partial(_timed_fragment, run_every=run_every)
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            TIMES[func.__name__].append(time.perf_counter() - t0)
+    return _fragment(run, run_every=run_every)
+
+
+def _button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def _pick(at, n):
+    sb = at.selectbox(key="checkout_item_search")
+    return sb.set_value(sb.options[n])
+
+
+# (label, what a browser click reruns now, action)
+STEPS = [
+    ("pick an item", "_checkout", lambda at, n: _pick(at, 10 + n)),
+    ("add it to the cart", "_checkout", lambda at, n: _button(at, "Add to Cart").click()),
+    ("change freight", "_checkout_cart",
+     lambda at, n: at.number_input(key="freight_charge").set_value(float(n + 1))),
+    ("pick a payment method", "_checkout_payment",
+     lambda at, n: next(s for s in at.selectbox if s.label == "Payment").set_value(
+         ["Card", "Cash"][n % 2])),
+    ("remove a line", "_checkout_cart", lambda at, n: at.button(key="del_0").click()),
+]
+
+
+def main():
+    script = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "Home.py"))
+    sys.path.insert(0, os.path.dirname(script))
+    page.exec = _timed_exec
+    st.fragment = _timed_fragment
+
+    at = AppTest.from_file(script, default_timeout=120)
+    at.session_state["admin_authenticated"] = True
+    at.run()
+    menu = at.sidebar.radio[0]
+    at = menu.set_value(next(o for o in menu.options if "Checkout" in o)).run()
+    # Something in the cart, so the cart and payment panels are drawn.
+    for n in range(3):
+        _pick(at, n).run()
+        _button(at, "Add to Cart").click().run()
+    if at.exception:
+        raise SystemExit(at.exception[0].message)
+
+    script_ms, frag_ms = collections.defaultdict(list), collections.defaultdict(list)
+    for n in range(REPEAT):
+        # One round of the cashier's moves leaves the cart as it found it.
+        for label, frag, step in STEPS:
+            TIMES.clear()
+            step(at, n).run()
+            if at.exception:
+                raise SystemExit(f"{label}: {at.exception[0].message}")
+            script_ms[label].append(sum(TIMES["script"]) * 1000)
+            if TIMES[frag]:
+                frag_ms[label].append(TIMES[frag][-1] * 1000)
+
+    print(f"{os.path.relpath(script)}, median of {REPEAT}\n")
+    print(f"{'interaction':<24} {'script':>9} {'fragment':>9}  reruns")
+    for label, frag, _ in STEPS:
+        f = f"{statistics.median(frag_ms[label]):>7.1f}ms" if frag_ms[label] else f"{'-':>9}"
+        print(f"{label:<24} {statistics.median(script_ms[label]):>7.1f}ms {f}  "
+              f"{frag if frag_ms[label] else 'Home.py'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""An offline stand-in for the slice of gspread the Sheets backend uses.
+
+Each worksheet is a list of rows of strings, header first, which is what the
+Sheets API stores and hands back. Every method that costs one HTTP request
+against the real API costs one entry in `Spreadsheet.calls` here, tagged
+"read" or "write" the way Google's per-minute quotas count them ("drive" for
+the modifiedTime lookup, which Sheets doesn't bill). That makes a
+backend function's price countable without a network, a service account, or
+a quota to burn.
+
+Only the behaviour the backend relies on is reproduced: A1 ranges, appends,
+row deletion, find() returning None on a miss, get_all_records() numericising
+like gspread does. Formatting, formulas and value render options are not.
+"""
+import re
+
+from gspread.cell import Cell
+from gspread.utils import numericise_all, rowcol_to_a1, to_records
+
+_RANGE = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+def _col(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def _bounds(a1):
+    """(row1, col1, row2, col2), 1-based and inclusive; None for an open end."""
+    m = _RANGE.match(a1.upper())
+    c1, r1, c2, r2 = m.group(1), m.group(2), m.group(3), m.group(4)
+    if m.group(3) is None and m.group(4) is None:
+        c2, r2 = c1, r1
+    return (int(r1) if r1 else 1, _col(c1) if c1 else 1,
+            int(r2) if r2 else None, _col(c2) if c2 else None)
+
+
+def _cell(v):
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    return "" if v is None else str(v)
+
+
+def _split(name):
+    """"'Tab'!A1:B2" -> ("Tab", "A1:B2"); a bare "'Tab'" is the whole sheet."""
+    tab, bang, a1 = name.rpartition("!")
+    return (tab.strip("'"), a1) if bang else (name.strip("'"), "")
+
+
+class Spreadsheet:
+    def __init__(self, tabs, quota=None):
+        """`tabs` maps title -> rows, header row first. `quota`, if given, is
+        anything with take(kind): every call passes through it first."""
+        self.quota = quota
+        self.calls = []
+        self.revision = 0
+        self._sheets = {title: Worksheet(self, i, title, [list(map(_cell, r)) for r in rows])
+                        for i, (title, rows) in enumerate(tabs.items())}
+
+    def _call(self, kind, what):
+        if self.quota is not None:
+            self.quota.take(kind)
+        self.calls.append((kind, what))
+        if kind == "write":
+            self.revision += 1
+
+    def count(self, kind=None):
+        return sum(1 for k, _ in self.calls if kind in (None, k))
+
+    def get_lastUpdateTime(self):
+        self.calls.append(("drive", "get_lastUpdateTime"))
+        return f"revision-{self.revision}"
+
+    def worksheet(self, title):
+        self._call("read", "worksheet")     # a metadata fetch, every time
+        return self._sheets[title]
+
+    def values_batch_get(self, ranges, params=None):
+        self._call("read", "values_batch_get")
+        out = []
+        for name in ranges:
+            tab, a1 = _split(name)
+            out.append({"range": name, "values": self._sheets[tab]._get(a1)})
+        return {"valueRanges": out}
+
+    def values_batch_update(self, body=None):
+        self._call("write", "values_batch_update")
+        for d in body["data"]:
+            tab, a1 = _split(d["range"])
+            self._sheets[tab]._put(a1, d["values"])
+        return {}
+
+    def values_append(self, range, params, body):
+        self._call("write", "values_append")
+        tab, _ = _split(range)
+        self._sheets[tab].rows.extend(list(map(_cell, v)) for v in body["values"])
+        return {}
+
+    def batch_update(self, body):
+        self._call("write", "batch_update")
+        by_id = {ws.id: ws for ws in self._sheets.values()}
+        for req in body["requests"]:
+            dim = req["deleteDimension"]["range"]
+            del by_id[dim["sheetId"]].rows[dim["startIndex"]:dim["endIndex"]]
+        return {}
+
+
+class Worksheet:
+    def __init__(self, spreadsheet, sheet_id, title, rows):
+        self.spreadsheet, self.id, self.title, self.rows = spreadsheet, sheet_id, title, rows
+
+    def _call(self, kind, what):
+        self.spreadsheet._call(kind, what)
+
+    # -- storage, free of charge --------------------------------------------
+    def _get(self, a1):
+        r1, c1, r2, c2 = _bounds(a1)
+        r2 = len(self.rows) if r2 is None else r2
+        out = []
+        for row in self.rows[r1 - 1:r2]:
+            cells = row[c1 - 1:c2] if c2 else row[c1 - 1:]
+            while cells and cells[-1] == "":
+                cells = cells[:-1]
+            out.append(cells)
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    def _put(self, a1, values):
+        r1, c1, _, _ = _bounds(a1)
+        for i, vals in enumerate(values):
+            r = r1 - 1 + i
+            while len(self.rows) <= r:
+                self.rows.append([])
+            row = self.rows[r]
+            for j, v in enumerate(vals):
+                c = c1 - 1 + j
+                while len(row) <= c:
+                    row.append("")
+                row[c] = _cell(v)
+
+    # -- the API ------------------------------------------------------------
+    def get_all_values(self):
+        self._call("read", "get_all_values")
+        return [list(r) for r in self.rows]
+
+    def get_all_records(self):
+        self._call("read", "get_all_records")
+        if not self.rows:
+            return []
+        width = len(self.rows[0])
+        values = [(r + [""] * width)[:width] for r in self.rows[1:]]
+        return to_records(self.rows[0], [numericise_all(v) for v in values])
+
+    def row_values(self, row):
+        self._call("read", "row_values")
+        return self._get(f"A{row}:{row}")[0] if len(self.rows) >= row else []
+
+    def col_values(self, col):
+        self._call("read", "col_values")
+        return [r[col - 1] if len(r) >= col else "" for r in self.rows]
+
+    def find(self, query, in_column=None):
+        self._call("read", "find")
+        for i, row in enumerate(self.rows):
+            for j, v in enumerate(row):
+                if (in_column is None or j + 1 == in_column) and v == query:
+                    return Cell(i + 1, j + 1, v)
+        return None
+
+    def cell(self, row, col):
+        self._call("read", "cell")
+        got = self._get(rowcol_to_a1(row, col))
+        return Cell(row, col, got[0][0] if got and got[0] else "")
+
+    def update_cell(self, row, col, value):
+        self._call("write", "update_cell")
+        self._put(rowcol_to_a1(row, col), [[value]])
+
+    def update(self, values=None, range_name=None, **kw):
+        self._call("write", "update")
+        self._put(range_name or "A1", values)
+
+    def batch_update(self, data, **kw):
+        self._call("write", "batch_update")
+        for d in data:
+            self._put(d["range"], d["values"])
+
+    def batch_clear(self, ranges):
+        self._call("write", "batch_clear")
+        for a1 in ranges:
+            r1, c1, r2, c2 = _bounds(a1)
+            for r in range(r1, (r2 or len(self.rows)) + 1):
+                self._put(rowcol_to_a1(r, c1), [[""] * ((c2 or c1) - c1 + 1)])
+
+    def append_row(self, values, **kw):
+        self._call("write", "append_row")
+        self.rows.append(list(map(_cell, values)))
+
+    def append_rows(self, values, **kw):
+        self._call("write", "append_rows")
+        self.rows.extend(list(map(_cell, v)) for v in values)
+
+    def delete_rows(self, start, end=None):
+        self._call("write", "delete_rows")
+        del self.rows[start - 1:end or start]
+
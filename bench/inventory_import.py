@@ -0,0 +1,59 @@
+"""How long a vendor catalogue takes to go through the Bulk Import tab.
+
+    DATABASE_URL=... python -m bench.inventory_import            # 50,000 rows
+    DATABASE_URL=... python -m bench.inventory_import 200000
+
+Builds a CSV the way a vendor sends one: every product already in the
+database, a tenth of them with a new price and a new shelf count, then new
+SKUs up to the row count. It goes through backend.import_inventory() with
+dry_run, so the whole pipeline runs — chunked validation, COPY, the merge,
+the stock_moves — and is then rolled back. The database is left as it was.
+"""
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import backend     # noqa: E402
+
+
+def catalogue(rows):
+    inv = backend.snapshot()["inventory"]
+    cur = pd.DataFrame({"SKU": inv["SKU"], "Name": inv["Name"], "Price": inv["Price"],
+                        "StockQty": inv["StockQty"], "Vendor": inv["Vendor"],
+                        "Category": inv["Category"]})
+    bump = cur.index % 10 == 0
+    cur.loc[bump, "Price"] = cur.loc[bump, "Price"].astype(float) + 0.25
+    cur.loc[bump, "StockQty"] = cur.loc[bump, "StockQty"] + 12
+    n = max(0, rows - len(cur))
+    new = pd.DataFrame({"SKU": [f"CAT-{k:07d}" for k in range(n)],
+                        "Name": [f"Catalogue item {k}" for k in range(n)],
+                        "Price": [f"{1 + k % 400 / 4:.2f}" for k in range(n)],
+                        "StockQty": [k % 50 for k in range(n)],
+                        "Vendor": "Bench Supply Co.", "Category": "Notions"})
+    out = io.BytesIO()
+    pd.concat([cur, new], ignore_index=True).head(rows).to_csv(out, index=False)
+    return out
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    t0 = time.perf_counter()
+    csv = catalogue(rows)
+    print(f"{rows:,} rows, {len(csv.getvalue()) / 1e6:.1f} MB of CSV"
+          f" (built in {time.perf_counter() - t0:.1f}s)")
+    csv.seek(0)
+    r = backend.import_inventory(csv, dry_run=True)
+    if r["errors"]:
+        raise SystemExit(r["errors"][:5])
+    print(f"{r['inserted']:,} new, {r['updated']:,} updated, {r['unchanged']:,} unchanged,"
+          f" {r['moves']:,} stock moves")
+    print(f"{r['seconds']:.2f}s, {r['rows'] / r['seconds']:,.0f} rows/s (rolled back)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""What the admin app costs to start, and to open each page.
+
+    DATABASE_URL=... python -m bench.page_loads            # this Home.py
+    DATABASE_URL=... python -m bench.page_loads old/Home.py
+
+Two measurements. The first is `python -X importtime` over the imports at the
+top of Home.py, in a fresh interpreter that has already imported streamlit and
+pandas (every Streamlit server has, so they aren't ours to save): the total,
+and whether the heavy modules only some pages need — fpdf, smtplib and the
+email package, streamlit_pdf_viewer — are among them.
+
+The second drives Home.py through streamlit.testing's AppTest against a real
+database, the way bench/checkout_reruns.py does, and times the script: the
+cold first run of a fresh process, the first visit to each page, and the
+median of REPEAT reruns of it after that.
+"""
+import ast
+import collections
+import os
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+from streamlit.navigation import page
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPEAT = 7
+PAGES = ["Dashboard", "Inventory", "Stocktake", "Checkout", "Customers", "Financials", "Settings"]
+HEAVY = ["fpdf", "smtplib", "email.mime", "streamlit_pdf_viewer"]
+MARK = "-- Home.py imports --"
+
+TIMES = collections.defaultdict(list)
+
+
+def _timed_exec(code, env):
+    t0 = time.perf_counter()
+    try:
+        exec(code, env)  # noqa: S102
+    finally:
+        TIMES["script"].append(time.perf_counter() - t0)
+
+
+def _top_imports(script):
+    tree = ast.parse(open(script, encoding="utf-8").read())
+    return [ast.unparse(n) for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+
+
+def importtime(script):
+    """{module: (self ms, cumulative ms)} for what Home.py's imports load past
+    streamlit and pandas."""
+    code = "\n".join(["import streamlit, pandas, sys", f"sys.stderr.write({MARK!r} + '\\n')",
+                      *_top_imports(script)])
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=os.path.dirname(script),
+                         capture_output=True, text=True, check=True).stderr
+    mods = {}
+    for line in out.split(MARK + "\n", 1)[1].splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            mods[name.strip()] = (int(self_us) / 1000, int(cum_us) / 1000)
+    return mods
+
+
+def _menu(at, name):
+    menu = at.sidebar.radio[0]
+    return menu.set_value(next(o for o in menu.options if name in o))
+
+
+def _run(at, label):
+    TIMES.clear()
+    at.run()
+    if at.exception:
+        raise SystemExit(f"{label}: {at.exception[0].message}")
+    return sum(TIMES["script"]) * 1000
+
+
+def main():
+    script = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "Home.py"))
+    mods = importtime(script)
+    total = sum(own for own, _ in mods.values())
+    print(f"{os.path.relpath(script)}\n\nstartup imports past streamlit+pandas: {total:.1f}ms"
+          f" over {len(mods)} modules")
+    for name in HEAVY:
+        print(f"  {name:<22} {f'{mods[name][1]:.1f}ms' if name in mods else 'not loaded'}")
+
+    warnings.simplefilter("ignore")     # the pages' pandas chatter, once per rerun
+    sys.path.insert(0, os.path.dirname(script))
+    page.exec = _timed_exec
+    at = AppTest.from_file(script, default_timeout=120)
+    at.session_state["admin_authenticated"] = True
+    print(f"\ncold first run (Dashboard): {_run(at, 'cold'):.1f}ms\n")
+    print(f"{'page':<12} {'first visit':>11} {'rerun':>9}   median of {REPEAT}")
+    for name in PAGES:
+        _menu(at, name)
+        first = _run(at, name)
+        again = statistics.median(_run(at, name) for _ in range(REPEAT))
+        print(f"{name:<12} {first:>9.1f}ms {again:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""Every SQL statement in backend.py, EXPLAINed against a big shop.
+
+    DATABASE_URL=... python -m bench.plans                # 100x the shop
+    DATABASE_URL=... python -m bench.plans --scale 10 --keep
+    DATABASE_URL=... python -m bench.plans --reuse -v     # the kept one, with plans
+
+backend.py leans on the primary keys and the indexes under the foreign keys,
+and nothing said they were actually used. A plan that quietly turns into a Seq Scan costs nothing at 1x
+and a checkout's worth of time at 100x. This builds the scratch database the
+way bench/suite.py does, at --scale, and runs each statement under
+EXPLAIN (ANALYZE, BUFFERS) with realistic parameters, every one inside a
+savepoint that is rolled back, so nothing it inserts or deletes stays.
+
+The statements are read out of backend.py itself: every string literal passed
+to _q(), _x(), cur.execute() or cur.copy(). Each one must match exactly one
+entry in CHECKS below, which says what parameters to run it with, which
+tables it may read with a sequential scan and how many shared buffers (hits +
+reads) it may touch. A new query without a check fails, and so does a check
+whose query is gone; add the entry when you add the query.
+
+A statement fails when
+
+  - a Seq Scan appears on a table its check doesn't allow. The plan is walked
+    for Seq Scan nodes, and pg_stat_xact_user_tables is compared before and
+    after, which also catches scans the plan doesn't show: foreign-key checks
+    and cascades, and everything inside record_sale();
+  - its plan's shared buffers exceed the check's budget. Budgets are on the
+    lookups, which should cost a few index pages at any scale; whole-table
+    reads have none;
+  - it errors.
+
+record_sale() runs under EXPLAIN as a whole, but a PL/pgSQL body's own
+statements don't appear in its plan, and auto_explain (which would log them)
+isn't something we can count on being installed. So its statements are
+mirrored in RECORD_SALE with the function's variables as parameters, and each
+mirror's text must still be in pg_get_functiondef('record_sale') — if the
+function changes, this fails with "record_sale changed" until the mirror does.
+Postgres may switch a function's statements to a generic plan after five
+calls; the mirrors are planned for their parameters, which is what a fresh
+session gets.
+
+Exits 1 on any failure, so it can gate a migration or a backend.py change.
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import sys
+import time
+import warnings
+
+import psycopg
+from psycopg.conninfo import conninfo_to_dict
+
+from bench import suite
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend.py")
+SQL_CALLS = {"_q", "_x", "execute", "copy"}
+
+# Per-statement lookups: a btree descent or two plus the heap page, and the
+# foreign-key checks' own descents for writes. Generous, so that only a
+# change of plan trips them, not another level in an index.
+POINT = 40
+WRITE = 80
+
+
+def _norm(sql):
+    return " ".join(sql.split())
+
+
+def _check(fn, match, params=None, seq=(), buffers=None, skip=None):
+    return {"fn": fn, "match": match, "params": params or (lambda s: ()),
+            "seq": set(seq), "buffers": buffers, "skip": skip}
+
+
+def _cart(skus):
+    return json.dumps([{"sku": k, "description": k, "qty": 1, "unit_price": 9.5} for k in skus])
+
+
+CHECKS = [
+    # The snapshot re-reads whole tables; a Seq Scan is the right plan.
+    _check("_read", "FROM products ORDER BY sku", seq={"products"}),
+    _check("_read", "FROM invoices ORDER BY sold_at", seq={"invoices"}),
+    _check("_read", "FROM invoice_lines ORDER BY invoice_id, id", seq={"invoice_lines"}),
+    _check("_read", "LEFT JOIN customer_stats s", seq={"customers", "customer_stats"}),
+    _check("_read", "FROM settings ORDER BY key", seq={"settings"}),
+    _check("_read", "FROM expenses ORDER BY spent_on DESC", seq={"expenses"}),
+    _check("_read", "FROM sales_months m", seq={"sales_months", "sales_archive"}),
+    _check("check_integrity", "HAVING count(*)>1", seq={"customers", "products"}),
+    _check("lookup_sku", "WHERE sku = %s", lambda s: (s["sku"],), buffers=POINT),
+    _check("invoice", "SELECT 1 FROM invoices WHERE id = %s", lambda s: (s["invoice"],), buffers=POINT),
+    _check("invoice", "FROM archived_invoices WHERE id", lambda s: (s["invoice"],), buffers=POINT),
+    # An archived year is one row; its arrays are expanded in memory.
+    _check("_archived_year", "NULL::invoices", lambda s: (s["year"],), buffers=POINT),
+    _check("_archived_year", "NULL::invoice_lines", lambda s: (s["year"],), buffers=POINT),
+    _check("customer_history", "FROM archived_invoices WHERE customer_id",
+           lambda s: (s["customer"],), buffers=POINT),
+    _check("archive_year", "archive_sales_year", skip="DDL; detaches and drops a year"),
+    _check("restore_year", "restore_sales_year", skip="DDL; attaches a year"),
+    _check("_year_lock", "SET LOCAL lock_timeout", skip="a setting, no plan"),
+    _check("missing_sales_years", "to_regclass('stock_moves_'", skip="catalog lookup"),
+    _check("create_sales_year", "ensure_sales_year", skip="DDL; creates a year"),
+    # The stock ledger (012). stock_at reads every product and the newest
+    # checkpoint of each; a fresh build has never been checked, so its first
+    # reconcile compares everything.
+    _check("stock_at", "LEFT JOIN stock_at(%s)", lambda s: (s["sold_at"],),
+           seq={"products", "stock_checkpoints", "stock_moves"}),
+    _check("reconcile_stock", "FROM reconcile_stock()",
+           seq={"products", "stock_moves", "stock_drift", "stock_checks", "stock_check"}),
+    _check("stock_drift", "max(checked_at)", seq={"stock_checks"}, buffers=POINT),
+    _check("stock_drift", "FROM stock_drift d", seq={"stock_drift"}),
+    # Stocktakes (013). A handful of rows each, read whole.
+    _check("stocktakes", "FROM stocktakes s LEFT JOIN", seq={"stocktakes", "stocktake_counts"}),
+    _check("open_stocktake", "INSERT INTO stocktakes", lambda s: ("Plan Check",), buffers=WRITE),
+    _check("record_count", "INSERT INTO stocktake_counts",
+           lambda s: (4, "plans", s["stocktake"], s["sku"], True, True),
+           seq={"stocktakes"}, buffers=WRITE),
+    _check("stocktake_counts", "FROM stocktake_counts c JOIN products", lambda s: (s["stocktake"],),
+           seq={"stocktake_counts"}),
+    _check("apply_stocktake", "FROM apply_stocktake(%s)", lambda s: (s["stocktake"],),
+           seq={"stocktakes", "stocktake_counts"}),
+    _check("discard_stocktake", "DELETE FROM stocktakes", lambda s: (s["stocktake"],),
+           seq={"stocktakes", "stocktake_counts"}, buffers=WRITE),
+
+    _check("add_customer", "INSERT INTO customers",
+           lambda s: ("Plan Check", "plans@example.com", False), buffers=WRITE),
+    _check("add_inventory_item", "INSERT INTO products",
+           lambda s: ("PLAN-CHECK-1", "Plan check", 9.5, 3, 0, 0), buffers=WRITE),
+    _check("restock_item", "SET stock_qty = stock_qty + %s", lambda s: (5, s["sku"]), buffers=WRITE),
+    _check("restock_item", "SET cost=%s", lambda s: (4.25, s["sku"]), buffers=WRITE),
+    _check("restock_item", "INSERT INTO stock_moves", lambda s: (s["sku"], 5), buffers=WRITE),
+    _check("update_inventory_batch", "UPDATE products p SET name=%s",
+           lambda s: ("Renamed", 9.5, 10, 0, 0, True, s["sku"]), buffers=WRITE),
+    _check("import_inventory", "CREATE TEMP TABLE inventory_import", skip="DDL; run as setup"),
+    _check("import_inventory", "COPY inventory_import", skip="COPY; the rows are inserted as setup"),
+    _check("import_inventory", "LOCK TABLE products", skip="a lock, no plan"),
+    # An unanalyzed temp table of unknown size against all of products: the
+    # planner may hash-join, and for a 5,000-row import it should.
+    _check("import_inventory", "FROM inventory_import s WHERE",
+           seq={"inventory_import", "products"}),
+    _check("import_inventory", "WITH src AS", seq={"inventory_import", "products"}),
+
+    _check("commit_sale", "SELECT record_sale(",
+           lambda s: (s["customer"], _cart(s["skus"]), "card", "paid", 1.25, 0, False),
+           buffers=WRITE * 4),
+    _check("commit_sale", "SET due_date", lambda s: ("30 days", s["pending"]), buffers=WRITE),
+    _check("record_freight", "INSERT INTO invoice_lines", lambda s: (12.0, s["invoice"]), buffers=WRITE),
+    _check("record_freight", "SET freight=%s", lambda s: (12.0, 12.0, s["invoice"]), buffers=WRITE),
+    _check("mark_invoice_paid", "SET status='paid'", lambda s: (s["pending"],), buffers=WRITE),
+    # The cascade to invoice_lines and the SET NULLs in stock_moves, email_log
+    # and email_replies run as foreign-key triggers; the table stats see them.
+    # The mail tables are indexed on both keys but empty in a synthetic shop,
+    # and an empty table is always scanned.
+    _check("delete_invoice", "DELETE FROM invoices", lambda s: (s["invoice"],),
+           seq={"email_log", "email_replies"}, buffers=WRITE),
+    _check("update_customer_details", "UPDATE customers SET name=%s",
+           lambda s: ("Renamed", "", "", "", None, None, s["customer"]), buffers=WRITE),
+    _check("delete_customer", "DELETE FROM customers", lambda s: (s["idle_customer"],),
+           seq={"email_replies"}, buffers=WRITE),
+    _check("sell_gift_certificate", "SELECT name FROM customers", lambda s: (s["customer"],),
+           buffers=POINT),
+    _check("sell_gift_certificate", "SELECT record_sale(",
+           lambda s: (s["customer"], json.dumps([{"sku": None, "description": "Gift Certificate",
+                                                  "qty": 1, "unit_price": 25.0}]), "cash"),
+           buffers=WRITE * 2),
+    _check("sell_gift_certificate", "SET credit = credit + %s", lambda s: (25.0, s["customer"]),
+           buffers=WRITE),
+    _check("update_settings", "INSERT INTO settings", lambda s: ("Plan check", "1"), seq={"settings"}),
+    _check("add_expense", "INSERT INTO expenses",
+           lambda s: ("2024-01-01", "Supplies", 12.5, "plan check"), buffers=WRITE),
+
+    # Settings' Database tab: the statistics views, over catalogs only.
+    _check("_server_statements", "to_regclass", skip="statistics view"),
+    _check("_server_statements", "FROM pg_stat_statements", skip="statistics view"),
+    _check("database_health", "FROM pg_stat_user_tables", skip="statistics view"),
+    _check("database_health", "FROM pg_stat_user_indexes", skip="statistics view"),
+    _check("database_health", "FROM pg_stat_database", skip="statistics view"),
+]
+
+# record_sale()'s body, mirrored. `body` must appear, whitespace-normalised, in
+# pg_get_functiondef; `sql` is what runs, with the PL/pgSQL variables as %s.
+RECORD_SALE = [
+    {"name": "lock the cart's products",
+     "body": "PERFORM 1 FROM products WHERE sku = ANY (ARRAY(SELECT l->>'sku' FROM jsonb_array_elements(p_lines) l)) ORDER BY sku FOR NO KEY UPDATE;",
+     "sql": "SELECT 1 FROM products WHERE sku = ANY (ARRAY(SELECT l->>'sku' FROM jsonb_array_elements(%s::jsonb) l))"
+            " ORDER BY sku FOR NO KEY UPDATE",
+     "params": lambda s: (_cart(s["skus"]),)},
+    {"name": "insert the invoice",
+     "body": "INSERT INTO invoices (customer_id, status, payment, subtotal, discount, freight, tax, credit_applied, total, is_wholesale, paid_at)",
+     "sql": "INSERT INTO invoices (customer_id, status, payment, subtotal, discount, freight,"
+            " tax, credit_applied, total, is_wholesale, paid_at)"
+            " VALUES (%s, 'paid', 'card', 19, 0, 0, 1.25, 0, 20.25, false, now()) RETURNING id",
+     "params": lambda s: (s["customer"],)},
+    {"name": "insert the lines",
+     "body": "INSERT INTO invoice_lines (invoice_id, sold_at, sku, description, qty, unit_price) SELECT v_invoice_id, v_sold_at,",
+     "sql": "INSERT INTO invoice_lines (invoice_id, sold_at, sku, description, qty, unit_price)"
+            " SELECT %s, %s, NULLIF(l->>'sku', ''), l->>'description',"
+            " (l->>'qty')::numeric, (l->>'unit_price')::numeric"
+            " FROM jsonb_array_elements(%s::jsonb) WITH ORDINALITY AS t(l, n) ORDER BY n",
+     "params": lambda s: (s["invoice"], s["sold_at"], _cart(s["skus"]))},
+    {"name": "insert the stock moves",
+     "body": "INSERT INTO stock_moves (sku, delta, reason, invoice_id) SELECT l->>'sku',",
+     "sql": "INSERT INTO stock_moves (sku, delta, reason, invoice_id)"
+            " SELECT l->>'sku', -(l->>'qty')::numeric::integer, 'sale', %s"
+            " FROM jsonb_array_elements(%s::jsonb) WITH ORDINALITY AS t(l, n)"
+            " WHERE NULLIF(l->>'sku', '') IS NOT NULL ORDER BY n",
+     "params": lambda s: (s["invoice"], _cart(s["skus"]))},
+    {"name": "take the stock",
+     "body": "UPDATE products p SET stock_qty = p.stock_qty - (SELECT sum((l->>'qty')::numeric::integer)",
+     "sql": "UPDATE products p SET stock_qty = p.stock_qty - (SELECT sum((l->>'qty')::numeric::integer)"
+            " FROM jsonb_array_elements(%s::jsonb) l WHERE l->>'sku' = p.sku)"
+            " WHERE p.sku = ANY (ARRAY(SELECT l->>'sku' FROM jsonb_array_elements(%s::jsonb) l))",
+     "params": lambda s: (_cart(s["skus"]), _cart(s["skus"]))},
+    {"name": "spend store credit",
+     "body": "UPDATE customers SET credit = credit - round(p_credit, 2) WHERE id = p_customer_id;",
+     "sql": "UPDATE customers SET credit = credit - round(0, 2) WHERE id = %s",
+     "params": lambda s: (s["customer"],)},
+]
+
+
+def statements(path=BACKEND):
+    """[(function, line, sql)] for every SQL literal in backend.py, in file order."""
+    out = []
+    for fn in ast.walk(ast.parse(open(path).read())):
+        if not isinstance(fn, ast.FunctionDef):
+            continue
+        for node in ast.walk(fn):
+            if not (isinstance(node, ast.Call) and node.args):
+                continue
+            name = getattr(node.func, "id", None) or getattr(node.func, "attr", None)
+            arg = node.args[0]
+            if name not in SQL_CALLS:
+                continue
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                out.append((fn.name, node.lineno, _norm(arg.value)))
+            elif isinstance(arg, ast.JoinedStr):
+                out.append((fn.name, node.lineno, _norm(ast.unparse(arg))))
+    return sorted(out, key=lambda s: s[1])
+
+
+def _pair(stmts):
+    """Each statement with its one check; failures for anything unmatched."""
+    pairs, problems, used = [], [], set()
+    for fn, line, sql in stmts:
+        hits = [i for i, c in enumerate(CHECKS) if c["fn"] == fn and c["match"] in sql]
+        if len(hits) != 1:
+            problems.append(f"{fn}:{line} has {len(hits)} checks, needs 1: {sql[:70]}")
+            continue
+        used.add(hits[0])
+        pairs.append((f"{fn}:{line}", sql, CHECKS[hits[0]]))
+    problems += [f"check ({c['fn']}, {c['match']!r}) matches no statement in backend.py"
+                 for i, c in enumerate(CHECKS) if i not in used]
+    return pairs, problems
+
+
+def _samples(conn):
+    one = lambda sql: (conn.execute(sql).fetchone() or (None,))[0]     # noqa: E731
+    s = {
+        "sku": one("""SELECT sku FROM invoice_lines WHERE sku IS NOT NULL
+                       GROUP BY sku ORDER BY count(*) DESC LIMIT 1"""),
+        "customer": one("""SELECT customer_id FROM invoices WHERE customer_id IS NOT NULL
+                            GROUP BY customer_id ORDER BY count(*) DESC LIMIT 1"""),
+        "idle_customer": one("""SELECT id FROM customers c WHERE NOT EXISTS
+                                   (SELECT 1 FROM invoices i WHERE i.customer_id = c.id)
+                                 ORDER BY id LIMIT 1"""),
+        "invoice": one("""SELECT invoice_id FROM invoice_lines
+                           GROUP BY invoice_id ORDER BY count(*) DESC LIMIT 1"""),
+        "pending": one("SELECT id FROM invoices WHERE status = 'pending' ORDER BY id LIMIT 1"),
+        "skus": [r[0] for r in conn.execute(
+            "SELECT sku FROM products WHERE active ORDER BY sku DESC LIMIT 3")],
+    }
+    if s["idle_customer"] is None:      # every customer has bought something
+        s["idle_customer"] = conn.execute(
+            "INSERT INTO customers (id, name) VALUES ('C-plancheck', 'Plan Check') RETURNING id"
+        ).fetchone()[0]
+    if s["pending"] is None:
+        s["pending"] = s["invoice"]
+    s["sold_at"] = conn.execute("SELECT sold_at FROM invoices WHERE id = %s",
+                                (s["invoice"],)).fetchone()[0]
+    s["year"] = s["sold_at"].year - 1
+    s["stocktake"] = conn.execute(
+        "INSERT INTO stocktakes (name) VALUES ('Plan Check') RETURNING id").fetchone()[0]
+    conn.execute("""INSERT INTO stocktake_counts (stocktake_id, sku, counted, expected)
+                    SELECT %s, sku, stock_qty + 2, stock_qty FROM products WHERE sku = ANY(%s)""",
+                 (s["stocktake"], s["skus"] + [s["sku"]]))
+    return s
+
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _nodes(child)
+
+
+def _scans(conn):
+    return {r[0]: (r[1], r[2]) for r in conn.execute(
+        "SELECT relname, seq_scan, COALESCE(idx_scan, 0) FROM pg_stat_xact_user_tables")}
+
+
+def _relations(conn):
+    """Table -> (the table a check names, whether it has any pages). Partitions
+    answer to their partitioned table: a check says invoices, not
+    invoices_2026. A Seq Scan of an empty one — next year's, say — reads
+    nothing, and isn't held against the statement."""
+    return {name: (parent, size > 0) for name, parent, size in conn.execute("""
+        SELECT c.relname, COALESCE(p.relname, c.relname), pg_relation_size(c.oid)
+          FROM pg_class c
+          LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+          LEFT JOIN pg_class p ON p.oid = i.inhparent
+         WHERE c.relkind = 'r' AND c.relnamespace = 'public'::regnamespace""")}
+
+
+def explain(conn, sql, params, rels=None):
+    """Runs sql under EXPLAIN ANALYZE in a savepoint that's rolled back.
+    Once first, unmeasured: the app's pooled connections have long since
+    loaded the catalog pages and compiled record_sale, and a cold first call
+    would charge them to the statement."""
+    with conn.transaction(force_rollback=True):
+        conn.execute(sql, params)
+    before = _scans(conn)
+    with conn.transaction(force_rollback=True):
+        t0 = time.perf_counter()
+        doc = conn.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params).fetchone()[0]
+        ms = (time.perf_counter() - t0) * 1000
+    after = _scans(conn)
+    plan = doc[0]["Plan"]
+    nodes = list(_nodes(plan))
+    seq = ({n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"}
+           | {t for t, (n, _) in after.items() if n > before.get(t, (0, 0))[0]})
+    rels = rels or {}
+    return {"ms": ms, "plan": doc[0],
+            "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+            # invoices_2024_pkey, invoices_2025_pkey... as one invoices_YYYY_pkey
+            "indexes": sorted({re.sub(r"_\d{4}_", "_YYYY_", n["Index Name"])
+                               for n in nodes if "Index Name" in n}),
+            "seq": sorted({rels.get(t, (t, True))[0] for t in seq if rels.get(t, (t, True))[1]})}
+
+
+def _verdict(r, seq_ok, budget):
+    bad = [f"Seq Scan on {t}" for t in r["seq"] if t not in seq_ok]
+    if budget is not None and r["buffers"] > budget:
+        bad.append(f"{r['buffers']} buffers > {budget}")
+    return bad
+
+
+def _import_setup(conn, create_sql, s):
+    conn.execute(create_sql.replace("ON COMMIT DROP", ""))
+    rows = [(2 + i, k, None, None) for i, k in enumerate(s["skus"])] + [(9, "PLAN-NEW-1", "New", 5)]
+    with conn.cursor() as cur:
+        cur.executemany("INSERT INTO inventory_import (line, sku, name, price) VALUES (%s,%s,%s,%s)", rows)
+
+
+def run(conn, verbose=False):
+    pairs, problems = _pair(statements())
+    s = _samples(conn)
+    rels = _relations(conn)
+    print(f"samples: sku {s['sku']}, customer {s['customer']}, invoice {s['invoice']}, "
+          f"pending {s['pending']}\n")
+    print(f"{'statement':<38} {'ms':>8} {'buffers':>8}  indexes / result")
+
+    def report(label, r, bad):
+        tail = ", ".join(r["indexes"]) or "-"
+        if r["seq"]:
+            tail += f"  [seq: {', '.join(r['seq'])}]"
+        print(f"{label:<38} {r['ms']:>8.1f} {r['buffers']:>8}  {tail}")
+        for b in bad:
+            print(f"{'':<38} FAIL {b}")
+            problems.append(f"{label}: {b}")
+        if verbose:
+            print(json.dumps(r["plan"], indent=1))
+
+    create = next(sql for _, sql, c in pairs if "CREATE TEMP TABLE" in sql)
+    _import_setup(conn, create, s)
+    todo = [(label, sql, c["params"], c["seq"], c["buffers"], c["skip"]) for label, sql, c in pairs]
+    body = _norm(conn.execute("SELECT pg_get_functiondef('record_sale'::regproc)").fetchone()[0])
+    for m in RECORD_SALE:
+        changed = _norm(m["body"]) not in body
+        todo.append((f"record_sale: {m['name']}", m["sql"], m["params"], set(), WRITE,
+                     "FAIL record_sale changed; update its mirror in RECORD_SALE" if changed else None))
+
+    for label, sql, params, seq_ok, budget, skip in todo:
+        if skip:
+            print(f"{label:<38} {'':>8} {'':>8}  {skip if skip.startswith('FAIL') else 'skipped: ' + skip}")
+            if skip.startswith("FAIL"):
+                problems.append(f"{label}: {skip[5:]}")
+            continue
+        try:
+            r = explain(conn, sql, params(s), rels)
+        except psycopg.Error as e:
+            print(f"{label:<38} FAIL {type(e).__name__}: {str(e).splitlines()[0]}")
+            problems.append(f"{label}: {type(e).__name__}")
+            continue
+        report(label, r, _verdict(r, seq_ok, budget))
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--scale", default=100.0, type=float)
+    ap.add_argument("--seed", default=0, type=int)
+    ap.add_argument("--keep", action="store_true", help="leave the scratch database for --reuse")
+    ap.add_argument("--reuse", action="store_true", help="skip the build; use the kept database")
+    ap.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = ap.parse_args()
+    warnings.simplefilter("ignore")
+
+    base = suite.load._url()
+    url = suite._scratch(base)
+    if not args.reuse:
+        print(f"building a {args.scale:g}x scratch database...", flush=True)
+        print(f"  {suite.build(base, args.scale, args.seed):.0f}s, "
+              f"{suite._counts(base)['invoices']:,} invoices\n")
+    try:
+        suite._admin(url, "ANALYZE")
+        with psycopg.connect(url) as conn:
+            problems = run(conn, args.verbose)
+            conn.rollback()
+    finally:
+        if not args.keep:
+            suite._admin(base, f'DROP DATABASE IF EXISTS "{conninfo_to_dict(url)["dbname"]}" WITH (FORCE)')
+    print()
+    for p in problems:
+        print(f"FAIL {p}")
+    print(f"{len(problems)} problems" if problems else "every plan within budget")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
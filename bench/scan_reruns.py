@@ -0,0 +1,109 @@
+"""What ringing up an item costs: the search list against a barcode scan.
+
+    DATABASE_URL=... python -m bench.scan_reruns
+
+Drives pages/Kiosk.py and the admin Checkout in Home.py through
+streamlit.testing's AppTest against a real database and adds SCANS items to
+the cart both ways: picking from the search list and pressing Add, or typing
+the SKU into the scan box and pressing Enter, as a scanner does.
+
+Timed as in bench/checkout_reruns.py: "script" is the whole page, which is
+what every add cost when it reran the app, "fragment" the st.fragment the
+widget sits in, which is all a browser reruns now. The kiosk's search path
+has no fragment, so it pays two full runs per item: pick, then Add.
+"""
+import os
+import statistics
+import sys
+
+import streamlit as st
+from streamlit.navigation import page
+from streamlit.runtime.scriptrunner import script_runner
+from streamlit.testing.v1 import AppTest
+
+from bench.checkout_reruns import ROOT, TIMES, _button, _timed_exec, _timed_fragment
+
+SCANS = 30
+
+
+def _skus():
+    sys.path.insert(0, ROOT)
+    import backend
+    inv = backend.snapshot()["inventory"]
+    return list(inv.loc[inv["Active"].astype(bool), "SKU"].astype(str)[:SCANS])
+
+
+def _timed(at, action, frag=None):
+    TIMES.clear()
+    action(at).run()
+    if at.exception:
+        raise SystemExit(at.exception[0].message)
+    return sum(TIMES["script"]) * 1000, (TIMES[frag][-1] * 1000 if frag and TIMES[frag] else None)
+
+
+def _search(key, n):
+    def pick(at):
+        sb = at.selectbox(key=key)
+        return sb.set_value(next(o for o in sb.options if o.startswith(f"{_SKUS[n]} ")))
+    return pick
+
+
+def _scan(key, sku):
+    return lambda at: at.text_input(key=key).input(sku)
+
+
+def kiosk():
+    at = AppTest.from_file(os.path.join(ROOT, "pages", "Kiosk.py"), default_timeout=120).run()
+    search, scan = [], []
+    for n, sku in enumerate(_SKUS):
+        a, _ = _timed(at, _search("kiosk_item_search", n))
+        b, _ = _timed(at, lambda at: _button(at, "Add to Cart").click())
+        search.append((a + b, None))
+        scan.append(_timed(at, _scan("kiosk_scan", sku), "_scan_bar"))
+    # Each SKU went in once each way, and a repeat adds to the line.
+    if sorted(i["qty"] for i in at.session_state["kiosk_cart"]) != [2] * SCANS:
+        raise SystemExit(f"kiosk cart came out wrong: {at.session_state['kiosk_cart'][:3]}...")
+    return search, scan
+
+
+def admin():
+    at = AppTest.from_file(os.path.join(ROOT, "Home.py"), default_timeout=120)
+    at.session_state["admin_authenticated"] = True
+    at.run()
+    menu = at.sidebar.radio[0]
+    at = menu.set_value(next(o for o in menu.options if "Checkout" in o)).run()
+    search, scan = [], []
+    for n, sku in enumerate(_SKUS):
+        a, fa = _timed(at, _search("checkout_item_search", n), "_checkout")
+        b, fb = _timed(at, lambda at: _button(at, "Add to Cart").click(), "_checkout")
+        search.append((a + b, fa + fb))
+        scan.append(_timed(at, _scan("checkout_scan", sku), "_checkout_cart"))
+    if len(at.session_state["cart"]) != SCANS:
+        raise SystemExit(f"expected {SCANS} cart lines, got {len(at.session_state['cart'])}")
+    return search, scan
+
+
+def _row(label, runs):
+    script = statistics.median(s for s, _ in runs)
+    frags = [f for _, f in runs if f is not None]
+    frag = f"{statistics.median(frags):>7.1f}ms" if frags else f"{'-':>9}"
+    print(f"{label:<28} {script:>7.1f}ms {frag}")
+
+
+def main():
+    global _SKUS
+    _SKUS = _skus()
+    # A script outside a pages/ app (the kiosk, run on its own) is exec'd by
+    # the script runner directly rather than through navigation.page.
+    page.exec = script_runner.exec = _timed_exec
+    st.fragment = _timed_fragment
+    print(f"median per item over {SCANS} items\n")
+    print(f"{'':<28} {'script':>9} {'fragment':>9}")
+    for name, run in (("kiosk", kiosk), ("admin checkout", admin)):
+        search, scan = run()
+        _row(f"{name}: search + Add", search)
+        _row(f"{name}: scan", scan)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""How much of the ledger each connected session keeps in memory.
+
+    DATABASE_URL=... python -m bench.session_memory            # up to 8 sessions
+    DATABASE_URL=... python -m bench.session_memory 16
+
+Opens sessions one at a time in a single process — kiosk iPads and admin
+tabs on the Dashboard, alternately, the way a shop day looks — through
+streamlit.testing's AppTest against a real database, and keeps them all
+alive. After each one it reports two things:
+
+  held  the bytes behind every session's st.session_state['data'], counted
+        once however many sessions point at them: numpy buffers by their
+        base array, and the Python objects (str, Decimal) in object columns
+        by identity. Flat means sessions share the data; linear means each
+        has its own copy.
+  rss   the process's resident memory, for the allocator's view of it.
+"""
+import gc
+import os
+import sys
+import warnings
+
+import numpy as np
+import psutil
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOME = os.path.join(ROOT, "Home.py")
+KIOSK = os.path.join(ROOT, "pages", "Kiosk.py")
+
+
+def _root(arr):
+    while isinstance(arr, np.ndarray) and arr.base is not None:
+        arr = arr.base
+    return arr
+
+
+def held(datas):
+    """Bytes behind all the DataFrames in `datas`, shared storage counted once."""
+    seen, total = set(), 0
+    for data in datas:
+        for table in data:
+            df = data[table]
+            for i in range(df.shape[1]):
+                col = df.iloc[:, i].to_numpy()
+                base = _root(col)
+                if id(base) not in seen:
+                    seen.add(id(base))
+                    total += getattr(base, "nbytes", 0)
+                if col.dtype == object:
+                    for v in col:
+                        if id(v) not in seen:
+                            seen.add(id(v))
+                            total += sys.getsizeof(v)
+    return total
+
+
+def _open(script, admin):
+    at = AppTest.from_file(script, default_timeout=120)
+    if admin:
+        at.session_state["admin_authenticated"] = True
+    at.run()
+    if at.exception:
+        raise SystemExit(at.exception[0].message)
+    return at
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    warnings.simplefilter("ignore")
+    sys.path.insert(0, ROOT)
+    proc = psutil.Process()
+    sessions, base_rss = [], None
+    print(f"{'sessions':>8} {'held':>10} {'rss':>10}")
+    for k in range(n):
+        admin = k % 2 == 1
+        sessions.append(_open(HOME if admin else KIOSK, admin))
+        gc.collect()
+        rss = proc.memory_info().rss
+        base_rss = base_rss or rss
+        mb = held(at.session_state["data"] for at in sessions) / 2**20
+        print(f"{k + 1:>8} {mb:>8.1f}MB {(rss - base_rss) / 2**20:>+8.1f}MB"
+              f"  {'admin' if admin else 'kiosk'}")
+
+
+if __name__ == "__main__":
+    main()
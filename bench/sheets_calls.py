@@ -0,0 +1,196 @@
+"""What each Sheets-backend write costs in API calls.
+
+    python -m bench.sheets_calls
+
+Runs every write function in backend_sheets_legacy.py against a fresh
+fake_gspread workbook built from db/synthetic.py at today's size, and counts
+the read and write requests it would have sent. Google allows 60 of each per
+minute per user; the last column is how many of that operation fit in a
+minute before the quota answers 429.
+
+Then the read side: what get_data() costs over a session — the first load,
+a rerun, the cache's expiry with nothing changed, and the load after a sale.
+
+If the backend has a Quota, a busy hour is then replayed through it on a
+virtual clock: a sale every `--every` seconds, and how long the counter would
+have stood waiting on the limiter.
+"""
+import argparse
+import contextlib
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "db"))
+import backend_sheets_legacy as backend     # noqa: E402
+import synthetic                            # noqa: E402
+from bench import fake_gspread              # noqa: E402
+
+HEADERS = {
+    "Inventory": ["SKU", "Name", "Price", "Stock", "Vendor", "Category", "WholesalePrice",
+                  "Cost", "Active"],
+    "Transactions": ["TransactionID", "Date", "Total", "PaymentMethod", "CustomerID",
+                     "Status", "DueDate", "Tax", "IsWholesale"],
+    "TransactionItems": ["TransactionID", "SKU", "Qty", "Price", "Name"],
+    "Customers": ["CustomerID", "Name", "Email", "Phone", "DateJoined", "Address", "Notes",
+                  "StoreCredit", "IsWholesale", "TaxRate"],
+    "Settings": ["Key", "Value"],
+    "Expenses": ["Date", "Category", "Amount", "Description"],
+}
+
+
+def workbook(scale=1.0):
+    tabs = synthetic.sheets(scale)
+    return {tab: [head] + [list(r) for r in tabs[tab]] for tab, head in HEADERS.items()}
+
+
+def _cart(n):
+    return [{"sku": f"SKU-{k * 37:06d}", "qty": 1 + k % 3, "price": 2.5, "name": f"Item {k * 37}"}
+            for k in range(n)]
+
+
+def _inventory(n):
+    """The first n rows of Inventory as the editor hands them over."""
+    rows = list(synthetic.sheets()["Inventory"])[:n]
+    return pd.DataFrame(rows, columns=HEADERS["Inventory"])
+
+
+SCENARIOS = [
+    ("commit_sale, 1 item", lambda: backend.commit_sale(_cart(1), 2.7, 0.2, "C-1", "Cash", False)),
+    ("commit_sale, 5 items", lambda: backend.commit_sale(_cart(5), 27.0, 2.0, "C-1", "Cash", False)),
+    ("commit_sale, 20 items", lambda: backend.commit_sale(_cart(20), 100.0, 7.0, "C-1", "Cash", False)),
+    ("commit_sale, 5 + credit", lambda: backend.commit_sale(_cart(5), 22.0, 2.0, "C-1", "Cash",
+                                                            False, credit_used=5.0)),
+    ("add_customer", lambda: backend.add_customer("New Customer", "new@example.com")),
+    ("add_inventory_item", lambda: backend.add_inventory_item("SKU-NEW", "New", 3.0, 10, 1.8, 1.2)),
+    ("restock_item", lambda: backend.restock_item("SKU-000042", 12, 1.1)),
+    ("update_inventory_batch", lambda: backend.update_inventory_batch(_inventory(1000))),
+    ("record_freight", lambda: backend.record_freight("1300", 12.5)),
+    ("mark_invoice_paid", lambda: backend.mark_invoice_paid("1300")),
+    ("mark_invoice_paid, '1300.0'", lambda: backend.mark_invoice_paid("1300.0")),
+    ("delete_invoice", lambda: backend.delete_invoice("1300")),
+    ("update_customer_details", lambda: backend.update_customer_details(
+        "C-1", "Renamed", "1 Main St", "2095550000", "", is_wholesale=True, tax_rate_override=0.08)),
+    ("delete_customer", lambda: backend.delete_customer("C-2")),
+    ("sell_gift_certificate", lambda: backend.sell_gift_certificate("C-1", "C-3", 25.0, "Cash")),
+    ("update_settings", lambda: backend.update_settings({"TaxRate": "0.08", "Footer": "Thanks!"})),
+    ("add_expense", lambda: backend.add_expense("2026-10-01", "Rent", 850, "Shop rent")),
+]
+
+
+@contextlib.contextmanager
+def installed(sh):
+    """Points the backend at `sh` for the duration."""
+    saved = backend.get_sheet
+    backend.get_sheet = lambda: sh
+    with contextlib.suppress(AttributeError):
+        backend._worksheet.clear()
+    try:
+        yield sh
+    finally:
+        backend.get_sheet = saved
+        with contextlib.suppress(AttributeError):
+            backend._worksheet.clear()
+
+
+def count(book, fn, quota=None):
+    sh = fake_gspread.Spreadsheet(book, quota)
+    with installed(sh):
+        fn()
+    return sh
+
+
+def _expire():
+    """What the passing of time does to the read cache: the revision check
+    lapses, or on the old per-tab cache, the TTL."""
+    (getattr(backend, "_revision", None) or backend._read_sheet).clear()
+
+
+READS = [
+    ("first load", lambda: None),
+    ("rerun", lambda: None),
+    ("cache expires, nothing changed", _expire),
+    ("after a sale", lambda: backend.commit_sale(_cart(5), 27.0, 2.0, "C-1", "Cash", False)),
+]
+
+
+def reads(book):
+    sh = fake_gspread.Spreadsheet(book)
+    out = []
+    with installed(sh):
+        backend.force_refresh()
+        for label, step in READS:
+            step()
+            before = len(sh.calls)
+            backend.get_data()
+            calls = sh.calls[before:]
+            out.append((label, sum(k == "read" for k, _ in calls), sum(k == "drive" for k, _ in calls)))
+        backend.force_refresh()
+    return out
+
+
+class Clock:
+    """Virtual time: sleep() advances it instead of blocking."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now += secs
+
+
+def busy_hour(book, every, sales, items):
+    clock = Clock()
+    quota = backend.Quota(clock=clock, sleep=clock.sleep)
+    sh = fake_gspread.Spreadsheet(book, quota)
+    waited = worst = 0.0
+    with installed(sh):
+        for _ in range(sales):
+            start = clock.now
+            backend.commit_sale(_cart(items), 27.0, 2.0, "C-1", "Cash", False)
+            took = clock.now - start
+            waited, worst = waited + took, max(worst, took)
+            clock.sleep(max(0.0, every - took))
+    return sh, waited, worst
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--scale", type=float, default=1.0)
+    ap.add_argument("--every", type=float, default=6.0, help="seconds between sales")
+    ap.add_argument("--sales", type=int, default=60)
+    ap.add_argument("--items", type=int, default=5)
+    args = ap.parse_args()
+
+    book = workbook(args.scale)
+    print(f"{'operation':<30} {'reads':>5} {'writes':>6}  {'per min':>7}  calls")
+    for label, fn in SCENARIOS:
+        sh = count(book, fn)
+        r, w = sh.count("read"), sh.count("write")
+        kinds = {}
+        for _, what in sh.calls:
+            kinds[what] = kinds.get(what, 0) + 1
+        detail = ", ".join(f"{what}×{n}" for what, n in kinds.items())
+        print(f"{label:<30} {r:>5} {w:>6}  {60 // max(r, w, 1):>7}  {detail}")
+
+    print(f"\n{'get_data()':<30} {'reads':>5} {'drive':>6}")
+    for label, r, d in reads(book):
+        print(f"{label:<30} {r:>5} {d:>6}")
+
+    if not hasattr(backend, "Quota"):
+        print("\n(no backend.Quota: skipping the busy-hour replay)")
+        return
+    sh, waited, worst = busy_hour(book, args.every, args.sales, args.items)
+    print(f"\n{args.sales} sales of {args.items} items, one every {args.every:g}s:"
+          f" {sh.count('read')} reads, {sh.count('write')} writes,"
+          f" {waited:.1f}s spent in the limiter (worst sale {worst:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""The app's hot paths at 1x, 10x, 100x the shop, as a JSON report.
+
+    DATABASE_URL=... python -m bench.suite                     # scales 1 and 10
+    DATABASE_URL=... python -m bench.suite --scales 1,10,100 --out after.json
+    python -m bench.suite --compare before.json after.json
+
+For each scale, a scratch database named after the one in DATABASE_URL plus
+"_bench" is created on the same server, filled the way production was —
+db/synthetic.py's workbook at that scale, through migrate.transform() and
+load.load(), then db/migrations.py's numbered files — and dropped at the
+end. The database in DATABASE_URL itself is only used to connect to the
+server. The generator is seeded, so the same scale and --seed give the same
+rows on every machine.
+
+Against it, through backend.py exactly as the app calls it:
+
+  get_data            a full re-read of every table (the cold snapshot)
+  commit_sale         a five-line sale, i.e. record_sale() and its refresh
+  update_inventory    update_inventory_batch() of 50 edited rows
+  financials          the Financials page with Generate Report clicked over
+                      the whole ledger, through streamlit.testing's AppTest
+  create_pdf          an invoice PDF for the longest invoice
+
+Each is run --repeat times and reported as median and p95 in ms. The report
+also records the row counts, the load time, the commit and the library
+versions, so two reports can be compared — --compare prints the ratio of
+every median, worst first.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from datetime import date, datetime
+
+import pandas as pd
+import psycopg
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "db"))
+import load            # noqa: E402
+import migrate         # noqa: E402
+import migrations      # noqa: E402
+import synthetic       # noqa: E402
+
+PATHS = ["get_data", "commit_sale", "update_inventory", "financials", "create_pdf"]
+TABLES = ["customers", "products", "invoices", "invoice_lines", "stock_moves"]
+
+
+def _scratch(url):
+    name = conninfo_to_dict(url).get("dbname") or "postgres"
+    return make_conninfo(url, dbname=f"{name}_bench")
+
+
+def _admin(url, sql):
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute(sql)
+
+
+def build(url, scale, seed):
+    """Rebuilds the scratch database at `scale`; returns the load seconds."""
+    dbname = conninfo_to_dict(_scratch(url))["dbname"]
+    _admin(url, f'DROP DATABASE IF EXISTS "{dbname}" WITH (FORCE)')
+    _admin(url, f"CREATE DATABASE \"{dbname}\" TEMPLATE template0 ENCODING 'UTF8'")
+    os.environ["DATABASE_URL"] = _scratch(url)
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tables, _ = migrate.transform(synthetic.sheets(scale, seed))
+        if not load.load(tables):
+            raise SystemExit(f"load at {scale:g}x rolled back")
+        with psycopg.connect(_scratch(url), autocommit=True) as conn:
+            migrations.apply(conn)
+    return time.perf_counter() - t0
+
+
+def _counts(url):
+    with psycopg.connect(_scratch(url)) as conn:
+        rows = {t: conn.execute(f"SELECT count(*) FROM {t}").fetchone()[0] for t in TABLES}
+        rows["migrations"] = conn.execute("SELECT max(version) FROM schema_migrations").fetchone()[0]
+        return rows
+
+
+def _timed(fn, repeat):
+    out = []
+    for n in range(repeat):
+        t0 = time.perf_counter()
+        fn(n)
+        out.append((time.perf_counter() - t0) * 1000)
+    out.sort()
+    return {"median_ms": round(statistics.median(out), 2),
+            "p95_ms": round(out[min(len(out) - 1, round(0.95 * (len(out) - 1)))], 2),
+            "n": repeat}
+
+
+def _financials(at):
+    """Reruns the Financials page with the report generated over everything."""
+    at.date_input(key="r_start").set_value(date(2000, 1, 1))
+    next(b for b in at.button if "Generate Report" in b.label).click().run()
+    if at.exception:
+        raise SystemExit(f"financials: {at.exception[0].message}")
+
+
+def measure(repeat):
+    import backend as db
+    from streamlit.testing.v1 import AppTest
+
+    snap = db.snapshot()
+    inv = snap["inventory"]
+    stocked = inv[(inv["StockQty"] > 0) & inv["Active"].astype(bool)].reset_index(drop=True)
+    items = snap["items"]
+    longest = items["TransactionID"].value_counts().index[0]
+    lines = items[items["TransactionID"] == longest]
+    cart = [{"sku": r["SKU"], "name": r["Name"], "qty": float(r["QtySold"]), "price": float(r["Price"])}
+            for _, r in lines.iterrows()]
+
+    def get_data(n):
+        db.force_refresh()
+        db.get_data()
+
+    def commit_sale(n):
+        picks = stocked.iloc[[(n * 5 + k) * 7 % len(stocked) for k in range(5)]]
+        sale = [{"sku": r["SKU"], "name": r["Name"], "qty": 1, "price": float(r["Price"])}
+                for _, r in picks.iterrows()]
+        db.commit_sale(sale, sum(i["price"] for i in sale), 0.0, "Guest", "Cash", False)
+
+    def update_inventory(n):
+        edits = inv.iloc[[(n * 50 + k) * 13 % len(inv) for k in range(50)]].copy()
+        edits["Price"] = pd.to_numeric(edits["Price"]) + 0.01
+        db.update_inventory_batch(edits)
+
+    def create_pdf(n):
+        db.create_pdf(longest, "Bench Customer", "Modesto, CA", cart,
+                      sum(i["qty"] * i["price"] for i in cart), 0.0,
+                      sum(i["qty"] * i["price"] for i in cart), "", transaction_date=None)
+
+    at = AppTest.from_file(os.path.join(ROOT, "Home.py"), default_timeout=600)
+    at.session_state["admin_authenticated"] = True
+    at.run()
+    menu = at.sidebar.radio[0]
+    at = menu.set_value(next(o for o in menu.options if "Financials" in o)).run()
+
+    return {"get_data": _timed(get_data, repeat),
+            "commit_sale": _timed(commit_sale, repeat),
+            "update_inventory": _timed(update_inventory, repeat),
+            "financials": _timed(lambda n: _financials(at), repeat),
+            "create_pdf": _timed(create_pdf, repeat)}
+
+
+def _reset_backend():
+    """Closes the pool on this scratch database; the next one gets its own."""
+    import backend as db
+    with contextlib.suppress(Exception):
+        db.get_pool().close()
+    db.get_pool.clear()
+    db._snapshots.clear()
+
+
+def _meta(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        commit = None
+    return {"commit": commit, "when": datetime.now().isoformat(timespec="seconds"),
+            "seed": args.seed, "repeat": args.repeat, "python": platform.python_version(),
+            "pandas": pd.__version__, "psycopg": psycopg.__version__}
+
+
+def run(args):
+    url = load._url()
+    report = {"meta": _meta(args), "scales": {}}
+    warnings.simplefilter("ignore")
+    try:
+        for scale in args.scales:
+            print(f"{scale:g}x: building...", end="", flush=True)
+            secs = build(url, scale, args.seed)
+            rows = _counts(url)
+            print(f" {secs:.1f}s, {rows['invoices']:,} invoices, {rows['invoice_lines']:,} lines")
+            try:
+                paths = measure(args.repeat)
+            finally:
+                _reset_backend()
+            for p in PATHS:
+                print(f"  {p:<18} {paths[p]['median_ms']:>10.1f}ms  p95 {paths[p]['p95_ms']:.1f}ms")
+            report["scales"][f"{scale:g}"] = {"rows": rows, "load_s": round(secs, 2), "paths": paths}
+    finally:
+        os.environ["DATABASE_URL"] = url
+        dbname = conninfo_to_dict(_scratch(url))["dbname"]
+        _admin(url, f'DROP DATABASE IF EXISTS "{dbname}" WITH (FORCE)')
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {args.out}")
+
+
+def compare(before, after):
+    a, b = (json.load(open(p)) for p in (before, after))
+    print(f"{before} ({a['meta']['commit']}) -> {after} ({b['meta']['commit']})\n")
+    rows = []
+    for scale in b["scales"]:
+        if scale not in a["scales"]:
+            continue
+        for p in PATHS:
+            old = a["scales"][scale]["paths"].get(p, {}).get("median_ms")
+            new = b["scales"][scale]["paths"].get(p, {}).get("median_ms")
+            if old and new:
+                rows.append((new / old, scale, p, old, new))
+    print(f"{'scale':>6} {'path':<18} {'before':>10} {'after':>10} {'ratio':>7}")
+    for ratio, scale, p, old, new in sorted(rows, reverse=True):
+        print(f"{scale + 'x':>6} {p:<18} {old:>8.1f}ms {new:>8.1f}ms {ratio:>6.2f}x")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--scales", default="1,10", type=lambda s: [float(x) for x in s.split(",")])
+    ap.add_argument("--seed", default=0, type=int)
+    ap.add_argument("--repeat", default=15, type=int)
+    ap.add_argument("--out", default="bench-report.json")
+    ap.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = ap.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
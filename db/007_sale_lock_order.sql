@@ -0,0 +1,81 @@
+-- Notion to Sew — migration 007: sale lock order
+--
+-- record_sale updated products.stock_qty a line at a time, in the order the
+-- cart was rung up. Two registers selling the same two items, scanned in the
+-- opposite order, each held one row and waited for the other: a deadlock,
+-- which Postgres only notices after deadlock_timeout (1s) and settles by
+-- failing one of the sales. bench/checkout_load.py, four registers on five hot
+-- SKUs: 5 failed sales in 5 seconds, p95 over a second, 16 sales/s where one
+-- register alone does 460.
+--
+-- The fix is one statement: lock every product on the cart before touching
+-- any of them, always in SKU order. Carts that share items now queue on the
+-- first one they share instead of crossing. The stock_moves insert only takes
+-- KEY SHARE on products, which NO KEY UPDATE doesn't block, so nothing else
+-- in the function can take a row lock out of order. The lines themselves keep
+-- the order they were rung up in.
+--
+-- Everything else is exactly as 006 left it.
+
+CREATE OR REPLACE FUNCTION record_sale(
+    p_customer_id text,
+    p_lines       jsonb,
+    p_payment     payment_method,
+    p_status      invoice_status,
+    p_discount    numeric DEFAULT 0,
+    p_freight     numeric DEFAULT 0,
+    p_tax         numeric DEFAULT 0,
+    p_credit      numeric DEFAULT 0,
+    p_wholesale   boolean DEFAULT false
+) RETURNS bigint LANGUAGE plpgsql AS $$
+DECLARE
+    v_invoice_id bigint;
+    v_subtotal   numeric(10,2);
+    v_line       jsonb;
+    v_qty        numeric;
+BEGIN
+    SELECT COALESCE(SUM((l->>'qty')::numeric * (l->>'unit_price')::numeric), 0)
+      INTO v_subtotal FROM jsonb_array_elements(p_lines) l;
+
+    -- Every product on the cart, locked up front and in SKU order.
+    PERFORM 1 FROM products
+     WHERE sku IN (SELECT l->>'sku' FROM jsonb_array_elements(p_lines) l)
+     ORDER BY sku
+       FOR NO KEY UPDATE;
+
+    INSERT INTO invoices (customer_id, status, payment, subtotal, discount, freight,
+                          tax, credit_applied, total, is_wholesale, paid_at)
+    VALUES (p_customer_id, p_status, p_payment,
+            round(v_subtotal, 2), round(p_discount, 2), round(p_freight, 2),
+            round(p_tax, 2), round(p_credit, 2),
+            round(v_subtotal - p_discount + p_freight + p_tax - p_credit, 2),
+            p_wholesale,
+            CASE WHEN p_status = 'paid' THEN now() END)
+    RETURNING id INTO v_invoice_id;
+
+    FOR v_line IN SELECT * FROM jsonb_array_elements(p_lines) LOOP
+        INSERT INTO invoice_lines (invoice_id, sku, description, qty, unit_price)
+        VALUES (v_invoice_id,
+                NULLIF(v_line->>'sku', ''),
+                v_line->>'description',
+                (v_line->>'qty')::numeric,
+                (v_line->>'unit_price')::numeric);
+
+        IF NULLIF(v_line->>'sku', '') IS NOT NULL THEN
+            v_qty := (v_line->>'qty')::numeric;
+            INSERT INTO stock_moves (sku, delta, reason, invoice_id)
+            VALUES (v_line->>'sku', -v_qty::integer,
+                    CASE WHEN v_qty < 0 THEN 'return' ELSE 'sale' END::stock_reason,
+                    v_invoice_id);
+
+            UPDATE products SET stock_qty = stock_qty - v_qty::integer
+             WHERE sku = v_line->>'sku';
+        END IF;
+    END LOOP;
+
+    IF p_credit > 0 AND p_customer_id IS NOT NULL THEN
+        UPDATE customers SET credit = credit - round(p_credit, 2) WHERE id = p_customer_id;
+    END IF;
+
+    RETURN v_invoice_id;
+END $$;
@@ -0,0 +1,85 @@
+-- Notion to Sew — migration 008: plan fixes
+--
+-- bench/plans.py EXPLAINs every statement backend.py runs against a 10x shop,
+-- and two of them read a whole table to touch a row or two.
+--
+-- record_sale's up-front lock from 007 was written as `sku IN (SELECT ...)`.
+-- The planner can't see how many lines a jsonb cart has, guesses a hundred,
+-- and hash-joins them against a Seq Scan of products: 243 pages at 10x, on
+-- every sale, where the products_pkey lookup it replaces was 7. `= ANY
+-- (ARRAY(...))` evaluates the cart first and hands the index a list.
+--
+-- Deleting an invoice sets stock_moves.invoice_id to NULL through the foreign
+-- key, and nothing indexed that column, so every delete scanned the whole
+-- ledger. email_replies.invoice_id had the same problem on a smaller table.
+
+CREATE INDEX IF NOT EXISTS stock_moves_invoice_idx ON stock_moves (invoice_id)
+    WHERE invoice_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS email_replies_invoice_idx ON email_replies (invoice_id)
+    WHERE invoice_id IS NOT NULL;
+
+-- ---------------------------------------------------------------------------
+-- record_sale, as 007 left it but for the lock's WHERE clause.
+
+CREATE OR REPLACE FUNCTION record_sale(
+    p_customer_id text,
+    p_lines       jsonb,
+    p_payment     payment_method,
+    p_status      invoice_status,
+    p_discount    numeric DEFAULT 0,
+    p_freight     numeric DEFAULT 0,
+    p_tax         numeric DEFAULT 0,
+    p_credit      numeric DEFAULT 0,
+    p_wholesale   boolean DEFAULT false
+) RETURNS bigint LANGUAGE plpgsql AS $$
+DECLARE
+    v_invoice_id bigint;
+    v_subtotal   numeric(10,2);
+    v_line       jsonb;
+    v_qty        numeric;
+BEGIN
+    SELECT COALESCE(SUM((l->>'qty')::numeric * (l->>'unit_price')::numeric), 0)
+      INTO v_subtotal FROM jsonb_array_elements(p_lines) l;
+
+    -- Every product on the cart, locked up front and in SKU order.
+    PERFORM 1 FROM products
+     WHERE sku = ANY (ARRAY(SELECT l->>'sku' FROM jsonb_array_elements(p_lines) l))
+     ORDER BY sku
+       FOR NO KEY UPDATE;
+
+    INSERT INTO invoices (customer_id, status, payment, subtotal, discount, freight,
+                          tax, credit_applied, total, is_wholesale, paid_at)
+    VALUES (p_customer_id, p_status, p_payment,
+            round(v_subtotal, 2), round(p_discount, 2), round(p_freight, 2),
+            round(p_tax, 2), round(p_credit, 2),
+            round(v_subtotal - p_discount + p_freight + p_tax - p_credit, 2),
+            p_wholesale,
+            CASE WHEN p_status = 'paid' THEN now() END)
+    RETURNING id INTO v_invoice_id;
+
+    FOR v_line IN SELECT * FROM jsonb_array_elements(p_lines) LOOP
+        INSERT INTO invoice_lines (invoice_id, sku, description, qty, unit_price)
+        VALUES (v_invoice_id,
+                NULLIF(v_line->>'sku', ''),
+                v_line->>'description',
+                (v_line->>'qty')::numeric,
+                (v_line->>'unit_price')::numeric);
+
+        IF NULLIF(v_line->>'sku', '') IS NOT NULL THEN
+            v_qty := (v_line->>'qty')::numeric;
+            INSERT INTO stock_moves (sku, delta, reason, invoice_id)
+            VALUES (v_line->>'sku', -v_qty::integer,
+                    CASE WHEN v_qty < 0 THEN 'return' ELSE 'sale' END::stock_reason,
+                    v_invoice_id);
+
+            UPDATE products SET stock_qty = stock_qty - v_qty::integer
+             WHERE sku = v_line->>'sku';
+        END IF;
+    END LOOP;
+
+    IF p_credit > 0 AND p_customer_id IS NOT NULL THEN
+        UPDATE customers SET credit = credit - round(p_credit, 2) WHERE id = p_customer_id;
+    END IF;
+
+    RETURN v_invoice_id;
+END $$;
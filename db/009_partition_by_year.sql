@@ -0,0 +1,320 @@
+-- Notion to Sew — migration 009: invoices, lines and the ledger, by year
+--
+-- invoices, invoice_lines and stock_moves only ever grow, and nearly every
+-- question asked of them is about this month or this year. As single tables,
+-- every year ever sold is in every index and every vacuum, and the only way to
+-- retire 2022 is a DELETE of 2022 row by row.
+--
+-- Each is now partitioned by range on its timestamp, one partition per
+-- calendar year in the shop's time zone: invoices_2026, invoice_lines_2026,
+-- stock_moves_2026. A query bounded by sold_at or created_at reads only the
+-- years it names, autovacuum freezes a closed year once and then skips it,
+-- and a closed year can be taken out whole with detach_sales_year().
+--
+-- What that costs, because a partitioned table's unique keys must include the
+-- partition key:
+--
+--   * invoices' primary key is (id, sold_at). An invoice number is still
+--     unique across all years: invoices_unique_id() checks it on insert and
+--     on renumbering (005), under an advisory lock on the number.
+--   * invoice_lines carries its invoice's sold_at, and references
+--     (invoice_id, sold_at). A line always lives in its invoice's year, so a
+--     year's lines and invoices detach together. Whatever inserts a line has
+--     to supply sold_at: record_sale below, backend.record_freight, the web
+--     app's addFreight, load.py's merge.
+--   * stock_moves.invoice_id, email_log.invoice_id, email_replies.invoice_id
+--     and invoices.returns_id can't be foreign keys any more: there is no
+--     unique (id) for them to reference. Triggers do what the constraints did
+--     — refuse a number that isn't an invoice, follow a renumbering, set NULL
+--     on delete — with the same row lock a foreign key check takes.
+--   * checkout is slower. A foreign key check against a partitioned table
+--     has no fast path; it is a query over every year's partition, ~0.1 ms
+--     per line. bench/checkout_load.py: 628 → ~385 sales/s at one register,
+--     466 → ~400 at sixteen, where the hot rows' lock waits dominate anyway.
+--
+-- New years: this file creates every year from the oldest row to next year.
+-- After that, db/migrations.py --apply makes sure of this year and next on
+-- every deploy, and Settings' Archive tab warns when next year isn't there
+-- and can create it. Never checkout: CREATE TABLE ... PARTITION OF locks all
+-- three tables ACCESS EXCLUSIVE, and a sale has no business waiting on that,
+-- or holding it. There's no DEFAULT partition either — a sale with no year
+-- to go to fails loudly rather than piling up where the next year's CREATE
+-- would have to scan it.
+--
+-- The copy rewrites all three tables inside one transaction, under ACCESS
+-- EXCLUSIVE: run it after closing. bench/suite.py at 100x moves 137k invoices
+-- and their lines in well under a minute.
+
+CREATE OR REPLACE FUNCTION ensure_sales_year(p_year integer) RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_table text;
+    v_from  timestamptz := make_timestamptz(p_year, 1, 1, 0, 0, 0, 'America/Los_Angeles');
+    v_to    timestamptz := make_timestamptz(p_year + 1, 1, 1, 0, 0, 0, 'America/Los_Angeles');
+BEGIN
+    IF to_regclass(format('stock_moves_%s', p_year)) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    -- A deploy and the Settings button racing to create the same year would
+    -- otherwise both try.
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_sales_year'), p_year);
+    FOREACH v_table IN ARRAY ARRAY['invoices', 'invoice_lines', 'stock_moves'] LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                       v_table || '_' || p_year, v_table, v_from, v_to);
+    END LOOP;
+END $$;
+
+-- Takes a closed year out of the live tables, leaving invoices_2022,
+-- invoice_lines_2022 and stock_moves_2022 as ordinary tables to archive or
+-- drop. Lines first: the lines' foreign key won't let their invoices go
+-- before they do.
+CREATE OR REPLACE FUNCTION detach_sales_year(p_year integer) RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF p_year >= extract(year FROM now() AT TIME ZONE 'America/Los_Angeles') THEN
+        RAISE EXCEPTION '% is not a closed year', p_year;
+    END IF;
+    EXECUTE format('ALTER TABLE invoice_lines DETACH PARTITION %I', 'invoice_lines_' || p_year);
+    EXECUTE format('ALTER TABLE stock_moves DETACH PARTITION %I', 'stock_moves_' || p_year);
+    EXECUTE format('ALTER TABLE invoices DETACH PARTITION %I', 'invoices_' || p_year);
+END $$;
+
+-- ---------------------------------------------------------------------------
+-- The old tables step aside, into a schema of their own with their indexes,
+-- so the new ones can have the same names. First, everything that points at
+-- invoices(id): none of it can point at the new table.
+ALTER TABLE invoice_lines DROP CONSTRAINT invoice_lines_invoice_id_fkey;
+ALTER TABLE stock_moves   DROP CONSTRAINT stock_moves_invoice_id_fkey;
+ALTER TABLE email_log     DROP CONSTRAINT email_log_invoice_id_fkey;
+ALTER TABLE email_replies DROP CONSTRAINT email_replies_invoice_id_fkey;
+ALTER TABLE invoices      DROP CONSTRAINT invoices_returns_id_fkey;
+
+-- Kept: the new tables go on numbering from the same sequences.
+ALTER SEQUENCE invoice_lines_id_seq OWNED BY NONE;
+ALTER SEQUENCE stock_moves_id_seq   OWNED BY NONE;
+
+CREATE SCHEMA migration_009;
+ALTER TABLE invoices      SET SCHEMA migration_009;
+ALTER TABLE invoice_lines SET SCHEMA migration_009;
+ALTER TABLE stock_moves   SET SCHEMA migration_009;
+
+CREATE TABLE invoices (
+    LIKE migration_009.invoices INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+    PRIMARY KEY (id, sold_at)
+) PARTITION BY RANGE (sold_at);
+
+CREATE TABLE invoice_lines (
+    LIKE migration_009.invoice_lines INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED,
+    sold_at timestamptz NOT NULL,      -- the invoice's, which decides the year
+    PRIMARY KEY (id, sold_at)
+) PARTITION BY RANGE (sold_at);
+
+CREATE TABLE stock_moves (
+    LIKE migration_009.stock_moves INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+SELECT ensure_sales_year(y)
+  FROM generate_series(
+           extract(year FROM least((SELECT min(sold_at) FROM migration_009.invoices),
+                                   (SELECT min(created_at) FROM migration_009.stock_moves),
+                                   now()) AT TIME ZONE 'America/Los_Angeles')::integer,
+           extract(year FROM now() AT TIME ZONE 'America/Los_Angeles')::integer + 1) y;
+
+INSERT INTO invoices SELECT * FROM migration_009.invoices;
+INSERT INTO invoice_lines (id, invoice_id, sku, description, qty, unit_price, sold_at)
+SELECT l.id, l.invoice_id, l.sku, l.description, l.qty, l.unit_price, i.sold_at
+  FROM migration_009.invoice_lines l JOIN migration_009.invoices i ON i.id = l.invoice_id;
+INSERT INTO stock_moves SELECT * FROM migration_009.stock_moves;
+
+-- The new tables start with no grants: copy the old ones'. The owner's own
+-- are implicit, and go with ownership.
+DO $$
+DECLARE
+    v record;
+BEGIN
+    FOR v IN
+        SELECT c.relname, a.privilege_type, a.is_grantable,
+               CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(r.rolname) END AS grantee
+          FROM pg_class c
+         CROSS JOIN LATERAL aclexplode(c.relacl) a
+          LEFT JOIN pg_roles r ON r.oid = a.grantee
+         WHERE c.relnamespace = 'migration_009'::regnamespace AND c.relkind = 'r'
+           AND a.grantee <> c.relowner
+    LOOP
+        EXECUTE format('GRANT %s ON %I TO %s%s', v.privilege_type, v.relname, v.grantee,
+                       CASE WHEN v.is_grantable THEN ' WITH GRANT OPTION' ELSE '' END);
+    END LOOP;
+END $$;
+
+DROP SCHEMA migration_009 CASCADE;
+ALTER SEQUENCE invoice_lines_id_seq OWNED BY invoice_lines.id;
+ALTER SEQUENCE stock_moves_id_seq   OWNED BY stock_moves.id;
+
+-- Every index the old tables had, now one per partition.
+CREATE INDEX invoices_customer_idx     ON invoices (customer_id, sold_at DESC);
+CREATE INDEX invoices_open_idx         ON invoices (due_date) WHERE status = 'pending';
+CREATE INDEX invoices_sold_at_idx      ON invoices (sold_at DESC);
+CREATE INDEX invoices_returns_idx      ON invoices (returns_id) WHERE returns_id IS NOT NULL;
+CREATE INDEX invoice_lines_invoice_idx ON invoice_lines (invoice_id);
+CREATE INDEX invoice_lines_sku_idx     ON invoice_lines (sku);
+CREATE INDEX stock_moves_sku_idx       ON stock_moves (sku, created_at DESC);
+CREATE INDEX stock_moves_invoice_idx   ON stock_moves (invoice_id) WHERE invoice_id IS NOT NULL;
+
+ALTER TABLE invoices ADD CONSTRAINT invoices_customer_id_fkey
+    FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE RESTRICT;
+ALTER TABLE invoice_lines ADD CONSTRAINT invoice_lines_invoice_id_fkey
+    FOREIGN KEY (invoice_id, sold_at) REFERENCES invoices (id, sold_at)
+    ON UPDATE CASCADE ON DELETE CASCADE;
+ALTER TABLE invoice_lines ADD CONSTRAINT invoice_lines_sku_fkey
+    FOREIGN KEY (sku) REFERENCES products(sku) ON DELETE RESTRICT;
+ALTER TABLE stock_moves ADD CONSTRAINT stock_moves_sku_fkey
+    FOREIGN KEY (sku) REFERENCES products(sku) ON DELETE RESTRICT;
+
+-- ---------------------------------------------------------------------------
+-- An invoice number, unique across every year.
+CREATE OR REPLACE FUNCTION invoices_unique_id() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.id = OLD.id THEN
+        RETURN NEW;
+    END IF;
+    PERFORM pg_advisory_xact_lock(NEW.id);
+    IF EXISTS (SELECT 1 FROM invoices WHERE id = NEW.id) THEN
+        RAISE unique_violation USING
+            MESSAGE = format('invoice %s already exists', NEW.id),
+            CONSTRAINT = 'invoices_pkey';
+    END IF;
+    RETURN NEW;
+END $$;
+
+CREATE TRIGGER invoices_unique_id BEFORE INSERT OR UPDATE OF id ON invoices
+    FOR EACH ROW EXECUTE FUNCTION invoices_unique_id();
+
+-- What the foreign keys onto invoices(id) did when an invoice changed number
+-- or went away.
+CREATE OR REPLACE FUNCTION invoices_follow() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_new bigint;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        IF NEW.id = OLD.id THEN
+            RETURN NULL;
+        END IF;
+        v_new := NEW.id;
+    ELSIF EXISTS (SELECT 1 FROM invoices WHERE id = OLD.id) THEN
+        RETURN NULL;        -- a changed sold_at moved it to another year; not gone
+    END IF;
+    UPDATE stock_moves   SET invoice_id = v_new WHERE invoice_id = OLD.id;
+    UPDATE email_log     SET invoice_id = v_new WHERE invoice_id = OLD.id;
+    UPDATE email_replies SET invoice_id = v_new WHERE invoice_id = OLD.id;
+    UPDATE invoices      SET returns_id = v_new WHERE returns_id = OLD.id;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER invoices_follow AFTER UPDATE OF id OR DELETE ON invoices
+    FOR EACH ROW EXECUTE FUNCTION invoices_follow();
+
+-- And what they refused: a number that isn't an invoice. FOR KEY SHARE is the
+-- lock a foreign key check takes, so the invoice can't be deleted underneath.
+CREATE OR REPLACE FUNCTION invoice_ref_exists() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_id bigint := to_jsonb(NEW) ->> TG_ARGV[0];
+BEGIN
+    IF v_id IS NOT NULL THEN
+        PERFORM 1 FROM invoices WHERE id = v_id FOR KEY SHARE;
+        IF NOT FOUND THEN
+            RAISE foreign_key_violation USING
+                MESSAGE = format('%s.%s = %s is not an invoice', TG_TABLE_NAME, TG_ARGV[0], v_id);
+        END IF;
+    END IF;
+    RETURN NEW;
+END $$;
+
+CREATE TRIGGER stock_moves_invoice_ref BEFORE INSERT OR UPDATE OF invoice_id ON stock_moves
+    FOR EACH ROW EXECUTE FUNCTION invoice_ref_exists('invoice_id');
+CREATE TRIGGER email_log_invoice_ref BEFORE INSERT OR UPDATE OF invoice_id ON email_log
+    FOR EACH ROW EXECUTE FUNCTION invoice_ref_exists('invoice_id');
+CREATE TRIGGER email_replies_invoice_ref BEFORE INSERT OR UPDATE OF invoice_id ON email_replies
+    FOR EACH ROW EXECUTE FUNCTION invoice_ref_exists('invoice_id');
+CREATE TRIGGER invoices_returns_ref BEFORE INSERT OR UPDATE OF returns_id ON invoices
+    FOR EACH ROW EXECUTE FUNCTION invoice_ref_exists('returns_id');
+
+-- Autovacuum analyzes partitions, never the partitioned table itself, and the
+-- planner wants both.
+ANALYZE invoices, invoice_lines, stock_moves;
+
+-- ---------------------------------------------------------------------------
+-- record_sale, as 008 left it but for:
+--   * each line written with its invoice's sold_at;
+--   * the lines, the stock moves and the stock updates each one statement
+--     instead of one per line. Every INSERT into a partitioned table sets up
+--     its routing afresh, and per line that put a five-line sale ~30% behind
+--     008's; set-based it is level with it. Products were already locked in
+--     SKU order above, so the UPDATE's own order doesn't matter. It finds them
+--     the way the lock does: joined to jsonb_array_elements the planner
+--     expects 100 rows and hashes all of products.
+
+CREATE OR REPLACE FUNCTION record_sale(
+    p_customer_id text,
+    p_lines       jsonb,
+    p_payment     payment_method,
+    p_status      invoice_status,
+    p_discount    numeric DEFAULT 0,
+    p_freight     numeric DEFAULT 0,
+    p_tax         numeric DEFAULT 0,
+    p_credit      numeric DEFAULT 0,
+    p_wholesale   boolean DEFAULT false
+) RETURNS bigint LANGUAGE plpgsql AS $$
+DECLARE
+    v_invoice_id bigint;
+    v_sold_at    timestamptz;
+    v_subtotal   numeric(10,2);
+BEGIN
+    SELECT COALESCE(SUM((l->>'qty')::numeric * (l->>'unit_price')::numeric), 0)
+      INTO v_subtotal FROM jsonb_array_elements(p_lines) l;
+
+    -- Every product on the cart, locked up front and in SKU order.
+    PERFORM 1 FROM products
+     WHERE sku = ANY (ARRAY(SELECT l->>'sku' FROM jsonb_array_elements(p_lines) l))
+     ORDER BY sku
+       FOR NO KEY UPDATE;
+
+    INSERT INTO invoices (customer_id, status, payment, subtotal, discount, freight,
+                          tax, credit_applied, total, is_wholesale, paid_at)
+    VALUES (p_customer_id, p_status, p_payment,
+            round(v_subtotal, 2), round(p_discount, 2), round(p_freight, 2),
+            round(p_tax, 2), round(p_credit, 2),
+            round(v_subtotal - p_discount + p_freight + p_tax - p_credit, 2),
+            p_wholesale,
+            CASE WHEN p_status = 'paid' THEN now() END)
+    RETURNING id, sold_at INTO v_invoice_id, v_sold_at;
+
+    INSERT INTO invoice_lines (invoice_id, sold_at, sku, description, qty, unit_price)
+    SELECT v_invoice_id, v_sold_at, NULLIF(l->>'sku', ''), l->>'description',
+           (l->>'qty')::numeric, (l->>'unit_price')::numeric
+      FROM jsonb_array_elements(p_lines) WITH ORDINALITY AS t(l, n)
+     ORDER BY n;
+
+    INSERT INTO stock_moves (sku, delta, reason, invoice_id)
+    SELECT l->>'sku', -(l->>'qty')::numeric::integer,
+           CASE WHEN (l->>'qty')::numeric < 0 THEN 'return' ELSE 'sale' END::stock_reason,
+           v_invoice_id
+      FROM jsonb_array_elements(p_lines) WITH ORDINALITY AS t(l, n)
+     WHERE NULLIF(l->>'sku', '') IS NOT NULL
+     ORDER BY n;
+
+    UPDATE products p
+       SET stock_qty = p.stock_qty - (SELECT sum((l->>'qty')::numeric::integer)
+                                        FROM jsonb_array_elements(p_lines) l
+                                       WHERE l->>'sku' = p.sku)
+     WHERE p.sku = ANY (ARRAY(SELECT l->>'sku' FROM jsonb_array_elements(p_lines) l));
+
+    IF p_credit > 0 AND p_customer_id IS NOT NULL THEN
+        UPDATE customers SET credit = credit - round(p_credit, 2) WHERE id = p_customer_id;
+    END IF;
+
+    RETURN v_invoice_id;
+END $$;
@@ -0,0 +1,186 @@
+-- Notion to Sew — migration 010: closed years, archived
+--
+-- Nobody edits a 2023 invoice, but every session still reads 2023: the
+-- snapshot's transactions and items are every invoice and line ever sold, and
+-- both are re-read after every sale. archive_sales_year() takes a closed year
+-- out of the live tables and keeps it here instead:
+--
+--   sales_archive      one row per year: its invoices and its lines, each as
+--                      one jsonb array. A value that size is stored compressed
+--                      out of line by TOAST — a 10x year's lines take ~55 kB
+--                      against ~390 kB of heap and indexes as a partition.
+--   archived_invoices  id -> year (and customer), so an archived invoice can
+--                      still be found by number or by customer without
+--                      opening every year, and its number is never reused.
+--   sales_months       per-month totals of every archived year, small enough
+--                      for the snapshot to keep hot.
+--
+-- backend.py reads an archived year back on demand (sales_between,
+-- customer_history, invoice) from the same columns _read() produces, so a
+-- report over 2023 looks exactly as it did before. restore_sales_year() puts
+-- a year back.
+--
+-- A year with unpaid invoices can't be archived: receivables stay where the
+-- Unpaid tab and mark_invoice_paid can reach them. stock_moves are left in
+-- place; the ledger must still add up to stock_qty.
+
+CREATE TABLE sales_archive (
+    year          integer PRIMARY KEY,
+    invoices      jsonb NOT NULL,       -- [invoices row, ...] by sold_at
+    lines         jsonb NOT NULL,       -- [invoice_lines row, ...] by invoice, line
+    invoice_count integer NOT NULL,
+    line_count    integer NOT NULL,
+    raw_bytes     bigint NOT NULL,      -- the two arrays before compression
+    archived_at   timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE archived_invoices (
+    id          bigint PRIMARY KEY,
+    year        integer NOT NULL REFERENCES sales_archive(year) ON DELETE CASCADE,
+    -- Still a customer's history: they can't be deleted out from under it.
+    customer_id text REFERENCES customers(id) ON DELETE RESTRICT
+);
+CREATE INDEX archived_invoices_customer_idx ON archived_invoices (customer_id)
+    WHERE customer_id IS NOT NULL;
+
+CREATE TABLE sales_months (
+    month     date PRIMARY KEY,         -- the 1st, shop time
+    invoices  integer NOT NULL,
+    customers integer NOT NULL,         -- distinct, walk-ins not counted
+    total     numeric(12,2) NOT NULL,
+    tax       numeric(12,2) NOT NULL,
+    freight   numeric(12,2) NOT NULL,
+    wholesale numeric(12,2) NOT NULL    -- total of wholesale invoices
+);
+
+-- ---------------------------------------------------------------------------
+-- An archived number is still taken: a renumbering (005) mustn't reuse it.
+CREATE OR REPLACE FUNCTION invoices_unique_id() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.id = OLD.id THEN
+        RETURN NEW;
+    END IF;
+    PERFORM pg_advisory_xact_lock(NEW.id);
+    IF EXISTS (SELECT 1 FROM invoices WHERE id = NEW.id)
+       OR EXISTS (SELECT 1 FROM archived_invoices WHERE id = NEW.id) THEN
+        RAISE unique_violation USING
+            MESSAGE = format('invoice %s already exists', NEW.id),
+            CONSTRAINT = 'invoices_pkey';
+    END IF;
+    RETURN NEW;
+END $$;
+
+-- And still an invoice: a return, an email or a stock move may refer to it.
+CREATE OR REPLACE FUNCTION invoice_ref_exists() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_id bigint := to_jsonb(NEW) ->> TG_ARGV[0];
+BEGIN
+    IF v_id IS NOT NULL THEN
+        PERFORM 1 FROM invoices WHERE id = v_id FOR KEY SHARE;
+        IF NOT FOUND THEN
+            PERFORM 1 FROM archived_invoices WHERE id = v_id FOR KEY SHARE;
+        END IF;
+        IF NOT FOUND THEN
+            RAISE foreign_key_violation USING
+                MESSAGE = format('%s.%s = %s is not an invoice', TG_TABLE_NAME, TG_ARGV[0], v_id);
+        END IF;
+    END IF;
+    RETURN NEW;
+END $$;
+
+-- ---------------------------------------------------------------------------
+-- The year's partitions are locked against writes first, then checked, copied
+-- and dropped. Dropped rather than deleted from: the DELETE triggers would
+-- NULL out every stock move and email that names one of these invoices.
+-- Sales carry on until the DETACH, which waits for the ones in flight.
+CREATE OR REPLACE FUNCTION archive_sales_year(p_year integer) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_from   timestamptz := make_timestamptz(p_year, 1, 1, 0, 0, 0, 'America/Los_Angeles');
+    v_to     timestamptz := make_timestamptz(p_year + 1, 1, 1, 0, 0, 0, 'America/Los_Angeles');
+    v_unpaid integer;
+    v_count  integer;
+BEGIN
+    IF p_year >= extract(year FROM now() AT TIME ZONE 'America/Los_Angeles') THEN
+        RAISE EXCEPTION '% is not a closed year', p_year;
+    END IF;
+    IF to_regclass(format('invoices_%s', p_year)) IS NULL THEN
+        RAISE EXCEPTION '% has no sales to archive', p_year;
+    END IF;
+    EXECUTE format('LOCK TABLE %I, %I IN EXCLUSIVE MODE',
+                   'invoices_' || p_year, 'invoice_lines_' || p_year);
+
+    SELECT count(*), count(*) FILTER (WHERE status = 'pending')
+      INTO v_count, v_unpaid
+      FROM invoices WHERE sold_at >= v_from AND sold_at < v_to;
+    IF v_unpaid > 0 THEN
+        RAISE EXCEPTION '% has % unpaid invoice(s); settle or void them first', p_year, v_unpaid;
+    END IF;
+    IF v_count = 0 THEN
+        RAISE EXCEPTION '% has no sales to archive', p_year;
+    END IF;
+
+    INSERT INTO sales_archive (year, invoices, lines, invoice_count, line_count, raw_bytes)
+    SELECT p_year, i.rows, l.rows, i.n, l.n, pg_column_size(i.rows) + pg_column_size(l.rows)
+      FROM (SELECT jsonb_agg(to_jsonb(x) ORDER BY x.sold_at, x.id), count(*)
+              FROM invoices x WHERE x.sold_at >= v_from AND x.sold_at < v_to) i (rows, n),
+           (SELECT COALESCE(jsonb_agg(to_jsonb(x) ORDER BY x.invoice_id, x.id), '[]'), count(*)
+              FROM invoice_lines x WHERE x.sold_at >= v_from AND x.sold_at < v_to) l (rows, n);
+
+    INSERT INTO archived_invoices (id, year, customer_id)
+    SELECT id, p_year, customer_id FROM invoices WHERE sold_at >= v_from AND sold_at < v_to;
+
+    -- freight as the invoices recorded it, not from 'FREIGHT' lines: the
+    -- reports' two ways of finding it disagree on old imported invoices.
+    INSERT INTO sales_months (month, invoices, customers, total, tax, freight, wholesale)
+    SELECT date_trunc('month', sold_at AT TIME ZONE 'America/Los_Angeles')::date,
+           count(*), count(DISTINCT customer_id), sum(total), sum(tax), sum(freight),
+           COALESCE(sum(total) FILTER (WHERE is_wholesale), 0)
+      FROM invoices WHERE sold_at >= v_from AND sold_at < v_to
+     GROUP BY 1;
+
+    -- Lines first, as in detach_sales_year().
+    EXECUTE format('ALTER TABLE invoice_lines DETACH PARTITION %I', 'invoice_lines_' || p_year);
+    EXECUTE format('DROP TABLE %I', 'invoice_lines_' || p_year);
+    EXECUTE format('ALTER TABLE invoices DETACH PARTITION %I', 'invoices_' || p_year);
+    EXECUTE format('DROP TABLE %I', 'invoices_' || p_year);
+    RETURN v_count;
+END $$;
+
+-- The reverse. The rows are loaded into plain tables and attached as
+-- partitions, so none of the per-row triggers run: they were checked when
+-- they were written, and archived_invoices has held their numbers since.
+-- Columns added after the year was archived come back NULL.
+CREATE OR REPLACE FUNCTION restore_sales_year(p_year integer) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    v      sales_archive;
+    v_from timestamptz := make_timestamptz(p_year, 1, 1, 0, 0, 0, 'America/Los_Angeles');
+    v_to   timestamptz := make_timestamptz(p_year + 1, 1, 1, 0, 0, 0, 'America/Los_Angeles');
+BEGIN
+    DELETE FROM sales_archive WHERE year = p_year RETURNING * INTO v;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION '% is not archived', p_year;
+    END IF;
+    DELETE FROM sales_months WHERE month >= make_date(p_year, 1, 1) AND month < make_date(p_year + 1, 1, 1);
+
+    EXECUTE format('CREATE TABLE %I (LIKE invoices INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                   'invoices_' || p_year);
+    EXECUTE format('INSERT INTO %I SELECT * FROM jsonb_populate_recordset(NULL::invoices, $1)',
+                   'invoices_' || p_year) USING v.invoices;
+    EXECUTE format('ALTER TABLE invoices ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   'invoices_' || p_year, v_from, v_to);
+
+    EXECUTE format('CREATE TABLE %I (LIKE invoice_lines INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)',
+                   'invoice_lines_' || p_year);
+    EXECUTE format('INSERT INTO %I (id, invoice_id, sku, description, qty, unit_price, sold_at)
+                    SELECT id, invoice_id, sku, description, qty, unit_price, sold_at
+                      FROM jsonb_populate_recordset(NULL::invoice_lines, $1)',
+                   'invoice_lines_' || p_year) USING v.lines;
+    EXECUTE format('ALTER TABLE invoice_lines ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   'invoice_lines_' || p_year, v_from, v_to);
+    EXECUTE format('ANALYZE %I, %I', 'invoices_' || p_year, 'invoice_lines_' || p_year);
+    RETURN v.invoice_count;
+END $$;
@@ -0,0 +1,102 @@
+-- Notion to Sew — migration 011: each customer's totals, kept as they change
+--
+-- The Customers page worked out a customer's spend, open balance and last
+-- purchase by scanning every invoice in the snapshot for their id, once per
+-- profile opened, and the list couldn't be sorted by any of them without
+-- doing it for everyone. customer_stats holds the answer instead, one row per
+-- customer who has bought anything, and a trigger on invoices keeps it right:
+--
+--   invoices      how many, void ones not counted
+--   spend         their total, returns netted off (a return's is negative)
+--   balance       the total of their unpaid (pending) invoices
+--   last_sold_at  their latest invoice
+--
+-- Every insert, delete, void, payment and change of total or customer takes
+-- the old row's share off and adds the new one's, so a renumbering or a sale
+-- moved to another year comes out even however Postgres fires it. Walk-ins
+-- have no row, so the register's own sales never wait on one.
+--
+-- The totals are lifetime: archiving a year (010) drops its partitions
+-- without firing a trigger, and changes nothing here, which is right — the
+-- money was still spent. A year archived can't hold an unpaid invoice, so no
+-- balance goes with it. Anything done behind the trigger's back (a detached
+-- year dropped by hand, a TRUNCATE) wants rebuild_customer_stats().
+
+CREATE TABLE customer_stats (
+    customer_id  text PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
+    invoices     integer       NOT NULL DEFAULT 0,
+    spend        numeric(12,2) NOT NULL DEFAULT 0,
+    balance      numeric(12,2) NOT NULL DEFAULT 0,
+    last_sold_at timestamptz
+);
+
+-- A customer's latest invoice, for when the one that was goes away. An
+-- archived year is only opened if nothing live is left: its newest one.
+CREATE OR REPLACE FUNCTION customer_last_sale(p_customer_id text) RETURNS timestamptz
+LANGUAGE sql STABLE AS $$
+    SELECT COALESCE(
+        (SELECT max(sold_at) FROM invoices
+          WHERE customer_id = p_customer_id AND status <> 'void'),
+        (SELECT max(i.sold_at)
+           FROM sales_archive a, jsonb_populate_recordset(NULL::invoices, a.invoices) i
+          WHERE a.year = (SELECT max(year) FROM archived_invoices WHERE customer_id = p_customer_id)
+            AND i.customer_id = p_customer_id AND i.status <> 'void'))
+$$;
+
+CREATE OR REPLACE FUNCTION invoices_customer_stats() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_last timestamptz;
+BEGIN
+    IF TG_OP <> 'INSERT' AND OLD.customer_id IS NOT NULL AND OLD.status <> 'void' THEN
+        UPDATE customer_stats
+           SET invoices = invoices - 1,
+               spend    = spend - OLD.total,
+               balance  = balance - CASE WHEN OLD.status = 'pending' THEN OLD.total ELSE 0 END
+         WHERE customer_id = OLD.customer_id
+        RETURNING last_sold_at INTO v_last;
+        IF v_last <= OLD.sold_at THEN
+            UPDATE customer_stats SET last_sold_at = customer_last_sale(OLD.customer_id)
+             WHERE customer_id = OLD.customer_id;
+        END IF;
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.customer_id IS NOT NULL AND NEW.status <> 'void' THEN
+        INSERT INTO customer_stats AS s (customer_id, invoices, spend, balance, last_sold_at)
+        VALUES (NEW.customer_id, 1, NEW.total,
+                CASE WHEN NEW.status = 'pending' THEN NEW.total ELSE 0 END, NEW.sold_at)
+        ON CONFLICT (customer_id) DO UPDATE
+           SET invoices     = s.invoices + 1,
+               spend        = s.spend + EXCLUDED.spend,
+               balance      = s.balance + EXCLUDED.balance,
+               last_sold_at = greatest(s.last_sold_at, EXCLUDED.last_sold_at);
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER invoices_customer_stats
+    AFTER INSERT OR DELETE OR UPDATE OF customer_id, status, total, sold_at ON invoices
+    FOR EACH ROW EXECUTE FUNCTION invoices_customer_stats();
+
+-- From scratch, live and archived years both. The lock waits out sales
+-- already counted and holds new ones at the trigger until it's done.
+CREATE OR REPLACE FUNCTION rebuild_customer_stats() RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_count integer;
+BEGIN
+    LOCK TABLE customer_stats IN EXCLUSIVE MODE;
+    DELETE FROM customer_stats;
+    INSERT INTO customer_stats (customer_id, invoices, spend, balance, last_sold_at)
+    SELECT customer_id, count(*), sum(total),
+           COALESCE(sum(total) FILTER (WHERE status = 'pending'), 0), max(sold_at)
+      FROM (SELECT customer_id, status, total, sold_at FROM invoices
+            UNION ALL
+            SELECT i.customer_id, i.status, i.total, i.sold_at
+              FROM sales_archive a, jsonb_populate_recordset(NULL::invoices, a.invoices) i) x
+     WHERE customer_id IS NOT NULL AND status <> 'void'
+     GROUP BY customer_id;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END $$;
+
+SELECT rebuild_customer_stats();
@@ -0,0 +1,157 @@
+-- Notion to Sew — migration 012: stock checkpoints and an incremental stock check
+--
+-- stock_moves explains every unit on hand, but the only way to ask it
+-- anything was to add it all up: "what was on hand on Dec 31?" and "does
+-- stock_qty still match the ledger?" both summed every move of every SKU
+-- since the spreadsheet.
+--
+--   stock_checkpoints  a SKU's on-hand as of a moment: the sum of its moves
+--                      made before it. take_stock_checkpoint() writes one
+--                      for each SKU that moved since the last checkpoint,
+--                      from that one plus what moved in between. A SKU that
+--                      didn't move keeps its older row, which still holds.
+--   stock_on_hand()    one SKU at any moment: its latest checkpoint before
+--                      then, plus the moves since.
+--   stock_at()         every SKU at a moment, for a stocktake or year end.
+--   reconcile_stock()  compares stock_qty with the ledger for just the SKUs
+--                      that moved or were edited since the last check, plus
+--                      whatever is already flagged, and keeps the ones that
+--                      disagree in stock_drift. It takes the day's
+--                      checkpoint first if it's due, so running it is what
+--                      keeps checkpoints coming: the Check button in
+--                      Settings' Database tab, or from cron,
+--                          psql "$DATABASE_URL" -c 'SELECT * FROM reconcile_stock()'
+--
+-- A move is stamped with its transaction's start (now()), not its commit. A
+-- sale that began just before a checkpoint can still commit just after it,
+-- stamped before it and counted nowhere. So checkpoints are only taken an
+-- hour in arrears, at the shop's midnight, and a check looks an hour further
+-- back than the last one: no sale, restock or import stays open that long.
+-- Checkpoints only go forward; one can't be slipped in before the latest.
+
+CREATE TABLE stock_checkpoints (
+    sku      text NOT NULL REFERENCES products(sku) ON DELETE CASCADE,
+    taken_at timestamptz NOT NULL,      -- as of: every move created before it
+    on_hand  integer NOT NULL,
+    PRIMARY KEY (sku, taken_at)
+);
+CREATE INDEX stock_checkpoints_taken_idx ON stock_checkpoints (taken_at);
+
+CREATE TABLE stock_checks (
+    checked_at timestamptz PRIMARY KEY DEFAULT clock_timestamp(),
+    since      timestamptz,             -- changes from here on were looked at; NULL = all
+    skus       integer NOT NULL,        -- how many were compared
+    drifted    integer NOT NULL         -- how many disagree, after this check
+);
+
+-- What the latest check found wrong. A SKU leaves when a check finds it
+-- right again.
+CREATE TABLE stock_drift (
+    sku       text PRIMARY KEY REFERENCES products(sku) ON DELETE CASCADE,
+    stock_qty integer NOT NULL,
+    ledger    integer NOT NULL,
+    found_at  timestamptz NOT NULL DEFAULT now()    -- first seen
+);
+
+-- ---------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION take_stock_checkpoint(p_at timestamptz) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_prev  timestamptz;
+    v_count integer;
+BEGIN
+    IF p_at > now() - interval '1 hour' THEN
+        RAISE EXCEPTION 'a checkpoint must be at least an hour old; moves stamped before % may not have committed yet', p_at;
+    END IF;
+    PERFORM pg_advisory_xact_lock(hashtext('take_stock_checkpoint'));
+    SELECT max(taken_at) INTO v_prev FROM stock_checkpoints;
+    IF p_at <= v_prev THEN
+        RAISE EXCEPTION 'there is already a checkpoint at %; checkpoints only go forward', v_prev;
+    END IF;
+
+    -- Every SKU that moved before v_prev has a checkpoint at or before it,
+    -- so what's new is exactly the moves from v_prev on.
+    INSERT INTO stock_checkpoints (sku, taken_at, on_hand)
+    SELECT m.sku, p_at, COALESCE(c.on_hand, 0) + m.delta
+      FROM (SELECT sku, sum(delta) AS delta FROM stock_moves
+             WHERE created_at >= COALESCE(v_prev, '-infinity') AND created_at < p_at
+             GROUP BY sku) m
+      LEFT JOIN LATERAL (SELECT on_hand FROM stock_checkpoints c
+                          WHERE c.sku = m.sku ORDER BY taken_at DESC LIMIT 1) c ON true;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END $$;
+
+CREATE OR REPLACE FUNCTION stock_on_hand(p_sku text, p_at timestamptz DEFAULT 'infinity')
+RETURNS integer
+LANGUAGE sql STABLE AS $$
+    SELECT (COALESCE(c.on_hand, 0)
+            + COALESCE((SELECT sum(delta) FROM stock_moves
+                         WHERE sku = p_sku AND created_at < p_at
+                           AND created_at >= COALESCE(c.taken_at, '-infinity')), 0))::integer
+      FROM (SELECT 1) one
+      LEFT JOIN LATERAL (SELECT taken_at, on_hand FROM stock_checkpoints
+                          WHERE sku = p_sku AND taken_at <= p_at
+                          ORDER BY taken_at DESC LIMIT 1) c ON true
+$$;
+
+-- SKUs that never moved before p_at aren't listed: they had none.
+CREATE OR REPLACE FUNCTION stock_at(p_at timestamptz)
+RETURNS TABLE (sku text, on_hand integer)
+LANGUAGE sql STABLE AS $$
+    WITH cp AS (
+        SELECT max(taken_at) AS at FROM stock_checkpoints WHERE taken_at <= p_at
+    ), base AS (
+        SELECT DISTINCT ON (c.sku) c.sku, c.on_hand
+          FROM stock_checkpoints c, cp
+         WHERE c.taken_at <= cp.at
+         ORDER BY c.sku, c.taken_at DESC
+    ), since AS (
+        SELECT m.sku, sum(m.delta) AS delta
+          FROM stock_moves m, cp
+         WHERE m.created_at >= COALESCE(cp.at, '-infinity') AND m.created_at < p_at
+         GROUP BY m.sku
+    )
+    SELECT sku, (COALESCE(b.on_hand, 0) + COALESCE(s.delta, 0))::integer
+      FROM base b FULL JOIN since s USING (sku)
+$$;
+
+-- stock_qty and the ledger are read in one statement, so a sale committing
+-- halfway through can't show up as drift: it moves both or neither.
+-- products has no index on updated_at, on purpose — every sale updates it,
+-- and an index there would cost each one its HOT update — so finding the
+-- edited ones reads products whole. The ledger side is what's incremental.
+CREATE OR REPLACE FUNCTION reconcile_stock(OUT checked integer, OUT drifted integer)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_day   timestamptz := date_trunc('day', now() - interval '1 hour', 'America/Los_Angeles');
+    v_since timestamptz;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('reconcile_stock'));
+    IF v_day > (SELECT COALESCE(max(taken_at), '-infinity') FROM stock_checkpoints) THEN
+        PERFORM take_stock_checkpoint(v_day);
+    END IF;
+    SELECT max(checked_at) - interval '1 hour' INTO v_since FROM stock_checks;
+
+    CREATE TEMP TABLE stock_check ON COMMIT DROP AS
+    SELECT p.sku, p.stock_qty, stock_on_hand(p.sku) AS ledger
+      FROM products p
+     WHERE p.sku IN (SELECT sku FROM stock_moves WHERE created_at >= COALESCE(v_since, '-infinity')
+                     UNION
+                     SELECT sku FROM products WHERE updated_at >= COALESCE(v_since, '-infinity')
+                     UNION
+                     SELECT sku FROM stock_drift);
+
+    DELETE FROM stock_drift d USING stock_check c
+     WHERE d.sku = c.sku AND c.stock_qty = c.ledger;
+    INSERT INTO stock_drift (sku, stock_qty, ledger)
+    SELECT sku, stock_qty, ledger FROM stock_check WHERE stock_qty <> ledger
+        ON CONFLICT (sku) DO UPDATE SET stock_qty = EXCLUDED.stock_qty, ledger = EXCLUDED.ledger;
+
+    SELECT count(*) INTO checked FROM stock_check;
+    SELECT count(*) INTO drifted FROM stock_drift;
+    INSERT INTO stock_checks (since, skus, drifted) VALUES (v_since, checked, drifted);
+    DROP TABLE stock_check;
+END $$;
+
+SELECT take_stock_checkpoint(date_trunc('day', now() - interval '1 hour', 'America/Los_Angeles'));
@@ -0,0 +1,72 @@
+-- Notion to Sew — migration 013: stocktakes
+--
+-- Counting the shelves meant typing each count over StockQty in the inventory
+-- grid, one cell at a time, then saving the whole catalogue through
+-- update_inventory_batch, a row at a time. The ledger called every one of
+-- those an 'adjustment', though 'count' has been in stock_reason since the
+-- start, and nothing said afterwards what the count had found.
+--
+-- A stocktake collects counts first and changes nothing until it's applied:
+--
+--   stocktakes        one per count, open until applied.
+--   stocktake_counts  one row per SKU counted. Any number of phones can count
+--                     into the same stocktake; a SKU counted again replaces
+--                     its count, or adds to it when it sits on two shelves.
+--                     `expected` is stock_qty when the count was taken.
+--
+-- apply_stocktake() applies every count at once, in one transaction. The stock
+-- moves by counted - expected rather than being set to counted: a sale rung up
+-- between the count and the apply has already taken its unit off stock_qty,
+-- and setting it to the count would put that unit back. SKUs nobody counted
+-- are left alone, so an aisle at a time is a stocktake too.
+
+CREATE TABLE stocktakes (
+    id         serial PRIMARY KEY,
+    name       text NOT NULL CHECK (btrim(name) <> ''),
+    opened_at  timestamptz NOT NULL DEFAULT now(),
+    applied_at timestamptz
+);
+
+CREATE TABLE stocktake_counts (
+    stocktake_id integer NOT NULL REFERENCES stocktakes(id) ON DELETE CASCADE,
+    sku          text NOT NULL REFERENCES products(sku) ON DELETE CASCADE,
+    counted      integer NOT NULL CHECK (counted >= 0),
+    expected     integer NOT NULL,
+    counted_by   text,
+    counted_at   timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (stocktake_id, sku)
+);
+
+-- Returns what it applied, biggest variance first. The products are locked
+-- in SKU order before any is touched, as record_sale does (007), so a sale
+-- mid-apply queues behind it instead of deadlocking with it.
+CREATE OR REPLACE FUNCTION apply_stocktake(p_id integer)
+RETURNS TABLE (sku text, expected integer, counted integer, variance integer)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+BEGIN
+    PERFORM 1 FROM stocktakes WHERE id = p_id AND applied_at IS NULL FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'stocktake % is not open', p_id;
+    END IF;
+    PERFORM 1 FROM products
+      WHERE sku IN (SELECT sku FROM stocktake_counts
+                     WHERE stocktake_id = p_id AND counted <> expected)
+      ORDER BY sku FOR NO KEY UPDATE;
+
+    WITH moved AS (
+        UPDATE products p SET stock_qty = p.stock_qty + c.counted - c.expected
+          FROM stocktake_counts c
+         WHERE c.stocktake_id = p_id AND c.sku = p.sku AND c.counted <> c.expected
+        RETURNING p.sku, c.counted - c.expected AS delta
+    )
+    INSERT INTO stock_moves (sku, delta, reason, note)
+    SELECT m.sku, m.delta, 'count', s.name
+      FROM moved m, stocktakes s WHERE s.id = p_id;
+
+    UPDATE stocktakes SET applied_at = now() WHERE id = p_id;
+    RETURN QUERY
+        SELECT c.sku, c.expected, c.counted, c.counted - c.expected
+          FROM stocktake_counts c WHERE c.stocktake_id = p_id
+         ORDER BY abs(c.counted - c.expected) DESC, c.sku;
+END $$;
@@ -0,0 +1,60 @@
+"""Text vs binary COPY, table by table.
+
+    DATABASE_URL=... python db/bench_copy.py          # 100x today's data
+    DATABASE_URL=... python db/bench_copy.py 10       # or any other scale
+
+Builds a db/synthetic.py payload, runs it through migrate.transform() once and
+holds the rows, then COPYs them into a scratch schema twice: once in text
+format, with the server parsing every value, and once in binary, typed with
+set_types. The scratch schema is created and dropped here; nothing else in
+the database is touched. Point it at a local Postgres — over a network link
+the wire, not the formatting, is what gets measured. load.BINARY records
+which one won, and why.
+"""
+import os
+import sys
+import pathlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import load             # noqa: E402
+import migrate          # noqa: E402
+import synthetic        # noqa: E402
+
+SCHEMA = "bench_copy"
+
+
+def main():
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+    print(f"building payload at {scale:g}x...")
+    tables, _ = migrate.transform(synthetic.sheets(scale))
+    rows = {t: list(load._rows(tables[t], cols)) for t, cols in load.COLUMNS.items()}
+
+    schema = (pathlib.Path(__file__).parent / "schema.sql").read_text()
+    with load._connect(load._url()) as conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"SET search_path = {SCHEMA}")
+        cur.execute(schema)
+        conn.commit()
+        try:
+            totals = {}
+            for name, binary in (("text", False), ("binary", True)):
+                print(f"\n=== {name} ===")
+                cur.execute(f"TRUNCATE {', '.join(load.COLUMNS)} CASCADE")
+                n = size = secs = 0
+                for table, cols in load.COLUMNS.items():
+                    r = load._copy(cur, table, cols, rows[table], binary=binary)
+                    print(load._throughput(table, *r))
+                    n, size, secs = n + r[0], size + r[1], secs + r[2]
+                conn.commit()
+                print(load._throughput("all", n, size, secs) + f"  {secs:.2f}s")
+                totals[name] = secs
+            print(f"\nbinary takes {totals['binary'] / totals['text']:.0%} of the text time")
+        finally:
+            conn.rollback()
+            cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+            conn.commit()
+
+
+if __name__ == "__main__":
+    main()
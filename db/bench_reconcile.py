@@ -0,0 +1,57 @@
+"""How long transform + reconcile take as the sheet grows.
+
+    python db/bench_reconcile.py                 # today, 10x, 100x
+    python db/bench_reconcile.py 1 10 128        # scales, as multiples of today
+
+Runs the dry-run pipeline over db/synthetic.py data, with no spreadsheet and
+no database: every stream is drained exactly as migrate.py does without
+--load, then the checks are evaluated. Scale 128 is about a million line
+items.
+
+At large scales the last check, "invoice sequence starts above every existing
+id", fails by design: the synthetic invoice ids run past 10200. The timing is
+what matters here.
+"""
+import os
+import sys
+import time
+import resource
+import collections
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import migrate          # noqa: E402
+import synthetic        # noqa: E402
+
+
+def run(scale):
+    raw = synthetic.sheets(scale)
+    rec = migrate.Reconciler()
+    t0 = time.perf_counter()
+    tables, _ = migrate.transform(raw, rec)
+    for rows in tables.values():
+        collections.deque(rows, maxlen=0)
+    t1 = time.perf_counter()
+    checks = rec.checks()
+    t2 = time.perf_counter()
+    return rec, checks, t1 - t0, t2 - t1
+
+
+def main():
+    scales = [float(a) for a in sys.argv[1:]] or [1, 10, 100]
+    print(f"{'scale':>7} {'lines':>10} {'invoices':>9} {'transform':>10} {'checks':>8}"
+          f" {'lines/s':>10} {'peak RSS':>9}  failed")
+    for scale in scales:
+        rec, checks, stream, settle = run(scale)
+        lines = rec.rows["invoice_lines"]
+        failed = [label for ok, label, _ in checks if not ok]
+        # ru_maxrss is KiB on Linux; it only ever grows, so a scale's figure is
+        # the high-water mark of everything up to and including it.
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{scale:>7g} {lines:>10,} {rec.rows['invoices']:>9,} {stream:>9.2f}s"
+              f" {settle * 1000:>6.1f}ms {lines / stream:>10,.0f} {rss:>7.0f}MB  {len(failed)}")
+        for label in failed:
+            print(f"{'':>9}✗ {label}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,60 @@
-"""Loads a transformed payload into Postgres, in one transaction.
+"""Loads a transformed payload into Postgres.
 
 Imported by migrate.py --load. Kept separate so the dry run never needs a
-database driver installed.
+database driver installed. Also loads a payload migrate.py already wrote:
+
+    python db/load.py [payload_dir]                  # rebuild from it
+    python db/load.py --incremental [payload_dir]    # sync a live database
+
+Each table may be a list or a generator; rows are COPY'd as they arrive, so a
+streamed payload is never held in memory whole.
+
+Two modes:
+
+    load()              rebuild from scratch, in one transaction
+    load_incremental()  bring a live database up to date with the payload,
+                        one table at a time, resuming where it stopped
 """
 import os
+import sys
+import json
+import time
+import hashlib
+import functools
 import pathlib
+from decimal import Decimal
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
 
 import psycopg
+from psycopg.copy import LibpqWriter
+
+# Load order, and the columns each table takes from the payload.
+COLUMNS = {
+    "customers": ["id", "name", "email", "phone", "address", "notes",
+                  "joined_on", "credit", "is_wholesale", "tax_rate"],
+    "products": ["sku", "name", "price", "wholesale_price", "cost",
+                 "stock_qty", "vendor", "category", "active"],
+    "invoices": ["id", "customer_id", "status", "payment", "tax",
+                 "credit_applied", "discount", "total", "is_wholesale",
+                 "due_date", "sold_at", "paid_at", "note"],
+    "invoice_lines": ["invoice_id", "sku", "description", "qty", "unit_price"],
+    "vendors": ["id", "name", "contact", "phone", "email", "address"],
+    "expenses": ["spent_on", "category", "amount", "description"],
+    "settings": ["key", "value"],
+}
+
+# Primary keys, for the tables that have a natural one.
+KEYS = {"customers": "id", "products": "sku", "invoices": "id", "vendors": "id"}
+
+# Columns the app owns once it is live: sales spend credit and move stock,
+# invoices get marked paid and have freight added. A re-sync writes these for
+# new rows only — overwriting them would quietly undo real business.
+LIVE = {
+    "customers": {"credit"},
+    "products": {"stock_qty"},
+    "invoices": {"status", "paid_at", "total"},
+}
 
 
 def _url():
@@ -21,20 +69,200 @@ def _url():
     raise SystemExit("DATABASE_URL not set and .env.local has no value")
 
 
+def _connect(url):
+    conn = psycopg.connect(url)
+    # Historic timestamps are naive strings written by an app pinned to
+    # Pacific. Interpreting them in that zone keeps sale times honest
+    # instead of silently shifting the whole ledger by 7-8 hours.
+    conn.execute("SET TIME ZONE 'America/Los_Angeles'")
+    return conn
+
+
+def _checksum(file):
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _ndjson(file, cols, expect):
+    # Hashed again on the way through: a file changed after read_payload()
+    # checked it fails here, before the COPY it is feeding can commit.
+    digest, n = hashlib.sha256(), 0
+    with open(file, "rb") as f:
+        for line in f:
+            digest.update(line)
+            n += 1
+            yield dict(zip(cols, json.loads(line)))
+    if digest.hexdigest() != expect["sha256"] or n != expect["rows"]:
+        raise ValueError(f"{file} changed while loading — nothing from it was committed")
+
+
+def read_payload(path):
+    """{table: rows} from a payload directory written by migrate.Payload,
+    streamed a line at a time. Every file is checked against the manifest
+    first, and a single mismatch refuses the whole payload: a half-copied or
+    hand-edited table never gets as far as a COPY."""
+    path = pathlib.Path(path)
+    try:
+        manifest = json.loads((path / "manifest.json").read_text())
+    except FileNotFoundError:
+        raise SystemExit(f"{path} has no manifest.json — the run that wrote it never finished")
+    if not manifest.get("checks_passed"):
+        raise SystemExit(f"{path} failed its reconciliation checks; fix those first")
+    tables = manifest["tables"]
+    bad = [t for t, m in tables.items() if _checksum(path / m["file"]) != m["sha256"]]
+    if bad:
+        raise SystemExit(f"refusing {path}: checksum mismatch in {', '.join(bad)}")
+    missing = [t for t in COLUMNS if t not in tables]
+    if missing:
+        raise SystemExit(f"refusing {path}: no {', '.join(missing)}")
+    return {t: _ndjson(path / m["file"], m["columns"], m) for t, m in tables.items()}
+
+
 def _rows(items, cols):
-    return [tuple(i.get(c) for c in cols) for i in items]
+    return (tuple(i.get(c) for c in cols) for i in items)
+
+
+# -- COPY ----------------------------------------------------------------------
+# In binary, psycopg packs each Decimal, date and bool straight into Postgres'
+# wire format, typed up front with set_types, instead of printing it for the
+# server to parse back. The price is that nothing gets parsed server-side any
+# more: values still in spreadsheet form have to become the real type here.
+#
+# Measured with db/bench_copy.py at 100x today's data against a local
+# Postgres, the two formats load within noise of each other: the time goes to
+# index and foreign-key upkeep and to building rows, not to parsing. Binary
+# numerics are also nearly twice the bytes of their text, and production is
+# across a network. So text stays the default; binary is here to measure.
+BINARY = False
+
+PACIFIC = ZoneInfo("America/Los_Angeles")
+_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y")
+
+
+def _when(v):
+    if isinstance(v, datetime):
+        return v
+    try:
+        return datetime.fromisoformat(v)
+    except ValueError:
+        for fmt in _FORMATS:
+            try:
+                return datetime.strptime(v, fmt)
+            except ValueError:
+                pass
+    raise ValueError(f"unrecognised date {v!r}")
+
+
+# Cached: paid_at repeats the row's sold_at, and due dates repeat endlessly.
+@functools.lru_cache(maxsize=4096)
+def _timestamptz(v):
+    t = _when(v)
+    # Naive, like every timestamp the old app wrote: it meant shop time. This
+    # is what SET TIME ZONE did for the text path.
+    return t if t.tzinfo else t.replace(tzinfo=PACIFIC)
+
+
+@functools.lru_cache(maxsize=4096)
+def _date(v):
+    return v if isinstance(v, date) and not isinstance(v, datetime) else _when(v).date()
+
+
+def _bool(v):
+    return v if isinstance(v, bool) else str(v).strip().upper() in ("TRUE", "T", "1", "YES")
+
+
+# The Python type each column type dumps from, and how a value that isn't one
+# yet becomes one.
+_PY = {"numeric": Decimal, "int2": int, "int4": int, "int8": int, "bool": bool,
+       "date": date, "timestamptz": datetime}
+_CAST = {
+    "numeric": lambda v: v if isinstance(v, Decimal) else Decimal(str(v)),
+    "int2": int, "int4": int, "int8": int,
+    "bool": _bool,
+    "date": _date,
+    "timestamptz": _timestamptz,
+}
+
+
+def _types(cur, table, cols):
+    """The declared type of each column, as psycopg names them. Read from the
+    catalog rather than written down, so it follows the migrations. Enums
+    travel as their label: enum_recv reads exactly what a text dumper sends."""
+    cur.execute("""
+        SELECT a.attname, CASE WHEN t.typtype = 'e' THEN 'text' ELSE t.typname END
+          FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid
+         WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    """, (table,))
+    types = dict(cur.fetchall())
+    return [types[c] for c in cols]
+
+
+class _Counted(LibpqWriter):
+    """Counts what actually goes over the wire."""
+
+    def __init__(self, cursor):
+        super().__init__(cursor)
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        super().write(data)
 
 
-def load(out, schema_path=None):
+def _copy(cur, table, cols, rows, digest=None, binary=None):
+    """COPY `rows` (tuples, in `cols` order) into `table`. Returns (rows,
+    bytes, seconds); `digest`, if given, is fed each row as written."""
+    binary = BINARY if binary is None else binary
+    # A column is cast only if its first value needs it. Payload columns are
+    # uniformly typed — transform() hands over Decimals, a text payload hands
+    # over strings — and a per-value check on a column that never needs one
+    # costs more than the binary format saves.
+    types = _types(cur, table, cols) if binary else []
+    undecided = {i: t for i, t in enumerate(types) if t in _CAST}
+    casts = []
+    writer = _Counted(cur)
+    n, t0 = 0, time.perf_counter()
+    with cur.copy(f"COPY {table} ({', '.join(cols)}) FROM STDIN"
+                  f"{' (FORMAT BINARY)' if binary else ''}", writer=writer) as cp:
+        if binary:
+            cp.set_types(types)
+        for row in rows:
+            if undecided:
+                for i, t in list(undecided.items()):
+                    if row[i] is not None:
+                        del undecided[i]
+                        if not isinstance(row[i], _PY[t]):
+                            casts.append((i, _CAST[t]))
+            if casts:
+                row = list(row)
+                for i, cast in casts:
+                    if row[i] is not None:
+                        row[i] = cast(row[i])
+            if digest is not None:
+                digest.update(repr(tuple(row)).encode())
+            # psycopg gathers rows into its own buffer and sends it in large
+            # chunks, so this is already batched on the wire.
+            cp.write_row(row)
+            n += 1
+    return n, writer.bytes, time.perf_counter() - t0
+
+
+def _throughput(table, n, size, secs):
+    return (f"    {table:<16} {n:>9,}  {n / secs if secs else 0:>10,.0f} rows/s"
+            f"  {size / 1e6:>8.2f} MB")
+
+
+def load(out, schema_path=None, verify=None):
+    """`out` maps table -> rows, consumed in load order. `verify`, if given, is
+    called once everything is in but before COMMIT; a falsy result rolls the
+    whole load back. Returns whether it committed."""
     url = _url()
     schema = pathlib.Path(schema_path or (pathlib.Path(__file__).parent / "schema.sql"))
 
-    with psycopg.connect(url) as conn:
-        # Historic timestamps are naive strings written by an app pinned to
-        # Pacific. Interpreting them in that zone keeps sale times honest
-        # instead of silently shifting the whole ledger by 7-8 hours.
-        conn.execute("SET TIME ZONE 'America/Los_Angeles'")
-
+    with _connect(url) as conn:
         with conn.cursor() as cur:
             # Idempotent: a re-run rebuilds from scratch. DDL is transactional
             # in Postgres, so a failure anywhere below leaves the database
@@ -44,39 +272,9 @@ def load(out, schema_path=None):
             print("  applying schema...")
             cur.execute(schema.read_text())
 
-            def copy(table, cols, items):
-                if not items:
-                    print(f"    {table:<16} 0")
-                    return
-                with cur.copy(
-                    f"COPY {table} ({', '.join(cols)}) FROM STDIN"
-                ) as cp:
-                    for row in _rows(items, cols):
-                        cp.write_row(row)
-                print(f"    {table:<16} {len(items)}")
-
             print("  loading...")
-            copy("customers",
-                 ["id", "name", "email", "phone", "address", "notes",
-                  "joined_on", "credit", "is_wholesale", "tax_rate"],
-                 out["customers"])
-            copy("products",
-                 ["sku", "name", "price", "wholesale_price", "cost",
-                  "stock_qty", "vendor", "category", "active"],
-                 out["products"])
-            copy("invoices",
-                 ["id", "customer_id", "status", "payment", "tax",
-                  "credit_applied", "discount", "total", "is_wholesale",
-                  "due_date", "sold_at", "paid_at", "note"],
-                 out["invoices"])
-            copy("invoice_lines",
-                 ["invoice_id", "sku", "description", "qty", "unit_price"],
-                 out["invoice_lines"])
-            copy("vendors", ["id", "name", "contact", "phone", "email", "address"],
-                 out["vendors"])
-            copy("expenses", ["spent_on", "category", "amount", "description"],
-                 out["expenses"])
-            copy("settings", ["key", "value"], out["settings"])
+            for table, cols in COLUMNS.items():
+                print(_throughput(table, *_copy(cur, table, cols, _rows(out[table], cols))))
 
             # Opening balances, so the stock ledger explains every unit on hand.
             cur.execute("""
@@ -104,5 +302,226 @@ def load(out, schema_path=None):
             """)
             print(f"    next invoice no  {cur.fetchone()[0]}")
 
+        if verify is not None and not verify():
+            conn.rollback()
+            print("  rolled back — nothing was written.")
+            return False
         conn.commit()
     print("  committed.")
+    return True
+
+
+def _stage(cur, table, cols, items):
+    """COPY `items` into a session-local copy of `table`. Returns the row count
+    and a digest of exactly what was staged."""
+    stage = f"stage_{table}"
+    cur.execute(f"DROP TABLE IF EXISTS {stage}")
+    # Types only, no constraints: the real table checks them on the way in.
+    cur.execute(f"CREATE TEMP TABLE {stage} AS SELECT {', '.join(cols)} FROM {table} WITH NO DATA")
+    digest = hashlib.sha256()
+    n, _, _ = _copy(cur, stage, cols, _rows(items, cols), digest)
+    return n, digest.hexdigest()
+
+
+def _upsert(cur, table, cols):
+    key = KEYS[table]
+    live = LIVE.get(table, set())
+    sets = [c for c in cols if c != key and c not in live]
+    col_list = ", ".join(cols)
+    if table in _BY_YEAR:
+        return _update_insert(cur, table, cols, key, sets)
+    cur.execute(f"""
+        WITH up AS (
+            INSERT INTO {table} AS t ({col_list})
+            SELECT {col_list} FROM stage_{table}
+            ON CONFLICT ({key}) DO UPDATE
+               SET {", ".join(f"{c} = EXCLUDED.{c}" for c in sets)}
+             WHERE ({", ".join(f"t.{c}" for c in sets)})
+                   IS DISTINCT FROM ({", ".join(f"EXCLUDED.{c}" for c in sets)})
+            RETURNING t.*, (t.xmax = 0) AS inserted
+        ){_upsert_tail.get(table, "")}
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM up
+    """)
+    return cur.fetchone()
+
+
+# Partitioned by year (009), so their only unique key is (id, sold_at). A sale
+# whose date was corrected in the sheet doesn't conflict with itself on that,
+# and the INSERT would reach invoices_unique_id() and abort the load. They're
+# matched on id alone instead: an UPDATE of sold_at moves the row to its year's
+# partition, and ON UPDATE CASCADE takes its lines along.
+_BY_YEAR = {"invoices"}
+
+
+def _update_insert(cur, table, cols, key, sets):
+    col_list = ", ".join(cols)
+    cur.execute(f"""
+        UPDATE {table} t SET {", ".join(f"{c} = s.{c}" for c in sets)}
+          FROM stage_{table} s
+         WHERE t.{key} = s.{key}
+           AND ({", ".join(f"t.{c}" for c in sets)})
+               IS DISTINCT FROM ({", ".join(f"s.{c}" for c in sets)})
+    """)
+    changed = cur.rowcount
+    cur.execute(f"""
+        INSERT INTO {table} ({col_list})
+        SELECT {col_list} FROM stage_{table} s
+         WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{key} = s.{key})
+    """)
+    return cur.rowcount, changed
+
+
+# Extra statements riding on an upsert, keyed by table.
+_upsert_tail = {
+    # A product that is new to the database arrives with its opening balance on
+    # the ledger, exactly as in a full load.
+    "products": """, moves AS (
+            INSERT INTO stock_moves (sku, delta, reason, note)
+            SELECT sku, stock_qty, 'migration', 'opening balance carried from the spreadsheet'
+              FROM up WHERE inserted AND stock_qty <> 0
+        )""",
+}
+
+
+def _merge_lines(cur, cols):
+    """Lines have no natural key, so compare each payload invoice's lines as a
+    multiset and replace them only where they differ. Lines of invoices the
+    payload doesn't carry — every sale rung up since cut-over — are left alone."""
+    col_list = ", ".join(cols)
+    cur.execute("DROP TABLE IF EXISTS changed_invoices")
+    cur.execute(f"""
+        CREATE TEMP TABLE changed_invoices AS
+        WITH cur AS (
+            SELECT {col_list} FROM invoice_lines
+             WHERE invoice_id IN (SELECT id FROM stage_invoices)
+        )
+        SELECT DISTINCT invoice_id AS id FROM (
+            (SELECT {col_list} FROM stage_invoice_lines EXCEPT ALL SELECT {col_list} FROM cur)
+            UNION ALL
+            (SELECT {col_list} FROM cur EXCEPT ALL SELECT {col_list} FROM stage_invoice_lines)
+        ) d
+    """)
+    cur.execute("DELETE FROM invoice_lines WHERE invoice_id IN (SELECT id FROM changed_invoices)")
+    cur.execute(f"""
+        INSERT INTO invoice_lines ({col_list}, sold_at)
+        SELECT {", ".join(f"s.{c}" for c in cols)}, i.sold_at
+          FROM stage_invoice_lines s JOIN invoices i ON i.id = s.invoice_id
+         WHERE s.invoice_id IN (SELECT id FROM changed_invoices)
+    """)
+    cur.execute("""
+        UPDATE invoices i SET subtotal = COALESCE(s.sum, 0)
+          FROM changed_invoices c
+          LEFT JOIN (SELECT invoice_id, ROUND(SUM(line_total), 2) AS sum
+                       FROM invoice_lines
+                      WHERE invoice_id IN (SELECT id FROM changed_invoices)
+                      GROUP BY invoice_id) s ON s.invoice_id = c.id
+         WHERE i.id = c.id
+    """)
+    cur.execute("SELECT count(*) FROM changed_invoices")
+    return cur.fetchone()[0]
+
+
+def load_incremental(out):
+    """Bring an already-loaded database up to date with `out`, without taking
+    it down. Nothing is dropped and nothing is deleted: rows are inserted or
+    updated in place, so the app's own writes since cut-over survive.
+
+    Each table is staged with COPY, diffed against the live table, merged, and
+    checkpointed in its own transaction. The checkpoint records a digest of the
+    staged rows; a table whose digest matches its checkpoint is already in and
+    is skipped. So an interrupted run, started again, redoes only the table it
+    was on and what came after.
+
+    There is no verify hook: with a commit per table there is no single moment
+    to veto the whole thing. Run the dry run first — migrate.py does.
+    """
+    with _connect(_url()) as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS load_checkpoints (
+                    table_name text PRIMARY KEY,
+                    digest     text NOT NULL,
+                    rows       bigint NOT NULL,
+                    loaded_at  timestamptz NOT NULL DEFAULT now()
+                )
+            """)
+            conn.commit()
+            # A database that hasn't had 010 has no archive to leave out.
+            cur.execute("SELECT to_regclass('archived_invoices') IS NOT NULL")
+            archive = cur.fetchone()[0]
+
+            print("  syncing...")
+            for table, cols in COLUMNS.items():
+                # Staged even when it turns out unchanged: the payload's tables
+                # share state and are consumed in order, and later merges
+                # read earlier stages (lines are scoped by stage_invoices).
+                n, digest = _stage(cur, table, cols, out[table])
+                # An archived year (010) has no partition left to land in,
+                # and its numbers are taken; the payload still carries it. Out
+                # of both stages, whether or not invoices is skipped below:
+                # lines left in would have _merge_lines find them missing from
+                # the live table and count them changed on every run.
+                if archive and table == "invoices":
+                    cur.execute("DELETE FROM stage_invoices WHERE id IN (SELECT id FROM archived_invoices)")
+                elif archive and table == "invoice_lines":
+                    cur.execute("""DELETE FROM stage_invoice_lines
+                                    WHERE invoice_id IN (SELECT id FROM archived_invoices)""")
+                cur.execute("SELECT digest FROM load_checkpoints WHERE table_name = %s", (table,))
+                done = cur.fetchone()
+                if done and done[0] == digest:
+                    conn.commit()
+                    print(f"    {table:<16} {n} rows, unchanged since last load")
+                    continue
+
+                if table in KEYS:
+                    added, changed = _upsert(cur, table, cols)
+                    summary = f"+{added} new, {changed} changed"
+                elif table == "invoice_lines":
+                    summary = f"lines replaced on {_merge_lines(cur, cols)} invoices"
+                elif table == "expenses":
+                    # No key, and nobody edits an expense: add what's missing.
+                    col_list = ", ".join(cols)
+                    cur.execute(f"""
+                        INSERT INTO expenses ({col_list})
+                        SELECT {col_list} FROM stage_expenses
+                        EXCEPT ALL SELECT {col_list} FROM expenses
+                    """)
+                    summary = f"+{cur.rowcount} new"
+                else:
+                    # Settings belong to the Settings page now; only add keys
+                    # the database has never seen.
+                    cur.execute("""
+                        INSERT INTO settings (key, value) SELECT key, value FROM stage_settings
+                        ON CONFLICT (key) DO NOTHING
+                    """)
+                    summary = f"+{cur.rowcount} new"
+
+                cur.execute("""
+                    INSERT INTO load_checkpoints (table_name, digest, rows)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (table_name) DO UPDATE
+                       SET digest = EXCLUDED.digest, rows = EXCLUDED.rows, loaded_at = now()
+                """, (table, digest, n))
+                conn.commit()
+                print(f"    {table:<16} {n} rows, {summary}")
+
+            # Only ever forward: the app may already have handed out numbers
+            # past anything in the payload.
+            cur.execute("""
+                SELECT setval('invoice_no_seq', GREATEST(
+                    (SELECT COALESCE(MAX(id), 0) FROM invoices) + 1, 10200,
+                    (SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END
+                       FROM invoice_no_seq)), false)
+            """)
+            print(f"    next invoice no  {cur.fetchone()[0]}")
+            conn.commit()
+    print("  done.")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    payload = read_payload(args[0] if args else pathlib.Path(__file__).parent / "migration_payload")
+    if "--incremental" in sys.argv:
+        load_incremental(payload)
+    elif not load(payload):
+        sys.exit(1)
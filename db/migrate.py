@@ -4,15 +4,25 @@ Runs in two modes:
 
     python db/migrate.py            # dry run: transform + reconcile, touches nothing
     python db/migrate.py --load     # dry run, then load into $DATABASE_URL
+    python db/migrate.py --load --incremental
+                                    # dry run, then sync a live database in
+                                    # place: no rebuild, no downtime, resumable
 
 The dry run is the point. It does every transform, resolves every foreign-key
 violation, and reconciles totals against the spreadsheet. If the report is clean,
 the load is a formality; if it isn't, nothing has been written yet.
+
+Rows stream. Each worksheet is read a page at a time, each table is a generator,
+and --load COPYs rows as they are produced while the reconciliation counters
+fill in alongside. Nothing is committed until every check has passed: a failed
+check rolls the whole load back, exactly as if it had never started.
 """
 import os
 import re
 import sys
 import json
+import hashlib
+import functools
 import collections
 from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
@@ -32,10 +42,18 @@ STATUS = {"paid": "paid", "pending": "pending", "void": "void",
 
 NON_PRODUCT_SKUS = {"FREIGHT", "GIFT-CERT", ""}
 
+PAGE = 2000     # worksheet rows fetched per Sheets request
+
+
+CENT = Decimal("0.01")
+
 
+@functools.lru_cache(maxsize=1 << 16)
 def money(v):
+    # Cached: a sheet has a few thousand distinct prices and every line is
+    # parsed more than once. Decimals are immutable, so sharing them is safe.
     try:
-        return Decimal(str(v).strip() or 0).quantize(Decimal("0.01"), ROUND_HALF_UP)
+        return Decimal(str(v).strip() or 0).quantize(CENT, ROUND_HALF_UP)
     except Exception:
         return Decimal("0.00")
 
@@ -60,117 +78,63 @@ def connect():
     return gc.open("NotionToSew_DB")
 
 
+class Tab:
+    """One worksheet, read a page at a time.
+
+    Iterable more than once: transform() passes over TransactionItems twice,
+    and a second pass costs a few requests where holding the sheet costs memory
+    in proportion to its length.
+    """
+
+    def __init__(self, ws, page=PAGE):
+        self.ws, self.page = ws, page
+
+    def __iter__(self):
+        last = self.ws.row_count
+        for start in range(2, last + 1, self.page):          # row 1 is the header
+            end = min(start + self.page - 1, last)
+            for r in self.ws.get_values(f"{start}:{end}"):
+                if r and any(c.strip() for c in r):
+                    yield r
+
+
 def extract(sh):
-    def rows(tab):
-        return [r for r in sh.worksheet(tab).get_all_values()[1:]
-                if r and any(c.strip() for c in r)]
-    return {t: rows(t) for t in
+    return {t: Tab(sh.worksheet(t)) for t in
             ("Inventory", "Transactions", "TransactionItems", "Customers",
              "Vendors", "Expenses", "Settings")}
 
 
-def transform(raw):
-    out, notes = {}, []
+def transform(raw, rec=None):
+    """Returns ({table: generator of rows}, notes).
 
-    # -- customers ----------------------------------------------------------
-    customers, seen = [], set()
-    for r in raw["Customers"]:
-        cid = r[0].strip()
-        if not cid or cid in seen:
-            notes.append(f"customer row skipped (blank or duplicate id): {r[:2]}")
-            continue
-        seen.add(cid)
-        g = lambda i: r[i].strip() if len(r) > i else ""
-        rate = g(9)
-        customers.append(dict(
-            id=cid, name=g(1), email=g(2) or None, phone=g(3) or None,
-            joined_on=g(4) or None, address=g(5) or None, notes=g(6) or None,
-            credit=money(g(7)), is_wholesale=truthy(g(8)),
-            tax_rate=(Decimal(rate) if re.fullmatch(r"0?\.\d+", rate) else None),
-        ))
-    out["customers"] = customers
-    known_cust = seen
+    The generators share state — invoices need to know which customers exist,
+    lines which invoices and products do — so they must be consumed in the
+    order given, each to the end before the next starts. load() does exactly
+    that. `notes` fills in as they run.
+    """
+    notes = []
+    rec = rec or Reconciler()
 
-    # -- products -----------------------------------------------------------
-    products, pseen = [], set()
-    for r in raw["Inventory"]:
-        sku = r[0].strip()
-        if not sku or sku in pseen:
-            notes.append(f"product row skipped (blank or duplicate sku): {r[:2]}")
-            continue
-        pseen.add(sku)
-        g = lambda i: r[i].strip() if len(r) > i else ""
-        products.append(dict(
-            sku=sku, name=g(1) or sku, price=money(g(2)), stock_qty=as_int(g(3)),
-            vendor=g(4) or None, category=g(5) or None,
-            wholesale_price=(money(g(6)) if g(6) else None),
-            cost=(money(g(7)) if g(7) else None),
-            active=(g(8).upper() != "FALSE"),
-        ))
-
-    # 1,056 line items point at 264 SKUs that no longer exist in Inventory.
-    # Their names survive on the line items, so rebuild them as inactive
-    # products rather than dropping the FK or losing the history.
-    line_names = {}
-    for r in raw["TransactionItems"]:
-        sku = r[1].strip() if len(r) > 1 else ""
-        if sku and sku not in NON_PRODUCT_SKUS and sku not in pseen:
-            line_names.setdefault(sku, collections.Counter())[
-                (r[4].strip() if len(r) > 4 else "") or sku] += 1
-    for sku, names in line_names.items():
-        products.append(dict(
-            sku=sku, name=names.most_common(1)[0][0], price=Decimal("0.00"),
-            stock_qty=0, vendor=None, category="Discontinued",
-            wholesale_price=None, cost=None, active=False,
-        ))
-    notes.append(f"recreated {len(line_names)} discontinued products from line-item names")
-    out["products"] = products
-    known_sku = pseen | set(line_names)
-
-    # -- invoices -----------------------------------------------------------
-    invoices, iseen = [], set()
-    for r in raw["Transactions"]:
-        iid = r[0].strip()
-        if not iid or iid in iseen:
-            notes.append(f"invoice skipped (blank or duplicate id): {iid!r}")
-            continue
-        iseen.add(iid)
-        g = lambda i: r[i].strip() if len(r) > i else ""
-        cust = g(4)
-        if cust in ("", "Guest") or cust not in known_cust:
-            if cust and cust != "Guest":
-                notes.append(f"invoice {iid}: customer {cust} does not exist -> walk-in (NULL)")
-            cust = None
-        status = STATUS.get(g(5).lower(), "pending")
-        pay_raw = g(3).lower()
-        pay = PAYMENT.get(pay_raw)
-        if pay is None and pay_raw:
-            pay = PAYMENT.get(pay_raw.split(" (")[0], None)   # "Check (+$5 Credit)"
-            if pay is None:
-                notes.append(f"invoice {iid}: unmapped payment {g(3)!r} -> NULL")
-        sold = g(1)
-        invoices.append(dict(
-            id=int(iid) if iid.isdigit() else None, raw_id=iid,
-            customer_id=cust, status=status, payment=pay,
-            total=money(g(2)), tax=money(g(7)),
-            is_wholesale=truthy(g(8)), due_date=g(6)[:10] or None,
-            sold_at=sold, paid_at=(sold if status == "paid" else None),
-            credit_applied=Decimal("0.00"), discount=Decimal("0.00"), note=None,
-        ))
-    out["invoices"] = [i for i in invoices if i["id"] is not None]
-    dropped = [i["raw_id"] for i in invoices if i["id"] is None]
-    if dropped:
-        notes.append(f"{len(dropped)} invoices have non-numeric ids: {dropped[:5]}")
-
-    # -- invoice lines ------------------------------------------------------
+    # One pass over the line items up front, for the little that has to be known
+    # before any table can be written: which discontinued SKUs to rebuild, and
+    # which invoices carried credit or a discount as a negative line.
+    #
     # Store credit was sometimes entered as a negative line item instead of in
     # the credit field. On invoice 80 that pushed the recorded total to -$1.36,
-    # which no sane schema should accept. Move those amounts into
-    # credit_applied where they belong and floor the total at zero, recording a
+    # which no sane schema should accept. Those amounts move into
+    # credit_applied where they belong and the total is floored at zero, with a
     # note on the invoice so the adjustment is auditable rather than silent.
+    line_names = {}
     credit_lines = collections.defaultdict(Decimal)
     discount_lines = collections.defaultdict(Decimal)
     for r in raw["TransactionItems"]:
+        rec.sheet_line(r)
+        sku = r[1].strip() if len(r) > 1 else ""
+        if sku and sku not in NON_PRODUCT_SKUS:
+            names = line_names.get(sku)
+            if names is None:
+                names = line_names[sku] = collections.Counter()
+            names[(r[4].strip() if len(r) > 4 else "") or sku] += 1
         iid = r[0].strip()
         if not iid.isdigit():
             continue
@@ -183,137 +147,348 @@ def transform(raw):
             else:
                 discount_lines[int(iid)] += amount   # "Discount", "40% Off Discount", ...
 
-    by_id = {i["id"]: i for i in out["invoices"]}
-    for iid, amt in discount_lines.items():
-        if iid in by_id:
-            by_id[iid]["discount"] = amt
-    notes.append(f"moved {len(discount_lines)} negative discount lines into invoices.discount "
-                 f"(${sum(discount_lines.values())})")
-    for iid, amt in credit_lines.items():
-        inv = by_id.get(iid)
-        if not inv:
-            continue
-        inv["credit_applied"] = amt
-        original = inv["total"]
-        if original < 0:
-            inv["total"] = Decimal("0.00")
-            inv["note"] = (f"migration: recorded total was {original}; store credit of "
-                           f"{amt} had been entered as a negative line item")
-            notes.append(f"invoice {iid}: total {original} -> 0.00, ${amt} moved to credit_applied")
-
-    valid_inv = {i["id"] for i in out["invoices"]}
-    lines = []
-    for r in raw["TransactionItems"]:
-        iid = r[0].strip()
-        if not iid.isdigit() or int(iid) not in valid_inv:
-            notes.append(f"line skipped, no such invoice: {iid!r}")
-            continue
-        g = lambda i: r[i].strip() if len(r) > i else ""
-        sku = g(1)
-        qty = Decimal(g(2) or 0)
-        if money(g(3)) < 0:
-            continue        # moved into invoices.credit_applied / .discount above
-        if qty == 0:
-            notes.append(f"line skipped, qty 0 on invoice {iid}")
-            continue
-        lines.append(dict(
-            invoice_id=int(iid),
-            sku=(sku if sku in known_sku and sku not in NON_PRODUCT_SKUS else None),
-            description=g(4) or sku or "Item",
-            qty=qty, unit_price=money(g(3)),
-        ))
-    out["invoice_lines"] = lines
+    known_cust, known_sku, valid_inv = set(), set(), set()
+
+    # -- customers ----------------------------------------------------------
+    def customers():
+        for r in raw["Customers"]:
+            cid = r[0].strip()
+            if not cid or cid in known_cust:
+                notes.append(f"customer row skipped (blank or duplicate id): {r[:2]}")
+                continue
+            known_cust.add(cid)
+            g = lambda i: r[i].strip() if len(r) > i else ""
+            rate = g(9)
+            yield dict(
+                id=cid, name=g(1), email=g(2) or None, phone=g(3) or None,
+                joined_on=g(4) or None, address=g(5) or None, notes=g(6) or None,
+                credit=money(g(7)), is_wholesale=truthy(g(8)),
+                tax_rate=(Decimal(rate) if re.fullmatch(r"0?\.\d+", rate) else None),
+            )
+
+    # -- products -----------------------------------------------------------
+    def products():
+        for r in raw["Inventory"]:
+            sku = r[0].strip()
+            if not sku or sku in known_sku:
+                notes.append(f"product row skipped (blank or duplicate sku): {r[:2]}")
+                continue
+            known_sku.add(sku)
+            g = lambda i: r[i].strip() if len(r) > i else ""
+            yield dict(
+                sku=sku, name=g(1) or sku, price=money(g(2)), stock_qty=as_int(g(3)),
+                vendor=g(4) or None, category=g(5) or None,
+                wholesale_price=(money(g(6)) if g(6) else None),
+                cost=(money(g(7)) if g(7) else None),
+                active=(g(8).upper() != "FALSE"),
+            )
+
+        # 1,056 line items point at 264 SKUs that no longer exist in Inventory.
+        # Their names survive on the line items, so rebuild them as inactive
+        # products rather than dropping the FK or losing the history.
+        gone = [sku for sku in line_names if sku not in known_sku]
+        for sku in gone:
+            known_sku.add(sku)
+            yield dict(
+                sku=sku, name=line_names[sku].most_common(1)[0][0], price=Decimal("0.00"),
+                stock_qty=0, vendor=None, category="Discontinued",
+                wholesale_price=None, cost=None, active=False,
+            )
+        notes.append(f"recreated {len(gone)} discontinued products from line-item names")
+
+    # -- invoices -----------------------------------------------------------
+    def invoices():
+        seen, dropped = set(), []
+        for r in raw["Transactions"]:
+            rec.sheet_invoice(r)
+            iid = r[0].strip()
+            if not iid or iid in seen:
+                notes.append(f"invoice skipped (blank or duplicate id): {iid!r}")
+                continue
+            seen.add(iid)
+            if not iid.isdigit():
+                dropped.append(iid)
+                continue
+            g = lambda i: r[i].strip() if len(r) > i else ""
+            cust = g(4)
+            if cust in ("", "Guest") or cust not in known_cust:
+                if cust and cust != "Guest":
+                    notes.append(f"invoice {iid}: customer {cust} does not exist -> walk-in (NULL)")
+                cust = None
+            status = STATUS.get(g(5).lower(), "pending")
+            pay_raw = g(3).lower()
+            pay = PAYMENT.get(pay_raw)
+            if pay is None and pay_raw:
+                pay = PAYMENT.get(pay_raw.split(" (")[0], None)   # "Check (+$5 Credit)"
+                if pay is None:
+                    notes.append(f"invoice {iid}: unmapped payment {g(3)!r} -> NULL")
+            sold = g(1)
+            inv = dict(
+                id=int(iid), customer_id=cust, status=status, payment=pay,
+                total=money(g(2)), tax=money(g(7)),
+                is_wholesale=truthy(g(8)), due_date=g(6)[:10] or None,
+                sold_at=sold, paid_at=(sold if status == "paid" else None),
+                credit_applied=Decimal("0.00"),
+                discount=discount_lines.get(int(iid), Decimal("0.00")), note=None,
+            )
+            amt = credit_lines.get(int(iid))
+            if amt is not None:
+                inv["credit_applied"] = amt
+                original = inv["total"]
+                if original < 0:
+                    inv["total"] = Decimal("0.00")
+                    inv["note"] = (f"migration: recorded total was {original}; store credit of "
+                                   f"{amt} had been entered as a negative line item")
+                    notes.append(f"invoice {iid}: total {original} -> 0.00, ${amt} moved to credit_applied")
+            valid_inv.add(inv["id"])
+            yield inv
+        if dropped:
+            notes.append(f"{len(dropped)} invoices have non-numeric ids: {dropped[:5]}")
+        notes.append(f"moved {len(discount_lines)} negative discount lines into invoices.discount "
+                     f"(${sum(discount_lines.values())})")
+
+    # -- invoice lines ------------------------------------------------------
+    def invoice_lines():
+        for r in raw["TransactionItems"]:
+            iid = r[0].strip()
+            if not iid.isdigit() or int(iid) not in valid_inv:
+                notes.append(f"line skipped, no such invoice: {iid!r}")
+                continue
+            g = lambda i: r[i].strip() if len(r) > i else ""
+            sku = g(1)
+            qty = Decimal(g(2) or 0)
+            price = money(g(3))
+            if price < 0:
+                continue        # moved into invoices.credit_applied / .discount above
+            if qty == 0:
+                notes.append(f"line skipped, qty 0 on invoice {iid}")
+                continue
+            yield dict(
+                invoice_id=int(iid),
+                sku=(sku if sku in known_sku and sku not in NON_PRODUCT_SKUS else None),
+                description=g(4) or sku or "Item",
+                qty=qty, unit_price=price,
+            )
 
     # -- vendors / expenses / settings --------------------------------------
-    out["vendors"] = [dict(id=r[0].strip(), name=(r[1].strip() if len(r) > 1 else "") or r[0].strip(),
+    def vendors():
+        for r in raw["Vendors"]:
+            if r[0].strip():
+                yield dict(id=r[0].strip(), name=(r[1].strip() if len(r) > 1 else "") or r[0].strip(),
                            contact=(r[2].strip() if len(r) > 2 else None) or None,
                            phone=(r[3].strip() if len(r) > 3 else None) or None,
                            email=(r[4].strip() if len(r) > 4 else None) or None,
                            address=(r[5].strip() if len(r) > 5 else None) or None)
-                      for r in raw["Vendors"] if r[0].strip()]
-    out["expenses"] = [dict(spent_on=r[0].strip(), category=(r[1].strip() if len(r) > 1 else "Other") or "Other",
-                            amount=money(r[2] if len(r) > 2 else 0),
-                            description=(r[3].strip() if len(r) > 3 else None) or None)
-                       for r in raw["Expenses"] if r and r[0].strip()]
-    out["settings"] = [dict(key=r[0].strip(), value=(r[1].strip() if len(r) > 1 else ""))
-                       for r in raw["Settings"] if r[0].strip()]
-    return out, notes
-
-
-def reconcile(raw, out):
-    """Everything that must be true before this is allowed near a database."""
-    checks = []
-
-    def check(label, ok, detail=""):
-        checks.append((ok, label, detail))
-
-    sheet_inv = [r for r in raw["Transactions"] if r[0].strip()]
-    check("every invoice migrated",
-          len(out["invoices"]) == len(sheet_inv),
-          f"{len(out['invoices'])} of {len(sheet_inv)}")
-
-    sheet_total = sum(money(r[2]) for r in sheet_inv if r[5].strip().lower() == "paid")
-    pg_total = sum(i["total"] for i in out["invoices"] if i["status"] == "paid")
-    # Every deviation must be an adjustment we chose and recorded on the invoice,
-    # never unexplained drift.
-    adjust = sum(money(i["total"]) - money(next(
-        (r[2] for r in sheet_inv if r[0].strip() == str(i["id"])), 0))
-        for i in out["invoices"] if i.get("note"))
-    check("paid revenue matches, net of recorded adjustments",
-          sheet_total + adjust == pg_total,
-          f"sheet ${sheet_total:,} + ${adjust} adjustment = ${sheet_total + adjust:,} "
-          f"vs migrated ${pg_total:,}")
-
-    sheet_lines = [r for r in raw["TransactionItems"] if r[0].strip()]
-    relocated = sum(1 for r in raw["TransactionItems"]
-                    if len(r) > 3 and money(r[3]) < 0)
-    check("every line item migrated or relocated to credit_applied",
-          len(out["invoice_lines"]) + relocated == len(sheet_lines),
-          f"{len(out['invoice_lines'])} lines + {relocated} relocated of {len(sheet_lines)}")
-
-    ids = [i["id"] for i in out["invoices"]]
-    check("invoice ids unique", len(ids) == len(set(ids)), f"{len(ids)} ids")
-    cids = [c["id"] for c in out["customers"]]
-    check("customer ids unique", len(cids) == len(set(cids)), f"{len(cids)} ids")
-    skus = [p["sku"] for p in out["products"]]
-    check("skus unique", len(skus) == len(set(skus)), f"{len(skus)} skus")
-
-    known_cust = {c["id"] for c in out["customers"]}
-    bad = [i["id"] for i in out["invoices"] if i["customer_id"] and i["customer_id"] not in known_cust]
-    check("no invoice points at a missing customer", not bad, str(bad[:5]))
-
-    known_sku = {p["sku"] for p in out["products"]}
-    bad = [l["invoice_id"] for l in out["invoice_lines"] if l["sku"] and l["sku"] not in known_sku]
-    check("no line points at a missing product", not bad, str(bad[:5]))
-
-    valid_inv = {i["id"] for i in out["invoices"]}
-    bad = [l["invoice_id"] for l in out["invoice_lines"] if l["invoice_id"] not in valid_inv]
-    check("no line points at a missing invoice", not bad, str(bad[:5]))
-
-    check("all paid invoices have a paid_at (CHECK constraint)",
-          all(i["paid_at"] for i in out["invoices"] if i["status"] == "paid"))
-    check("no negative money",
-          all(i["total"] >= 0 and i["tax"] >= 0 for i in out["invoices"]))
-    check("no negative line prices (CHECK constraint)",
-          all(l["unit_price"] >= 0 for l in out["invoice_lines"]))
-    check("no negative customer credit (CHECK constraint)",
-          all(c["credit"] >= 0 for c in out["customers"]))
-
-    max_id = max(ids) if ids else 0
-    check("invoice sequence starts above every existing id", max_id < 10200,
-          f"highest existing {max_id}, sequence starts 10200")
-    return checks
-
-
-def main():
-    sh = connect()
-    print("reading spreadsheet...")
-    raw = extract(sh)
-    out, notes = transform(raw)
 
+    def expenses():
+        for r in raw["Expenses"]:
+            if r and r[0].strip():
+                yield dict(spent_on=r[0].strip(), category=(r[1].strip() if len(r) > 1 else "Other") or "Other",
+                           amount=money(r[2] if len(r) > 2 else 0),
+                           description=(r[3].strip() if len(r) > 3 else None) or None)
+
+    def settings():
+        for r in raw["Settings"]:
+            if r[0].strip():
+                yield dict(key=r[0].strip(), value=(r[1].strip() if len(r) > 1 else ""))
+
+    streams = {"customers": customers(), "products": products(), "invoices": invoices(),
+               "invoice_lines": invoice_lines(), "vendors": vendors(),
+               "expenses": expenses(), "settings": settings()}
+    return {t: rec.observe(t, rows) for t, rows in streams.items()}, notes
+
+
+class Reconciler:
+    """Reconciliation in one pass, as rows stream past.
+
+    Each check is settled the moment the row it concerns goes by, against a set
+    or dict built from the tables before it: customers and products are
+    complete by the time invoices arrive, and invoices by the time lines do,
+    which is the order transform() yields them in. What stays behind is those
+    indexes and a handful of counters, never the rows — so the cost is one
+    lookup per row, whatever the size of the sheet.
+    """
+
+    SAMPLE = 5      # offending ids kept per check, for the report
+
+    def __init__(self):
+        self.rows = collections.Counter()
+        # The spreadsheet's side of the ledger.
+        self.sheet_invoices = 0
+        self.sheet_paid = Decimal("0.00")
+        self.sheet_totals = {}          # invoice id -> first recorded total, as typed
+        self.sheet_lines = 0
+        self.relocated = 0
+        # The migrated side.
+        self.keys = {"customers": set(), "products": set(), "invoices": set()}
+        self.dupes = collections.Counter()
+        self.bad = collections.defaultdict(list)
+        self.nbad = collections.Counter()
+        self.paid = Decimal("0.00")
+        self.adjust = Decimal("0.00")
+        self.max_id = 0
+
+    def _flag(self, check, value=None):
+        self.nbad[check] += 1
+        if value is not None and len(self.bad[check]) < self.SAMPLE:
+            self.bad[check].append(value)
+
+    def _key(self, table, key):
+        seen = self.keys[table]
+        if key in seen:
+            self.dupes[table] += 1
+        seen.add(key)
+
+    # -- spreadsheet rows, fed by transform() as it reads them ----------------
+    def sheet_invoice(self, r):
+        iid = r[0].strip()
+        if not iid:
+            return
+        self.sheet_invoices += 1
+        total = r[2] if len(r) > 2 else ""
+        self.sheet_totals.setdefault(iid, total)
+        if len(r) > 5 and r[5].strip().lower() == "paid":
+            self.sheet_paid += money(total)
+
+    def sheet_line(self, r):
+        if r[0].strip():
+            self.sheet_lines += 1
+        if len(r) > 3 and money(r[3]) < 0:
+            self.relocated += 1
+
+    # -- migrated rows ---------------------------------------------------------
+    def _customers(self, c):
+        self._key("customers", c["id"])
+        if c["credit"] < 0:
+            self._flag("credit")
+
+    def _products(self, p):
+        self._key("products", p["sku"])
+
+    def _invoices(self, i):
+        self._key("invoices", i["id"])
+        self.max_id = max(self.max_id, i["id"])
+        if i["customer_id"] and i["customer_id"] not in self.keys["customers"]:
+            self._flag("customer", i["id"])
+        if i["status"] == "paid":
+            self.paid += i["total"]
+            if not i["paid_at"]:
+                self._flag("paid_at")
+            if i.get("note"):
+                # Every deviation must be an adjustment we chose and recorded on
+                # the invoice, never unexplained drift. Only paid invoices count:
+                # a pending one's adjustment isn't in either revenue figure.
+                self.adjust += money(i["total"]) - money(self.sheet_totals.get(str(i["id"]), 0))
+        if i["total"] < 0 or i["tax"] < 0:
+            self._flag("money")
+
+    def _invoice_lines(self, l):
+        if l["sku"] and l["sku"] not in self.keys["products"]:
+            self._flag("product", l["invoice_id"])
+        if l["invoice_id"] not in self.keys["invoices"]:
+            self._flag("invoice", l["invoice_id"])
+        if l["unit_price"] < 0:
+            self._flag("line_price")
+
+    def observe(self, table, rows):
+        check = getattr(self, f"_{table}", None)
+        for row in rows:
+            self.rows[table] += 1
+            if check:
+                check(row)
+            yield row
+
+    def checks(self):
+        """Everything that must be true before this is allowed near a database."""
+        rows, nbad = self.rows, self.nbad
+        checks = []
+
+        def check(label, ok, detail=""):
+            checks.append((ok, label, detail))
+
+        check("every invoice migrated",
+              rows["invoices"] == self.sheet_invoices,
+              f"{rows['invoices']} of {self.sheet_invoices}")
+
+        sheet_total, adjust, pg_total = self.sheet_paid, self.adjust, self.paid
+        check("paid revenue matches, net of recorded adjustments",
+              sheet_total + adjust == pg_total,
+              f"sheet ${sheet_total:,} + ${adjust} adjustment = ${sheet_total + adjust:,} "
+              f"vs migrated ${pg_total:,}")
+
+        check("every line item migrated or relocated to credit_applied",
+              rows["invoice_lines"] + self.relocated == self.sheet_lines,
+              f"{rows['invoice_lines']} lines + {self.relocated} relocated of {self.sheet_lines}")
+
+        check("invoice ids unique", not self.dupes["invoices"], f"{rows['invoices']} ids")
+        check("customer ids unique", not self.dupes["customers"], f"{rows['customers']} ids")
+        check("skus unique", not self.dupes["products"], f"{rows['products']} skus")
+
+        check("no invoice points at a missing customer", not nbad["customer"],
+              str(self.bad["customer"]))
+        check("no line points at a missing product", not nbad["product"],
+              str(self.bad["product"]))
+        check("no line points at a missing invoice", not nbad["invoice"],
+              str(self.bad["invoice"]))
+
+        check("all paid invoices have a paid_at (CHECK constraint)", not nbad["paid_at"])
+        check("no negative money", not nbad["money"])
+        check("no negative line prices (CHECK constraint)", not nbad["line_price"])
+        check("no negative customer credit (CHECK constraint)", not nbad["credit"])
+
+        check("invoice sequence starts above every existing id", self.max_id < 10200,
+              f"highest existing {self.max_id}, sequence starts 10200")
+        return checks
+
+
+class Payload:
+    """The transformed tables, written to disk as they stream past.
+
+    A directory: one <table>.ndjson per table, each line one row's values as a
+    JSON array in column order, and a manifest.json naming the columns and
+    recording each file's row count and SHA-256. Decimals and dates are
+    written as their exact strings. load.read_payload() streams it back a line
+    at a time and refuses it if a checksum doesn't match.
+
+    The manifest is written last and removed first, so a run that dies halfway
+    leaves a payload nothing will load.
+    """
+
+    def __init__(self, path):
+        self.path, self.tables = path, {}
+        os.makedirs(path, exist_ok=True)
+        manifest = os.path.join(path, "manifest.json")
+        if os.path.exists(manifest):
+            os.remove(manifest)
+
+    def table(self, name, rows):
+        cols, n, digest = None, 0, hashlib.sha256()
+        with open(os.path.join(self.path, f"{name}.ndjson"), "wb") as f:
+            for row in rows:
+                if cols is None:
+                    cols = list(row)
+                line = json.dumps([row[c] for c in cols], default=str,
+                                  separators=(",", ":")).encode() + b"\n"
+                f.write(line)
+                digest.update(line)
+                n += 1
+                yield row
+        self.tables[name] = dict(file=f"{name}.ndjson", columns=cols or [], rows=n,
+                                 sha256=digest.hexdigest())
+
+    def close(self, checks_passed):
+        tmp = os.path.join(self.path, "manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(dict(format="ndjson-1", written_at=datetime.now().isoformat(timespec="seconds"),
+                           checks_passed=checks_passed, tables=self.tables), f, indent=1)
+        os.replace(tmp, os.path.join(self.path, "manifest.json"))
+
+
+def report(rec, notes):
+    """Prints the dry-run report. True if every check passed."""
     print("\n=== TRANSFORM ===")
-    for t, rows in out.items():
-        print(f"  {t:<16} {len(rows):>6} rows")
+    for t, n in rec.rows.items():
+        print(f"  {t:<16} {n:>6} rows")
 
     print("\n=== NOTES ===")
     for n in collections.Counter(
@@ -322,26 +497,52 @@ def main():
         print(f"  {n[1]:>4}x  {n[0]}" if n[1] > 1 else f"        {n[0]}")
 
     print("\n=== RECONCILIATION ===")
-    checks = reconcile(raw, out)
+    checks = rec.checks()
     for ok, label, detail in checks:
         print(f"  {'PASS' if ok else 'FAIL'}  {label}" + (f"  ({detail})" if detail else ""))
     failed = [c for c in checks if not c[0]]
-
-    art = os.path.join(os.path.dirname(__file__), "migration_payload.json")
-    with open(art, "w") as f:
-        json.dump(out, f, default=str, indent=1)
-    print(f"\npayload written to {art}")
-
     if failed:
         print(f"\n{len(failed)} check(s) FAILED — not safe to load.")
-        sys.exit(1)
-    print("\nAll checks passed. Safe to load with --load once DATABASE_URL is set.")
+    return not failed
+
 
-    if "--load" in sys.argv:
+def main():
+    sh = connect()
+    print("reading spreadsheet...")
+    raw = extract(sh)
+    rec = Reconciler()
+    tables, notes = transform(raw, rec)
+    incremental = "--incremental" in sys.argv
+
+    art = os.path.join(os.path.dirname(__file__), "migration_payload")
+    payload = Payload(art)
+    streams = {t: payload.table(t, rows) for t, rows in tables.items()}
+    if "--load" in sys.argv and not incremental:
         sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
         from load import load          # noqa: separate module, only imported when loading
         print("\n=== LOAD ===")
-        load(out)
+        # The checks run inside the load's transaction, after the last row
+        # is in; load() commits only if they pass.
+        ok = load(streams, verify=lambda: report(rec, notes))
+    else:
+        for rows in streams.values():
+            collections.deque(rows, maxlen=0)
+        ok = report(rec, notes)
+    payload.close(ok)
+    print(f"\npayload written to {art}/")
+
+    if not ok:
+        sys.exit(1)
+    if "--load" in sys.argv and incremental:
+        # An incremental load commits table by table, so it can't be vetoed at
+        # the end like a rebuild: it only starts once the dry run is clean, and
+        # loads the payload that dry run just wrote.
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from load import load_incremental, read_payload      # noqa: see above
+        print("\n=== INCREMENTAL LOAD ===")
+        load_incremental(read_payload(art))
+    if "--load" not in sys.argv:
+        print("\nAll checks passed. Safe to load with --load once DATABASE_URL is set.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,386 @@
+"""Applies the numbered migrations, db/NNN_*.sql, and remembers which ran.
+
+    python db/migrations.py                   # dry run: what's pending, what each
+                                              # statement will lock, for how long
+    python db/migrations.py --apply           # run what's pending, then make
+                                              # sure next year's partitions exist
+    python db/migrations.py --baseline 006    # record 002..006 as already applied
+                                              # (they were run by hand) without
+                                              # running them
+
+schema.sql is the starting point and is not a migration; a database built by
+load.py has none of these applied yet.
+
+Every applied file is recorded in schema_migrations with a SHA-256 of its text.
+Editing a file after it has run is refused rather than silently skipped: the
+database would no longer match what the file says.
+
+The dry run is the point, again. 004 dropped and re-added line_total, which
+rewrote invoice_lines under an ACCESS EXCLUSIVE lock — nothing could read a
+single line, so no receipt, no kiosk, until it finished. The dry run reads each
+statement, names the lock it takes and whether it rewrites or scans the table,
+and sizes that from the live catalog, so a change like that is seen coming and
+run after closing.
+
+Each file runs in one transaction, with a lock_timeout: an ALTER stuck behind
+the kiosk's open transaction gives up after a few seconds instead of queueing,
+because every read that arrives behind a waiting ACCESS EXCLUSIVE queues too.
+A file containing CREATE INDEX CONCURRENTLY (or any other CONCURRENTLY) can't
+run inside a transaction, so it runs in autocommit instead: the concurrent
+statements on their own, everything between them in a transaction each. Write
+those files to be safely re-runnable — IF NOT EXISTS — since a failure partway
+leaves the first half applied.
+"""
+import os
+import re
+import sys
+import glob
+import time
+import hashlib
+
+import psycopg
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load import _url       # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOCK_TIMEOUT = "5s"
+
+# What each lock level stops the shop from doing while it is held.
+BLOCKS = {
+    "ACCESS EXCLUSIVE": "blocks reads and writes",
+    "EXCLUSIVE": "blocks writes",
+    "SHARE ROW EXCLUSIVE": "blocks writes",
+    "SHARE": "blocks writes",
+    "SHARE UPDATE EXCLUSIVE": "blocks other DDL only",
+    "ROW EXCLUSIVE": "blocks other DDL only",
+}
+
+
+def files():
+    """[(version, name, path)] for every db/NNN_*.sql, in order."""
+    out = []
+    for path in sorted(glob.glob(os.path.join(HERE, "[0-9][0-9][0-9]_*.sql"))):
+        name = os.path.basename(path)
+        out.append((name[:3], name, path))
+    return out
+
+
+def checksum(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# -- splitting ----------------------------------------------------------------
+_DOLLAR = re.compile(r"\$([A-Za-z_][A-Za-z_0-9]*)?\$")
+
+
+def split(sql):
+    """Statements in a file, comments removed. Knows enough SQL to leave alone
+    the semicolons inside quotes and $$-quoted function bodies."""
+    out, buf, start, i, n = [], [], 0, 0, len(sql)
+    while i < n:
+        if sql.startswith("--", i) or sql.startswith("/*", i):
+            buf.append(sql[start:i] + " ")
+            end = sql.find("\n", i) if sql[i + 1] == "-" else sql.find("*/", i) + 1
+            i = start = n if end <= 0 else end + 1
+            continue
+        c = sql[i]
+        if c in "'\"":
+            j = i + 1
+            while j < n:
+                if sql[j] == c:
+                    if sql.startswith(c * 2, j):
+                        j += 2
+                        continue
+                    break
+                j += 1
+            i = j + 1
+            continue
+        if c == "$":
+            m = _DOLLAR.match(sql, i)
+            if m:
+                end = sql.find(m.group(0), m.end())
+                i = n if end < 0 else end + len(m.group(0))
+                continue
+        if c == ";":
+            buf.append(sql[start:i])
+            stmt = "".join(buf).strip()
+            if stmt:
+                out.append(stmt)
+            buf, start = [], i + 1
+        i += 1
+    buf.append(sql[start:])
+    stmt = "".join(buf).strip()
+    if stmt:
+        out.append(stmt)
+    return out
+
+
+# -- what a statement locks -----------------------------------------------------
+def outside_transaction(stmt):
+    return bool(re.search(r"\bCONCURRENTLY\b", stmt, re.I)) or stmt.upper().startswith("VACUUM")
+
+
+def _commas(s):
+    """Split on commas outside parentheses: ALTER TABLE's subcommands."""
+    parts, depth, start = [], 0, 0
+    for i, c in enumerate(s):
+        depth += c == "("
+        depth -= c == ")"
+        if c == "," and depth == 0:
+            parts.append(s[start:i])
+            start = i + 1
+    parts.append(s[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _name(s):
+    return s.split("(")[0].split(".")[-1].strip('"').lower()
+
+
+def _references(sub):
+    return [(_name(r), "SHARE ROW EXCLUSIVE", None)
+            for r in re.findall(r"REFERENCES\s+(\S+?)\s*\(", sub, re.I)]
+
+
+def _alter_table(table, body):
+    """[(table, lock, effect)] for one ALTER TABLE."""
+    out = []
+    for sub in _commas(body):
+        u = sub.upper()
+        if re.match(r"ADD (?!(CONSTRAINT|CHECK|PRIMARY|UNIQUE|FOREIGN|EXCLUDE)\b)", u):
+            # A plain new column is catalog-only since Postgres 11. One whose
+            # every row needs computing is not.
+            volatile = re.search(r"\bDEFAULT\b.*\b(NEXTVAL|RANDOM|CLOCK_TIMESTAMP|GEN_RANDOM_UUID)\b", u)
+            serial = re.search(r"\b(BIG|SMALL)?SERIAL\b", u)
+            rewrite = "STORED" in u or volatile or serial
+            out.append((table, "ACCESS EXCLUSIVE", "rewrite" if rewrite else None))
+            out += _references(sub)
+        elif re.search(r"\bALTER (COLUMN )?\S+ (SET DATA )?TYPE\b", u):
+            out.append((table, "ACCESS EXCLUSIVE", "rewrite"))
+        elif "FOREIGN KEY" in u or (u.startswith("ADD") and "REFERENCES" in u):
+            effect = None if "NOT VALID" in u else "scan"
+            out.append((table, "SHARE ROW EXCLUSIVE", effect))
+            out += _references(sub)
+        elif u.startswith("ADD") and "CHECK" in u:
+            out.append((table, "ACCESS EXCLUSIVE", None if "NOT VALID" in u else "scan"))
+        elif u.startswith("ADD") and re.search(r"\b(PRIMARY KEY|UNIQUE)\b", u) and "USING INDEX" not in u:
+            out.append((table, "ACCESS EXCLUSIVE", "index build"))
+        elif "SET NOT NULL" in u:
+            out.append((table, "ACCESS EXCLUSIVE", "scan"))
+        elif u.startswith("VALIDATE CONSTRAINT"):
+            out.append((table, "SHARE UPDATE EXCLUSIVE", "scan"))
+        else:
+            # DROP COLUMN, DROP CONSTRAINT, RENAME, SET DEFAULT...: catalog only,
+            # but still ACCESS EXCLUSIVE for the moment it takes.
+            out.append((table, "ACCESS EXCLUSIVE", None))
+    return out
+
+
+def classify(stmt):
+    """[(table, lock, effect)] that `stmt` takes on existing tables. `effect` is
+    None (brief), "scan", "index build" or "rewrite" — the last three take time
+    in proportion to the table."""
+    s = " ".join(stmt.split())
+    u = s.upper()
+    m = re.match(r"CREATE (UNIQUE )?INDEX (CONCURRENTLY )?(IF NOT EXISTS )?(\S+ )?ON (ONLY )?(\S+)", u)
+    if m:
+        return [(_name(m.group(6)), "SHARE UPDATE EXCLUSIVE" if m.group(2) else "SHARE",
+                 "index build")]
+    m = re.match(r"ALTER TABLE (IF EXISTS )?(ONLY )?(\S+) (.*)", s, re.I | re.S)
+    if m:
+        return _alter_table(_name(m.group(3)), m.group(4))
+    m = re.match(r"(UPDATE|DELETE FROM|INSERT INTO) (ONLY )?(\S+)", s, re.I)
+    if m:
+        return [(_name(m.group(3)), "ROW EXCLUSIVE",
+                 None if m.group(1).upper() == "INSERT INTO" else "scan")]
+    m = re.match(r"(CREATE (OR REPLACE )?TRIGGER|CREATE RULE) .*? ON (\S+)", s, re.I)
+    if m:
+        return [(_name(m.group(3)), "SHARE ROW EXCLUSIVE", None)]
+    m = re.match(r"(DROP|TRUNCATE) TABLE (IF EXISTS )?(\S+)", s, re.I)
+    if m:
+        return [(_name(m.group(3)), "ACCESS EXCLUSIVE", None)]
+    if u.startswith("CREATE TABLE"):
+        # A new table locks nothing anyone is using, except briefly whatever
+        # its foreign keys point at.
+        return _references(s)
+    return []
+
+
+# -- the record ------------------------------------------------------------------
+def applied(cur):
+    """{version: checksum} already run, or {} if nothing ever has."""
+    cur.execute("SELECT to_regclass('schema_migrations')")
+    if cur.fetchone()[0] is None:
+        return {}
+    cur.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cur.fetchall())
+
+
+def _ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     text PRIMARY KEY,
+            name        text NOT NULL,
+            checksum    text NOT NULL,
+            applied_at  timestamptz NOT NULL DEFAULT now(),
+            duration_ms integer,
+            baseline    boolean NOT NULL DEFAULT false
+        )
+    """)
+
+
+def _record(cur, version, name, digest, ms=None, baseline=False):
+    cur.execute("""
+        INSERT INTO schema_migrations (version, name, checksum, duration_ms, baseline)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (version, name, digest, ms, baseline))
+
+
+def _pending(cur):
+    done = applied(cur)
+    edited = [name for v, name, path in files() if v in done and done[v] != checksum(path)]
+    if edited:
+        raise SystemExit("changed since they were applied: " + ", ".join(edited)
+                         + "\nwrite a new migration instead of editing an old one.")
+    return [(v, name, path) for v, name, path in files() if v not in done], done
+
+
+# -- dry run ----------------------------------------------------------------------
+def _size(cur, table):
+    """(rows, bytes) from the planner's statistics, or None for a table that
+    doesn't exist yet."""
+    cur.execute("""
+        SELECT c.reltuples::bigint, pg_total_relation_size(c.oid)
+          FROM pg_class c WHERE c.oid = to_regclass(%s)
+    """, (table,))
+    size = cur.fetchone()
+    if size and size[0] < 0:
+        # Never analysed — freshly loaded. Count it; the shop's tables are
+        # small enough that this is quick.
+        cur.execute(f"SELECT count(*) FROM {table}")
+        size = (cur.fetchone()[0], size[1])
+    return size
+
+
+def dry_run(cur):
+    pending, done = _pending(cur)
+    print(f"{len(done)} applied, {len(pending)} pending")
+    flagged = False
+    for version, name, path in pending:
+        with open(path) as f:
+            stmts = split(f.read())
+        mode = ("autocommit — CONCURRENTLY can't run in a transaction"
+                if any(outside_transaction(s) for s in stmts) else "one transaction")
+        print(f"\n  {name}  ({len(stmts)} statements, {mode})")
+        for stmt in stmts:
+            head = " ".join(stmt.split())[:70]
+            locks = classify(stmt)
+            if not locks:
+                print(f"    {head}")
+                continue
+            print(f"    {head}")
+            for table, lock, effect in locks:
+                size = _size(cur, table)
+                rows = f"~{size[0]:,} rows, {size[1] / 1e6:.1f} MB" if size else "created above"
+                warn = "!!" if lock == "ACCESS EXCLUSIVE" and effect else "  "
+                flagged |= warn == "!!"
+                print(f"    {warn} {table:<16} {lock:<23} {effect or 'brief':<12} {rows}"
+                      f"  — {BLOCKS[lock]}" + (" while it runs" if effect else ""))
+    if flagged:
+        print("\n!! marks a table nobody can read until the statement finishes. "
+              "Run those after closing.")
+    if pending:
+        print("\nApply with --apply.")
+
+
+# -- applying -----------------------------------------------------------------------
+def apply(conn):
+    with conn.cursor() as cur:
+        pending, _ = _pending(cur)
+        if not pending:
+            print("nothing to apply.")
+            return
+        _ensure_table(cur)
+        cur.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        for version, name, path in pending:
+            with open(path) as f:
+                stmts = split(f.read())
+            print(f"  {name} ...", end="", flush=True)
+            t0 = time.perf_counter()
+            if any(outside_transaction(s) for s in stmts):
+                # Consecutive ordinary statements share a transaction; each
+                # CONCURRENTLY statement runs on its own in autocommit.
+                block = []
+                for stmt in stmts + [None]:
+                    if stmt is not None and not outside_transaction(stmt):
+                        block.append(stmt)
+                        continue
+                    if block:
+                        with conn.transaction():
+                            for b in block:
+                                cur.execute(b)
+                        block = []
+                    if stmt is not None:
+                        cur.execute(stmt)
+                ms = round((time.perf_counter() - t0) * 1000)
+                with conn.transaction():
+                    _record(cur, version, name, checksum(path), ms)
+            else:
+                with conn.transaction():
+                    for stmt in stmts:
+                        cur.execute(stmt)
+                    ms = round((time.perf_counter() - t0) * 1000)
+                    _record(cur, version, name, checksum(path), ms)
+            print(f" {ms} ms")
+    print("done.")
+
+
+def sales_years(conn):
+    """This year's and next year's partitions of invoices, invoice_lines and
+    stock_moves (009). Creating one locks all three ACCESS EXCLUSIVE for a
+    moment, so it's done here, on deploy, and never by a sale."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regproc('ensure_sales_year') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return
+        cur.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        with conn.transaction():
+            cur.execute("""
+                WITH this AS (
+                    SELECT extract(year FROM now() AT TIME ZONE 'America/Los_Angeles')::integer AS y)
+                SELECT max(year) FROM (SELECT year, ensure_sales_year(year)
+                                         FROM this, generate_series(this.y, this.y + 1) year) t""")
+            print(f"sales years ready through {cur.fetchone()[0]}.")
+
+
+def baseline(conn, upto):
+    with conn.cursor() as cur, conn.transaction():
+        done = applied(cur)
+        _ensure_table(cur)
+        for version, name, path in files():
+            if version <= upto and version not in done:
+                _record(cur, version, name, checksum(path), baseline=True)
+                print(f"  {name}  recorded as applied")
+
+
+def main():
+    with psycopg.connect(_url(), autocommit=True) as conn:
+        try:
+            if "--baseline" in sys.argv:
+                baseline(conn, sys.argv[sys.argv.index("--baseline") + 1].zfill(3))
+            elif "--apply" in sys.argv:
+                apply(conn)
+                sales_years(conn)
+            else:
+                with conn.cursor() as cur:
+                    dry_run(cur)
+        except psycopg.errors.LockNotAvailable:
+            raise SystemExit(f"\ngave up waiting {LOCK_TIMEOUT} for a lock — something "
+                             "held it open (a kiosk mid-sale?). Nothing from that file "
+                             "was applied; try again, or after closing.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Deterministic, spreadsheet-shaped shop data at any scale.
+
+Rows come out exactly as the Sheets API hands them over — lists of strings in
+the old column order — so they feed migrate.transform() the same way the real
+workbook does. Scale 1 is the shop as it stood at cut-over: 226 customers,
+1,507 products, 1,374 invoices, 7,825 line items.
+
+Nothing is held in memory. Every tab regenerates its rows from the seed each
+time it is iterated, which is also how migrate.Tab behaves, so a benchmark at
+a million lines measures the pipeline and not this module.
+
+The quirks the real sheet had are here in proportion, because they are the
+expensive paths: discontinued SKUs on old lines, FREIGHT and GIFT-CERT lines,
+discounts and store credit entered as negative line items, and the odd invoice
+whose credit pushed its recorded total below zero.
+"""
+import random
+from datetime import datetime, timedelta
+
+TODAY = dict(customers=226, products=1507, invoices=1374, lines=7825)
+
+START = datetime(2022, 1, 3, 9, 0)
+SPAN = timedelta(days=4 * 365 + 200)
+
+PAYMENTS = ["Cash", "Check", "Check", "Card", "Venmo", "Invoice (Pay Later)",
+            "Check (+$5.0 Credit)"]
+CATEGORIES = ["Thread", "Buttons", "Zippers", "Needles", "Notions", "Books", "Trims"]
+
+
+def _money(x):
+    return f"{x:.2f}"
+
+
+def _price(k):
+    return 0.45 + (k * 7919 % 2400) / 100
+
+
+class _Tab:
+    """Re-iterable view of one worksheet."""
+
+    def __init__(self, rows, *args):
+        self.rows, self.args = rows, args
+
+    def __iter__(self):
+        return self.rows(*self.args)
+
+
+class Shop:
+    """Sizes and seed for one synthetic workbook."""
+
+    def __init__(self, scale=1.0, seed=0):
+        n = {k: max(1, round(v * scale)) for k, v in TODAY.items()}
+        self.seed = seed
+        self.customers, self.products, self.invoices = n["customers"], n["products"], n["invoices"]
+        self.per_invoice = n["lines"] / n["invoices"]
+        # Roughly one line in seven points at a SKU no longer in Inventory.
+        self.discontinued = max(1, self.products // 6)
+
+    # -- per-invoice, so Transactions and TransactionItems agree ---------------
+    def _invoice(self, i):
+        rng = random.Random(self.seed * 1_000_003 + i)
+        n = max(1, round(rng.expovariate(1 / self.per_invoice)))
+        wholesale = rng.random() < 0.08
+        lines, subtotal = [], 0.0
+        for _ in range(n):
+            r = rng.random()
+            if r < 0.03:
+                sku, name, price = "FREIGHT", "Shipping", round(rng.uniform(4, 25), 2)
+            elif r < 0.17:
+                k = rng.randrange(self.discontinued)
+                sku, name, price = f"OLD-{k:05d}", f"Discontinued item {k}", round(_price(k), 2)
+            else:
+                k = rng.randrange(self.products)
+                sku, name = f"SKU-{k:06d}", f"Item {k}"
+                price = round(_price(k) * (0.6 if wholesale else 1), 2)
+            qty = rng.choice((1, 1, 1, 2, 2, 3, 4, 6, 12))
+            lines.append([str(i), sku, str(qty), _money(price), name])
+            subtotal += qty * price
+        if rng.random() < 0.004:
+            gift = round(rng.choice((25, 50, 100)), 2)
+            lines.append([str(i), "GIFT-CERT", "1", _money(gift), "Gift Certificate"])
+            subtotal += gift
+        discount = credit = 0.0
+        if rng.random() < 0.02:
+            discount = round(subtotal * rng.choice((0.1, 0.2, 0.4)), 2)
+            lines.append([str(i), "", "1", _money(-discount), "Bulk Discount"])
+        tax = 0.0 if wholesale else round((subtotal - discount) * 0.0775, 2)
+        total = subtotal - discount + tax
+        if rng.random() < 0.01:
+            # Store credit typed in as a line; now and then more than the sale.
+            credit = round(total * (1.2 if rng.random() < 0.1 else 0.5), 2)
+            lines.append([str(i), "", "1", _money(-credit), "Store Credit applied"])
+        return rng, lines, round(total - credit, 2), tax, wholesale
+
+    # -- tabs ------------------------------------------------------------------
+    def _customers(self):
+        rng = random.Random(self.seed ^ 0xC)
+        for k in range(self.customers):
+            yield [f"C-{k:x}", f"Customer {k}", f"c{k}@example.com" if rng.random() < 0.6 else "",
+                   f"209555{k % 10000:04d}", "2023-04-01", "", "",
+                   _money(rng.choice((0, 0, 0, 0, 5, 25, 40))),
+                   "TRUE" if rng.random() < 0.05 else "FALSE",
+                   ".0825" if rng.random() < 0.02 else ""]
+
+    def _inventory(self):
+        rng = random.Random(self.seed ^ 0x1)
+        for k in range(self.products):
+            price = _price(k)
+            yield [f"SKU-{k:06d}", f"Item {k}", _money(price), str(rng.randint(-3, 120)),
+                   f"V{k % 12}", CATEGORIES[k % len(CATEGORIES)], _money(price * 0.6),
+                   _money(price * 0.4) if rng.random() < 0.8 else "",
+                   "FALSE" if rng.random() < 0.03 else "TRUE"]
+
+    def _transactions(self):
+        step = SPAN / self.invoices
+        for i in range(1, self.invoices + 1):
+            rng, _, total, tax, wholesale = self._invoice(i)
+            sold = START + step * i
+            pay = "Invoice (Pay Later)" if wholesale else rng.choice(PAYMENTS)
+            status = "Pending" if "Pay Later" in pay and rng.random() < 0.3 else "Paid"
+            cust = f"C-{rng.randrange(self.customers):x}" if rng.random() < 0.7 else "Guest"
+            yield [str(i), sold.strftime("%Y-%m-%d %H:%M:%S"), _money(total), pay, cust,
+                   status, (sold + timedelta(days=30)).strftime("%Y-%m-%d"), _money(tax),
+                   "TRUE" if wholesale else "FALSE"]
+
+    def _items(self):
+        for i in range(1, self.invoices + 1):
+            yield from self._invoice(i)[1]
+
+    def _vendors(self):
+        for k in range(12):
+            yield [f"V{k}", f"Vendor {k}", "", "", "", ""]
+
+    def _expenses(self):
+        months = max(1, round(SPAN.days / 30))
+        for m in range(months):
+            day = (START + timedelta(days=30 * m)).strftime("%Y-%m-%d")
+            yield [day, "Rent", "850.00", "Shop rent"]
+            yield [day, "Fabric", _money(_price(m) * 20), "Restock"]
+
+    def _settings(self):
+        yield ["TaxRate", "0.0775"]
+        yield ["CompanyName", "Notion to Sew"]
+        yield ["Address", "Modesto, CA"]
+        yield ["NextInvoiceID", str(self.invoices + 1)]
+
+    def sheets(self):
+        """{tab: re-iterable rows}, keyed like migrate.extract()."""
+        return {"Inventory": _Tab(self._inventory), "Transactions": _Tab(self._transactions),
+                "TransactionItems": _Tab(self._items), "Customers": _Tab(self._customers),
+                "Vendors": _Tab(self._vendors), "Expenses": _Tab(self._expenses),
+                "Settings": _Tab(self._settings)}
+
+
+def sheets(scale=1.0, seed=0):
+    return Shop(scale, seed).sheets()
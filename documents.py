@@ -3,18 +3,25 @@
 Split out of backend.py so the storage layer can be swapped without touching a
 line of document generation. Nothing here talks to a database.
 """
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email.mime.text import MIMEText
-from email import encoders
 from datetime import datetime
 import streamlit as st
 import pytz
-from fpdf import FPDF
+
+import metrics
+import profiling
+
+PDF_SECONDS = metrics.histogram("nts_pdf_render_seconds", "Time to render a PDF.", ["document"])
+EMAILS = metrics.counter("nts_receipt_emails_total", "Receipt emails, by outcome.", ["outcome"])
+
+# fpdf and the email modules are imported where they're used: backend.py
+# re-exports this module, so anything imported up here is paid by every page
+# load, and only a receipt, a reprint or the income statement needs them.
 
 # --- PDF GENERATOR ---
+@profiling.timed("pdf")
+@PDF_SECONDS.timed(document="invoice")
 def create_pdf(invoice_id, customer_name, company_address, cart, subtotal, tax, total, due_date, credit_applied=0.0, transaction_date=None, discount_amount=0.0, freight_amount=0.0):
+    from fpdf import FPDF
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Helvetica", "B", 20); pdf.cell(0, 10, "Notion to Sew", ln=True)
@@ -70,6 +77,7 @@ def create_pdf(invoice_id, customer_name, company_address, cart, subtotal, tax,
     pdf.set_font("Helvetica", "B", 12); pdf.cell(165, 8, "AMOUNT DUE:", 0, 0, 'R'); pdf.cell(25, 8, f"${max(0.0, total - credit_applied):.2f}", 0, 1, 'R')
     return pdf.output(dest='S').encode('latin-1')
 # --- EMAIL RECEIPT ---
+@EMAILS.counts()
 def send_receipt_email(to_email: str, invoice_id: str, pdf_bytes: bytes):
     """Sends the PDF receipt as an email attachment via Gmail SMTP.
     Requires [email] sender and app_password keys in st.secrets.
@@ -110,6 +118,12 @@ def send_receipt_email(to_email: str, invoice_id: str, pdf_bytes: bytes):
     except Exception:
         company_name = "Notion to Sew"
 
+    import smtplib
+    from email import encoders
+    from email.mime.base import MIMEBase
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
     msg = MIMEMultipart()
     msg['From'] = f"{company_name} <{sender}>"
     msg['To'] = to_email
@@ -138,7 +152,10 @@ def send_receipt_email(to_email: str, invoice_id: str, pdf_bytes: bytes):
         smtp.send_message(msg)
 
 # --- REPORT GENERATION ---
+@profiling.timed("pdf")
+@PDF_SECONDS.timed(document="income_statement")
 def generate_income_statement_pdf(start_date, end_date, financials):
+    from fpdf import FPDF
     pdf = FPDF()
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
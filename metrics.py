@@ -0,0 +1,216 @@
+"""Operational counters and histograms, in Prometheus' text format.
+
+Everything the shop would want a graph of or an alert on when a weekend goes
+wrong: sales committed and failed, how long a checkout takes, the snapshot's
+hits, re-reads and invalidations, the connection pool, PDF render times and
+whether receipt emails go out. backend.py and documents.py record them; nothing
+here touches Streamlit, so it works the same from a bench script.
+
+Two ways out, both off unless configured, so a deploy that doesn't scrape pays
+only for the counting:
+
+    METRICS_PORT=9464          serve GET /metrics on that port, from a daemon
+                               thread; point Prometheus at it
+    METRICS_TEXTFILE=/var/lib/node_exporter/textfile/nts.prom
+                               rewrite that file every METRICS_INTERVAL seconds
+                               (default 15), for node_exporter's textfile
+                               collector where the app can't open a port
+
+prometheus_client would do this too. It isn't in requirements.txt, and the
+subset used here — counters and histograms with labels, rendered as text — is
+the page below.
+
+The numbers are per process. Streamlit runs every session in one process, so
+that is per deployment.
+"""
+import contextlib
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds. From a cached snapshot read to a slow SMTP handshake.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_lock = threading.Lock()
+_metrics = {}
+_collectors = {}
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v):
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {} if labels else {(): 0}
+
+    def inc(self, n=1, **labels):
+        key = tuple(labels[k] for k in self.labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def counts(self, **labels):
+        """Decorator: one increment per call, outcome="ok" or "error"."""
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                try:
+                    out = fn(*args, **kwargs)
+                except Exception:
+                    self.inc(outcome="error", **labels)
+                    raise
+                self.inc(outcome="ok", **labels)
+                return out
+            return inner
+        return wrap
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        out += [f"{self.name}{_labels(self.labels, k)} {_num(v)}" for k, v in sorted(self.values.items())]
+        return out
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket..., +Inf count, sum]
+        self.values = {} if labels else {(): [0] * (len(self.buckets) + 1) + [0.0]}
+
+    def observe(self, seconds, **labels):
+        key = tuple(labels[k] for k in self.labels)
+        with _lock:
+            v = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, le in enumerate(self.buckets):
+                if seconds <= le:
+                    v[i] += 1
+            v[-2] += 1
+            v[-1] += seconds
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def timed(self, **labels):
+        """Decorator form of time()."""
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.time(**labels):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, v in sorted(self.values.items()):
+            for le, n in zip(self.buckets + ("+Inf",), v[:-1]):
+                lab = _labels(self.labels + ("le",), key + (le if le == "+Inf" else _num(le),))
+                out.append(f"{self.name}_bucket{lab} {n}")
+            out.append(f"{self.name}_sum{_labels(self.labels, key)} {_num(v[-1])}")
+            out.append(f"{self.name}_count{_labels(self.labels, key)} {v[-2]}")
+        return out
+
+
+# By name, and the existing one handed back: Streamlit re-executes an edited
+# module in place, and the counts shouldn't restart or appear twice.
+def counter(name, help, labels=()):
+    with _lock:
+        return _metrics.setdefault(name, Counter(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=BUCKETS):
+    with _lock:
+        return _metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+
+def collector(key, fn):
+    """Registers fn() -> [(name, type, help, value)], read at every render.
+    For numbers something else already keeps, like the pool's. A second call
+    with the same key replaces the first."""
+    _collectors[key] = fn
+
+
+def render() -> str:
+    with _lock:
+        lines = [line for m in _metrics.values() for line in m.render()]
+    for fn in list(_collectors.values()):
+        try:
+            samples = fn()
+        except Exception:
+            continue
+        for name, kind, help, value in samples:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {_num(value)}"]
+    return "\n".join(lines) + "\n"
+
+
+# --- EXPOSITION ---------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _write_textfile(path, interval):
+    while True:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(render())
+            os.replace(tmp, path)   # the collector must never read half a file
+        except OSError:
+            pass
+        time.sleep(interval)
+
+
+_started = False
+
+
+def expose():
+    """Starts whatever METRICS_PORT / METRICS_TEXTFILE ask for, once per process."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        try:
+            server = ThreadingHTTPServer(("", int(port)), _Handler)
+        except OSError:
+            server = None   # taken: another app process on this host serves it
+        if server:
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    path = os.environ.get("METRICS_TEXTFILE")
+    if path:
+        interval = float(os.environ.get("METRICS_INTERVAL", 15))
+        threading.Thread(target=_write_textfile, args=(path, interval),
+                         name="metrics-textfile", daemon=True).start()
@@ -5,10 +5,18 @@ import base64
 import sys, pathlib
 sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
 import ui
+import profiling
 import streamlit.components.v1 as components
 
+# Every session shares one snapshot of the ledger (backend.Snapshot). With
+# copy-on-write, a page that assigns into a frame copies what it changes
+# instead of writing through to everyone's. Pages must not mutate snapshot
+# frames in place all the same: the write lands in their own copy and is lost.
+pd.set_option("mode.copy_on_write", True)
+
 # --- CONFIG (iPad Optimized - Refined) ---
 st.set_page_config(page_title="Kiosk | Notion to Sew", layout="wide", initial_sidebar_state="collapsed")
+profiling.start("Kiosk.py")
 
 ui.inject(kiosk=True)
 
@@ -24,12 +32,14 @@ components.html(
 
 # --- INIT ---
 if 'data' not in st.session_state or not st.session_state['data']:
-    st.session_state['data'] = db.get_data()
+    with profiling.section("get_data"):
+        st.session_state['data'] = db.get_data()
 if 'kiosk_cart' not in st.session_state: st.session_state['kiosk_cart'] = []
 if 'page' not in st.session_state: st.session_state['page'] = 'shop'
 if 'show_admin_login' not in st.session_state: st.session_state['show_admin_login'] = False
 
 # --- HELPERS ---
+@profiling.timed("top sellers")
 def _top_sellers(inv_df, n=4):
     """Actual best sellers by units over the last 12 months.
 
@@ -37,13 +47,13 @@ def _top_sellers(inv_df, n=4):
     spreadsheet, unchanging and unrelated to what people buy.
     """
     try:
-        items = st.session_state['data']['items']
-        trans = st.session_state['data']['transactions']
+        start = pd.Timestamp.now() - pd.DateOffset(months=12)
+        trans, items = db.sales_between(start, pd.Timestamp.now())
         if items.empty or trans.empty:
             return inv_df.head(n)
-        cutoff = (pd.Timestamp.now() - pd.DateOffset(months=12)).strftime('%Y-%m-%d')
-        recent = trans[trans['Timestamp'].astype(str) >= cutoff]['TransactionID'].astype(str)
-        sold = items[items['TransactionID'].astype(str).isin(set(recent))]
+        cutoff = start.strftime('%Y-%m-%d')
+        recent = trans[trans['Timestamp'].astype(str) >= cutoff]['TransactionID']
+        sold = items[items['TransactionID'].isin(recent)]
         ranked = (sold.assign(_q=pd.to_numeric(sold['QtySold'], errors='coerce').fillna(0))
                       .groupby(sold['SKU'].astype(str).str.strip())['_q'].sum()
                       .sort_values(ascending=False))
@@ -71,6 +81,42 @@ def _get_pdf_print_button(pdf_bytes, label="🖨️ Print / Open in New Tab"):
         st.markdown(html, unsafe_allow_html=True)
     except: pass
 
+# --- BARCODE SCAN ---
+# A scanner types the SKU and presses Enter. That is one exact lookup and an
+# add to the cart inside this fragment, so thirty scans at the counter are
+# thirty small reruns, not thirty rebuilds of the search list below it.
+def _kiosk_scan():
+    code = st.session_state['kiosk_scan'].strip()
+    st.session_state['kiosk_scan'] = ""
+    if not code: return
+    item = db.lookup_sku(code)
+    if item is None or str(item.get('Active', True)).strip().lower() in ['false', '0', 'no', '']:
+        st.session_state['kiosk_scan_msg'] = ("warning", f"We couldn't find item **{code}** — please ask for help.")
+        return
+    for cart_item in st.session_state['kiosk_cart']:
+        if str(cart_item['sku']) == str(item['SKU']):
+            cart_item['qty'] += 1
+            break
+    else:
+        st.session_state['kiosk_cart'].append({"sku": item['SKU'], "name": item['Name'], "price": item['Price'], "qty": 1})
+    st.session_state['kiosk_scan_msg'] = ("success", f"Added **{item['Name']}**")
+
+@st.fragment
+def _scan_bar():
+    st.text_input("Scan", key="kiosk_scan", on_change=_kiosk_scan,
+                  placeholder="📷  SCAN A BARCODE", label_visibility="collapsed")
+    kind, msg = st.session_state.get('kiosk_scan_msg', (None, None))
+    count = sum(item['qty'] for item in st.session_state['kiosk_cart'])
+    if kind == "warning" or (kind and count):
+        # The cart button above is outside this fragment and only catches up on
+        # the next full rerun, so the scan bar carries its own way to checkout.
+        c_msg, c_go = st.columns([4, 1.2], vertical_alignment="center")
+        getattr(c_msg, kind)(msg)
+        if count and c_go.button(f"🛒 CHECKOUT ({count})", key="scan_checkout", type="primary", use_container_width=True):
+            st.session_state.pop('kiosk_scan_msg', None)
+            go_checkout()
+            st.rerun()
+
 # --- STAFF ACCESS (RESTORED) ---
 with st.sidebar:
     st.markdown("### 🔐 Staff Access")
@@ -116,8 +162,10 @@ if st.session_state['page'] == 'shop':
     # --- HERO SECTION (SLIMMER & SOFTER) ---
     ui.wordmark("Quality Supplies · Local Service")
 
+    _scan_bar()
+
     # --- DOMINANT SEARCH BAR ---
-    df = st.session_state['data']['inventory'].copy()
+    df = st.session_state['data']['inventory']
     if 'Active' in df.columns:
         df = df[df['Active'].apply(lambda x: str(x).strip().lower() not in ['false', '0', 'no', ''])]
     df['lookup'] = df.apply(lambda r: f"{r['SKU']} — {r['Name']} (${float(r['Price']):.2f})", axis=1)
@@ -149,7 +197,7 @@ if st.session_state['page'] == 'shop':
     # --- SEARCH RESULT VIEW ---
     if search_selection:
         sku = search_selection.split(" — ")[0].strip()
-        row = df[df['SKU'].astype(str).str.strip() == sku].iloc[0]
+        row = db.lookup_sku(sku)
         
         if 'main_qty' not in st.session_state: st.session_state['main_qty'] = 1
         
@@ -405,3 +453,5 @@ elif st.session_state['page'] == 'success':
             st.write("")
             if st.button("🏠 Start New Order", type="primary", use_container_width=True):
                 st.session_state['last_kiosk_order'] = None; go_home(); st.rerun()
+
+profiling.finish()
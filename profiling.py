@@ -0,0 +1,195 @@
+"""Opt-in profiling of one rerun: where a slow page's time and memory go.
+
+Off unless the URL has ?profile=1 or Settings has "Profiling panel" ticked;
+when off, every call here is a few attribute lookups. When on, Home.py and
+Kiosk.py call start() before anything else and finish() last, and finish()
+puts a panel in the sidebar for the rerun that just ran:
+
+  sections   time in each `with profiling.section(...)` — get_data, every
+             Postgres statement, the page, each report, each PDF — and each
+             one's self time, what's left when its sub-sections are taken out.
+             A page's self time is its pandas and its widgets; the rerun's
+             "(unsectioned)" row is everything outside every section.
+  functions  cProfile of the script thread, top functions by own time
+  memory     tracemalloc: the lines that allocated the most during the rerun
+
+and two downloads: the whole thing as JSON, and the cProfile stats as a .prof
+file for pstats, snakeviz or gprof2dot.
+
+A rerun that ends in st.rerun() or st.stop() never reaches finish(), so it
+isn't shown; the panel is always the last rerun that ran to the end. Its
+profile is still ended: by end() where the page has a try/finally for it, and
+otherwise by the next start() in any session — cProfile left enabled on a
+thread refuses the next one (on 3.12+, in any thread). Fragment reruns don't
+run the script and aren't profiled. tracemalloc sees the whole process, so
+another session's rerun at the same moment shows up in memory; it's on only
+while some rerun is being profiled.
+"""
+import contextlib
+import cProfile
+import functools
+import json
+import marshal
+import sys
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+import streamlit as st
+
+_local = threading.local()
+_lock = threading.Lock()
+_runs = {}              # thread -> its rerun being profiled, not yet ended
+_tracing = False        # whether tracemalloc is on because of us
+
+
+def enabled() -> bool:
+    if str(st.query_params.get("profile", "")).lower() in ("1", "true", "on"):
+        return True
+    s = (st.session_state.get('data') or {}).get('settings')
+    return s is not None and (s.loc[s['Key'] == 'Profiling', 'Value'].astype(str) == 'on').any()
+
+
+def start(script: str):
+    """Begins profiling this rerun of `script`, if profiling is on."""
+    end()           # the last rerun on this thread stopped short of finish()
+    if _runs:
+        _sweep()
+    if not enabled():
+        return
+    global _tracing
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing = True
+        prof = cProfile.Profile()
+        run = {"script": script, "sections": {}, "stack": [], "prof": prof,
+               "thread": threading.current_thread(),
+               "mem": tracemalloc.take_snapshot(), "t0": time.perf_counter()}
+        _runs[run["thread"]] = run
+    _local.run = run
+    prof.enable()
+
+
+def end():
+    """Ends this thread's profile without drawing anything, for a finally:
+    the rerun may be on its way out through st.rerun() or st.stop()."""
+    run = getattr(_local, "run", None)
+    _local.run = None
+    if run is not None:
+        run["prof"].disable()
+        _release(run)
+
+
+def _release(run):
+    global _tracing
+    with _lock:
+        _runs.pop(run["thread"], None)
+        if not _runs and _tracing:
+            tracemalloc.stop()
+            _tracing = False
+
+
+def _sweep():
+    """Ends the runs of script threads that are gone: a rerun that st.stop()
+    ended on a page without a finally."""
+    for thread, run in list(_runs.items()):
+        if not thread.is_alive():
+            # Before 3.12 the profile died with its thread, and disable() here
+            # would unhook this one. From 3.12 it's process-wide and is still on.
+            if sys.version_info >= (3, 12):
+                run["prof"].disable()
+            _release(run)
+
+
+@contextlib.contextmanager
+def section(label: str):
+    """Times the block as `label`, nested under whatever section it's in."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        yield
+        return
+    run["stack"].append(label)
+    path = tuple(run["stack"])
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        run["stack"].pop()
+        rec = run["sections"].setdefault(path, [0.0, 0])
+        rec[0] += ms
+        rec[1] += 1
+
+
+def timed(label: str):
+    """Decorator form of section()."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with section(label):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def _sections(run, total):
+    rows = []
+    for path, (ms, calls) in run["sections"].items():
+        child = sum(c_ms for p, (c_ms, _) in run["sections"].items()
+                    if len(p) == len(path) + 1 and p[:len(path)] == path)
+        rows.append({"Section": " › ".join(path), "Calls": calls,
+                     "ms": round(ms, 1), "Self ms": round(ms - child, 1)})
+    top = sum(ms for path, (ms, _) in run["sections"].items() if len(path) == 1)
+    rows.append({"Section": "(unsectioned)", "Calls": 1,
+                 "ms": round(total - top, 1), "Self ms": round(total - top, 1)})
+    for r in rows:
+        r["% of rerun"] = round(100 * r["Self ms"] / total, 1) if total else 0.0
+    return sorted(rows, key=lambda r: -r["Self ms"])
+
+
+def _functions(stats, n):
+    rows = [{"Function": f"{func} ({file.rsplit('/', 1)[-1]}:{line})", "Calls": nc,
+             "Own ms": round(tt * 1000, 2), "Cumulative ms": round(ct * 1000, 2)}
+            for (file, line, func), (cc, nc, tt, ct, _) in stats.items()]
+    return sorted(rows, key=lambda r: -r["Own ms"])[:n]
+
+
+def _memory(before, after, n):
+    # Leave out the profiler's own bookkeeping: cProfile's tables and the
+    # snapshots themselves would otherwise top the list every time.
+    ours = [tracemalloc.Filter(False, f) for f in (cProfile.__file__, tracemalloc.__file__, __file__)]
+    diff = after.filter_traces(ours).compare_to(before.filter_traces(ours), "lineno")
+    return [{"Line": str(s.traceback[0]), "KB": round(s.size_diff / 1024, 1), "Blocks": s.count_diff}
+            for s in diff if s.size_diff > 0][:n]
+
+
+def finish():
+    """Ends this rerun's profile and draws the panel. No-op when off."""
+    run = getattr(_local, "run", None)
+    if run is None:
+        return
+    run["prof"].disable()
+    _local.run = None
+    total = (time.perf_counter() - run["t0"]) * 1000
+    run["prof"].create_stats()
+    stats = run["prof"].stats
+    report = {"script": run["script"], "total_ms": round(total, 1),
+              "sections": _sections(run, total), "functions": _functions(stats, 100),
+              "memory": _memory(run["mem"], tracemalloc.take_snapshot(), 25),
+              "traced_peak_kb": round(tracemalloc.get_traced_memory()[1] / 1024)}
+    _release(run)
+
+    with st.sidebar.expander(f"⏱️ Profile: {report['total_ms']:.0f} ms", expanded=True):
+        st.caption(f"{run['script']}, last full rerun")
+        st.dataframe(pd.DataFrame(report["sections"]), hide_index=True)
+        st.markdown("**Functions**, by own time")
+        st.dataframe(pd.DataFrame(report["functions"][:15]), hide_index=True)
+        st.markdown("**Memory** allocated during the rerun")
+        st.dataframe(pd.DataFrame(report["memory"][:10]), hide_index=True)
+        c1, c2 = st.columns(2)
+        c1.download_button("JSON", json.dumps(report, indent=1), file_name="profile.json",
+                           mime="application/json", key="_profile_json")
+        c2.download_button(".prof", marshal.dumps(stats), file_name="profile.prof",
+                           mime="application/octet-stream", key="_profile_prof")
@@ -156,8 +156,9 @@ export async function addFreight(invoiceId: number, amount: number) {
   const amt = round2(amount);
   if (amt <= 0) return false;
   await sql.transaction([
-    sql`INSERT INTO invoice_lines (invoice_id, sku, description, qty, unit_price)
-        VALUES (${invoiceId}, NULL, 'Shipping', 1, ${amt})`,
+    // Lines are partitioned by their invoice's year, so they carry its sold_at.
+    sql`INSERT INTO invoice_lines (invoice_id, sold_at, sku, description, qty, unit_price)
+        SELECT id, sold_at, NULL, 'Shipping', 1, ${amt} FROM invoices WHERE id = ${invoiceId}`,
     sql`UPDATE invoices SET total = total + ${amt} WHERE id = ${invoiceId}`,
   ]);
   return true;